@@ -7,6 +7,9 @@ Updates the grid_id column in the beaches table.
 import math
 from config import logger
 from database import supabase
+from reference_cache import BEACH_COLUMNS, GRID_POINT_COLUMNS, CoordinateIndex, load_reference_rows
+
+KM_TO_MILES = 0.621371
 
 
 def calculate_distance_miles(lat1, lon1, lat2, lon2):
@@ -58,93 +61,32 @@ def normalize_longitude(lon):
 
 
 def fetch_all_beaches():
-    """Fetch all beaches from database with their coordinates."""
+    """Fetch all beaches with their coordinates (local snapshot when the table is unchanged)."""
     logger.info("Fetching beaches from database...")
 
-    try:
-        # Fetch all beaches (Supabase has 1000 row default limit, so we need to paginate)
-        all_beaches = []
-        page_size = 1000
-        offset = 0
-
-        while True:
-            response = supabase.table("beaches").select(
-                "id, Name, LATITUDE, LONGITUDE, grid_id"
-            ).range(offset, offset + page_size - 1).execute()
-
-            if not response.data:
-                break
-
-            all_beaches.extend(response.data)
-
-            # If we got less than page_size, we're done
-            if len(response.data) < page_size:
-                break
-
-            offset += page_size
-
-        # Normalize column names to lowercase for easier handling
-        for beach in all_beaches:
-            beach['name'] = beach.pop('Name', None)
-            beach['latitude'] = beach.pop('LATITUDE', None)
-            beach['longitude'] = beach.pop('LONGITUDE', None)
-
-        logger.info(f"Found {len(all_beaches)} beaches")
-        return all_beaches
+    # Normalize column names to lowercase for easier handling (copies: snapshot rows are shared)
+    all_beaches = [
+        {
+            'id': row['id'],
+            'name': row.get('Name'),
+            'latitude': row.get('LATITUDE'),
+            'longitude': row.get('LONGITUDE'),
+            'grid_id': row.get('grid_id'),
+        }
+        for row in load_reference_rows(supabase, "beaches", BEACH_COLUMNS)
+    ]
 
-    except Exception as e:
-        logger.error(f"Error fetching beaches: {e}")
-        return []
+    logger.info(f"Found {len(all_beaches)} beaches")
+    return all_beaches
 
 
 def fetch_all_grid_points():
     """Fetch all grid points from database with their coordinates."""
     logger.info("Fetching grid points from database...")
 
-    try:
-        response = supabase.table("grid_points").select(
-            "id, latitude, longitude, region, distance_from_coast_miles"
-        ).execute()
-
-        grid_points = response.data
-        logger.info(f"Found {len(grid_points)} grid points")
-        return grid_points
-
-    except Exception as e:
-        logger.error(f"Error fetching grid points: {e}")
-        return []
-
-
-def find_nearest_grid_point(beach_lat, beach_lon, grid_points):
-    """
-    Find the nearest grid point to a beach.
-
-    Args:
-        beach_lat: Beach latitude (decimal degrees)
-        beach_lon: Beach longitude (decimal degrees, can be -180 to 180)
-        grid_points: List of grid point dicts with id, latitude, longitude
-
-    Returns:
-        Tuple of (grid_point_id, distance_miles)
-    """
-    # Normalize beach longitude to 0-360 range to match grid points
-    beach_lon_normalized = normalize_longitude(beach_lon)
-
-    min_distance = float('inf')
-    nearest_grid_id = None
-
-    for grid_point in grid_points:
-        grid_lat = grid_point['latitude']
-        grid_lon = grid_point['longitude']
-
-        # Calculate distance
-        distance = calculate_distance_miles(beach_lat, beach_lon_normalized, grid_lat, grid_lon)
-
-        if distance < min_distance:
-            min_distance = distance
-            nearest_grid_id = grid_point['id']
-
-    return nearest_grid_id, min_distance
+    grid_points = load_reference_rows(supabase, "grid_points", GRID_POINT_COLUMNS)
+    logger.info(f"Found {len(grid_points)} grid points")
+    return grid_points
 
 
 def assign_beaches_to_grid_points():
@@ -171,6 +113,17 @@ def assign_beaches_to_grid_points():
     # Process each beach
     logger.info(f"\nProcessing {len(beaches)} beaches...")
 
+    # Nearest grid point for every beach in one vectorized pass (haversine ignores the 0-360 / +-180 convention)
+    grid_index = CoordinateIndex(grid_points)
+    located = [b for b in beaches if b.get('latitude') is not None and b.get('longitude') is not None]
+    positions, distances_km = grid_index.nearest(
+        [b['latitude'] for b in located], [b['longitude'] for b in located]
+    )
+    nearest_by_beach = {
+        b['id']: (grid_index.ids[pos] if pos >= 0 else None, float(km) * KM_TO_MILES)
+        for b, pos, km in zip(located, positions.tolist(), distances_km.tolist())
+    }
+
     updates = []
     statistics = {
         'updated': 0,
@@ -193,7 +146,7 @@ def assign_beaches_to_grid_points():
             continue
 
         # Find nearest grid point
-        nearest_grid_id, distance = find_nearest_grid_point(beach_lat, beach_lon, grid_points)
+        nearest_grid_id, distance = nearest_by_beach[beach_id]
 
         if nearest_grid_id is None:
             logger.warning(f"   Could not find grid point for {beach_name} (ID: {beach_id})")
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for Hybrid Surf Database Update Script
+Runs the hot paths against synthetic GFSwave / GFS Atmospheric / CDIP data and
+an in-memory supabase stand-in (no NOMADS, THREDDS or Supabase traffic), and
+appends results to a JSON-lines history so runs can be compared over time.
+
+Usage:
+    python benchmark.py                              # all benchmarks at 100/1k/10k entities
+    python benchmark.py --sizes 100,1000 --only extraction,neighbor_fill
+    python benchmark.py --times 41 --repeat 3       # shorter horizon, best of 3
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from config import logger, BENCHMARK_HISTORY_PATH
+import benchmark_fixtures as fx
+from fake_supabase import FakeSupabaseClient
+import instrumentation
+from instrumentation import stage
+
+DEFAULT_SIZES = (100, 1000, 10000)
+CDIP_SITES_PER_SIZE = 0.1  # roughly one CDIP MOP site per ten grid points
+
+# Fake client swapped into database.supabase before any module binds it
+FAKE_SUPABASE = FakeSupabaseClient()
+
+
+@contextmanager
+def _patched(target, **attrs):
+    """Temporarily replace module attributes (network loaders, sleeps)."""
+    saved = {name: getattr(target, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(target, name, value)
+
+
+def _install_fake_supabase():
+    import database
+    import reference_cache
+    database.supabase = FAKE_SUPABASE
+    database._BEACH_INDEX = None
+    # Never read or overwrite the real reference snapshots
+    reference_cache.REFERENCE_CACHE_DIR = ""
+    reference_cache._LOADED.clear()
+
+
+# === SCENARIOS ===
+_scenarios = {}
+
+
+def _scenario(size: int, n_times: int) -> dict:
+    """Synthetic inputs for one entity count, built once and shared across benchmarks."""
+    key = (size, n_times)
+    if key not in _scenarios:
+        logger.info(f"   Building synthetic scenario: {size:,} entities x {n_times} time steps")
+        wave_ds = fx.make_gfswave_dataset(size, n_times)
+        grid_points = fx.make_grid_points(wave_ds, size)
+        beaches = fx.make_beaches(grid_points)
+        _scenarios[key] = {
+            "wave_ds": wave_ds,
+            "grid_points": grid_points,
+            "beaches": beaches,
+            "cdip_ds": fx.make_cdip_dataset(grid_points, max(1, int(size * CDIP_SITES_PER_SIZE))),
+            "atmos_ds": fx.make_gfs_atmospheric_dataset(n_times),
+            "grid_records": fx.make_forecast_records([p["id"] for p in grid_points], n_times),
+            "beach_records": fx.make_forecast_records([b["id"] for b in beaches], n_times, id_field="beach_id"),
+        }
+    return _scenarios[key]
+
+
+def _cdip_data(scenario: dict) -> dict:
+    """Run the real CDIP loader over the synthetic dataset."""
+    if "cdip_data" not in scenario:
+        import xarray as xr
+        import noaa_handler
+        with _patched(xr, open_dataset=lambda url, **kwargs: scenario["cdip_ds"]):
+            scenario["cdip_data"] = noaa_handler.load_single_cdip_dataset("synthetic://cdip", "socal")
+    return scenario["cdip_data"]
+
+
+def _copy_records(records):
+    return [dict(rec) for rec in records]
+
+
+# === BENCHMARKS ===
+# Each returns the number of records (or items) it processed.
+def bench_extraction(scenario: dict) -> int:
+    """GFSwave point extraction + record building + swell ranking (no CDIP)."""
+    from noaa_grid_handler import get_noaa_grid_data
+    return len(get_noaa_grid_data(scenario["wave_ds"], scenario["grid_points"]))
+
+
+def bench_cdip_extraction(scenario: dict) -> int:
+    """Same as extraction with the CDIP swell_1 enhancement enabled."""
+    from noaa_grid_handler import get_noaa_grid_data
+    cdip_data = _cdip_data(scenario)
+    return len(get_noaa_grid_data(scenario["wave_ds"], scenario["grid_points"], cdip_data))
+
+
+def bench_record_building(scenario: dict) -> int:
+    """Records -> ForecastFrame -> records round trip."""
+    from forecast_frame import ForecastFrame
+    frame = ForecastFrame.from_records(scenario["grid_records"], id_field="grid_id")
+    return len(frame.to_records())
+
+
+def bench_ranking(scenario: dict) -> int:
+    """rank_swell_trains over three synthetic swell trains per record."""
+    from swell_ranking import rank_swell_trains
+    ds = scenario["wave_ds"]
+    heights = [ds[f"swell_{k}"].values.ravel() for k in (1, 2, 3)]
+    periods = [ds[f"swper_{k}"].values.ravel() for k in (1, 2, 3)]
+    directions = [ds[f"swdir_{k}"].values.ravel() for k in (1, 2, 3)]
+    n = min(len(scenario["grid_records"]), heights[0].size)
+
+    for i in range(n):
+        rank_swell_trains([
+            {"height_ft": float(heights[k][i]) * 3.28084, "period_s": float(periods[k][i]),
+             "direction_deg": float(directions[k][i])}
+            for k in range(3)
+        ])
+    return n
+
+
+def bench_supplement_gfs_atmospheric(scenario: dict) -> int:
+    """GFS atmospheric supplement with the dataset served from memory and sleeps disabled."""
+    import gfs_atmospheric_cube
+    import gfs_atmospheric_handler_v2 as gfs
+    records = _copy_records(scenario["beach_records"])
+    with _patched(
+        gfs,
+        get_gfs_atmospheric_dataset_url=lambda: "synthetic://gfs_0p25",
+        load_gfs_atmospheric_dataset=lambda url: scenario["atmos_ds"],
+    ), _patched(gfs_atmospheric_cube, enforce_noaa_rate_limit=lambda *args, **kwargs: None):
+        return len(gfs.get_gfs_atmospheric_supplement_data(scenario["beaches"], records))
+
+
+def bench_supplement_tides(scenario: dict) -> int:
+    """Harmonic tide + CO-OPS water temp supplement with constants and station series served from memory."""
+    import noaa_tides_handler as tides
+    tide_series = fx.make_coops_series()
+    water_series = fx.make_coops_series(interval_minutes=360, seed=6)
+    records = _copy_records(scenario["beach_records"])
+    with _patched(
+        tides,
+        load_station_constants=lambda station_ids, *args, **kwargs: fx.make_tide_constants(station_ids),
+        get_tide_predictions=lambda station_id, begin, end, datum="MLLW": tide_series,
+        get_water_temperature=lambda station_id, begin, end: water_series,
+    ):
+        return len(tides.get_noaa_tides_supplement_data(scenario["beaches"], records))
+
+
+def bench_neighbor_fill(scenario: dict) -> int:
+    """fill_from_neighbors_rowwise over grid records with ~20% missing fields."""
+    from fill_neighbors import EXCLUDED_FIELDS, fill_from_neighbors_rowwise
+    records = _copy_records(scenario["grid_records"])
+    meta = {str(p["id"]): (p["latitude"], p["longitude"]) for p in scenario["grid_points"]}
+    fields = [name for name in records[0] if name not in EXCLUDED_FIELDS] if records else []
+    fill_from_neighbors_rowwise(records, meta, fields, time_fallback=1, cadence="3h")
+    return len(records)
+
+
+def bench_upsert_prep(scenario: dict) -> int:
+    """upsert_grid_forecast_data (prepare + dedupe + chunked upserts) into the fake client."""
+    from database import upsert_grid_forecast_data
+    return upsert_grid_forecast_data(_copy_records(scenario["grid_records"]))
+
+
+BENCHMARKS = {
+    "extraction": bench_extraction,
+    "cdip_extraction": bench_cdip_extraction,
+    "record_building": bench_record_building,
+    "ranking": bench_ranking,
+    "supplement_gfs_atmospheric": bench_supplement_gfs_atmospheric,
+    "supplement_tides": bench_supplement_tides,
+    "neighbor_fill": bench_neighbor_fill,
+    "upsert_prep": bench_upsert_prep,
+}
+
+
+# === RUNNER ===
+def run_benchmark(name: str, size: int, n_times: int, repeat: int = 1) -> dict:
+    """Run one benchmark `repeat` times and keep the fastest run."""
+    scenario = _scenario(size, n_times)
+    best = None
+    for _ in range(max(1, repeat)):
+        instrumentation.reset()
+        start = time.perf_counter()
+        error = None
+        items = 0
+        try:
+            with stage(f"{name}[{size}]"):
+                items = BENCHMARKS[name](scenario) or 0
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.error(f"   Benchmark {name} @ {size} failed: {error}")
+        elapsed = time.perf_counter() - start
+        report = instrumentation.build_run_report()
+
+        result = {
+            "benchmark": name,
+            "entities": size,
+            "time_steps": n_times,
+            "seconds": round(elapsed, 4),
+            "items": items,
+            "items_per_s": round(items / elapsed, 1) if elapsed > 0 else None,
+            "peak_rss_mb": report["peak_rss_mb"],
+            "opendap_reads": sum(report["opendap_reads"].values()),
+            "upsert_rows": sum(t["rows"] for t in report["upserts"].values()),
+        }
+        if error:
+            result["error"] = error
+        if best is None or (not error and result["seconds"] < best["seconds"]):
+            best = result
+    return best
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_history(path: str):
+    """All previous runs from the JSON-lines history (oldest first)."""
+    if not path or not os.path.exists(path):
+        return []
+    runs = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                runs.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"   Skipping malformed history line in {path}")
+    return runs
+
+
+def append_history(path: str, run: dict):
+    if not path:
+        return
+    try:
+        with open(path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(run, default=str) + "\n")
+        logger.info(f"   Benchmark history appended to {path}")
+    except OSError as e:
+        logger.warning(f"   Could not append benchmark history to {path}: {e}")
+
+
+def _previous_seconds(history, name: str, size: int, n_times: int):
+    for run in reversed(history):
+        for result in run.get("results", []):
+            if (result.get("benchmark"), result.get("entities"), result.get("time_steps")) == (name, size, n_times) \
+                    and "error" not in result:
+                return result.get("seconds")
+    return None
+
+
+def print_results(results, history):
+    logger.info("=" * 96)
+    logger.info(f"   {'benchmark':<28}{'entities':>9}{'seconds':>11}{'items/s':>13}{'peak MB':>10}{'vs last':>10}")
+    logger.info("-" * 96)
+    for r in results:
+        previous = _previous_seconds(history, r["benchmark"], r["entities"], r["time_steps"])
+        delta = f"{r['seconds'] / previous:.2f}x" if previous and "error" not in r else "-"
+        rate = f"{r['items_per_s']:,.0f}" if r.get("items_per_s") else "-"
+        status = "  FAILED" if "error" in r else ""
+        logger.info(
+            f"   {r['benchmark']:<28}{r['entities']:>9,}{r['seconds']:>11.3f}{rate:>13}"
+            f"{(r['peak_rss_mb'] or 0):>10.1f}{delta:>10}{status}"
+        )
+    logger.info("=" * 96)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the surf forecast pipeline")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated entity counts (default: 100,1000,10000)")
+    parser.add_argument("--only", default="", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--times", type=int, default=fx.GFSWAVE_TIMES, help="Forecast time steps per entity")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per benchmark (fastest is kept)")
+    parser.add_argument("--history", default=BENCHMARK_HISTORY_PATH, help="JSON-lines history file ('' disables)")
+    parser.add_argument("--label", default="", help="Free-form label stored with this run")
+    parser.add_argument("--verbose", action="store_true", help="Keep pipeline INFO logging")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    names = [n.strip() for n in args.only.split(",") if n.strip()] or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    _install_fake_supabase()
+    history = load_history(args.history)
+
+    results = []
+    for size in sizes:
+        for name in names:
+            logger.info(f"   Running {name} @ {size:,} entities...")
+            previous_level = logger.level
+            if not args.verbose:
+                logger.setLevel(logging.WARNING)
+            try:
+                results.append(run_benchmark(name, size, args.times, args.repeat))
+            finally:
+                logger.setLevel(previous_level)
+
+    print_results(results, history)
+    append_history(args.history, {
+        "run_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "label": args.label,
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "results": results,
+    })
+    return 0 if all("error" not in r for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Offline fixtures for the Hybrid Surf Database Update benchmarks
+Synthetic GFSwave / GFS Atmospheric / CDIP datasets with the real variable
+names, forecast rows and CO-OPS series (the supabase stand-in lives in
+fake_supabase.py)
+"""
+
+import math
+import uuid
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from timestamps import BUCKET_SECONDS, PACIFIC_TZ, epoch_to_iso, pacific_midnight_epoch
+
+# California coastal box used by the production grid (degrees, lon 0-360)
+CA_LAT_RANGE = (32.5, 42.0)
+CA_LON_RANGE = (235.5, 243.0)
+
+GFSWAVE_TIMES = 129          # 16 days at 3-hour steps
+GFS_ATMOS_RESOLUTION = 0.25  # GFS 0.25 degree grid
+CDIP_TIMES = 384             # 16 days hourly
+CDIP_FREQUENCIES = 64
+LAND_FRACTION = 0.1          # share of GFSwave cells left NaN like land points
+
+
+def _forecast_times(n_times: int, step_seconds: int = BUCKET_SECONDS) -> np.ndarray:
+    """UTC datetime64 axis starting at today's Pacific midnight."""
+    start = pacific_midnight_epoch()
+    epochs = start + np.arange(n_times, dtype=np.int64) * step_seconds
+    return epochs.astype("datetime64[s]").astype("datetime64[ns]")
+
+
+def _grid_shape(n_points: int):
+    """Smallest lat x lon grid (roughly 4:3 like the CA box) holding n_points ocean cells."""
+    cells = int(math.ceil(n_points / (1.0 - 2 * LAND_FRACTION)))
+    n_lat = max(2, int(math.ceil(math.sqrt(cells * 4 / 3))))
+    n_lon = max(2, int(math.ceil(cells / n_lat)))
+    return n_lat, n_lon
+
+
+# === GFSWAVE ===
+def make_gfswave_dataset(n_points: int, n_times: int = GFSWAVE_TIMES, seed: int = 0) -> xr.Dataset:
+    """GFSwave-like dataset (time, lat, lon) sized to hold at least n_points ocean cells."""
+    rng = np.random.default_rng(seed)
+    n_lat, n_lon = _grid_shape(n_points)
+    lats = np.linspace(*CA_LAT_RANGE, n_lat)
+    lons = np.linspace(*CA_LON_RANGE, n_lon)
+    shape = (n_times, n_lat, n_lon)
+
+    land = rng.random((n_lat, n_lon)) < LAND_FRACTION
+
+    def field(low, high, dtype=np.float32):
+        values = rng.uniform(low, high, shape).astype(dtype)
+        values[:, land] = np.nan
+        return values
+
+    data_vars = {}
+    for train, (h_lo, h_hi) in enumerate([(0.5, 3.0), (0.2, 1.5), (0.1, 0.8)], start=1):
+        data_vars[f"swell_{train}"] = (("time", "lat", "lon"), field(h_lo, h_hi))
+        data_vars[f"swper_{train}"] = (("time", "lat", "lon"), field(6.0, 20.0))
+        data_vars[f"swdir_{train}"] = (("time", "lat", "lon"), field(180.0, 320.0))
+    data_vars["htsgwsfc"] = (("time", "lat", "lon"), field(0.5, 4.0))
+    data_vars["ugrdsfc"] = (("time", "lat", "lon"), field(-10.0, 10.0))
+    data_vars["vgrdsfc"] = (("time", "lat", "lon"), field(-10.0, 10.0))
+    data_vars["gustsfc"] = (("time", "lat", "lon"), field(0.0, 20.0))
+
+    ds = xr.Dataset(
+        data_vars,
+        coords={"time": _forecast_times(n_times), "lat": lats, "lon": lons},
+    )
+    return ds
+
+
+def make_grid_points(ds: xr.Dataset, n_points: int) -> List[Dict]:
+    """grid_points rows (id, latitude, longitude, *_index) for the first n_points ocean cells."""
+    land = ds["htsgwsfc"].isel(time=0).isnull().values
+    lat_idx, lon_idx = np.nonzero(~land)
+    lats = ds["lat"].values
+    lons = ds["lon"].values
+
+    points = []
+    for grid_id, (i, j) in enumerate(zip(lat_idx[:n_points], lon_idx[:n_points]), start=1):
+        lon = float(lons[j])
+        points.append({
+            "id": grid_id,
+            "latitude": float(lats[i]),
+            "longitude": lon - 360.0 if lon > 180 else lon,
+            "latitude_index": int(i),
+            "longitude_index": int(j),
+        })
+    return points
+
+
+# === GFS ATMOSPHERIC ===
+def make_gfs_atmospheric_dataset(n_times: int = GFSWAVE_TIMES, seed: int = 1) -> xr.Dataset:
+    """GFS 0.25 degree atmospheric dataset clipped to the CA box (lon 0-360)."""
+    rng = np.random.default_rng(seed)
+    lats = np.arange(CA_LAT_RANGE[0] - 0.5, CA_LAT_RANGE[1] + 0.5 + 1e-9, GFS_ATMOS_RESOLUTION)
+    lons = np.arange(CA_LON_RANGE[0] - 0.5, CA_LON_RANGE[1] + 0.5 + 1e-9, GFS_ATMOS_RESOLUTION)
+    shape = (n_times, len(lats), len(lons))
+
+    def field(low, high):
+        return rng.uniform(low, high, shape).astype(np.float32)
+
+    data_vars = {
+        "tmp2m": (("time", "lat", "lon"), field(280.0, 305.0)),        # Kelvin
+        "pressfc": (("time", "lat", "lon"), field(99000.0, 103000.0)),  # Pa
+        "tcdcclm": (("time", "lat", "lon"), field(0.0, 100.0)),        # %
+        "pratesfc": (("time", "lat", "lon"), field(0.0, 0.002)),       # kg/m^2/s
+        "ugrd10m": (("time", "lat", "lon"), field(-12.0, 12.0)),
+        "vgrd10m": (("time", "lat", "lon"), field(-12.0, 12.0)),
+        "gustsfc": (("time", "lat", "lon"), field(0.0, 25.0)),
+    }
+    return xr.Dataset(
+        data_vars,
+        coords={"time": _forecast_times(n_times), "lat": lats, "lon": lons},
+    )
+
+
+# === CDIP ===
+def make_cdip_dataset(grid_points: List[Dict], n_sites: int = 100,
+                      n_times: int = CDIP_TIMES, seed: int = 2) -> xr.Dataset:
+    """CDIP MOP-like dataset with sites placed near grid points so enhancement triggers."""
+    rng = np.random.default_rng(seed)
+    n_sites = max(1, min(n_sites, len(grid_points)))
+    picks = rng.choice(len(grid_points), size=n_sites, replace=False)
+    site_lats = np.array([grid_points[i]["latitude"] for i in picks]) + rng.uniform(-0.05, 0.05, n_sites)
+    site_lons = np.array([grid_points[i]["longitude"] for i in picks]) + rng.uniform(-0.05, 0.05, n_sites)
+
+    frequencies = np.linspace(0.025, 0.58, CDIP_FREQUENCIES).astype(np.float32)
+    shape = (n_times, n_sites)
+
+    return xr.Dataset(
+        {
+            "waveHs": (("waveTime", "siteCount"), rng.uniform(0.3, 3.5, shape).astype(np.float32)),
+            "waveTp": (("waveTime", "siteCount"), rng.uniform(5.0, 20.0, shape).astype(np.float32)),
+            "waveDp": (("waveTime", "siteCount"), rng.uniform(180.0, 320.0, shape).astype(np.float32)),
+            "waveEnergyDensity": (
+                ("waveTime", "waveFrequency", "siteCount"),
+                rng.uniform(0.0, 2.0, (n_times, CDIP_FREQUENCIES, n_sites)).astype(np.float32),
+            ),
+            "metaLatitude": (("siteCount",), site_lats.astype(np.float32)),
+            "metaLongitude": (("siteCount",), site_lons.astype(np.float32)),
+        },
+        coords={
+            "waveTime": _forecast_times(n_times, 3600),
+            "waveFrequency": frequencies,
+        },
+    )
+
+
+# === RECORDS ===
+def make_beaches(grid_points: List[Dict], per_point: int = 1, seed: int = 3) -> List[Dict]:
+    """Beach rows (id, Name, LATITUDE, LONGITUDE, grid_id) scattered around grid points."""
+    rng = np.random.default_rng(seed)
+    beaches = []
+    for point in grid_points:
+        for k in range(per_point):
+            beaches.append({
+                "id": f"beach-{point['id']}-{k}",
+                "Name": f"Synthetic Beach {point['id']}-{k}",
+                "LATITUDE": point["latitude"] + float(rng.uniform(-0.05, 0.05)),
+                "LONGITUDE": point["longitude"] + float(rng.uniform(-0.05, 0.05)),
+                "grid_id": point["id"],
+            })
+    return beaches
+
+
+def make_forecast_records(entity_ids: List, n_times: int = GFSWAVE_TIMES, id_field: str = "grid_id",
+                          null_fraction: float = 0.2, seed: int = 4) -> List[Dict]:
+    """
+    Forecast rows on 3-hour Pacific buckets with a share of fields left None (for fills/upserts).
+
+    Each row carries a stable "id" (uuid5 of entity and timestamp), like the table's surrogate key.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = epoch_to_iso(pacific_midnight_epoch() + np.arange(n_times, dtype=np.int64) * BUCKET_SECONDS, PACIFIC_TZ)
+    fields = {
+        "primary_swell_height_ft": (1.0, 8.0),
+        "primary_swell_period_s": (6.0, 20.0),
+        "primary_swell_direction": (180.0, 320.0),
+        "secondary_swell_height_ft": (0.5, 4.0),
+        "secondary_swell_period_s": (6.0, 16.0),
+        "secondary_swell_direction": (180.0, 320.0),
+        "surf_height_min_ft": (0.5, 4.0),
+        "surf_height_max_ft": (4.0, 8.0),
+        "wave_energy_kj": (10.0, 900.0),
+        "wind_speed_mph": (0.0, 25.0),
+        "wind_direction_deg": (0.0, 360.0),
+        "wind_gust_mph": (0.0, 35.0),
+        "temperature": (45.0, 90.0),
+        "pressure_inhg": (29.5, 30.5),
+    }
+
+    records = []
+    for entity_id in entity_ids:
+        values = {name: rng.uniform(lo, hi, n_times).round(2) for name, (lo, hi) in fields.items()}
+        nulls = {name: rng.random(n_times) < null_fraction for name in fields}
+        for t, ts in enumerate(timestamps):
+            rec = {
+                "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{id_field}/{entity_id}/{ts}")),
+                id_field: entity_id,
+                "timestamp": ts,
+            }
+            for name in fields:
+                rec[name] = None if nulls[name][t] else float(values[name][t])
+            records.append(rec)
+    return records
+
+
+def make_coops_series(n_days: int = 17, interval_minutes: int = 60, seed: int = 5) -> List[Dict]:
+    """CO-OPS style [{'t': 'YYYY-MM-DD HH:MM', 'v': '3.21'}] series in local time."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp.now(tz=PACIFIC_TZ).normalize().tz_localize(None)
+    times = pd.date_range(start, periods=n_days * 24 * 60 // interval_minutes, freq=f"{interval_minutes}min")
+    hours = np.arange(len(times)) * interval_minutes / 60.0
+    values = 3.0 + 2.5 * np.sin(2 * np.pi * hours / 12.42) + rng.normal(0, 0.05, len(times))
+    return [{"t": t.strftime("%Y-%m-%d %H:%M"), "v": f"{v:.3f}"} for t, v in zip(times, values)]
+
+
+
+def make_tide_constants(station_ids: List[str], seed: int = 7) -> Dict[str, Dict]:
+    """tide_harmonics.load_station_constants() style constants with the main constituents."""
+    rng = np.random.default_rng(seed)
+    base = {"M2": 1.7, "K1": 1.1, "O1": 0.7, "S2": 0.4, "N2": 0.4, "P1": 0.35, "K2": 0.1, "Q1": 0.12}
+    return {
+        str(station_id): {
+            "msl_above_mllw_ft": 2.8,
+            "constituents": {name: [amp * rng.uniform(0.8, 1.2), rng.uniform(0, 360)] for name, amp in base.items()},
+        }
+        for station_id in station_ids
+    }
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Per-source circuit breakers for Hybrid Surf Database Update Script
+A source that keeps failing (or answers with a rate-limit page) is skipped
+for CIRCUIT_RESET_SECONDS instead of being waited out with long sleeps;
+after that one trial request decides whether it is healthy again
+"""
+
+import logging
+import threading
+import time
+from typing import Dict
+
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+
+# Get shared logger
+logger = logging.getLogger("surf_update")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a source whose circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.time() - self._opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a request may go out (closed, or the single half-open trial)."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.time() - self._opened_at >= self.reset_seconds:
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may go out."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit open (retry after {self.retry_after():.0f}s)")
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.time() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"   Circuit {self.name}: closed (source recovered)")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, trip: bool = False):
+        """Count a failure; `trip` opens the circuit at once (e.g. a rate-limit page)."""
+        with self._lock:
+            self._failures += 1
+            if trip or self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                    logger.warning(
+                        f"   Circuit {self.name}: OPEN after {self._failures} failure(s); "
+                        f"skipping for {self.reset_seconds:.0f}s"
+                    )
+                self._state = OPEN
+                self._opened_at = time.time()
+                self._trial_in_flight = False
+
+    def snapshot(self) -> Dict:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures, "trips": self.trips}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(source: str) -> CircuitBreaker:
+    """Shared breaker for a source ("nomads", "openmeteo", ...), created on first use."""
+    with _registry_lock:
+        breaker = _breakers.get(source)
+        if breaker is None:
+            breaker = _breakers[source] = CircuitBreaker(source)
+        return breaker
+
+
+def breaker_states() -> Dict[str, Dict]:
+    """State of every breaker used so far (for the run report)."""
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+def reset():
+    """Forget all breakers (used by benchmarks between runs)."""
+    with _registry_lock:
+        _breakers.clear()
@@ -7,7 +7,6 @@ Reads all secrets from environment variables only. Do not hardcode secrets.
 import os
 import sys
 import logging
-import threading
 
 if sys.platform == "win32":
     os.environ["PYTHONIOENCODING"] = "utf-8"
@@ -21,6 +20,9 @@ VC_API_KEY = os.environ.get("VC_API_KEY")
 DAYS_FORECAST = 16  # Extended to 16 days using Open Meteo
 BATCH_SIZE = 20
 UPSERT_CHUNK = 500  # Reduced to avoid Supabase payload size limits
+# Row counts for stats/logging: "planned" (query-planner estimate, cheapest), "estimated"
+# (exact below PostgREST's max-rows, planner estimate above) or "exact"
+DB_COUNT_METHOD = os.environ.get("DB_COUNT_METHOD", "planned")
 MAX_WORKERS = 3
 LOG_LEVEL = logging.INFO
 API_DELAY = 2.0
@@ -47,20 +49,119 @@ OPENMETEO_BATCH_DELAY = 2.0
 OPENMETEO_RETRY_DELAY = 60
 OPENMETEO_MAX_RETRIES = 3
 
-# Physical constants
-TIDE_ADJUSTMENT_FT = 2.4
+# Adaptive per-host rate limits (rate_limiter.py): host -> (start, min, max requests per second, burst).
+# The rate rises by RATE_LIMIT_INCREASE per request once a host has gone
+# RATE_LIMIT_RECOVERY_SECONDS without throttling, and is multiplied by
+# RATE_LIMIT_DECREASE on every 429 / rate-limit page.
+RATE_LIMITS = {
+    # NOMADS allows ~120 requests/minute per IP and blocks addresses that exceed it.
+    # Worst case in any minute is burst + 60 * max rate: 1 + 60 * 1.9 = 115.
+    "nomads.ncep.noaa.gov": (1.5, 0.2, 1.9, 1),
+    "api.open-meteo.com": (1.0, 0.2, 5.0, 1),
+    "marine-api.open-meteo.com": (1.0, 0.2, 5.0, 1),
+    "api.tidesandcurrents.noaa.gov": (2.0, 0.5, 10.0, 2),
+    "aa.usno.navy.mil": (2.0, 0.5, 10.0, 2),
+    "default": (2.0, 0.2, 10.0, 1),
+}
+RATE_LIMIT_INCREASE = 0.05
+RATE_LIMIT_DECREASE = 0.5
+RATE_LIMIT_RECOVERY_SECONDS = 30
+
+# Shared HTTP response cache (http_cache.py): SQLite file ("" disables) and LRU size cap
+HTTP_CACHE_PATH = os.environ.get("HTTP_CACHE_PATH", "http_cache.sqlite")
+HTTP_CACHE_MAX_MB = 256
+# (host, URL substring, TTL seconds, JSON key) - first match wins; unmatched URLs are not cached.
+# A 200 is only stored when its JSON body has no "error" key and, if given, has the JSON key
+# (CO-OPS and USNO report rate limits and missing data as a 200 with an error body).
+# Stale entries with an ETag/Last-Modified are revalidated with a conditional GET.
+HTTP_CACHE_POLICIES = [
+    ("api.tidesandcurrents.noaa.gov", "product=predictions", 7 * 86400, "predictions"),  # fixed per station/day
+    ("api.tidesandcurrents.noaa.gov", "product=water_temperature", 30 * 60, "data"),
+    ("api.tidesandcurrents.noaa.gov", "/mdapi/", 30 * 86400, None),      # station harmonic constants / datums
+    ("aa.usno.navy.mil", "", 7 * 86400, "properties"),                   # sun/moon times for a date
+    ("api.weather.gov", "/points/", 30 * 86400, None),                   # lat/lon -> forecast office grid
+    ("api.weather.gov", "", 3600, None),                                 # forecasts update a few times a day
+    ("api.open-meteo.com", "", 3600, None),
+    ("marine-api.open-meteo.com", "", 3600, None),
+]
 
-# Rate limiting globals
-_noaa_last_request_time = 0
-_noaa_request_lock = threading.Lock()
+# Instrumentation: JSON run report written at the end of each run ("" disables)
+RUN_REPORT_PATH = os.environ.get("RUN_REPORT_PATH", "run_report.json")
+# Offline benchmarks (benchmark.py): JSON-lines history of results ("" disables)
+BENCHMARK_HISTORY_PATH = os.environ.get("BENCHMARK_HISTORY_PATH", "benchmark_history.jsonl")
+
+# Record/replay fixtures (replay.py): "off", "record" (capture live responses) or "replay" (offline)
+REPLAY_MODE = os.environ.get("REPLAY_MODE", "off")
+REPLAY_FIXTURE_DIR = os.environ.get("REPLAY_FIXTURE_DIR", "fixtures")
+# Artificial latency per request on replay: "150" or "nomads.ncep.noaa.gov=800,default=100" (ms)
+REPLAY_LATENCY_MS = os.environ.get("REPLAY_LATENCY_MS", "0")
+# Coastal box (lat_min, lat_max, lon_min, lon_max) saved from each OPeNDAP dataset when recording
+REPLAY_BOX = (30.0, 44.0, -127.0, -115.0)
+
+# NOMADS model-run discovery (model_discovery.py): last cycle found per model ("" disables)
+MODEL_RUN_STATE_PATH = os.environ.get("MODEL_RUN_STATE_PATH", "model_runs.json")
+MODEL_DISCOVERY_WORKERS = 4       # concurrent .dds probes (matches the NOMADS burst)
+MODEL_DISCOVERY_TIMEOUT = 15      # seconds per probe
+MODEL_DISCOVERY_DAYS_BACK = 3     # oldest run date considered
+
+# Model-cycle watcher (cycle_watcher.py, `python main_noaa_grid.py --watch`): poll interval, how long one
+# watcher process runs (0 = forever), per-cycle progress file ("" disables), and the forecast hours after
+# which a cycle counts as fully published
+MODEL_WATCH_POLL_SECONDS = int(os.environ.get("MODEL_WATCH_POLL_SECONDS", "300"))
+MODEL_WATCH_MAX_HOURS = float(os.environ.get("MODEL_WATCH_MAX_HOURS", "5.5"))
+MODEL_WATCH_STATE_PATH = os.environ.get("MODEL_WATCH_STATE_PATH", "model_watch.json")
+MODEL_WATCH_COMPLETE_HOURS = DAYS_FORECAST * 24
+
+# Circuit breakers (circuit_breaker.py): a source is skipped for CIRCUIT_RESET_SECONDS
+# after CIRCUIT_FAILURE_THRESHOLD consecutive failures (a rate-limit page trips at once)
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_RESET_SECONDS = 300
+# Previous-cycle fallback (cycle_cache.py): last good GFSwave extraction, used when NOMADS is down ("" disables)
+CYCLE_CACHE_DIR = os.environ.get("CYCLE_CACHE_DIR", "cycle_cache")
+# wave_model_cycle / wave_from_fallback on grid rows: "on", "off", or "auto" (on only when
+# grid_forecast_data has the columns from migrations/add_grid_forecast_provenance.sql)
+WAVE_PROVENANCE = os.environ.get("WAVE_PROVENANCE", "auto")
+
+# Progressive publish (progressive.py): forecast-lead window boundaries in hours; the 0-48h window is
+# supplemented and upserted before the rest ("" publishes the whole horizon at once)
+PROGRESSIVE_LEAD_HOURS = [int(h) for h in os.environ.get("PROGRESSIVE_LEAD_HOURS", "48").split(",") if h.strip()]
+
+# Reference-table snapshots (reference_cache.py): beaches / counties / grid_points kept locally and
+# revalidated with one version probe per table per run ("" disables)
+REFERENCE_CACHE_DIR = os.environ.get("REFERENCE_CACHE_DIR", "reference_cache")
+
+# Day-partitioned tables (migrations/partition_forecast_tables_by_day.sql): retention drops whole
+# Pacific-day partitions and creates the next PARTITION_DAYS_AHEAD days ahead of time.
+# PARTITION_RETENTION: "drop", "detach" (keep expired days as standalone tables) or "off" (row DELETEs)
+PARTITION_RETENTION = os.environ.get("PARTITION_RETENTION", "drop")
+PARTITION_DAYS_AHEAD = DAYS_FORECAST + 2
+
+# Data-quality report (data_quality.py): default tables and, per source, a column only that source fills
+DATA_QUALITY_TABLES = ["grid_forecast_data", "forecast_data", "county_tides_15min"]
+DATA_QUALITY_SOURCES = {
+    "gfswave": "primary_swell_height_ft",
+    "wind": "wind_speed_mph",
+    "weather": "weather",
+    "water_temp": "water_temp_f",
+    "tide": "tide_level_ft",
+}
 
-def get_noaa_rate_limit_globals():
-    global _noaa_last_request_time, _noaa_request_lock
-    return _noaa_last_request_time, _noaa_request_lock
+# Physical constants
+TIDE_ADJUSTMENT_FT = 2.4
 
-def set_noaa_last_request_time(timestamp):
-    global _noaa_last_request_time
-    _noaa_last_request_time = timestamp
+# Tide predictions: "coops" downloads CO-OPS predictions, "harmonic" computes them locally from station
+# constituents (tide_harmonics.py, fetched once into TIDE_HARMONICS_PATH). Stays "coops" until
+# tide_harmonics.json and the validation fixture are committed and `tide_harmonics.py --validate` passes.
+TIDE_SOURCE = os.environ.get("TIDE_SOURCE", "coops")
+TIDE_HARMONICS_PATH = os.environ.get("TIDE_HARMONICS_PATH", "tide_harmonics.json")
+TIDE_INTERVAL_MINUTES = 6
+# County tide refresh (tide.py): "incremental" only writes from each county's first missing or
+# incomplete day (after its latest stored row, or earlier if a day has gaps),
+# "full" rewrites the whole DAYS_FORECAST horizon
+TIDE_REFRESH_MODE = os.environ.get("TIDE_REFRESH", "incremental")
+TIDE_VALIDATION_TOLERANCE_FT = 0.15   # max RMSE vs CO-OPS predictions for a station to pass validation
+# Stored CO-OPS hourly predictions that `tide_harmonics.py --validate` checks against offline
+TIDE_VALIDATION_FIXTURE_PATH = os.environ.get("TIDE_VALIDATION_FIXTURE_PATH", "tide_validation_fixture.json")
 
 def setup_logging():
     logging.basicConfig(
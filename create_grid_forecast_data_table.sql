@@ -39,6 +39,10 @@ CREATE TABLE IF NOT EXISTS grid_forecast_data (
     tide_level_ft REAL,
     water_temp_f REAL,
 
+    -- Provenance (GFSwave cycle the swell/surf fields came from)
+    wave_model_cycle TEXT,              -- YYYYMMDDHH
+    wave_from_fallback BOOLEAN DEFAULT FALSE,  -- TRUE when NOMADS was down and a cached cycle was used
+
     -- Metadata
     created_at TIMESTAMPTZ DEFAULT NOW(),
 
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Previous-cycle fallback for Hybrid Surf Database Update Script
+Keeps the records extracted from the last good model cycle on disk so a run
+can still publish when NOMADS is unavailable; fallback rows are marked with
+the cycle they came from (wave_model_cycle / wave_from_fallback)
+"""
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import CYCLE_CACHE_DIR, WAVE_PROVENANCE
+from timestamps import PACIFIC_TZ, pacific_midnight_epoch, to_epoch
+
+# Get shared logger
+logger = logging.getLogger("surf_update")
+
+# Cache key for the GFSwave grid extraction (main_noaa_grid.py)
+GFSWAVE_GRID_MODEL = "gfswave_grid"
+PROVENANCE_TABLE = "grid_forecast_data"
+PROVENANCE_COLUMNS = ("wave_model_cycle", "wave_from_fallback")
+
+_provenance_enabled: Optional[bool] = None
+
+
+def _cache_path(model: str) -> str:
+    return os.path.join(CYCLE_CACHE_DIR, f"{model}.json.gz")
+
+
+def provenance_enabled() -> bool:
+    """WAVE_PROVENANCE on/off, or for "auto" whether the provenance columns exist (checked once)."""
+    global _provenance_enabled
+    if _provenance_enabled is None:
+        mode = (WAVE_PROVENANCE or "auto").strip().lower()
+        if mode in ("on", "off"):
+            _provenance_enabled = mode == "on"
+        else:
+            from database import supabase
+            try:
+                supabase.table(PROVENANCE_TABLE).select(",".join(PROVENANCE_COLUMNS)).limit(1).execute()
+                _provenance_enabled = True
+            except Exception as e:
+                logger.warning(
+                    f"   {PROVENANCE_TABLE} has no provenance columns ({e}); rows are written without them. "
+                    "Apply migrations/add_grid_forecast_provenance.sql to record the source cycle"
+                )
+                _provenance_enabled = False
+    return _provenance_enabled
+
+
+def mark_provenance(records: List[Dict], cycle: Optional[str], fallback: bool) -> List[Dict]:
+    """Tag records with the model cycle they came from (in place); strips the tags when provenance is off."""
+    if not provenance_enabled():
+        for rec in records:
+            for column in PROVENANCE_COLUMNS:
+                rec.pop(column, None)
+        return records
+    for rec in records:
+        rec["wave_model_cycle"] = cycle
+        rec["wave_from_fallback"] = fallback
+    return records
+
+
+def save_cycle(model: str, cycle: Optional[str], records: List[Dict]) -> bool:
+    """Write a cycle's records as the fallback for `model`; returns False on failure."""
+    if not CYCLE_CACHE_DIR or not records:
+        return False
+    path = _cache_path(model)
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(CYCLE_CACHE_DIR, exist_ok=True)
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+            json.dump({
+                "model": model,
+                "cycle": cycle,
+                "saved_at": datetime.now(timezone.utc).isoformat(),
+                "records": records,
+            }, fh, default=str)
+        os.replace(tmp_path, path)
+        logger.info(f"   Cached {len(records):,} {model} records from cycle {cycle} for fallback")
+        return True
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"   Could not cache {model} cycle: {e}")
+        return False
+
+
+def load_fallback_cycle(model: str, window_start_epoch: Optional[int] = None) -> Tuple[Optional[str], List[Dict]]:
+    """
+    Records of the last cached cycle that still fall in the forecast window.
+
+    Valid times are kept as they are: a forecast for 15:00 from an older run is
+    still a forecast for 15:00. Hours already in the past are dropped.
+
+    Args:
+        window_start_epoch: First epoch to keep (default: today's Pacific midnight)
+
+    Returns:
+        (cycle, records) marked as fallback, or (None, []) if nothing usable is cached
+    """
+    path = _cache_path(model)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            payload = json.load(fh)
+    except (OSError, ValueError) as e:
+        logger.warning(f"   No cached {model} cycle to fall back on ({e})")
+        return None, []
+
+    records = payload.get("records") or []
+    if window_start_epoch is None:
+        window_start_epoch = pacific_midnight_epoch()
+    epochs = to_epoch([r.get("timestamp") for r in records], naive_tz=PACIFIC_TZ)
+    keep = np.flatnonzero(epochs >= window_start_epoch)
+    records = [records[i] for i in keep.tolist()]
+
+    cycle = payload.get("cycle")
+    logger.warning(
+        f"   Falling back to cached {model} cycle {cycle} (saved {payload.get('saved_at')}): "
+        f"{len(records):,} records still in the forecast window"
+    )
+    return cycle, mark_provenance(records, cycle, True)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Model-cycle watcher for Hybrid Surf Database Update Script
+Polls NOMADS for the newest GFSwave cycle (the .dds probes of model_discovery)
+and publishes forecast hours as soon as they land instead of waiting for a
+fixed cron time. Hours already published for a cycle are recorded in
+MODEL_WATCH_STATE_PATH, so each poll only extracts the newly filled steps and a
+restarted watcher resumes where it stopped.
+
+    python main_noaa_grid.py --watch          # runs for MODEL_WATCH_MAX_HOURS
+    python main_noaa_grid.py --watch --once   # single poll (e.g. from a frequent cron)
+"""
+
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    MODEL_WATCH_POLL_SECONDS, MODEL_WATCH_MAX_HOURS, MODEL_WATCH_STATE_PATH, MODEL_WATCH_COMPLETE_HOURS,
+)
+from model_discovery import CYCLE_FORMAT, cycle_from_url
+from noaa_handler import get_noaa_dataset_url, load_noaa_dataset, validate_noaa_dataset
+from instrumentation import record_opendap_read
+from progressive import PublishResult
+
+# Get shared logger
+logger = logging.getLogger("surf_update")
+
+# State file key for the GFSwave grid cycle
+GFSWAVE_WATCH_MODEL = "gfswave_grid"
+# Variable read at the probe point to see which forecast steps are filled
+PROBE_VAR = "htsgwsfc"
+
+
+# === STATE FILE ===
+def load_watch_state(path: str = MODEL_WATCH_STATE_PATH) -> Dict:
+    if not path:
+        return {}
+    try:
+        with open(path, encoding="utf-8") as fh:
+            state = json.load(fh)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_watch_state(model: str, entry: Dict, path: str = MODEL_WATCH_STATE_PATH):
+    if not path:
+        return
+    state = load_watch_state(path)
+    state[model] = dict(entry, updated_at=datetime.now(timezone.utc).isoformat())
+    try:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(state, fh, indent=2, sort_keys=True)
+    except OSError as e:
+        logger.warning(f"   Could not write watcher state to {path}: {e}")
+
+
+# === READY STEPS ===
+def ready_steps(ds, probe_point: Tuple[int, int]) -> int:
+    """
+    Leading forecast steps that hold data, from one read of PROBE_VAR at an ocean grid cell.
+
+    NOMADS declares the full time axis while a cycle is still being published;
+    steps that have not landed read as missing values.
+    """
+    lat_var, lon_var = ("latitude", "longitude") if "latitude" in ds.dims else ("lat", "lon")
+    values = np.asarray(ds[PROBE_VAR].isel({lat_var: probe_point[0], lon_var: probe_point[1]}).values, dtype=np.float64)
+    record_opendap_read(PROBE_VAR)
+    missing = np.flatnonzero(~np.isfinite(values))
+    return int(missing[0]) if missing.size else int(values.size)
+
+
+def _cycle_complete(ds, cycle: str, ready: int) -> bool:
+    """All steps filled and the last one reaches MODEL_WATCH_COMPLETE_HOURS past the cycle."""
+    if ready < ds.sizes["time"] or ready == 0:
+        return False
+    cycle_start = datetime.strptime(cycle, CYCLE_FORMAT).replace(tzinfo=timezone.utc)
+    last_epoch = int(np.asarray(ds["time"].values[ready - 1], dtype="datetime64[s]").astype(np.int64))
+    last_valid = datetime.fromtimestamp(last_epoch, timezone.utc)
+    return last_valid >= cycle_start + timedelta(hours=MODEL_WATCH_COMPLETE_HOURS)
+
+
+def _steps_before(ds, start: int, stop: int, epoch: int) -> int:
+    """Steps of start..stop-1 valid before `epoch` (the time axis is increasing, so they lead)."""
+    valid = np.asarray(ds["time"].values[start:stop], dtype="datetime64[s]").astype(np.int64)
+    return int(np.count_nonzero(valid < epoch))
+
+
+# === POLLING ===
+def poll_once(publish: Callable[[object, str], PublishResult], probe_point: Tuple[int, int],
+              model: str = GFSWAVE_WATCH_MODEL, state_path: str = MODEL_WATCH_STATE_PATH) -> int:
+    """
+    One poll: find the newest cycle and publish the steps that landed since the last poll.
+
+    Steps count as published only up to the first failed lead window, so the
+    next poll retries from there.
+
+    Args:
+        publish: (dataset sliced to the new steps, cycle "YYYYMMDDHH") -> PublishResult
+        probe_point: (lat index, lon index) of an ocean cell
+
+    Returns:
+        Rows written by this poll
+    """
+    try:
+        url = get_noaa_dataset_url()
+    except Exception as e:
+        logger.warning(f"   Watcher: no GFSwave cycle available ({e})")
+        return 0
+    cycle = cycle_from_url(url)
+
+    entry = load_watch_state(state_path).get(model) or {}
+    same_cycle = entry.get("cycle") == cycle
+    if same_cycle and entry.get("complete"):
+        logger.info(f"   Watcher: cycle {cycle} already fully published")
+        return 0
+    start = int(entry.get("published_steps") or 0) if same_cycle else 0
+    if not same_cycle:
+        logger.info(f"   Watcher: new GFSwave cycle {cycle} (previous {entry.get('cycle')})")
+
+    ds = load_noaa_dataset(url)
+    if ds is None or not validate_noaa_dataset(ds):
+        logger.warning(f"   Watcher: could not open cycle {cycle}")
+        return 0
+
+    written = 0
+    try:
+        total = int(ds.sizes["time"])
+        ready = ready_steps(ds, probe_point)
+        if ready > start:
+            logger.info(f"   Watcher: cycle {cycle} steps {start}-{ready - 1} landed ({ready}/{total}), publishing")
+            result = publish(ds.isel(time=slice(start, ready)), cycle)
+            written = result.written
+            if not result.ok:
+                done = _steps_before(ds, start, ready, result.failed_from)
+                logger.warning(
+                    f"   Watcher: cycle {cycle} window(s) {', '.join(result.failed)} failed, "
+                    f"will retry steps {start + done}-{ready - 1}"
+                )
+                ready = start + done
+            elif written == 0:
+                logger.warning(f"   Watcher: nothing written for cycle {cycle}, will retry steps {start}-{ready - 1}")
+                ready = start
+        else:
+            logger.info(f"   Watcher: cycle {cycle} at {ready}/{total} steps, waiting for more")
+        complete = _cycle_complete(ds, cycle, max(ready, start))
+    finally:
+        ds.close()
+
+    save_watch_state(model, {
+        "cycle": cycle,
+        "url": url,
+        "published_steps": max(ready, start),
+        "total_steps": total,
+        "complete": complete,
+    }, state_path)
+    return written
+
+
+def watch(publish: Callable[[object, str], PublishResult], probe_point: Tuple[int, int],
+          once: bool = False, max_hours: Optional[float] = None,
+          poll_seconds: float = MODEL_WATCH_POLL_SECONDS) -> int:
+    """
+    Poll every `poll_seconds` until `max_hours` (MODEL_WATCH_MAX_HOURS; 0 = forever) have passed.
+
+    Returns:
+        Total rows written
+    """
+    max_hours = MODEL_WATCH_MAX_HOURS if max_hours is None else max_hours
+    deadline = time.time() + max_hours * 3600 if max_hours else None
+    logger.info(
+        f"   Watching GFSwave cycles every {poll_seconds:.0f}s"
+        + (f" for {max_hours:g}h" if deadline and not once else "")
+    )
+
+    total = 0
+    while True:
+        try:
+            total += poll_once(publish, probe_point)
+        except Exception as e:
+            logger.error(f"   Watcher poll failed: {e}")
+        if once or (deadline is not None and time.time() + poll_seconds >= deadline):
+            break
+        time.sleep(poll_seconds)
+    return total
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Data-quality report for Hybrid Surf Database Update Script
+One data_quality_report() RPC per table (migrations/data_quality_report.sql)
+aggregates in Postgres: null counts per column, value ranges, wind gust < speed
+violations per grid/beach and coverage per Pacific date and source. Replaces the
+check_nulls / check_wind_data / find_problem_grids / check_water_temp_coverage
+scripts that paged rows over REST.
+
+    python data_quality.py                       # default tables, whole horizon
+    python data_quality.py grid_forecast_data --days 2 --top 10
+    python data_quality.py forecast_data --json
+"""
+
+import argparse
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import pytz
+
+from config import DATA_QUALITY_TABLES, DATA_QUALITY_SOURCES
+from database import supabase
+
+# Get shared logger
+logger = logging.getLogger("surf_update")
+
+
+def fetch_report(table_name: str, since: Optional[datetime] = None, top: int = 20) -> Optional[Dict]:
+    """
+    Data-quality report for one table in a single round trip.
+
+    Returns:
+        Report dict (see format_report), or None if the RPC failed
+    """
+    try:
+        resp = supabase.rpc("data_quality_report", {
+            "target_table": table_name,
+            "since": since.isoformat() if since is not None else None,
+            "source_columns": DATA_QUALITY_SOURCES,
+            "top_entities": top,
+        }).execute()
+    except Exception as e:
+        logger.error(f"ERROR: data_quality_report failed for {table_name}: {e}")
+        return None
+    return resp.data
+
+
+def _pct(part, whole) -> str:
+    return f"{part / whole * 100:5.1f}%" if whole else "    -"
+
+
+def format_report(report: Dict) -> List[str]:
+    """Readable lines for one table's report."""
+    rows = report.get("rows") or 0
+    entity = report.get("entity")
+    lines = [
+        f"{report['table']}: {rows:,} rows, {report.get('entities') or 0} {entity or 'entity'} values, "
+        f"{report.get('first_timestamp')} .. {report.get('last_timestamp')}"
+    ]
+
+    nulls = {col: n for col, n in (report.get("nulls") or {}).items() if n}
+    ranges = report.get("ranges") or {}
+    if nulls or ranges:
+        lines.append(f"   {'column':<28}{'nulls':>10}{'':>8}{'min':>12}{'max':>12}")
+        for col in sorted(set(nulls) | set(ranges)):
+            lo, hi = ranges.get(col) or (None, None)
+            lo = "-" if lo is None else f"{lo:.2f}"
+            hi = "-" if hi is None else f"{hi:.2f}"
+            lines.append(f"   {col:<28}{nulls.get(col, 0):>10,}{_pct(nulls.get(col, 0), rows):>8}{lo:>12}{hi:>12}")
+
+    with_source = report.get("entities_with_source") or {}
+    if with_source and report.get("entities"):
+        lines.append("   " + ", ".join(
+            f"{source} {count}/{report['entities']}" for source, count in with_source.items()
+        ) + f" {entity} values have data")
+
+    gusts = report.get("gust_violations")
+    if gusts and gusts.get("checked"):
+        lines.append(
+            f"   wind gust < speed: {gusts['bad']:,}/{gusts['checked']:,} rows ({_pct(gusts['bad'], gusts['checked']).strip()}), "
+            "by " + entity + ": " + ", ".join(f"{k} bad: {v}" for k, v in gusts["severity"].items())
+        )
+        for w in gusts.get("worst") or []:
+            lines.append(f"      {entity} {w['entity']}: {w['bad']}/{w['checked']} ({w['bad_pct']}%)")
+
+    coverage = report.get("coverage") or []
+    if coverage:
+        sources = sorted({s for day in coverage for s in (day.get("sources") or {})})
+        lines.append(f"   {'date':<12}{'rows':>8}{'ents':>6}" + "".join(f"{s:>12}" for s in sources))
+        for day in coverage:
+            filled = day.get("sources") or {}
+            lines.append(
+                f"   {day['date']:<12}{day['rows']:>8}{day.get('entities') or '-':>6}"
+                + "".join(f"{_pct(filled.get(s, 0), day['rows']):>12}" for s in sources)
+            )
+    return lines
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Server-side data-quality report for the forecast tables")
+    parser.add_argument("tables", nargs="*", default=DATA_QUALITY_TABLES, help="Tables to report on")
+    parser.add_argument("--days", type=int, default=None, help="Only rows from the last N days (default: all)")
+    parser.add_argument("--top", type=int, default=20, help="Worst grids/beaches listed for gust < speed")
+    parser.add_argument("--json", action="store_true", help="Print the raw reports as JSON")
+    args = parser.parse_args()
+
+    since = datetime.now(pytz.utc) - timedelta(days=args.days) if args.days else None
+    reports = {table: fetch_report(table, since, args.top) for table in args.tables}
+
+    if args.json:
+        print(json.dumps(reports, indent=2, default=str))
+    else:
+        for report in reports.values():
+            if report:
+                for line in format_report(report):
+                    logger.info(line)
+    return all(report is not None for report in reports.values())
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)
@@ -10,9 +10,12 @@ from collections import defaultdict
 from datetime import datetime, timedelta, time as dtime
 from numbers import Real
 from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_KEY, UPSERT_CHUNK
+from config import SUPABASE_URL, SUPABASE_KEY, UPSERT_CHUNK, DB_COUNT_METHOD, PARTITION_RETENTION, PARTITION_DAYS_AHEAD
 import pytz
 from utils import log_step, valid_coord, chunk_iter, safe_float
+from timestamps import INVALID_EPOCH, to_epoch
+from instrumentation import counts_upsert
+from reference_cache import BEACH_COLUMNS, CoordinateIndex, load_reference_rows
 
 # Get shared logger
 logger = logging.getLogger("surf_update")
@@ -20,7 +23,7 @@ logger = logging.getLogger("surf_update")
 # Initialize Supabase client
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-_BEACH_COORD_CACHE = None
+_BEACH_INDEX = None
 
 FIELDS_FOR_NEIGHBOR_FILL = (
     'weather',
@@ -39,7 +42,8 @@ def cleanup_old_data(batch_size: int = 100):
 
     This run keeps the current-day forecast horizon intact and only removes rows
     older than today's Pacific midnight (forecast_data) or calendar date
-    (daily_county_conditions).
+    (daily_county_conditions). Day-partitioned tables drop expired partitions
+    instead of deleting rows.
     """
     log_step("Cleaning up old data", 1)
 
@@ -51,11 +55,14 @@ def cleanup_old_data(batch_size: int = 100):
         midnight_today = pacific.localize(datetime.combine(today_date, dtime(0, 0)))
         cutoff_date = today_date
 
-        logger.info(f"DELETE: Removing forecast_data before {midnight_today.isoformat()} (Pacific)")
-        forecast_ok = cleanup_forecast_data_by_date(midnight_today)
+        if maintain_day_partitions(("forecast_data", "beach_tides_hourly"), midnight_today):
+            forecast_ok = tide_ok = True
+        else:
+            logger.info(f"DELETE: Removing forecast_data before {midnight_today.isoformat()} (Pacific)")
+            forecast_ok = cleanup_forecast_data_by_date(midnight_today)
 
-        logger.info(f"DELETE: Removing beach_tides_hourly before {midnight_today.isoformat()} (Pacific)")
-        tide_ok = delete_tide_data_before(midnight_today)
+            logger.info(f"DELETE: Removing beach_tides_hourly before {midnight_today.isoformat()} (Pacific)")
+            tide_ok = delete_tide_data_before(midnight_today)
 
         logger.info(f"DELETE: Removing daily_county_conditions before {cutoff_date.isoformat()}")
         daily_ok = cleanup_daily_conditions_by_date(cutoff_date)
@@ -67,34 +74,44 @@ def cleanup_old_data(batch_size: int = 100):
         logger.error(f"ERROR: Error during cleanup: {e}")
         return False
 
-def fetch_all_beaches(page_size: int = 1000):
-    """Fetch all beaches with valid coordinates."""
-    log_step("Fetching beach data", 2)
+def maintain_day_partitions(tables, cutoff=None) -> bool:
+    """
+    Partition retention for day-partitioned tables: create the next
+    PARTITION_DAYS_AHEAD days and drop (or detach) whole days ending on/before
+    `cutoff` (no cutoff = only create ahead).
 
-    all_rows = []
-    start = 0
-    while True:
-        try:
-            end_idx = start + page_size - 1
-            resp = (
-                supabase
-                .table("beaches")
-                .select("id,Name,LATITUDE,LONGITUDE,COUNTY", count="exact")
-                .range(start, end_idx)
-                .execute()
-            )
-            rows = resp.data or []
-            all_rows.extend(rows)
+    Returns:
+        True if done; False when disabled or the tables are not partitioned yet
+        (callers then fall back to row deletes)
+    """
+    if PARTITION_RETENTION == "off":
+        return False
+    keep_from = cutoff.isoformat() if cutoff is not None else "-infinity"
+    try:
+        resp = supabase.rpc("maintain_day_partitions", {
+            "table_names": list(tables),
+            "keep_from": keep_from,
+            "days_ahead": PARTITION_DAYS_AHEAD,
+            "detach_only": PARTITION_RETENTION == "detach",
+        }).execute()
+    except Exception as e:
+        logger.warning(f"   Partition maintenance unavailable for {', '.join(tables)} ({e}); using row deletes")
+        return False
 
-            logger.info(f"   Fetched {len(rows)} beaches (batch {start//page_size + 1})")
+    verb = "detached" if PARTITION_RETENTION == "detach" else "dropped"
+    for row in resp.data or []:
+        logger.info(
+            f"   {row.get('table_name')}: {row.get('created', 0)} day partition(s) created, "
+            f"{row.get('dropped', 0)} expired {verb}"
+        )
+    return True
 
-            if len(rows) < page_size:
-                break
-            start += page_size
 
-        except Exception as e:
-            logger.error(f"ERROR: Error fetching beaches: {e}")
-            break
+def fetch_all_beaches():
+    """Fetch all beaches with valid coordinates (local snapshot when the table is unchanged)."""
+    log_step("Fetching beach data", 2)
+
+    all_rows = load_reference_rows(supabase, "beaches", BEACH_COLUMNS)
 
     # Filter for valid coordinates
     valid_beaches = [
@@ -112,30 +129,11 @@ def fetch_all_beaches(page_size: int = 1000):
     log_step(f"Found {len(valid_beaches)} beaches with valid coordinates")
     return valid_beaches
 
-def fetch_all_counties(page_size: int = 1000):
-    """Get unique counties with their centroid coordinates."""
+def fetch_all_counties():
+    """Get unique counties with their centroid coordinates (from the beaches snapshot)."""
     log_step("Calculating county centroids", 3)
-    
-    all_rows = []
-    start = 0
-    while True:
-        try:
-            end_idx = start + page_size - 1
-            resp = (
-                supabase
-                .table("beaches")
-                .select("COUNTY,LATITUDE,LONGITUDE", count="exact")
-                .range(start, end_idx)
-                .execute()
-            )
-            rows = resp.data or []
-            all_rows.extend(rows)
-            if len(rows) < page_size:
-                break
-            start += page_size
-        except Exception as e:
-            logger.error(f"ERROR: Error fetching county data: {e}")
-            break
+
+    all_rows = load_reference_rows(supabase, "beaches", BEACH_COLUMNS)
     
     # Group by county and calculate centroid coordinates
     county_data = {}
@@ -167,26 +165,6 @@ def fetch_all_counties(page_size: int = 1000):
 
 
 
-def _normalize_timestamp(ts):
-    if ts is None:
-        return None
-    if isinstance(ts, datetime):
-        dt = ts
-    else:
-        ts_str = str(ts).strip()
-        if ts_str.endswith('Z'):
-            ts_str = ts_str[:-1] + '+00:00'
-        try:
-            dt = datetime.fromisoformat(ts_str)
-        except ValueError:
-            return None
-    if dt.tzinfo is None:
-        dt = pytz.UTC.localize(dt)
-    else:
-        dt = dt.astimezone(pytz.UTC)
-    return dt.isoformat()
-
-
 def _haversine_distance(lat1, lon1, lat2, lon2):
     try:
         lat1 = float(lat1)
@@ -206,22 +184,23 @@ def _haversine_distance(lat1, lon1, lat2, lon2):
     return 6371.0 * c
 
 
+def get_beach_index() -> CoordinateIndex:
+    """Beach coordinates as NumPy arrays with nearest lookup (built once per process)."""
+    global _BEACH_INDEX
+    if _BEACH_INDEX is None:
+        _BEACH_INDEX = CoordinateIndex(
+            load_reference_rows(supabase, "beaches", BEACH_COLUMNS), "LATITUDE", "LONGITUDE"
+        )
+        logger.debug('Loaded %s beach coordinates', len(_BEACH_INDEX))
+    return _BEACH_INDEX
+
+
 def _get_beach_coord_map():
-    global _BEACH_COORD_CACHE
-    if _BEACH_COORD_CACHE is not None:
-        return _BEACH_COORD_CACHE
-    logger.debug('Fetching beach coordinate map for neighbor fill')
-    resp = supabase.table('beaches').select('id,LATITUDE,LONGITUDE').execute()
-    data = resp.data or []
-    coord_map = {}
-    for row in data:
-        lat = row.get('LATITUDE')
-        lon = row.get('LONGITUDE')
-        if valid_coord(lat) and valid_coord(lon):
-            coord_map[row['id']] = (float(lat), float(lon))
-    _BEACH_COORD_CACHE = coord_map
-    logger.debug('Loaded %s beach coordinates', len(coord_map))
-    return coord_map
+    index = get_beach_index()
+    return {
+        beach_id: (lat, lon)
+        for beach_id, lat, lon in zip(index.ids.tolist(), index.lats.tolist(), index.lons.tolist())
+    }
 
 
 def _fill_records_with_neighbors(records, fields=None, fill_surf_min=False):
@@ -230,12 +209,12 @@ def _fill_records_with_neighbors(records, fields=None, fill_surf_min=False):
     coord_map = _get_beach_coord_map()
     fields = tuple(fields) if fields else FIELDS_FOR_NEIGHBOR_FILL
     grouped = defaultdict(list)
-    for idx, rec in enumerate(records):
-        ts_norm = _normalize_timestamp(rec.get('timestamp'))
+    epochs = to_epoch([rec.get('timestamp') for rec in records])
+    for idx, (rec, epoch) in enumerate(zip(records, epochs.tolist())):
         bid = rec.get('beach_id')
-        if ts_norm is None or bid not in coord_map:
+        if epoch == INVALID_EPOCH or bid not in coord_map:
             continue
-        grouped[(ts_norm)].append(idx)
+        grouped[epoch].append(idx)
 
     for ts_key, indices in grouped.items():
         per_meta = []
@@ -362,6 +341,7 @@ def _deduplicate_records(records, unique_keys):
     return list(merged.values())
 
 
+@counts_upsert
 def upsert_forecast_data(records, table_name="forecast_data"):
     """Upsert forecast records to database in chunks."""
     if not records:
@@ -393,7 +373,8 @@ def upsert_forecast_data(records, table_name="forecast_data"):
             supabase.table(table_name).upsert(
                 chunk,
                 on_conflict="beach_id,timestamp",
-                default_to_null=False  # Don't set missing fields to NULL on update
+                default_to_null=False,  # Don't set missing fields to NULL on update
+                returning="minimal"
             ).execute()
             total_inserted += len(chunk)
             logger.debug(f"   Upserted chunk of {len(chunk)} records")
@@ -404,6 +385,7 @@ def upsert_forecast_data(records, table_name="forecast_data"):
     return total_inserted
 
 
+@counts_upsert
 def upsert_grid_forecast_data(records, table_name="grid_forecast_data"):
     """Upsert grid forecast records to database in chunks."""
     if not records:
@@ -433,7 +415,8 @@ def upsert_grid_forecast_data(records, table_name="grid_forecast_data"):
             supabase.table(table_name).upsert(
                 chunk,
                 on_conflict="grid_id,timestamp",
-                default_to_null=False  # Don't set missing fields to NULL on update
+                default_to_null=False,  # Don't set missing fields to NULL on update
+                returning="minimal"
             ).execute()
             total_inserted += len(chunk)
             logger.debug(f"   Upserted chunk of {len(chunk)} records")
@@ -444,6 +427,7 @@ def upsert_grid_forecast_data(records, table_name="grid_forecast_data"):
     return total_inserted
 
 
+@counts_upsert
 def upsert_daily_conditions(records, table_name="daily_county_conditions"):
     """Upsert daily condition records to database in chunks."""
     if not records:
@@ -466,7 +450,8 @@ def upsert_daily_conditions(records, table_name="daily_county_conditions"):
             supabase.table(table_name).upsert(
                 chunk,
                 on_conflict="county,date",
-                default_to_null=False  # Don't set missing fields to NULL on update
+                default_to_null=False,  # Don't set missing fields to NULL on update
+                returning="minimal"
             ).execute()
             total_inserted += len(chunk)
             logger.debug(f"   Upserted chunk of {len(chunk)} daily records")
@@ -476,6 +461,7 @@ def upsert_daily_conditions(records, table_name="daily_county_conditions"):
     logger.info(f"   Successfully upserted {total_inserted} daily records to {table_name}")
     return total_inserted
 
+@counts_upsert
 def upsert_tide_data(records, table_name="beach_tides_hourly"):
     """Upsert tide records to database in chunks."""
     if not records:
@@ -498,7 +484,8 @@ def upsert_tide_data(records, table_name="beach_tides_hourly"):
             supabase.table(table_name).upsert(
                 chunk,
                 on_conflict="beach_id,timestamp",
-                default_to_null=False  # Don't set missing fields to NULL on update
+                default_to_null=False,  # Don't set missing fields to NULL on update
+                returning="minimal"
             ).execute()
             total_inserted += len(chunk)
             logger.debug(f"   Upserted chunk of {len(chunk)} tide records")
@@ -508,10 +495,14 @@ def upsert_tide_data(records, table_name="beach_tides_hourly"):
     logger.info(f"   Successfully upserted {total_inserted} tide records to {table_name}")
     return total_inserted
 
+def _delete_counted(table_name):
+    """DELETE builder that reports the affected row count without shipping the deleted rows back."""
+    return supabase.table(table_name).delete(count="exact", returning="minimal")
+
 def delete_all_tide_data(table_name="beach_tides_hourly"):
     """Delete all existing tide records (safe coarse delete)."""
     try:
-        supabase.table(table_name).delete().neq("beach_id", None).execute()
+        supabase.table(table_name).delete(returning="minimal").neq("beach_id", None).execute()
         logger.info(f"   Deleted all rows from {table_name}")
         return True
     except Exception as e:
@@ -546,8 +537,8 @@ def delete_tide_data_before(cutoff, table_name="beach_tides_hourly"):
 
         for label, cutoff_iso in cutoff_variants:
             try:
-                resp = supabase.table(table_name).delete().lt("timestamp", cutoff_iso).execute()
-                deleted = len(resp.data) if hasattr(resp, 'data') and resp.data is not None else 0
+                resp = _delete_counted(table_name).lt("timestamp", cutoff_iso).execute()
+                deleted = resp.count or 0
                 used_variant = (label, cutoff_iso)
                 if deleted:
                     logger.info(
@@ -590,6 +581,7 @@ def delete_tide_data_before(cutoff, table_name="beach_tides_hourly"):
         logger.error(f"ERROR: Failed to delete outdated tide data before {cutoff}: {e}")
         return False
 
+@counts_upsert
 def upsert_county_tide_data(records, table_name="county_tides_15min"):
     """Upsert county-based tide records to database in chunks."""
     if not records:
@@ -612,7 +604,8 @@ def upsert_county_tide_data(records, table_name="county_tides_15min"):
             supabase.table(table_name).upsert(
                 chunk,
                 on_conflict="county,timestamp",
-                default_to_null=False  # Don't set missing fields to NULL on update
+                default_to_null=False,  # Don't set missing fields to NULL on update
+                returning="minimal"
             ).execute()
             total_inserted += len(chunk)
             logger.debug(f"   Upserted chunk of {len(chunk)} county tide records")
@@ -626,7 +619,7 @@ def upsert_county_tide_data(records, table_name="county_tides_15min"):
 def delete_all_county_tide_data(table_name="county_tides_15min"):
     """Delete all existing county tide records."""
     try:
-        supabase.table(table_name).delete().neq("county", None).execute()
+        supabase.table(table_name).delete(returning="minimal").neq("county", None).execute()
         logger.info(f"   Deleted all rows from {table_name}")
         return True
     except Exception as e:
@@ -653,8 +646,8 @@ def delete_county_tide_data_before(cutoff, table_name="county_tides_15min"):
         cutoff_dt = pacific.normalize(cutoff_dt)
         cutoff_iso = cutoff_dt.isoformat()
 
-        resp = supabase.table(table_name).delete().lt("timestamp", cutoff_iso).execute()
-        deleted = len(resp.data) if hasattr(resp, 'data') and resp.data is not None else 0
+        resp = _delete_counted(table_name).lt("timestamp", cutoff_iso).execute()
+        deleted = resp.count or 0
 
         if deleted:
             logger.info(f"   Deleted {deleted} county tide rows before {cutoff_iso}")
@@ -667,6 +660,79 @@ def delete_county_tide_data_before(cutoff, table_name="county_tides_15min"):
         return False
 
 
+def fetch_county_tide_high_water_marks(counties, table_name="county_tides_15min"):
+    """
+    Latest stored tide timestamp and station per county (one small query each).
+
+    Query errors are raised, not skipped: a county missing from the result
+    must mean it has no rows.
+
+    Returns:
+        Dict of county -> (timestamp ISO string, station_id); counties without rows are absent
+    """
+    marks = {}
+    for county in counties:
+        resp = (
+            supabase.table(table_name)
+            .select("timestamp,station_id")
+            .eq("county", county)
+            .order("timestamp", desc=True)
+            .limit(1)
+            .execute()
+        )
+        if resp.data:
+            marks[county] = (resp.data[0].get("timestamp"), resp.data[0].get("station_id"))
+    return marks
+
+
+def count_county_tide_rows(county, start, end, table_name="county_tides_15min"):
+    """
+    Stored tide rows for a county with start <= timestamp < end (tz-aware datetimes).
+
+    Query errors are raised, like fetch_county_tide_high_water_marks().
+    """
+    resp = (
+        supabase.table(table_name)
+        .select("timestamp", count="exact")
+        .eq("county", county)
+        .gte("timestamp", start.isoformat())
+        .lt("timestamp", end.isoformat())
+        .limit(1)
+        .execute()
+    )
+    return resp.count or 0
+
+
+def refresh_daily_surf_intensity(function_name, target_dates) -> int:
+    """
+    Refresh a daily surf-intensity rollup for several dates in one RPC
+    (<function_name>_for_dates, migrations/refresh_daily_surf_intensity_for_dates.sql);
+    falls back to one <function_name> call per date when that is not installed.
+
+    Returns:
+        Number of dates refreshed
+    """
+    dates = sorted(set(target_dates))
+    if not dates:
+        return 0
+    try:
+        supabase.rpc(f"{function_name}_for_dates", {"target_dates": dates}).execute()
+        logger.info(f"   Refreshed {function_name} for {len(dates)} dates ({dates[0]} .. {dates[-1]})")
+        return len(dates)
+    except Exception as e:
+        logger.warning(f"   {function_name}_for_dates unavailable ({e}); refreshing date by date")
+
+    refreshed = 0
+    for target_date in dates:
+        try:
+            supabase.rpc(function_name, {"target_date": target_date}).execute()
+            refreshed += 1
+        except Exception as e:
+            logger.error(f"ERROR: Failed to refresh {function_name} for {target_date}: {e}")
+    logger.info(f"   Refreshed {function_name} for {refreshed}/{len(dates)} dates")
+    return refreshed
+
+
 def get_beach_by_id(beach_id):
     """Get a specific beach by ID."""
     try:
@@ -698,17 +764,37 @@ def check_database_connection():
         logger.error(f"ERROR: Database connection failed: {e}")
         return False
 
-def get_table_record_count(table_name):
-    """Get record count for a table."""
+def get_table_record_count(table_name, method=None):
+    """
+    Get record count for a table with a head-only request (no rows are returned).
+
+    Args:
+        method: "exact", "planned" or "estimated" (default DB_COUNT_METHOD)
+    """
+    method = method or DB_COUNT_METHOD
     try:
-        resp = supabase.table(table_name).select("*", count="exact").execute()
+        resp = supabase.table(table_name).select("*", count=method, head=True).execute()
         count = resp.count if resp.count is not None else 0
-        logger.info(f"   {table_name}: {count} records")
+        logger.info(f"   {table_name}: {count} records ({method})")
         return count
     except Exception as e:
         logger.error(f"ERROR: Error counting records in {table_name}: {e}")
         return 0
 
+def get_exact_record_counts(tables):
+    """
+    Exact row counts for several tables from one aggregate RPC
+    (migrations/table_row_counts.sql); falls back to a head-only exact count per table.
+    """
+    try:
+        resp = supabase.rpc("table_row_counts", {"table_names": list(tables)}).execute()
+        counts = {row["table_name"]: int(row["row_count"]) for row in resp.data or []}
+        if set(counts) == set(tables):
+            return counts
+    except Exception as e:
+        logger.debug(f"   table_row_counts RPC unavailable ({e}); counting per table")
+    return {table: get_table_record_count(table, method="exact") for table in tables}
+
 def cleanup_forecast_data_by_date(cutoff_date):
     """Delete forecast data older than cutoff date."""
     try:
@@ -732,8 +818,8 @@ def cleanup_daily_conditions_by_date(cutoff_date):
     """Delete daily conditions older than cutoff date."""
     try:
         cutoff_str = cutoff_date.strftime('%Y-%m-%d')
-        resp = supabase.table("daily_county_conditions").delete().lt('date', cutoff_str).execute()
-        logger.info(f"   Cleaned up daily conditions older than {cutoff_str}")
+        resp = _delete_counted("daily_county_conditions").lt('date', cutoff_str).execute()
+        logger.info(f"   Cleaned up {resp.count or 0} daily conditions older than {cutoff_str}")
         return True
     except Exception as e:
         logger.error(f"ERROR: Error cleaning up daily conditions: {e}")
@@ -755,13 +841,14 @@ def validate_database_schema():
     logger.info("Database schema validation passed")
     return True
 
-def get_database_stats():
-    """Get statistics about the database."""
-    stats = {}
+def get_database_stats(exact=False):
+    """Get statistics about the database (planner estimates unless exact=True)."""
     tables = ["beaches", "forecast_data", "daily_county_conditions"]
-    
-    for table in tables:
-        stats[table] = get_table_record_count(table)
+
+    if exact:
+        stats = get_exact_record_counts(tables)
+    else:
+        stats = {table: get_table_record_count(table) for table in tables}
     
     logger.info("Database statistics:")
     for table, count in stats.items():
@@ -787,7 +874,7 @@ def fetch_existing_forecast_records(page_size: int = 1000):
             resp = (
                 supabase
                 .table("forecast_data")
-                .select("*", count="exact")
+                .select("*")
                 .range(start, end_idx)
                 .execute()
             )
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+In-memory stand-in for the supabase client used by this repo
+Serves benchmarks (benchmark.py) and offline replay runs (replay.py)
+"""
+
+from typing import Callable, Dict, List, Optional
+
+
+class FakeResponse:
+    """Mirrors postgrest APIResponse: .data and .count."""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class _FakeQuery:
+    """Chainable query builder over FakeSupabaseClient tables."""
+
+    def __init__(self, client, table_name: str):
+        self._client = client
+        self._table = table_name
+        self._action = "select"
+        self._columns = None
+        self._count = None
+        self._filters = []
+        self._negate_next = False
+        self._order = []
+        self._limit = None
+        self._offset = 0
+        self._payload = None
+        self._on_conflict = None
+        self._default_to_null = True
+
+    # --- actions ---
+    def select(self, columns: str = "*", count: Optional[str] = None, **kwargs):
+        self._action = "select"
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        self._count = count
+        return self
+
+    def upsert(self, rows, on_conflict: str = "", default_to_null: bool = True, **kwargs):
+        self._action = "upsert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        self._on_conflict = [c.strip() for c in on_conflict.split(",") if c.strip()] or ["id"]
+        self._default_to_null = default_to_null
+        return self
+
+    def insert(self, rows, **kwargs):
+        self._action = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values: Dict, **kwargs):
+        self._action = "update"
+        self._payload = values
+        return self
+
+    def delete(self, **kwargs):
+        self._action = "delete"
+        return self
+
+    # --- filters ---
+    def _add(self, predicate: Callable[[Dict], bool]):
+        if self._negate_next:
+            self._filters.append(lambda row, p=predicate: not p(row))
+            self._negate_next = False
+        else:
+            self._filters.append(predicate)
+        return self
+
+    @property
+    def not_(self):
+        self._negate_next = True
+        return self
+
+    def eq(self, column, value):
+        return self._add(lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._add(lambda row: row.get(column) != value)
+
+    def gt(self, column, value):
+        return self._add(lambda row: row.get(column) is not None and row.get(column) > value)
+
+    def gte(self, column, value):
+        return self._add(lambda row: row.get(column) is not None and row.get(column) >= value)
+
+    def lt(self, column, value):
+        return self._add(lambda row: row.get(column) is not None and row.get(column) < value)
+
+    def lte(self, column, value):
+        return self._add(lambda row: row.get(column) is not None and row.get(column) <= value)
+
+    def in_(self, column, values):
+        allowed = set(values)
+        return self._add(lambda row: row.get(column) in allowed)
+
+    def is_(self, column, value):
+        if value in (None, "null"):
+            return self._add(lambda row: row.get(column) is None)
+        return self._add(lambda row: row.get(column) is value)
+
+    # --- modifiers ---
+    def order(self, column, desc: bool = False, **kwargs):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs):
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    # --- execution ---
+    def _matching(self, rows):
+        return [row for row in rows if all(f(row) for f in self._filters)]
+
+    def execute(self) -> FakeResponse:
+        self._client.calls.append((self._table, self._action))
+        table = self._client.tables.setdefault(self._table, {})
+
+        if self._action == "upsert":
+            return FakeResponse(self._client._upsert(self._table, self._payload, self._on_conflict, self._default_to_null))
+        if self._action == "insert":
+            for row in self._payload:
+                self._client._next_id += 1
+                table[(("id", self._client._next_id),)] = {"id": self._client._next_id, **row}
+            return FakeResponse(list(self._payload))
+        if self._action == "update":
+            matched = self._matching(table.values())
+            for row in matched:
+                row.update(self._payload)
+            return FakeResponse([dict(r) for r in matched])
+        if self._action == "delete":
+            doomed = [k for k, row in table.items() if all(f(row) for f in self._filters)]
+            removed = [table.pop(k) for k in doomed]
+            return FakeResponse(removed)
+
+        rows = self._matching(table.values())
+        for column, desc in reversed(self._order):
+            rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        total = len(rows)
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if self._columns is not None:
+            rows = [{c: r.get(c) for c in self._columns} for r in rows]
+        else:
+            rows = [dict(r) for r in rows]
+        return FakeResponse(rows, total if self._count else None)
+
+
+class _FakeRpc:
+    def __init__(self, client, name: str, params: Optional[Dict]):
+        self._client = client
+        self._name = name
+        self._params = params or {}
+
+    def execute(self) -> FakeResponse:
+        self._client.calls.append((self._name, "rpc"))
+        handler = self._client.rpc_handlers.get(self._name)
+        if handler is None:
+            raise Exception(f"Could not find the function public.{self._name} in the schema cache")
+        return FakeResponse(handler(self._client, **self._params))
+
+
+class FakeSupabaseClient:
+    """
+    In-memory stand-in for the supabase client surface used by this repo:
+    table().select/upsert/insert/update/delete with eq/neq/gt/gte/lt/lte/in_/is_/not_
+    filters, order/limit/range, and rpc() backed by registered Python handlers.
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[Dict]]] = None):
+        self.tables: Dict[str, Dict] = {}
+        self.rpc_handlers: Dict[str, Callable] = {}
+        self.calls: List = []
+        self.upserted_rows = 0
+        self._next_id = 0
+        for name, rows in (tables or {}).items():
+            self.load_table(name, rows)
+
+    def load_table(self, name: str, rows: List[Dict], key: str = "id"):
+        table = self.tables.setdefault(name, {})
+        for row in rows:
+            if key not in row:
+                self._next_id += 1
+                row = {key: self._next_id, **row}
+            table[((key, row[key]),)] = dict(row)
+
+    def table(self, name: str) -> _FakeQuery:
+        return _FakeQuery(self, name)
+
+    def from_(self, name: str) -> _FakeQuery:
+        return self.table(name)
+
+    def rpc(self, name: str, params: Optional[Dict] = None) -> _FakeRpc:
+        return _FakeRpc(self, name, params)
+
+    def register_rpc(self, name: str, handler: Callable):
+        """handler(client, **params) -> response data."""
+        self.rpc_handlers[name] = handler
+
+    def _upsert(self, table_name, rows, conflict_cols, default_to_null):
+        table = self.tables.setdefault(table_name, {})
+        keys = [tuple((c, row.get(c)) for c in conflict_cols) for row in rows]
+        if len(set(keys)) != len(keys):
+            # PostgREST rejects a batch that touches the same row twice
+            raise Exception("ON CONFLICT DO UPDATE command cannot affect row a second time")
+
+        for key, row in zip(keys, rows):
+            existing = table.get(key)
+            if existing is None:
+                self._next_id += 1
+                table[key] = {"id": self._next_id, **row}
+            elif default_to_null:
+                table[key] = {"id": existing["id"], **row}
+            else:
+                existing.update(row)
+        self.upserted_rows += len(rows)
+        return list(rows)
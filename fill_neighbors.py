@@ -15,12 +15,16 @@ from collections import Counter, defaultdict
 from datetime import datetime, timedelta
 from typing import Dict, Iterable, List, Optional, Set, Tuple
 
+import numpy as np
 import pandas as pd
 import pytz
 
 from config import logger
 from database import supabase
 from noaa_grid_handler import fetch_grid_points_from_db
+from timestamps import (
+    INVALID_EPOCH, cadence_seconds, epoch_to_iso, floor_epoch, to_epoch, to_epoch_scalar
+)
 from utils import chunk_iter
 
 # --------------------------------------------------------------------- #
@@ -151,6 +155,46 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     c = 2 * math.asin(min(1.0, math.sqrt(max(0.0, a))))
     return 6371.0 * c
 
+# Donors whose unit-vector dot products are this close to the best one are compared by haversine
+NEAREST_DOT_TOLERANCE = 1e-12
+
+def _unit_vectors(coords: List[Tuple]) -> np.ndarray:
+    """(lat, lon, ...) tuples -> (n, 3) unit vectors on the sphere; NaN rows for unparseable coordinates."""
+    lat = np.radians(pd.to_numeric(pd.Series([c[0] for c in coords], dtype=object), errors="coerce").to_numpy(np.float64))
+    lon = np.radians(pd.to_numeric(pd.Series([c[1] for c in coords], dtype=object), errors="coerce").to_numpy(np.float64))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+def nearest_donors(targets: List[Tuple], donors: List[Tuple], chunk: int = 512) -> np.ndarray:
+    """
+    Position of the nearest donor for each target, -1 where no donor has a finite distance.
+
+    The largest dot product of unit vectors is the smallest great-circle
+    distance, so one matrix product per chunk shortlists the donors; near-ties
+    are settled with haversine_distance() in donor order, exactly as a
+    pairwise scan would.
+    """
+    nearest = np.full(len(targets), -1, dtype=np.int64)
+    if not targets or not donors:
+        return nearest
+    donor_vectors = _unit_vectors(donors)
+    target_vectors = _unit_vectors(targets)
+    for start in range(0, len(targets), chunk):
+        dots = target_vectors[start:start + chunk] @ donor_vectors.T
+        dots[np.isnan(dots)] = -np.inf
+        best = np.argmax(dots, axis=1)
+        top = dots[np.arange(dots.shape[0]), best]
+        nearest[start:start + chunk] = np.where(np.isfinite(top), best, -1)
+        close = dots >= (top - NEAREST_DOT_TOLERANCE)[:, None]
+        for row in np.flatnonzero(np.isfinite(top) & (close.sum(axis=1) > 1)):
+            lat, lon = targets[start + row][:2]
+            best_distance = float("inf")
+            for pos in np.flatnonzero(close[row]):
+                d = haversine_distance(lat, lon, donors[pos][0], donors[pos][1])
+                if d < best_distance:
+                    best_distance = d
+                    nearest[start + row] = pos
+    return nearest
+
 def pacific_midnight_today(now: Optional[datetime] = None) -> datetime:
     tz = pytz.timezone("America/Los_Angeles")
     now = now.astimezone(tz) if now and now.tzinfo else now or datetime.now(tz)
@@ -161,14 +205,14 @@ def normalize_timestamp(value: object, freq: str = "h") -> Optional[str]:
     Coerce to UTC, snap to cadence bucket, return tz-naive ISO string key
     so equal buckets compare equal (e.g., '2025-10-02T07:00:00').
     """
-    if value is None:
+    epoch = to_epoch_scalar(value)
+    if epoch is None:
         return None
     try:
-        ts = pd.to_datetime(value, utc=True)
-        ts = ts.floor(freq)
-        return ts.tz_convert(None).isoformat()
-    except Exception:
+        bucket = floor_epoch([epoch], cadence_seconds(freq))
+    except ValueError:
         return None
+    return epoch_to_iso(bucket, "UTC")[0][:-len("+00:00")]
 
 def has_real_value(value) -> bool:
     """Treat None, NaN, '', 'nan', 'none', 'null' as missing. 0 is valid."""
@@ -252,12 +296,12 @@ def fetch_recent_forecast_records(
 # Fill logic (with ±N bucket fallback)
 # --------------------------------------------------------------------- #
 def _seed_donors_from_window(
-    ts_key: str,
+    ts_key: int,
     field: str,
-    grouped: Dict[str, List[int]],
+    grouped: Dict[int, List[int]],
     records: List[Dict],
     meta_by_index: Dict[int, Tuple[float, float]],
-    sorted_keys: List[str],
+    sorted_keys: List[int],
     radius: int,
 ) -> List[Tuple[float, float, object]]:
     """
@@ -326,12 +370,16 @@ def fill_from_neighbors_rowwise(
         return [], stats
 
     # Build index: timestamp -> list of record indices
-    grouped: Dict[str, List[int]] = defaultdict(list)
+    grouped: Dict[int, List[int]] = defaultdict(list)
     meta_by_index: Dict[int, Tuple[float, float]] = {}
 
-    for idx, rec in enumerate(records):
-        ts_key = normalize_timestamp(rec.get("timestamp"), cadence)
-        if not ts_key:
+    # Bucket keys are epoch seconds floored to the cadence (one vectorized parse)
+    bucket_keys = floor_epoch(
+        to_epoch([rec.get("timestamp") for rec in records]), cadence_seconds(cadence)
+    ).tolist()
+
+    for idx, (rec, ts_key) in enumerate(zip(records, bucket_keys)):
+        if ts_key == INVALID_EPOCH:
             stats["skipped_bad_timestamp"] += 1
             continue
 
@@ -414,34 +462,27 @@ def fill_from_neighbors_rowwise(
             if not missing:
                 continue
 
-            # PASS 1: Fill all missing values from existing donors
+            # PASS 1: Fill all missing values from their nearest existing donor
             filled_in_pass = []
-            for idx, lat, lon in missing:
-                # Find nearest donor value
-                best_value = None
-                best_distance = float("inf")
-                for d_lat, d_lon, d_val in donors:
-                    d = haversine_distance(lat, lon, d_lat, d_lon)
-                    if d < best_distance:
-                        best_distance = d
-                        best_value = d_val
-
-                if best_value is not None:
-                    # Fill the value in-memory
-                    records[idx][field] = best_value
-                    changed[idx].add(field)
-                    stats["field_filled"][field] += 1
-
-                    if verbose and len(stats["examples"][field]) < 5:
-                        stats["examples"][field].append({
-                            "timestamp": ts_key,
-                            "grid_id": records[idx].get("grid_id"),
-                            "value": best_value,
-                            "distance_km": best_distance,
-                        })
-
-                    # Track newly filled values for potential second pass
-                    filled_in_pass.append((lat, lon, best_value))
+            for (idx, lat, lon), pos in zip(missing, nearest_donors([(lat, lon) for _, lat, lon in missing], donors)):
+                if pos < 0:
+                    continue
+                d_lat, d_lon, best_value = donors[pos]
+                # Fill the value in-memory
+                records[idx][field] = best_value
+                changed[idx].add(field)
+                stats["field_filled"][field] += 1
+
+                if verbose and len(stats["examples"][field]) < 5:
+                    stats["examples"][field].append({
+                        "timestamp": ts_key,
+                        "grid_id": records[idx].get("grid_id"),
+                        "value": best_value,
+                        "distance_km": haversine_distance(lat, lon, d_lat, d_lon),
+                    })
+
+                # Track newly filled values for potential second pass
+                filled_in_pass.append((lat, lon, best_value))
 
             # PASS 2 (optional): Add newly filled values as donors and try again
             # This allows propagation without the expensive while loop
@@ -454,18 +495,11 @@ def fill_from_neighbors_rowwise(
                     if not has_real_value(records[idx].get(field))
                 ]
 
-                for idx, lat, lon in remaining_nulls:
-                    best_value = None
-                    best_distance = float("inf")
-                    # Only check newly filled donors (much smaller list)
-                    for d_lat, d_lon, d_val in filled_in_pass:
-                        d = haversine_distance(lat, lon, d_lat, d_lon)
-                        if d < best_distance:
-                            best_distance = d
-                            best_value = d_val
-
-                    if best_value is not None:
-                        records[idx][field] = best_value
+                # Only check newly filled donors (much smaller list)
+                retry = nearest_donors([(lat, lon) for _, lat, lon in remaining_nulls], filled_in_pass)
+                for (idx, _, _), pos in zip(remaining_nulls, retry):
+                    if pos >= 0:
+                        records[idx][field] = filled_in_pass[pos][2]
                         changed[idx].add(field)
                         stats["field_filled"][field] += 1
 
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Columnar forecast table for Hybrid Surf Database Update Script
+Replaces List[Dict] records and "beach_id_timestamp" string keys inside the
+supplement handlers with a pandas table indexed by (entity_id, epoch seconds)
+"""
+
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from config import logger
+from timestamps import INVALID_EPOCH, PACIFIC_TZ, epoch_to_iso, to_epoch
+
+FLOAT_DTYPE = np.float32
+INDEX_NAMES = ("entity_id", "epoch")
+TIMESTAMP_FIELD = "timestamp"
+
+# Fields stored as float32 internally but serialized back as Python ints
+INTEGER_FIELDS = {"weather"}
+
+
+class ForecastFrame:
+    """
+    Forecast records held as typed columns.
+
+    `data` is a DataFrame indexed by (entity_id, epoch) where epoch is int64
+    UTC seconds. Numeric fields are float32 with NaN as the validity mask;
+    the original ISO timestamp string is kept so serialization is lossless.
+    """
+
+    def __init__(self, data: pd.DataFrame, id_field: str = "beach_id"):
+        self.data = data
+        self.id_field = id_field
+
+    # --- construction ---
+    @classmethod
+    def from_records(cls, records: List[Dict], id_field: str = "beach_id") -> "ForecastFrame":
+        """Build a frame from forecast dicts keyed by `id_field` and `timestamp`."""
+        if not records:
+            return cls.empty(id_field)
+
+        df = pd.DataFrame.from_records(records)
+        if id_field not in df.columns or TIMESTAMP_FIELD not in df.columns:
+            logger.warning(f"   ForecastFrame: records missing {id_field}/{TIMESTAMP_FIELD}; building empty frame")
+            return cls.empty(id_field)
+
+        epochs = to_epoch(df[TIMESTAMP_FIELD])
+        keep = (epochs != INVALID_EPOCH) & df[id_field].notna().to_numpy()
+        if not keep.all():
+            logger.warning(f"   ForecastFrame: dropped {int((~keep).sum())} records with invalid {id_field}/{TIMESTAMP_FIELD}")
+            df = df.loc[keep]
+            epochs = epochs[keep]
+
+        index = pd.MultiIndex.from_arrays([df[id_field].to_numpy(), epochs], names=INDEX_NAMES)
+        df = df.drop(columns=[id_field])
+        df.index = index
+        df = df.loc[~df.index.duplicated(keep="last")]
+
+        for col in df.columns:
+            if col == TIMESTAMP_FIELD:
+                continue
+            series = df[col]
+            if pd.api.types.is_bool_dtype(series):
+                continue
+            if pd.api.types.is_numeric_dtype(series) or series.isna().all():
+                df[col] = pd.to_numeric(series, errors="coerce").astype(FLOAT_DTYPE)
+
+        return cls(df, id_field)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        entity_ids: Iterable,
+        epochs: Iterable,
+        columns: Dict[str, Iterable],
+        id_field: str = "beach_id",
+    ) -> "ForecastFrame":
+        """Build a source frame from parallel arrays (used by supplements to stage their values)."""
+        index = pd.MultiIndex.from_arrays(
+            [np.asarray(entity_ids), np.asarray(epochs, dtype=np.int64)], names=INDEX_NAMES
+        )
+        df = pd.DataFrame(
+            {name: np.asarray(values, dtype=FLOAT_DTYPE) for name, values in columns.items()},
+            index=index,
+        )
+        df = df.loc[~df.index.duplicated(keep="last")]
+        return cls(df, id_field)
+
+    @classmethod
+    def empty(cls, id_field: str = "beach_id") -> "ForecastFrame":
+        index = pd.MultiIndex.from_arrays([[], np.array([], dtype=np.int64)], names=INDEX_NAMES)
+        return cls(pd.DataFrame(index=index), id_field)
+
+    # --- accessors ---
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def entity_ids(self) -> np.ndarray:
+        return self.data.index.get_level_values(0).to_numpy()
+
+    @property
+    def epochs(self) -> np.ndarray:
+        return self.data.index.get_level_values(1).to_numpy(dtype=np.int64)
+
+    def valid_mask(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Boolean mask of populated cells (missing columns count as all-invalid)."""
+        columns = columns or [c for c in self.data.columns if c != TIMESTAMP_FIELD]
+        return self.data.reindex(columns=columns).notna()
+
+    def memory_bytes(self) -> int:
+        return int(self.data.memory_usage(deep=True, index=True).sum())
+
+    # --- merging ---
+    def fill_missing(self, columns: List[str], source_frame: "ForecastFrame", overwrite: bool = False) -> int:
+        """
+        Copy `columns` from `source_frame` into matching (entity_id, epoch) rows.
+
+        Only cells that are missing here are written unless `overwrite` is set;
+        missing values in the source never replace existing values.
+
+        Returns:
+            int: Number of cells written
+        """
+        if len(self.data) == 0 or len(source_frame.data) == 0:
+            return 0
+
+        filled = 0
+        for col in columns:
+            if col not in source_frame.data.columns:
+                continue
+            incoming = source_frame.data[col].reindex(self.data.index)
+            write = incoming.notna()
+            if col not in self.data.columns:
+                self.data[col] = pd.Series(np.nan, index=self.data.index, dtype=incoming.dtype)
+            elif not overwrite:
+                write &= self.data[col].isna()
+
+            count = int(write.sum())
+            if count:
+                self.data[col] = self.data[col].where(~write, incoming)
+                filled += count
+        return filled
+
+    # --- serialization ---
+    def to_records(self) -> List[Dict]:
+        """Serialize back to forecast dicts, omitting missing fields."""
+        n = len(self.data)
+        if n == 0:
+            return []
+
+        ids = self.entity_ids.tolist()
+        if TIMESTAMP_FIELD in self.data.columns:
+            timestamps = self.data[TIMESTAMP_FIELD].tolist()
+        else:
+            timestamps = epoch_to_iso(self.epochs, PACIFIC_TZ)
+
+        column_values = []
+        for col in self.data.columns:
+            if col == TIMESTAMP_FIELD:
+                continue
+            series = self.data[col]
+            valid = series.notna().to_numpy()
+            if series.dtype == FLOAT_DTYPE:
+                # Shortest float32 repr keeps 2.3 as 2.3 rather than 2.299999952316284
+                values = series.to_numpy().astype(str).astype(np.float64)
+                if col in INTEGER_FIELDS:
+                    values = np.where(valid, values, 0).astype(np.int64)
+                values = values.tolist()
+            else:
+                values = series.tolist()
+            column_values.append((col, values, valid))
+
+        records = []
+        for i in range(n):
+            rec = {self.id_field: ids[i], TIMESTAMP_FIELD: timestamps[i]}
+            for col, values, valid in column_values:
+                if valid[i]:
+                    rec[col] = values[i]
+            records.append(rec)
+        return records
+
+
+def as_forecast_frame(records: Union[List[Dict], ForecastFrame], id_field: str = "beach_id") -> ForecastFrame:
+    """Accept either records or a frame so supplements can be chained on frames."""
+    if isinstance(records, ForecastFrame):
+        return records
+    return ForecastFrame.from_records(records, id_field)
+
+
+def frame_like_input(frame: ForecastFrame, original: Union[List[Dict], ForecastFrame]):
+    """Return `frame` in the same shape the caller passed in (frame or records)."""
+    if isinstance(original, ForecastFrame):
+        return frame
+    return frame.to_records()
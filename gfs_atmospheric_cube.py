@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Bulk GFS Atmospheric extraction for Hybrid Surf Database Update Script
+Reads each variable once for the whole coastal box and time window (one
+contiguous OPeNDAP hyperslab per variable) and serves every location group
+from that in-memory cube instead of one remote read per group
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from config import logger
+from instrumentation import record_opendap_read
+from utils import enforce_noaa_rate_limit, is_noaa_html_rate_limit, is_rate_limit_error, report_rate_limited
+
+GFS_RESOLUTION_DEG = 0.25
+ATMOSPHERIC_VARS = ("tmp2m", "pressfc", "ugrd10m", "vgrd10m", "tcdcclm", "pratesfc", "gustsfc")
+
+
+def _to_dataset_lon(lon: float, lon_values: np.ndarray) -> float:
+    """Express a longitude in the dataset's convention (GFS uses 0-360)."""
+    if lon_values.size and float(lon_values.max()) > 180 and lon < 0:
+        return lon + 360.0
+    return lon
+
+
+def coastal_bounds(beaches: Iterable[Dict], pad_deg: float = GFS_RESOLUTION_DEG) -> Optional[Tuple[float, float, float, float]]:
+    """(lat_min, lat_max, lon_min, lon_max) around all beaches, padded by one grid cell (lon in -180..180)."""
+    lats = [b["LATITUDE"] for b in beaches if b.get("LATITUDE") is not None]
+    lons = [b["LONGITUDE"] for b in beaches if b.get("LONGITUDE") is not None]
+    if not lats or not lons:
+        return None
+    return min(lats) - pad_deg, max(lats) + pad_deg, min(lons) - pad_deg, max(lons) + pad_deg
+
+
+def _index_range(coord: np.ndarray, low: float, high: float) -> slice:
+    """Contiguous index slice covering [low, high] on a monotonic coordinate."""
+    inside = np.flatnonzero((coord >= low) & (coord <= high))
+    if inside.size == 0:
+        # Box narrower than one cell: take the nearest cell to its centre
+        centre = (low + high) / 2.0
+        nearest = int(np.abs(coord - centre).argmin())
+        return slice(nearest, nearest + 1)
+    return slice(int(inside.min()), int(inside.max()) + 1)
+
+
+class AtmosphericCube:
+    """GFS variables held in memory as (time, lat, lon) arrays over the coastal box."""
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, time_start: int, data: Dict[str, np.ndarray]):
+        self.lats = lats
+        self.lons = lons
+        self.time_start = time_start
+        self.data = data
+
+    def __contains__(self, var: str) -> bool:
+        return var in self.data
+
+    def nearest_cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        lon = _to_dataset_lon(lon, self.lons)
+        return int(np.abs(self.lats - lat).argmin()), int(np.abs(self.lons - lon).argmin())
+
+    def series(self, var: str, lat: float, lon: float, time_indices: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """
+        Values of `var` at the grid cell nearest (lat, lon).
+
+        Args:
+            time_indices: Dataset-wide time indices (None returns the full loaded window)
+
+        Returns:
+            np.ndarray or None if the variable is not in the cube
+        """
+        values = self.data.get(var)
+        if values is None:
+            return None
+        i, j = self.nearest_cell(lat, lon)
+        column = values[:, i, j]
+        if time_indices is None:
+            return column
+        return column[np.asarray(time_indices, dtype=np.int64) - self.time_start]
+
+    def nbytes(self) -> int:
+        return int(sum(v.nbytes for v in self.data.values()))
+
+
+def load_atmospheric_cube(
+    ds,
+    bounds: Tuple[float, float, float, float],
+    time_indices: Iterable[int],
+    variables: Iterable[str] = ATMOSPHERIC_VARS,
+) -> Optional[AtmosphericCube]:
+    """
+    Pull `variables` for the box and time span in one read per variable.
+
+    Args:
+        ds: Open GFS dataset (lazy OPeNDAP)
+        bounds: (lat_min, lat_max, lon_min, lon_max) from coastal_bounds()
+        time_indices: Dataset time indices needed; the read spans min..max
+        variables: Variable names (missing ones are skipped)
+
+    Returns:
+        AtmosphericCube or None if nothing could be read
+    """
+    time_indices = np.unique(np.asarray(list(time_indices), dtype=np.int64))
+    if time_indices.size == 0:
+        return None
+
+    lat_values = np.asarray(ds["lat"].values, dtype=np.float64)
+    lon_values = np.asarray(ds["lon"].values, dtype=np.float64)
+    lat_min, lat_max, lon_min, lon_max = bounds
+    lon_lo, lon_hi = sorted((_to_dataset_lon(lon_min, lon_values), _to_dataset_lon(lon_max, lon_values)))
+
+    lat_slice = _index_range(lat_values, lat_min, lat_max)
+    lon_slice = _index_range(lon_values, lon_lo, lon_hi)
+    time_slice = slice(int(time_indices[0]), int(time_indices[-1]) + 1)
+
+    data = {}
+    for var in variables:
+        if var not in ds.data_vars:
+            continue
+        enforce_noaa_rate_limit()
+        try:
+            data[var] = np.asarray(
+                ds[var].isel(time=time_slice, lat=lat_slice, lon=lon_slice).values, dtype=np.float32
+            )
+            record_opendap_read(var)
+        except Exception as e:
+            if is_rate_limit_error(e) or is_noaa_html_rate_limit(e):
+                report_rate_limited()
+            logger.warning(f"   GFS cube: failed to read {var}: {e}")
+
+    if not data:
+        logger.error("   GFS cube: no variables could be read")
+        return None
+
+    cube = AtmosphericCube(lat_values[lat_slice], lon_values[lon_slice], time_slice.start, data)
+    logger.info(
+        f"   GFS cube: {len(data)} variables x {time_slice.stop - time_slice.start} times x "
+        f"{cube.lats.size}x{cube.lons.size} cells ({cube.nbytes() / 1e6:.1f} MB)"
+    )
+    return cube
@@ -9,23 +9,34 @@ import time
 import xarray as xr
 import numpy as np
 import pandas as pd
-from datetime import datetime, timezone, timedelta
+from datetime import datetime
 import pytz
 from typing import List, Dict, Optional
 
-from config import logger, NOAA_ATMOSPHERIC_REQUEST_DELAY, NOAA_ATMOSPHERIC_BATCH_DELAY
+from config import logger
+from model_discovery import discover_model_run
+from gfs_atmospheric_cube import coastal_bounds, load_atmospheric_cube
+from timestamps import (
+    BUCKET_SECONDS, INVALID_EPOCH, PACIFIC_TZ, EpochIndex, bucket_pacific_3h, epoch_to_iso, to_epoch
+)
 from utils import (
     enforce_noaa_rate_limit, safe_float, safe_int, celsius_to_fahrenheit,
-    mps_to_mph, pa_to_inhg
+    mps_to_mph, pa_to_inhg, derive_weather_codes, wind_speed_direction
 )
 
 
+# Records within this distance of a GFS bucket count as a (fuzzy) match
+FUZZY_MATCH_TOLERANCE_SECONDS = 90 * 60
+
 # GFS Atmospheric Base URLs (0.25 degree resolution)
 GFS_ATMOSPHERIC_BASE_URLS = [
     "https://nomads.ncep.noaa.gov/dods/gfs_0p25",
     "http://nomads.ncep.noaa.gov/dods/gfs_0p25",
 ]
 
+# Variables a run's .dds must declare to be used
+GFS_REQUIRED_VARS = ("tmp2m", "pressfc")
+
 
 # WMO Weather codes mapping
 def derive_weather_code(cloud_cover_pct: float, precip_rate: float, temperature_f: float) -> int:
@@ -76,69 +87,27 @@ def derive_weather_code(cloud_cover_pct: float, precip_rate: float, temperature_
 
 
 def get_gfs_atmospheric_dataset_url() -> Optional[str]:
-    """Get the current GFS atmospheric dataset URL."""
+    """
+    Get the current GFS atmospheric dataset URL.
+    GFS runs at 00, 06, 12, 18 UTC daily; the newest cycle whose .dds lists
+    the required variables wins (see model_discovery).
+    """
     logger.info("   Searching for available GFS Atmospheric dataset...")
-
-    now_utc = datetime.now(timezone.utc)
-    possible_hours = [18, 12, 6, 0]
-    current_hour = now_utc.hour
-    effective_hour = (current_hour - 4) % 24
-    recent_runs = [h for h in possible_hours if h <= effective_hour]
-
-    if not recent_runs:
-        run_date = (now_utc - timedelta(days=1)).date()
-        run_hour = 18
-    else:
-        if current_hour < 4:
-            run_date = (now_utc - timedelta(days=1)).date()
-        else:
-            run_date = now_utc.date()
-        run_hour = recent_runs[0]
-
-    logger.info(f"   Starting search from {run_date} {run_hour:02d}z")
-
-    for days_back in range(3):
-        test_date = run_date - timedelta(days=days_back)
-        date_str = test_date.strftime("%Y%m%d")
-
-        for base_url in GFS_ATMOSPHERIC_BASE_URLS:
-            hours_to_try = [run_hour] + [h for h in [18, 12, 6, 0] if h != run_hour]
-            for hour in hours_to_try:
-                url = f"{base_url}/gfs{date_str}/gfs_0p25_{hour:02d}z"
-
-                try:
-                    enforce_noaa_rate_limit(NOAA_ATMOSPHERIC_REQUEST_DELAY)
-                    ds = xr.open_dataset(url, engine="netcdf4")
-
-                    required_vars = ["tmp2m", "pressfc"]
-                    missing = [v for v in required_vars if v not in ds.variables]
-
-                    if missing:
-                        ds.close()
-                        continue
-
-                    # Check for optional wind gust variable
-                    has_gust = "gustsfc" in ds.variables
-                    if has_gust:
-                        logger.info(f"   Wind gust (gustsfc) available in this dataset")
-                    else:
-                        logger.info(f"   Wind gust (gustsfc) NOT available in this dataset")
-
-                    ds.close()
-                    logger.info(f"   [OK] Found GFS Atmospheric: {url}")
-                    return url
-
-                except Exception:
-                    continue
-
-    logger.error("   Could not find valid GFS Atmospheric dataset")
-    return None
+    url = discover_model_run(
+        "gfs_0p25",
+        lambda base_url, date_str, hour: f"{base_url}/gfs{date_str}/gfs_0p25_{hour:02d}z",
+        GFS_ATMOSPHERIC_BASE_URLS,
+        required_vars=GFS_REQUIRED_VARS,
+    )
+    if url is None:
+        logger.error("   Could not find valid GFS Atmospheric dataset")
+    return url
 
 
 def load_gfs_atmospheric_dataset(url: str) -> Optional[xr.Dataset]:
     """Load GFS Atmospheric dataset with error handling and rate limiting."""
     logger.info("   Loading GFS Atmospheric dataset...")
-    enforce_noaa_rate_limit(NOAA_ATMOSPHERIC_REQUEST_DELAY)
+    enforce_noaa_rate_limit()
 
     try:
         ds = xr.open_dataset(url, engine="netcdf4")
@@ -149,60 +118,30 @@ def load_gfs_atmospheric_dataset(url: str) -> Optional[xr.Dataset]:
         return None
 
 
-def extract_grid_point_data(ds, grid_lat, grid_lon, sel_idx, filtered_time_vals):
+def extract_grid_point_data(cube, grid_lat, grid_lon, time_indices, filtered_time_vals):
     """
-    Extract atmospheric variables for a single grid point.
-    EXACTLY matches the swell handler structure.
+    Extract atmospheric variables for a single grid point from the in-memory cube.
+    Same output structure as the swell handler; no network access here.
     """
     try:
-        # Extract each variable separately using .sel().values (SAME AS SWELL HANDLER)
-        # Use method='nearest' to handle slight coordinate mismatches
-        tmp = ds["tmp2m"].sel(lat=grid_lat, lon=grid_lon, method='nearest').values
-        pres = ds["pressfc"].sel(lat=grid_lat, lon=grid_lon, method='nearest').values
-
-        # Optional variables
-        cloud = None
-        precip = None
-        wind_gust = None
-        wind_u = None
-        wind_v = None
-
-        # Extract wind components (u and v) to calculate wind speed
-        if 'ugrd10m' in ds.data_vars and 'vgrd10m' in ds.data_vars:
-            try:
-                wind_u = ds["ugrd10m"].sel(lat=grid_lat, lon=grid_lon, method='nearest').values
-                wind_v = ds["vgrd10m"].sel(lat=grid_lat, lon=grid_lon, method='nearest').values
-            except Exception:
-                pass
-
-        if 'tcdcclm' in ds.data_vars:
-            try:
-                cloud = ds["tcdcclm"].sel(lat=grid_lat, lon=grid_lon, method='nearest').values
-            except Exception:
-                pass
-
-        if 'pratesfc' in ds.data_vars:
-            try:
-                precip = ds["pratesfc"].sel(lat=grid_lat, lon=grid_lon, method='nearest').values
-            except Exception:
-                pass
-
-        if 'gustsfc' in ds.data_vars:
-            try:
-                wind_gust = ds["gustsfc"].sel(lat=grid_lat, lon=grid_lon, method='nearest').values
-            except Exception:
-                pass
-
-        # Slice with the time index mask
+        # Nearest cell to the rounded grid coordinate (same as .sel(method='nearest'))
+        def _series(var):
+            return cube.series(var, grid_lat, grid_lon, time_indices)
+
+        tmp = _series("tmp2m")
+        pres = _series("pressfc")
+        if tmp is None or pres is None:
+            return None
+
         grid_data = {
             'time_vals': filtered_time_vals,
-            'temperature_k': tmp[sel_idx],
-            'pressure_pa': pres[sel_idx],
-            'cloud_cover_pct': cloud[sel_idx] if cloud is not None else None,
-            'precip_rate_kgm2s': precip[sel_idx] if precip is not None else None,
-            'wind_gust_ms': wind_gust[sel_idx] if wind_gust is not None else None,
-            'wind_u_ms': wind_u[sel_idx] if wind_u is not None else None,
-            'wind_v_ms': wind_v[sel_idx] if wind_v is not None else None,
+            'temperature_k': tmp,
+            'pressure_pa': pres,
+            'cloud_cover_pct': _series("tcdcclm"),
+            'precip_rate_kgm2s': _series("pratesfc"),
+            'wind_gust_ms': _series("gustsfc"),
+            'wind_u_ms': _series("ugrd10m"),
+            'wind_v_ms': _series("vgrd10m"),
         }
         return grid_data
 
@@ -211,6 +150,38 @@ def extract_grid_point_data(ds, grid_lat, grid_lon, sel_idx, filtered_time_vals)
         return None
 
 
+def derive_point_fields(grid_data: Dict) -> Dict[str, np.ndarray]:
+    """
+    Convert one grid point's raw GFS series to record units in a single pass.
+
+    Returns float64 arrays (NaN where missing) for temperature_f, pressure_inhg,
+    wind_speed_mph, wind_gust_mph, cloud_cover_pct and precip_mmhr, plus the
+    int64 weather_code derived from them.
+    """
+    n = len(grid_data['time_vals'])
+
+    def _raw(key):
+        values = grid_data.get(key)
+        if values is None:
+            return np.full(n, np.nan)
+        return np.asarray(values, dtype=np.float64)
+
+    temperature_f = celsius_to_fahrenheit(_raw('temperature_k') - 273.15)
+    wind_speed_ms, _ = wind_speed_direction(_raw('wind_u_ms'), _raw('wind_v_ms'))
+    cloud_cover_pct = _raw('cloud_cover_pct')
+    precip_mmhr = _raw('precip_rate_kgm2s') * 3600  # kg/m²/s -> mm/hr
+
+    return {
+        'temperature_f': temperature_f,
+        'pressure_inhg': pa_to_inhg(_raw('pressure_pa')),
+        'wind_speed_mph': mps_to_mph(wind_speed_ms),
+        'wind_gust_mph': mps_to_mph(_raw('wind_gust_ms')),
+        'cloud_cover_pct': cloud_cover_pct,
+        'precip_mmhr': precip_mmhr,
+        'weather_code': derive_weather_codes(cloud_cover_pct, precip_mmhr, temperature_f),
+    }
+
+
 def get_gfs_atmospheric_supplement_data(beaches: List[Dict], existing_records: List[Dict]) -> List[Dict]:
     """
     Supplement existing forecast records with GFS Atmospheric data.
@@ -249,6 +220,17 @@ def get_gfs_atmospheric_supplement_data(beaches: List[Dict], existing_records: L
     window_end_utc = window_end.astimezone(pytz.UTC)
 
     sel_idx = (time_vals_full >= window_start_utc) & (time_vals_full <= window_end_utc)
+
+    # Only read the hours the records cover (progressive publish passes one lead window at a time)
+    record_epochs = to_epoch([r.get("timestamp") for r in existing_records], naive_tz=PACIFIC_TZ)
+    record_epochs = record_epochs[record_epochs != INVALID_EPOCH]
+    if record_epochs.size:
+        gfs_epochs = np.asarray((time_vals_full - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1))
+        sel_idx = (
+            np.asarray(sel_idx)
+            & (gfs_epochs >= record_epochs.min() - BUCKET_SECONDS)
+            & (gfs_epochs <= record_epochs.max() + BUCKET_SECONDS)
+        )
     filtered_time_vals = time_vals_full[sel_idx]
 
     logger.info(f"   Filtered to {len(filtered_time_vals)} time steps in 16-day forecast window")
@@ -270,19 +252,19 @@ def get_gfs_atmospheric_supplement_data(beaches: List[Dict], existing_records: L
 
     logger.info(f"   Grouped {len(beaches)} beaches into {len(location_groups)} location groups")
 
-    # Step 2: Process each location group (SAME AS SWELL HANDLER)
-    grid_data_cache = {}
+    # Step 2: One coalesced read per variable for the coastal box and forecast window,
+    # then derive every location group from the in-memory cube (no per-group requests/sleeps)
+    time_indices = np.flatnonzero(np.asarray(sel_idx))
+    cube = load_atmospheric_cube(ds, coastal_bounds(beaches), time_indices) if time_indices.size else None
+    ds.close()
+    if cube is None:
+        logger.error("   GFS Atmospheric: Failed to load atmospheric cube")
+        return existing_records
 
-    group_count = 0
+    grid_data_cache = {}
     for location_key, group_beaches in location_groups.items():
-        group_count += 1
-        beach_count = len(group_beaches)
-
-        logger.info(f"   Loading location group {group_count}/{len(location_groups)}: {location_key} ({beach_count} beaches)")
-
         representative_beach = group_beaches[0]
         # Round to actual GFS grid (0.25 degrees) for data extraction
-        # Even though we group by 0.1 degrees, we still extract from 0.25 degree grid
         grid_lat = round(representative_beach["LATITUDE"] / 0.25) * 0.25
 
         # Convert longitude to 0-360 range (GFS uses 0-360, not -180 to 180)
@@ -290,66 +272,21 @@ def get_gfs_atmospheric_supplement_data(beaches: List[Dict], existing_records: L
         lon_360 = lon_raw if lon_raw >= 0 else lon_raw + 360
         grid_lon = round(lon_360 / 0.25) * 0.25
 
-        # Rate limiting BEFORE extraction
-        enforce_noaa_rate_limit(NOAA_ATMOSPHERIC_REQUEST_DELAY)
+        grid_data_cache[location_key] = extract_grid_point_data(
+            cube, grid_lat, grid_lon, time_indices, filtered_time_vals
+        )
 
-        try:
-            # Extract grid point data (SAME STRUCTURE AS SWELL)
-            grid_data = extract_grid_point_data(ds, grid_lat, grid_lon, sel_idx, filtered_time_vals)
-
-            if grid_data:
-                grid_data_cache[location_key] = grid_data
-                logger.info(f"   Location {location_key} loaded successfully")
-            else:
-                grid_data_cache[location_key] = None
-
-        except Exception as e:
-            logger.error(f"   Failed to load location {location_key}: {e}")
-            grid_data_cache[location_key] = None
-
-        # Delay between location groups
-        if group_count < len(location_groups):
-            logger.info(f"   Waiting {NOAA_ATMOSPHERIC_BATCH_DELAY}s before next location...")
-            time.sleep(NOAA_ATMOSPHERIC_BATCH_DELAY)
-
-    ds.close()
+    loaded = sum(1 for data in grid_data_cache.values() if data is not None)
+    logger.info(f"   Loaded {loaded}/{len(location_groups)} location groups from the GFS cube")
 
     # Step 3: Process all beaches using cached grid data (SAME AS SWELL HANDLER)
     logger.info("   Processing beaches using cached grid data...")
 
-    # Build index for quick updates with fuzzy timestamp matching
-    # Group records by beach_id and timestamp for fast lookup
+    # Build per-beach sorted epoch index: exact and fuzzy (within 90 minutes)
+    # matches are both a binary search, never a rescan of the beach's records
     updated_records = list(existing_records)
-    record_index = {}  # Exact match: "beach_id_timestamp" -> index
-    records_by_beach = {}  # Fuzzy match: beach_id -> [(timestamp_obj, index), ...]
-
-    for idx, record in enumerate(updated_records):
-        bid = record.get("beach_id")
-        ts = record.get("timestamp")
-        if bid and ts:
-            # Exact match index
-            record_index[f"{bid}_{ts}"] = idx
-
-            # Fuzzy match index: parse timestamp and store for closest-match lookup
-            try:
-                ts_obj = pd.Timestamp(ts)
-                if bid not in records_by_beach:
-                    records_by_beach[bid] = []
-                records_by_beach[bid].append((ts_obj, idx))
-            except Exception:
-                pass  # Skip if timestamp is invalid
-
-    # Sort each beach's timestamps for efficient binary search
-    for bid in records_by_beach:
-        records_by_beach[bid].sort(key=lambda x: x[0])
-
-    logger.info(f"   GFS: Built record index with {len(record_index)} entries")
-    logger.info(f"   GFS: Built fuzzy match index for {len(records_by_beach)} beaches")
-
-    # Debug: Show a few sample keys from record_index
-    if len(record_index) > 0:
-        sample_keys = list(record_index.keys())[:3]
-        logger.debug(f"   GFS: Sample record keys: {sample_keys}")
+    record_index = EpochIndex(updated_records, "beach_id", naive_tz=PACIFIC_TZ)
+    logger.info(f"   GFS: Built record index for {len(record_index)} beaches")
 
     filled_count = 0
     skipped_count = 0
@@ -362,133 +299,69 @@ def get_gfs_atmospheric_supplement_data(beaches: List[Dict], existing_records: L
 
         grid_data = grid_data_cache[location_key]
         time_vals = grid_data['time_vals']
+        fields = derive_point_fields(grid_data)
+
+        # Align to the nearest 3-hour boundary in Pacific time (SAME AS NOAA HANDLER)
+        bucket_epochs = bucket_pacific_3h(to_epoch(time_vals))
 
         for beach in group_beaches:
             bid = beach["id"]
+            matched = record_index.lookup(bid, bucket_epochs, FUZZY_MATCH_TOLERANCE_SECONDS)
 
             # Process each timestep
-            for i, time_val in enumerate(time_vals):
-                # Convert to Pacific time and align to 3-hour boundaries (SAME AS NOAA HANDLER)
-                ts = pd.Timestamp(time_val)
-                if ts.tzinfo is None:
-                    ts = ts.tz_localize("UTC")
-
-                # Align to the nearest 3-hour boundary in Pacific time (midnight-anchored)
-                local = ts.tz_convert("America/Los_Angeles")
-                hour = int(local.strftime('%H'))
-                remainder = hour % 3
-                lower = hour - remainder
-                upper = lower + 3
-                target_hour = lower if (hour - lower) <= (upper - hour) else upper
-                if target_hour >= 24:
-                    target_hour = 0
-                    local = (local + pd.Timedelta(days=1))
-                clean_pacific_time = pd.Timestamp(
-                    year=local.year, month=local.month, day=local.day,
-                    hour=target_hour, minute=0, second=0, tz="America/Los_Angeles"
-                )
-
-                # Use the clean Pacific timestamp to match NOAA records
-                ts_iso = clean_pacific_time.isoformat()
-
-                # Try exact match first
-                key = f"{bid}_{ts_iso}"
-                rec_idx = None
-                is_fuzzy = False
-
-                if key in record_index:
-                    rec_idx = record_index[key]
-                    exact_matches += 1
-                else:
-                    # Fallback: Find closest timestamp within 90 minutes (1.5 hours)
-                    if bid in records_by_beach:
-                        beach_records = records_by_beach[bid]
-                        closest_idx = None
-                        min_diff = None
-
-                        for ts_obj, idx in beach_records:
-                            diff = abs((clean_pacific_time - ts_obj).total_seconds())
-                            if diff <= 5400:  # 90 minutes = 5400 seconds
-                                if min_diff is None or diff < min_diff:
-                                    min_diff = diff
-                                    closest_idx = idx
-
-                        if closest_idx is not None:
-                            rec_idx = closest_idx
-                            is_fuzzy = True
-                            fuzzy_matches += 1
-                            if fuzzy_matches <= 3:  # Log first few fuzzy matches
-                                logger.debug(f"   GFS: Fuzzy match for {bid} at {ts_iso} (diff: {min_diff/60:.1f} min)")
-
-                if rec_idx is None:
+            for i, rec_idx in enumerate(matched.tolist()):
+                if rec_idx < 0:
                     skipped_count += 1
                     # Debug: Log first few mismatches to help diagnose timestamp issues
                     if skipped_count <= 5:  # Only log first few to avoid spam
-                        logger.debug(f"   GFS: No record found for key {key}")
+                        logger.debug(f"   GFS: No record found for {bid} at {epoch_to_iso([bucket_epochs[i]])[0]}")
                     continue
 
+                diff = abs(int(record_index.epochs[rec_idx]) - int(bucket_epochs[i]))
+                if diff == 0:
+                    exact_matches += 1
+                else:
+                    fuzzy_matches += 1
+                    if fuzzy_matches <= 3:  # Log first few fuzzy matches
+                        logger.debug(f"   GFS: Fuzzy match for {bid} at {epoch_to_iso([bucket_epochs[i]])[0]} (diff: {diff/60:.1f} min)")
+
                 rec = updated_records[rec_idx]
 
                 # Fill temperature (only if missing or GFS has valid data)
-                if grid_data['temperature_k'] is not None:
-                    temp_k = grid_data['temperature_k'][i]
-                    if not np.isnan(temp_k):
-                        temp_c = temp_k - 273.15
-                        temp_f = safe_float(celsius_to_fahrenheit(temp_c))
-                        if temp_f is not None:
-                            rec["temperature"] = temp_f
-                            filled_count += 1
+                temp_f = safe_float(fields['temperature_f'][i])
+                if temp_f is not None:
+                    rec["temperature"] = temp_f
+                    filled_count += 1
 
                 # Fill pressure
-                if grid_data['pressure_pa'] is not None:
-                    pres_pa = grid_data['pressure_pa'][i]
-                    if not np.isnan(pres_pa):
-                        rec["pressure_inhg"] = safe_float(pa_to_inhg(pres_pa))
-                        filled_count += 1
+                if not np.isnan(fields['pressure_inhg'][i]):
+                    rec["pressure_inhg"] = safe_float(fields['pressure_inhg'][i])
+                    filled_count += 1
 
                 # Fill wind speed (from u/v components) - FALLBACK ONLY
                 # Open Meteo is prioritized for wind data, GFS Atmospheric is fallback
-                if grid_data['wind_u_ms'] is not None and grid_data['wind_v_ms'] is not None:
-                    wind_u_val = grid_data['wind_u_ms'][i]
-                    wind_v_val = grid_data['wind_v_ms'][i]
-                    if not np.isnan(wind_u_val) and not np.isnan(wind_v_val):
-                        # Calculate wind speed from u/v components
-                        wind_speed_ms = np.sqrt(wind_u_val**2 + wind_v_val**2)
-                        wind_speed_mph = safe_float(mps_to_mph(wind_speed_ms))
-                        # Only fill if Open Meteo hasn't already filled it
-                        if wind_speed_mph is not None and rec.get("wind_speed_mph") is None:
-                            rec["wind_speed_mph"] = wind_speed_mph
-                            filled_count += 1
+                wind_speed_mph = safe_float(fields['wind_speed_mph'][i])
+                if wind_speed_mph is not None and rec.get("wind_speed_mph") is None:
+                    rec["wind_speed_mph"] = wind_speed_mph
+                    filled_count += 1
 
                 # Fill wind gust - FALLBACK ONLY
-                # Open Meteo is prioritized for wind data, GFS Atmospheric is fallback
-                if grid_data['wind_gust_ms'] is not None:
-                    gust_ms = grid_data['wind_gust_ms'][i]
-                    if not np.isnan(gust_ms):
-                        gust_mph = safe_float(mps_to_mph(gust_ms))
-                        # Only fill if Open Meteo hasn't already filled it
-                        if gust_mph is not None and rec.get("wind_gust_mph") is None:
-                            rec["wind_gust_mph"] = gust_mph
-                            filled_count += 1
-
-                # Fill weather code
-                cloud_pct = None
-                precip_mmhr = None
-                temp_f = rec.get("temperature")
-
-                if grid_data['cloud_cover_pct'] is not None:
-                    cloud_val = grid_data['cloud_cover_pct'][i]
-                    if not np.isnan(cloud_val):
-                        cloud_pct = float(cloud_val)
-
-                if grid_data['precip_rate_kgm2s'] is not None:
-                    precip_val = grid_data['precip_rate_kgm2s'][i]
-                    if not np.isnan(precip_val):
-                        precip_mmhr = float(precip_val) * 3600
-
-                weather_code = derive_weather_code(cloud_pct, precip_mmhr, temp_f)
+                gust_mph = safe_float(fields['wind_gust_mph'][i])
+                if gust_mph is not None and rec.get("wind_gust_mph") is None:
+                    rec["wind_gust_mph"] = gust_mph
+                    filled_count += 1
+
+                # Fill weather code (precomputed from GFS temperature; when that is
+                # missing, classify with whatever temperature the record already has)
+                if temp_f is None and rec.get("temperature") is not None:
+                    weather_code = derive_weather_code(
+                        safe_float(fields['cloud_cover_pct'][i]),
+                        safe_float(fields['precip_mmhr'][i]),
+                        rec["temperature"],
+                    )
+                else:
+                    weather_code = fields['weather_code'][i]
                 weather_int = safe_int(weather_code)
-                # Only set weather if we got a valid value
                 if weather_int is not None:
                     rec["weather"] = weather_int
                     filled_count += 1
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP response cache for Hybrid Surf Database Update Script
+One SQLite-backed cache for every REST source (CO-OPS, USNO, NWS, Open-Meteo)
+with a TTL per endpoint from HTTP_CACHE_POLICIES, conditional revalidation
+(ETag / Last-Modified) of stale entries and LRU eviction once the file grows
+past HTTP_CACHE_MAX_MB. NOMADS/OPeNDAP traffic is never cached.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from rate_limiter import get_limiter
+from config import HTTP_CACHE_PATH, HTTP_CACHE_MAX_MB, HTTP_CACHE_POLICIES, REPLAY_MODE
+
+# Get shared logger
+logger = logging.getLogger("surf_update")
+
+NOT_CACHED = 0
+# Body is stored decoded, so length/encoding headers of the original response no longer apply
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def policy_for(url: str) -> Tuple[Optional[int], Optional[str]]:
+    """(TTL in seconds, required JSON key) for a URL; TTL None = never expires, NOT_CACHED = bypass the cache."""
+    host = urlparse(url).hostname or ""
+    for policy_host, needle, ttl, required_key in HTTP_CACHE_POLICIES:
+        if host == policy_host and needle in url:
+            return ttl, required_key
+    return NOT_CACHED, None
+
+
+def storable(response: requests.Response, required_key: Optional[str]) -> bool:
+    """
+    A 200 worth keeping: a JSON error body ({"error": ...}) is not, and with
+    required_key the body must be a JSON object holding that key.
+    """
+    body = (response.content or b"").lstrip()
+    if not body.startswith(b"{"):
+        return required_key is None
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return required_key is None
+    if not isinstance(payload, dict) or "error" in payload:
+        return False
+    return required_key is None or required_key in payload
+
+
+class HttpCache:
+    """SQLite response store with LRU eviction by total body size."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, body BLOB,"
+            " size INTEGER, stored_at REAL, expires_at REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.stats = {
+            "hits": 0, "misses": 0, "revalidated": 0, "stored": 0, "rejected": 0, "evicted": 0, "bytes_served": 0,
+        }
+        self._purge_unrevalidatable()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _purge_unrevalidatable(self):
+        """Expired entries without ETag/Last-Modified can never be reused."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, headers FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).fetchall()
+            dead = [(key,) for key, headers in rows if not _validators(json.loads(headers))]
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", dead)
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status, headers, body, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        url, status, headers, body, expires_at = row
+        return {"url": url, "status": status, "headers": json.loads(headers), "body": body, "expires_at": expires_at}
+
+    def put(self, key: str, response: requests.Response, ttl):
+        body = response.content or b""
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+        now = time.time()
+        expires_at = None if ttl is None else now + ttl
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, response.url, response.status_code, json.dumps(headers), body, len(body), now, expires_at, now),
+            )
+            self._bytes += len(body) - (old[0] if old else 0)
+            self.stats["stored"] += 1
+            self._evict()
+
+    def refresh(self, key: str, ttl):
+        """Entry confirmed current by a 304: restart its TTL."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET stored_at = ?, expires_at = ?, last_used = ? WHERE key = ?",
+                (now, None if ttl is None else now + ttl, now, key),
+            )
+
+    def _evict(self):
+        """Drop least recently used entries until under max_bytes (caller holds the lock)."""
+        while self._bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 100").fetchall()
+            if not rows:
+                self._bytes = 0
+                return
+            for key, size in rows:
+                if self._bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bytes -= size
+                self.stats["evicted"] += 1
+
+    def count(self, stat: str, amount: int = 1):
+        with self._lock:
+            self.stats[stat] += amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size_mb"] = round(self._bytes / 1e6, 2)
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else None
+        return stats
+
+
+def _validators(headers: Dict) -> Dict:
+    """Conditional request headers for a cached response (empty if it has neither validator)."""
+    lowered = {k.lower(): v for k, v in headers.items()}
+    conditional = {}
+    if lowered.get("etag"):
+        conditional["If-None-Match"] = lowered["etag"]
+    if lowered.get("last-modified"):
+        conditional["If-Modified-Since"] = lowered["last-modified"]
+    return conditional
+
+
+def _cache_key(request: requests.PreparedRequest) -> str:
+    return hashlib.sha1(f"{request.method} {request.url}".encode("utf-8")).hexdigest()
+
+
+def _cached_response(entry: Dict, request: requests.PreparedRequest) -> requests.Response:
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.headers.update(entry["headers"])
+    response._content = entry["body"]
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.url = entry["url"] or request.url
+    response.request = request
+    response.from_cache = True
+    return response
+
+
+_cache: Optional[HttpCache] = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[HttpCache]:
+    """The process-wide cache, or None when disabled (HTTP_CACHE_PATH empty, replay/record mode)."""
+    global _cache, _cache_failed
+    if _cache is not None or _cache_failed:
+        return _cache
+    with _cache_lock:
+        if _cache is None and not _cache_failed:
+            if not HTTP_CACHE_PATH or (REPLAY_MODE or "off").strip().lower() != "off":
+                _cache_failed = True
+                return None
+            try:
+                _cache = HttpCache(HTTP_CACHE_PATH, int(HTTP_CACHE_MAX_MB * 1e6))
+            except sqlite3.Error as e:
+                logger.warning(f"   HTTP cache disabled ({HTTP_CACHE_PATH}: {e})")
+                _cache_failed = True
+    return _cache
+
+
+class CachedSession(requests.Session):
+    """
+    requests.Session that answers GETs from the shared cache when their policy allows.
+    With paced=True, requests that go out to the network take a token from the
+    host's rate limiter (and a 429 cuts its rate).
+    """
+
+    def __init__(self, paced: bool = False):
+        super().__init__()
+        self.paced = paced
+
+    def _network_send(self, request, **kwargs):
+        if not self.paced:
+            return super().send(request, **kwargs)
+        limiter = get_limiter(request.url)
+        limiter.acquire()
+        response = super().send(request, **kwargs)
+        if response.status_code == 429:
+            limiter.on_throttle()
+        return response
+
+    def send(self, request, **kwargs):
+        cache = get_cache()
+        if cache is None or request.method != "GET" or kwargs.get("stream"):
+            return self._network_send(request, **kwargs)
+        ttl, required_key = policy_for(request.url)
+        if ttl == NOT_CACHED:
+            return self._network_send(request, **kwargs)
+
+        key = _cache_key(request)
+        entry = cache.get(key)
+        # Entries stored without expiry only stay fresh while their policy still never expires
+        fresh = entry is not None and (
+            ttl is None if entry["expires_at"] is None else entry["expires_at"] > time.time()
+        )
+        if fresh:
+            cache.count("hits")
+            cache.count("bytes_served", len(entry["body"] or b""))
+            return _cached_response(entry, request)
+
+        conditional = _validators(entry["headers"]) if entry is not None else {}
+        request.headers.update(conditional)
+        response = self._network_send(request, **kwargs)
+
+        if conditional and response.status_code == 304:
+            cache.refresh(key, ttl)
+            cache.count("revalidated")
+            cache.count("bytes_served", len(entry["body"] or b""))
+            return _cached_response(entry, request)
+
+        cache.count("misses")
+        if response.status_code == 200:
+            if not storable(response, required_key):
+                cache.count("rejected")
+                return response
+            try:
+                cache.put(key, response, ttl)
+            except sqlite3.Error as e:
+                logger.debug(f"   HTTP cache: could not store {request.url}: {e}")
+        return response
+
+
+_shared_session: Optional[CachedSession] = None
+
+
+def shared_session() -> CachedSession:
+    """Module-wide paced CachedSession for callers that do not manage their own (see limited_get)."""
+    global _shared_session
+    with _cache_lock:
+        if _shared_session is None:
+            _shared_session = CachedSession(paced=True)
+        return _shared_session
+
+
+def cache_stats() -> Dict:
+    """Hit/miss/revalidation counts and size (for the run report)."""
+    cache = get_cache()
+    return cache.snapshot() if cache is not None else {"enabled": False}
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Performance instrumentation for Hybrid Surf Database Update Script
+Stage timers, per-host HTTP/rate-limit counters, OPeNDAP read counts,
+rows upserted per table, peak RSS per stage, and a JSON run report
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Get shared logger
+logger = logging.getLogger("surf_update")
+
+_lock = threading.Lock()
+_run_started = time.time()
+_stages = []  # finished stages in completion order
+_stage_stack = threading.local()
+_hosts = defaultdict(lambda: {
+    "requests": 0, "bytes": 0, "retries": 0, "errors": 0,
+    "rate_limit_sleeps": 0, "rate_limit_sleep_s": 0.0, "request_time_s": 0.0,
+})
+_opendap_reads = defaultdict(int)
+_upserts = defaultdict(lambda: {"rows": 0, "calls": 0, "seconds": 0.0})
+_steps = []
+_requests_hooked = False
+
+
+def _peak_rss_mb():
+    """Process peak resident set size in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _current_rss_mb():
+    """Current resident set size in MB from /proc (falls back to peak)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            pages = int(fh.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return _peak_rss_mb()
+
+
+def _host_of(url_or_host):
+    if not url_or_host:
+        return "unknown"
+    parsed = urlparse(str(url_or_host))
+    return parsed.hostname or str(url_or_host)
+
+
+# === STAGE TIMING ===
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage and capture RSS at entry/exit; nested stages get dotted names."""
+    stack = getattr(_stage_stack, "names", None)
+    if stack is None:
+        stack = _stage_stack.names = []
+    full_name = ".".join(stack + [name])
+    stack.append(name)
+
+    rss_start = _current_rss_mb()
+    start = time.time()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.time() - start
+        stack.pop()
+        entry = {
+            "name": full_name,
+            "seconds": round(elapsed, 3),
+            "rss_start_mb": rss_start,
+            "rss_end_mb": _current_rss_mb(),
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+        if error:
+            entry["error"] = error
+        with _lock:
+            _stages.append(entry)
+        logger.debug(f"   [stage] {full_name}: {elapsed:.2f}s")
+
+
+def timed_stage(name: str = None):
+    """Decorator form of stage(); defaults to the function name."""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# === COUNTERS ===
+def record_http_request(host, nbytes: int = 0, seconds: float = 0.0, error: bool = False):
+    with _lock:
+        counters = _hosts[_host_of(host)]
+        counters["requests"] += 1
+        counters["bytes"] += int(nbytes or 0)
+        counters["request_time_s"] += seconds
+        if error:
+            counters["errors"] += 1
+
+
+def record_retry(host):
+    with _lock:
+        _hosts[_host_of(host)]["retries"] += 1
+
+
+def record_rate_limit_sleep(host, seconds: float):
+    with _lock:
+        counters = _hosts[_host_of(host)]
+        counters["rate_limit_sleeps"] += 1
+        counters["rate_limit_sleep_s"] += seconds
+
+
+def record_opendap_read(variable: str, count: int = 1):
+    with _lock:
+        _opendap_reads[variable] += count
+
+
+def record_upsert(table: str, rows: int, seconds: float = 0.0):
+    with _lock:
+        counters = _upserts[table]
+        counters["rows"] += int(rows or 0)
+        counters["calls"] += 1
+        counters["seconds"] += seconds
+
+
+def counts_upsert(func):
+    """Decorator for database upsert helpers: records rows returned and time per table_name."""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind_partial(*args, **kwargs)
+        bound.apply_defaults()
+        table = bound.arguments.get("table_name", func.__name__)
+        start = time.time()
+        rows = func(*args, **kwargs)
+        record_upsert(table, rows if isinstance(rows, int) else 0, time.time() - start)
+        return rows
+    return wrapper
+
+
+def record_step(message: str, step_num: int = None):
+    with _lock:
+        _steps.append({
+            "step": step_num,
+            "message": message,
+            "elapsed_s": round(time.time() - _run_started, 3),
+        })
+
+
+def instrument_requests():
+    """Count every requests.Session request per host (idempotent)."""
+    global _requests_hooked
+    if _requests_hooked:
+        return
+    try:
+        import requests
+    except ImportError:
+        return
+
+    original_send = requests.Session.send
+
+    @functools.wraps(original_send)
+    def send(self, request, **kwargs):
+        start = time.time()
+        try:
+            response = original_send(self, request, **kwargs)
+        except Exception:
+            record_http_request(request.url, 0, time.time() - start, error=True)
+            raise
+        length = response.headers.get("Content-Length")
+        if length is None and not kwargs.get("stream"):
+            length = len(response.content or b"")
+        record_http_request(request.url, int(length or 0), time.time() - start, error=response.status_code >= 400)
+        return response
+
+    requests.Session.send = send
+    _requests_hooked = True
+
+
+# === REPORT ===
+def build_run_report(extra: dict = None) -> dict:
+    with _lock:
+        report = {
+            "started_at": datetime.fromtimestamp(_run_started, timezone.utc).isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "wall_seconds": round(time.time() - _run_started, 3),
+            "peak_rss_mb": _peak_rss_mb(),
+            "stages": list(_stages),
+            "steps": list(_steps),
+            "hosts": {h: dict(c) for h, c in _hosts.items()},
+            "opendap_reads": dict(_opendap_reads),
+            "upserts": {t: dict(c) for t, c in _upserts.items()},
+        }
+    if extra:
+        report.update(extra)
+    return report
+
+
+def write_run_report(path: str = None, extra: dict = None):
+    """Write the JSON run report; returns the path or None on failure."""
+    if path is None:
+        from config import RUN_REPORT_PATH
+        path = RUN_REPORT_PATH
+    if not path:
+        return None
+    try:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(build_run_report(extra), fh, indent=2, default=str)
+        logger.info(f"   Run report written to {path}")
+        return path
+    except OSError as e:
+        logger.warning(f"   Could not write run report to {path}: {e}")
+        return None
+
+
+def reset():
+    """Clear all counters (used by benchmarks between runs)."""
+    global _run_started
+    with _lock:
+        _run_started = time.time()
+        _stages.clear()
+        _steps.clear()
+        _hosts.clear()
+        _opendap_reads.clear()
+        _upserts.clear()
@@ -14,10 +14,12 @@ from datetime import datetime, timezone, timedelta
 
 # Import our custom modules
 from config import (
-    logger, TIDE_ADJUSTMENT_FT, NOAA_REQUEST_DELAY, OPENMETEO_REQUEST_DELAY,
-    NOAA_BATCH_DELAY, OPENMETEO_BATCH_DELAY, DAYS_FORECAST
+    logger, TIDE_ADJUSTMENT_FT, RATE_LIMITS, DAYS_FORECAST
 )
 from utils import log_step
+from timestamps import (
+    BUCKET_SECONDS, INVALID_EPOCH, PACIFIC_TZ, epoch_to_iso, pacific_midnight_epoch, to_epoch
+)
 from database import (
     cleanup_old_data, fetch_all_beaches, fetch_all_counties,
     upsert_forecast_data, upsert_daily_conditions, check_database_connection,
@@ -33,6 +35,12 @@ from openmeteo_handler import (
 )
 from noaa_tides_handler import get_noaa_tides_supplement_data, test_noaa_tides_connection
 from astral_handler import update_daily_conditions_astral, test_astral_calculation
+import replay
+from circuit_breaker import breaker_states
+from rate_limiter import limiter_stats
+from http_cache import cache_stats
+from instrumentation import instrument_requests, timed_stage, write_run_report
+from progressive import publish_progressively
 
 # --------------------------------------------------------------------------------------
 # HYBRID FORECAST UPDATE
@@ -48,105 +56,79 @@ def _ensure_today_midnight_start(records, beaches):
     if not records:
         return records
 
-    import pytz
-    from datetime import datetime, timedelta, time as dtime
+    midnight = pacific_midnight_epoch()
 
-    pacific = pytz.timezone('America/Los_Angeles')
-    today = datetime.now(pacific).date()
-    midnight = pacific.localize(datetime.combine(today, dtime(0, 0)))
+    # Expect tz-aware local ISO; naive timestamps are ignored
+    epochs = to_epoch([r.get("timestamp") for r in records], naive_tz=None)
 
-    # Build quick lookups
+    # Build quick lookups: beach_id -> epochs present
     by_beach = {}
-    for r in records:
+    for r, epoch in zip(records, epochs.tolist()):
         bid = r.get("beach_id")
-        if bid is None:
+        if bid is None or epoch == INVALID_EPOCH:
             continue
-        by_beach.setdefault(bid, []).append(r)
+        by_beach.setdefault(bid, set()).add(epoch)
 
     beach_ids = {b["id"] for b in beaches if b.get("id") is not None}
     all_out = list(records)
 
     for bid in beach_ids:
-        recs = by_beach.get(bid, [])
+        existing = by_beach.get(bid, set())
         # Find earliest timestamp for today for this beach
-        earliest_ts = None
-        for r in recs:
-            ts_str = r.get("timestamp")
-            if not ts_str:
-                continue
-            try:
-                ts = datetime.fromisoformat(ts_str)
-            except Exception:
-                continue
-            # Only consider timestamps on or after today's midnight
-            if ts.tzinfo is None:
-                continue  # expect tz-aware local ISO
-            if ts >= midnight and (earliest_ts is None or ts < earliest_ts):
-                earliest_ts = ts
+        today_epochs = [e for e in existing if e >= midnight]
 
         # If no records at/after midnight, we will backfill the entire day start
-        if earliest_ts is None:
-            # No records for today yet; start at midnight and let supplement fill
-            target_end = midnight
-        else:
-            target_end = earliest_ts
-
-        # Generate 3-hour steps from midnight up to target_end (exclusive)
-        t = midnight
-        placeholders = []
-        while t < target_end:
-            # Avoid duplicating if a record already exists at this timestamp
-            ts_iso = t.isoformat()
-            if not any(r.get("timestamp") == ts_iso for r in recs):
-                # Create placeholder with only required fields
-                # Don't explicitly set other fields to None - let supplement handlers fill them
-                # or preserve existing DB values (via default_to_null=False on upsert)
-                placeholders.append({
-                    "beach_id": bid,
-                    "timestamp": ts_iso,
-                    # No other fields - supplement handlers will add them if data is available
-                })
-            t += timedelta(hours=3)
-
-        if placeholders:
-            all_out.extend(placeholders)
+        target_end = min(today_epochs) if today_epochs else midnight
+
+        # Generate 3-hour steps from midnight up to target_end (exclusive),
+        # skipping any that already exist
+        steps = [e for e in range(midnight, target_end, BUCKET_SECONDS) if e not in existing]
+        if not steps:
+            continue
+
+        # Create placeholders with only required fields
+        # Don't explicitly set other fields to None - let supplement handlers fill them
+        # or preserve existing DB values (via default_to_null=False on upsert)
+        all_out.extend(
+            {"beach_id": bid, "timestamp": ts_iso}
+            for ts_iso in epoch_to_iso(steps, PACIFIC_TZ)
+        )
 
     return all_out
 
+
 def _drop_records_before_today(records):
     """Remove any forecast rows that fall before today's Pacific midnight."""
     if not records:
         return records
 
-    import pytz
+    midnight_today = pacific_midnight_epoch()
+    epochs = to_epoch([rec.get("timestamp") for rec in records], naive_tz=PACIFIC_TZ)
 
-    pacific = pytz.timezone('America/Los_Angeles')
-    midnight_today = datetime.now(pacific).replace(hour=0, minute=0, second=0, microsecond=0)
-
-    filtered = []
-    removed = 0
-    for rec in records:
-        ts_str = rec.get("timestamp")
-        if not ts_str:
-            filtered.append(rec)
-            continue
-        try:
-            cleaned = ts_str.replace('Z', '+00:00') if ts_str.endswith('Z') else ts_str
-            ts = datetime.fromisoformat(cleaned)
-        except Exception:
-            filtered.append(rec)
-            continue
-        if ts.tzinfo is None:
-            ts = pacific.localize(ts)
-        if ts >= midnight_today:
-            filtered.append(rec)
-        else:
-            removed += 1
+    # Unparseable or missing timestamps are kept, as before
+    keep = (epochs == INVALID_EPOCH) | (epochs >= midnight_today)
+    filtered = [rec for rec, ok in zip(records, keep.tolist()) if ok]
+    removed = len(records) - len(filtered)
     if removed:
         logger.info(f"   Dropped {removed} NOAA forecast records before today's midnight")
     return filtered
 
 
+def _supplement_and_upsert(beaches, records):
+    """Open-Meteo and CO-OPS supplements, then neighbor fill + upsert; returns rows written."""
+    # --- OPEN-METEO SUPPLEMENT ---
+    logger.info("   Enhancing with Open-Meteo supplement (temperature, weather, wind, pressure)…")
+    openmeteo_enhanced = get_openmeteo_supplement_data(beaches, records)
+
+    # --- NOAA CO-OPS SUPPLEMENT (Tides, Water Temp) ---
+    logger.info("   Enhancing with NOAA CO-OPS data (tides/water temp)…")
+    fully_enhanced = get_noaa_tides_supplement_data(beaches, openmeteo_enhanced)
+
+    # Upsert to DB
+    logger.info("   Uploading enhanced records to database…")
+    return upsert_forecast_data(fully_enhanced)
+
+@timed_stage("forecast_hybrid")
 def update_forecast_data_hybrid(beaches):
     """
     Update forecast data using:
@@ -181,17 +163,13 @@ def update_forecast_data_hybrid(beaches):
         all_noaa_records = _drop_records_before_today(all_noaa_records)
         all_noaa_records = _ensure_today_midnight_start(all_noaa_records, beaches)
 
-        # --- OPEN-METEO SUPPLEMENT ---
-        logger.info("   Enhancing with Open-Meteo supplement (temperature, weather, wind, pressure)…")
-        openmeteo_enhanced = get_openmeteo_supplement_data(beaches, all_noaa_records)
-
-        # --- NOAA CO-OPS SUPPLEMENT (Tides, Water Temp) ---
-        logger.info("   Enhancing with NOAA CO-OPS data (tides/water temp)…")
-        fully_enhanced = get_noaa_tides_supplement_data(beaches, openmeteo_enhanced)
-
-        # Upsert to DB
-        logger.info("   Uploading enhanced records to database…")
-        total_inserted = upsert_forecast_data(fully_enhanced)
+        # Supplements + upsert run per forecast-lead window (0-48h first, see progressive.py)
+        published = publish_progressively(
+            all_noaa_records, lambda window: _supplement_and_upsert(beaches, window), name="forecast"
+        )
+        # A failed window fails the update (and the exit code) after the other windows ran
+        published.raise_if_failed()
+        total_inserted = published.written
 
         log_step(
             f"Hybrid forecast update completed: {len(beaches)} beaches, "
@@ -302,8 +280,8 @@ def print_startup_banner():
     logger.info("")
     logger.info("Units: Imperial (mph, feet, °F, inHg)")
     logger.info("Swell ranking: Dynamic by surf impact score")
-    logger.info(f"NOAA rate limiting: {NOAA_REQUEST_DELAY}s per request, {NOAA_BATCH_DELAY}s between groups")
-    logger.info(f"Open-Meteo rate limiting: {OPENMETEO_REQUEST_DELAY}s per request, {OPENMETEO_BATCH_DELAY}s between batches")
+    logger.info(f"Rate limiting: adaptive per host, starting at {RATE_LIMITS['nomads.ncep.noaa.gov'][0]} req/s for NOAA "
+                f"and {RATE_LIMITS['api.open-meteo.com'][0]} req/s for Open-Meteo")
     logger.info("=" * 80)
 
 def print_completion_summary(start_time, beaches_count, counties_count, forecast_records, daily_records, success):
@@ -346,6 +324,8 @@ def print_completion_summary(start_time, beaches_count, counties_count, forecast
 def main():
     """Main execution function."""
     start_time = time.time()
+    replay.install()
+    instrument_requests()
     print_startup_banner()
 
     try:
@@ -420,6 +400,13 @@ if __name__ == "__main__":
     try:
         success = main()
         exit_code = 0 if success else 1
+        write_run_report(extra={
+            "script": "main",
+            "success": bool(success),
+            "circuit_breakers": breaker_states(),
+            "rate_limits": limiter_stats(),
+            "http_cache": cache_stats(),
+        })
 
         if success:
             logger.info("✓ Script completed successfully")
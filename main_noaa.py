@@ -32,6 +32,7 @@ from noaa_handler import (
 from gfs_atmospheric_handler_v2 import get_gfs_atmospheric_supplement_data, test_gfs_atmospheric_connection
 from noaa_tides_handler import get_noaa_tides_supplement_data, test_noaa_tides_connection
 from astral_handler import update_daily_conditions_astral, test_astral_calculation
+from progressive import publish_progressively
 
 # Keep Open-Meteo as optional fallback (not deleted, just not used by default)
 try:
@@ -150,6 +151,30 @@ def _drop_records_before_today(records):
 # FORECAST UPDATE (100% NOAA STACK)
 # --------------------------------------------------------------------------------------
 
+def _supplement_and_upsert(beaches, records):
+    """GFS Atmospheric and CO-OPS supplements, then neighbor fill + upsert; returns rows written."""
+    # --- NOAA NWS SUPPLEMENT (Weather, Temp, Wind, Pressure) ---
+    logger.info("   Enhancing with GFS Atmospheric data (weather/temp/pressure)…")
+    gfs_atmo_start = time.time()
+    gfs_enhanced = get_gfs_atmospheric_supplement_data(beaches, records)
+    gfs_atmo_time = time.time() - gfs_atmo_start
+    logger.info(f"   >>> GFS Atmospheric enhancement took: {gfs_atmo_time:.2f} seconds ({gfs_atmo_time/60:.2f} minutes)")
+
+    # --- NOAA CO-OPS SUPPLEMENT (Tides, Water Temp) ---
+    logger.info("   Enhancing with NOAA CO-OPS data (tides/water temp)…")
+    tides_start = time.time()
+    fully_enhanced = get_noaa_tides_supplement_data(beaches, gfs_enhanced)
+    tides_time = time.time() - tides_start
+    logger.info(f"   >>> CO-OPS enhancement took: {tides_time:.2f} seconds ({tides_time/60:.2f} minutes)")
+
+    # --- UPSERT TO DATABASE ---
+    logger.info("   Uploading enhanced records to database…")
+    db_start = time.time()
+    total_inserted = upsert_forecast_data(fully_enhanced)
+    db_time = time.time() - db_start
+    logger.info(f"   >>> Database upsert took: {db_time:.2f} seconds ({db_time/60:.2f} minutes)")
+    return total_inserted
+
 def update_forecast_data_noaa_stack(beaches):
     """
     Update forecast data using 100% NOAA/Government sources:
@@ -185,26 +210,13 @@ def update_forecast_data_noaa_stack(beaches):
         all_noaa_records = _drop_records_before_today(all_noaa_records)
         all_noaa_records = _ensure_today_midnight_start(all_noaa_records, beaches)
 
-        # --- NOAA NWS SUPPLEMENT (Weather, Temp, Wind, Pressure) ---
-        logger.info("   Enhancing with GFS Atmospheric data (weather/temp/pressure)…")
-        gfs_atmo_start = time.time()
-        gfs_enhanced = get_gfs_atmospheric_supplement_data(beaches, all_noaa_records)
-        gfs_atmo_time = time.time() - gfs_atmo_start
-        logger.info(f"   >>> GFS Atmospheric enhancement took: {gfs_atmo_time:.2f} seconds ({gfs_atmo_time/60:.2f} minutes)")
-
-        # --- NOAA CO-OPS SUPPLEMENT (Tides, Water Temp) ---
-        logger.info("   Enhancing with NOAA CO-OPS data (tides/water temp)…")
-        tides_start = time.time()
-        fully_enhanced = get_noaa_tides_supplement_data(beaches, gfs_enhanced)
-        tides_time = time.time() - tides_start
-        logger.info(f"   >>> CO-OPS enhancement took: {tides_time:.2f} seconds ({tides_time/60:.2f} minutes)")
-
-        # --- UPSERT TO DATABASE ---
-        logger.info("   Uploading enhanced records to database…")
-        db_start = time.time()
-        total_inserted = upsert_forecast_data(fully_enhanced)
-        db_time = time.time() - db_start
-        logger.info(f"   >>> Database upsert took: {db_time:.2f} seconds ({db_time/60:.2f} minutes)")
+        # Supplements + upsert run per forecast-lead window (0-48h first, see progressive.py)
+        published = publish_progressively(
+            all_noaa_records, lambda window: _supplement_and_upsert(beaches, window), name="forecast"
+        )
+        # A failed window fails the update (and the exit code) after the other windows ran
+        published.raise_if_failed()
+        total_inserted = published.written
 
         step_time = time.time() - step_start
         logger.info(f"   >>> TOTAL forecast update time: {step_time:.2f} seconds ({step_time/60:.2f} minutes)")
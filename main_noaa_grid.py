@@ -15,7 +15,7 @@ from datetime import datetime, timezone
 from config import logger, DAYS_FORECAST
 from utils import log_step
 from database import (
-    upsert_grid_forecast_data, upsert_daily_conditions,
+    upsert_grid_forecast_data, upsert_daily_conditions, maintain_day_partitions,
     check_database_connection, get_database_stats
 )
 from noaa_grid_handler import (
@@ -23,12 +23,97 @@ from noaa_grid_handler import (
     get_noaa_grid_data, fetch_grid_points_from_db
 )
 from noaa_handler import load_cdip_data
+from model_discovery import cycle_from_url
+from cycle_cache import GFSWAVE_GRID_MODEL, load_fallback_cycle, mark_provenance, save_cycle
+from circuit_breaker import breaker_states
+from reference_cache import load_reference_rows, reset_loaded
+from cycle_watcher import watch
+from progressive import publish_progressively
+from rate_limiter import limiter_stats
+from http_cache import cache_stats
 from gfs_atmospheric_handler_v2 import get_gfs_atmospheric_supplement_data
 from openmeteo_handler import get_openmeteo_supplement_data
 from noaa_tides_handler import get_noaa_tides_supplement_data
 from astral_handler import update_daily_conditions_astral, test_astral_calculation
+import replay
+from instrumentation import instrument_requests, stage, timed_stage, write_run_report
 
 
+def _grid_as_beaches(grid_points):
+    """Grid points in the beach-like format the supplement handlers expect."""
+    def _normalize_longitude(lon):
+        try:
+            lon_val = float(lon)
+        except (TypeError, ValueError):
+            return lon
+        return lon_val - 360.0 if lon_val > 180.0 else lon_val
+
+    grid_as_beaches = []
+    for gp in grid_points:
+        grid_as_beaches.append({
+            "id": gp["id"],
+            "Name": f"Grid Point {gp['id']}",
+            "LATITUDE": gp["latitude"],
+            "LONGITUDE": _normalize_longitude(gp["longitude"]),
+        })
+    return grid_as_beaches
+
+
+def _supplement_and_upsert(grid_as_beaches, grid_records):
+    """GFS Atmospheric, Open Meteo and CO-OPS supplements, then upsert; returns rows written."""
+    # --- GFS ATMOSPHERIC SUPPLEMENT ---
+    logger.info("   Enhancing with GFS Atmospheric data (pressure)...")
+    gfs_atmo_start = time.time()
+    # Temporarily rename grid_id to beach_id for supplement functions
+    for rec in grid_records:
+        rec["beach_id"] = rec["grid_id"]
+    with stage("gfs_atmospheric"):
+        gfs_enhanced = get_gfs_atmospheric_supplement_data(grid_as_beaches, grid_records)
+    # Rename back to grid_id
+    for rec in gfs_enhanced:
+        rec["grid_id"] = rec.pop("beach_id")
+    gfs_atmo_time = time.time() - gfs_atmo_start
+    logger.info(f"   >>> GFS Atmospheric enhancement took: {gfs_atmo_time:.2f} seconds")
+
+    # --- OPEN METEO SUPPLEMENT (WEATHER CODES, WATER TEMP, WIND) ---
+    logger.info("   Enhancing with Open Meteo data (weather_codes/water_temp/wind)...")
+    openmeteo_start = time.time()
+    # Temporarily rename grid_id to beach_id for Open Meteo handler
+    for rec in gfs_enhanced:
+        rec["beach_id"] = rec["grid_id"]
+    with stage("openmeteo"):
+        openmeteo_enhanced = get_openmeteo_supplement_data(grid_as_beaches, gfs_enhanced)
+    # Rename back to grid_id
+    for rec in openmeteo_enhanced:
+        rec["grid_id"] = rec.pop("beach_id")
+    openmeteo_time = time.time() - openmeteo_start
+    logger.info(f"   >>> Open Meteo enhancement took: {openmeteo_time:.2f} seconds")
+
+    # --- NOAA CO-OPS SUPPLEMENT ---
+    logger.info("   Enhancing with NOAA CO-OPS data (tides)...")
+    tides_start = time.time()
+    # Temporarily rename grid_id to beach_id for tide handler
+    for rec in openmeteo_enhanced:
+        rec["beach_id"] = rec.pop("grid_id")
+    with stage("coops_tides"):
+        fully_enhanced = get_noaa_tides_supplement_data(grid_as_beaches, openmeteo_enhanced)
+    # Rename back to grid_id
+    for rec in fully_enhanced:
+        rec["grid_id"] = rec.pop("beach_id")
+    tides_time = time.time() - tides_start
+    logger.info(f"   >>> CO-OPS enhancement took: {tides_time:.2f} seconds")
+
+    # --- UPSERT TO DATABASE ---
+    logger.info("   Uploading fully enhanced grid forecast records to database...")
+    db_start = time.time()
+    with stage("upsert"):
+        total_inserted = upsert_grid_forecast_data(fully_enhanced)
+    db_time = time.time() - db_start
+    logger.info(f"   >>> Database upsert took: {db_time:.2f} seconds ({db_time/60:.2f} minutes)")
+    return total_inserted
+
+
+@timed_stage("grid_forecast")
 def update_grid_forecast_data():
     """
     Update forecast data using grid-based approach with full data stack:
@@ -46,7 +131,8 @@ def update_grid_forecast_data():
     try:
         # --- FETCH GRID POINTS ---
         logger.info("   Fetching grid points from database...")
-        grid_points = fetch_grid_points_from_db()
+        with stage("fetch_grid_points"):
+            grid_points = fetch_grid_points_from_db()
 
         if not grid_points:
             logger.error("   No grid points found in database!")
@@ -57,21 +143,37 @@ def update_grid_forecast_data():
 
         # --- LOAD CDIP DATA ---
         logger.info("   Loading CDIP data for enhancement...")
-        cdip_data = load_cdip_data()
+        with stage("cdip_load"):
+            cdip_data = load_cdip_data()
 
         # --- LOAD NOAA DATASET ---
         logger.info("   Loading NOAA GFSwave dataset...")
         gfs_start = time.time()
-        noaa_url = get_noaa_dataset_url()
-        ds = load_noaa_dataset(noaa_url)
-
-        if not validate_noaa_dataset(ds):
-            raise Exception("NOAA dataset validation failed")
-
-        # --- EXTRACT GRID DATA WITH CDIP ENHANCEMENT ---
-        logger.info("   Extracting data from grid points with CDIP enhancement...")
-        grid_records = get_noaa_grid_data(ds, grid_points, cdip_data)
-        ds.close()
+        with stage("gfswave_discovery"):
+            try:
+                noaa_url = get_noaa_dataset_url()
+                ds = load_noaa_dataset(noaa_url)
+
+                if not validate_noaa_dataset(ds):
+                    raise Exception("NOAA dataset validation failed")
+            except Exception as e:
+                logger.error(f"   NOAA GFSwave unavailable: {e}")
+                ds = None
+
+        if ds is not None:
+            # --- EXTRACT GRID DATA WITH CDIP ENHANCEMENT ---
+            logger.info("   Extracting data from grid points with CDIP enhancement...")
+            with stage("gfswave_extraction"):
+                grid_records = get_noaa_grid_data(ds, grid_points, cdip_data)
+            ds.close()
+            mark_provenance(grid_records, cycle_from_url(noaa_url), fallback=False)
+            save_cycle(GFSWAVE_GRID_MODEL, cycle_from_url(noaa_url), grid_records)
+        else:
+            # --- PREVIOUS-CYCLE FALLBACK ---
+            with stage("gfswave_fallback"):
+                _, grid_records = load_fallback_cycle(GFSWAVE_GRID_MODEL)
+            if not grid_records:
+                raise Exception("NOAA GFSwave unavailable and no cached cycle to fall back on")
         gfs_time = time.time() - gfs_start
 
         logger.info(f"   NOAA GFSwave complete: {len(grid_records):,} records")
@@ -81,67 +183,18 @@ def update_grid_forecast_data():
             sample_ts = grid_records[0].get("timestamp")
             logger.info(f"   Sample timestamp: {sample_ts}")
 
-        # --- GFS ATMOSPHERIC SUPPLEMENT ---
-        logger.info("   Enhancing with GFS Atmospheric data (pressure)...")
-        gfs_atmo_start = time.time()
-        # Convert grid_points to beach-like format for compatibility
-        def _normalize_longitude(lon):
-            try:
-                lon_val = float(lon)
-            except (TypeError, ValueError):
-                return lon
-            return lon_val - 360.0 if lon_val > 180.0 else lon_val
-
-        grid_as_beaches = []
-        for gp in grid_points:
-            grid_as_beaches.append({
-                "id": gp["id"],
-                "Name": f"Grid Point {gp['id']}",
-                "LATITUDE": gp["latitude"],
-                "LONGITUDE": _normalize_longitude(gp["longitude"]),
-            })
-        # Temporarily rename grid_id to beach_id for supplement functions
-        for rec in grid_records:
-            rec["beach_id"] = rec["grid_id"]
-        gfs_enhanced = get_gfs_atmospheric_supplement_data(grid_as_beaches, grid_records)
-        # Rename back to grid_id
-        for rec in gfs_enhanced:
-            rec["grid_id"] = rec.pop("beach_id")
-        gfs_atmo_time = time.time() - gfs_atmo_start
-        logger.info(f"   >>> GFS Atmospheric enhancement took: {gfs_atmo_time:.2f} seconds")
-
-        # --- OPEN METEO SUPPLEMENT (WEATHER CODES, WATER TEMP, WIND) ---
-        logger.info("   Enhancing with Open Meteo data (weather_codes/water_temp/wind)...")
-        openmeteo_start = time.time()
-        # Temporarily rename grid_id to beach_id for Open Meteo handler
-        for rec in gfs_enhanced:
-            rec["beach_id"] = rec["grid_id"]
-        openmeteo_enhanced = get_openmeteo_supplement_data(grid_as_beaches, gfs_enhanced)
-        # Rename back to grid_id
-        for rec in openmeteo_enhanced:
-            rec["grid_id"] = rec.pop("beach_id")
-        openmeteo_time = time.time() - openmeteo_start
-        logger.info(f"   >>> Open Meteo enhancement took: {openmeteo_time:.2f} seconds")
-
-        # --- NOAA CO-OPS SUPPLEMENT ---
-        logger.info("   Enhancing with NOAA CO-OPS data (tides)...")
-        tides_start = time.time()
-        # Temporarily rename grid_id to beach_id for tide handler
-        for rec in openmeteo_enhanced:
-            rec["beach_id"] = rec.pop("grid_id")
-        fully_enhanced = get_noaa_tides_supplement_data(grid_as_beaches, openmeteo_enhanced)
-        # Rename back to grid_id
-        for rec in fully_enhanced:
-            rec["grid_id"] = rec.pop("beach_id")
-        tides_time = time.time() - tides_start
-        logger.info(f"   >>> CO-OPS enhancement took: {tides_time:.2f} seconds")
-
-        # --- UPSERT TO DATABASE ---
-        logger.info("   Uploading fully enhanced grid forecast records to database...")
-        db_start = time.time()
-        total_inserted = upsert_grid_forecast_data(fully_enhanced)
-        db_time = time.time() - db_start
-        logger.info(f"   >>> Database upsert took: {db_time:.2f} seconds ({db_time/60:.2f} minutes)")
+        grid_as_beaches = _grid_as_beaches(grid_points)
+
+        # Make sure the day partitions exist so new rows skip the default partition
+        maintain_day_partitions(("grid_forecast_data",))
+
+        # Supplements + upsert run per forecast-lead window (0-48h first, see progressive.py)
+        published = publish_progressively(
+            grid_records, lambda window: _supplement_and_upsert(grid_as_beaches, window), name="grid forecast"
+        )
+        # A failed window fails the update (and the exit code) after the other windows ran
+        published.raise_if_failed()
+        total_inserted = published.written
 
         step_time = time.time() - step_start
         logger.info(f"   >>> TOTAL grid forecast update time: {step_time:.2f} seconds ({step_time/60:.2f} minutes)")
@@ -158,19 +211,55 @@ def update_grid_forecast_data():
         return 0
 
 
+def run_watcher(once=False):
+    """Watcher mode: publish each GFSwave cycle's forecast hours as they land (see cycle_watcher.py)."""
+    log_step("Watching for new GFSwave cycles", 1)
+    context = {}
+
+    def _load_cycle_inputs(cycle):
+        # Reference rows and CDIP are refreshed once per model cycle
+        if context.get("cycle") != cycle:
+            reset_loaded()
+            with stage("fetch_grid_points"):
+                context["grid_points"] = fetch_grid_points_from_db()
+            with stage("cdip_load"):
+                context["cdip_data"] = load_cdip_data()
+            context["cycle"] = cycle
+        return context["grid_points"], context["cdip_data"]
+
+    def _publish(ds, cycle):
+        grid_points, cdip_data = _load_cycle_inputs(cycle)
+        with stage("gfswave_extraction"):
+            grid_records = get_noaa_grid_data(ds, grid_points, cdip_data)
+        mark_provenance(grid_records, cycle, fallback=False)
+        maintain_day_partitions(("grid_forecast_data",))
+        grid_as_beaches = _grid_as_beaches(grid_points)
+        return publish_progressively(
+            grid_records, lambda window: _supplement_and_upsert(grid_as_beaches, window), name=f"cycle {cycle}"
+        )
+
+    grid_points = fetch_grid_points_from_db()
+    probe = next(
+        (gp for gp in grid_points if gp.get("latitude_index") is not None and gp.get("longitude_index") is not None),
+        None,
+    )
+    if probe is None:
+        logger.error("   No grid points with grid indices to probe - run populate_grid_points.py first")
+        return False
+
+    total = watch(_publish, (int(probe["latitude_index"]), int(probe["longitude_index"])), once=once)
+    log_step(f"Watcher finished: {total:,} records upserted")
+    return True
+
+
 def fetch_all_counties():
     """Fetch all counties from database."""
     from database import supabase
 
     logger.info("   Fetching counties from database...")
-    try:
-        response = supabase.table("counties").select("*").execute()
-        counties = response.data
-        logger.info(f"   Found {len(counties)} counties")
-        return counties
-    except Exception as e:
-        logger.error(f"   Error fetching counties: {e}")
-        return []
+    counties = load_reference_rows(supabase, "counties")
+    logger.info(f"   Found {len(counties)} counties")
+    return counties
 
 
 def run_system_checks():
@@ -277,6 +366,8 @@ def print_completion_summary(start_time, grid_count, counties_count, forecast_re
 def main():
     """Main execution function."""
     start_time = time.time()
+    replay.install()
+    instrument_requests()
     print_startup_banner()
 
     try:
@@ -295,16 +386,18 @@ def main():
         # Step 2: Daily conditions (Astral - local calculations)
         log_step("Processing daily conditions (Astral)", 2)
         astral_start = time.time()
-        counties = fetch_all_counties()
-        daily_records = update_daily_conditions_astral(counties)
-        daily_count = upsert_daily_conditions(daily_records)
+        with stage("daily_conditions"):
+            counties = fetch_all_counties()
+            daily_records = update_daily_conditions_astral(counties)
+            daily_count = upsert_daily_conditions(daily_records)
         astral_time = time.time() - astral_start
         logger.info(f"   >>> Astral processing took: {astral_time:.2f} seconds")
 
         # Step 3: Final DB statistics
         log_step("Generating final statistics", 3)
         stats_start = time.time()
-        _ = get_database_stats()
+        with stage("database_stats"):
+            _ = get_database_stats()
         stats_time = time.time() - stats_start
         logger.info(f"   >>> Statistics generation took: {stats_time:.2f} seconds")
 
@@ -343,8 +436,20 @@ def main():
 
 if __name__ == "__main__":
     try:
-        success = main()
+        if "--watch" in sys.argv[1:]:
+            replay.install()
+            instrument_requests()
+            success = run_watcher(once="--once" in sys.argv[1:])
+        else:
+            success = main()
         exit_code = 0 if success else 1
+        write_run_report(extra={
+            "script": "main_noaa_grid",
+            "success": bool(success),
+            "circuit_breakers": breaker_states(),
+            "rate_limits": limiter_stats(),
+            "http_cache": cache_stats(),
+        })
 
         if success:
             logger.info("[OK] Grid-based script completed successfully")
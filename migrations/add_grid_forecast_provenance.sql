@@ -0,0 +1,12 @@
+-- Migration: Add wave provenance columns to grid_forecast_data
+-- Purpose: Record which GFSwave cycle each row came from, and flag rows published
+--          from the cached previous cycle while NOMADS was unavailable (cycle_cache.py)
+
+ALTER TABLE grid_forecast_data
+    ADD COLUMN IF NOT EXISTS wave_model_cycle TEXT,
+    ADD COLUMN IF NOT EXISTS wave_from_fallback BOOLEAN DEFAULT FALSE;
+
+-- Find fallback rows quickly (normally none)
+CREATE INDEX IF NOT EXISTS idx_grid_forecast_wave_fallback
+    ON grid_forecast_data(wave_from_fallback)
+    WHERE wave_from_fallback;
@@ -0,0 +1,125 @@
+-- Migration: Server-side data-quality report for the forecast tables
+-- Purpose: One RPC (data_quality.py) returns null counts per column, value ranges,
+--          wind gust < speed violations per entity and coverage per Pacific date and
+--          source, instead of paging rows over REST or issuing one count per field.
+-- Works on any table with a "timestamp" column (forecast_data, grid_forecast_data,
+-- county_tides_15min, ...). The entity column is grid_id, beach_id or county.
+
+CREATE OR REPLACE FUNCTION data_quality_report(
+    target_table TEXT DEFAULT 'grid_forecast_data',
+    since TIMESTAMPTZ DEFAULT NULL,
+    source_columns JSONB DEFAULT '{}'::jsonb,
+    top_entities INTEGER DEFAULT 20
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+SET search_path = public
+AS $$
+DECLARE
+    cols TEXT[];
+    numeric_cols TEXT[];
+    entity TEXT;
+    where_sql TEXT := CASE WHEN since IS NULL THEN '' ELSE format(' WHERE "timestamp" >= %L', since) END;
+    src RECORD;
+    source_exprs TEXT := '';
+    entity_exprs TEXT := '';
+    summary JSONB;
+    gusts JSONB;
+    coverage JSONB;
+BEGIN
+    SELECT array_agg(c.column_name::text ORDER BY c.ordinal_position)
+    INTO cols
+    FROM information_schema.columns c
+    WHERE c.table_schema = 'public'
+      AND c.table_name = target_table
+      AND c.column_name NOT IN ('id', 'timestamp', 'created_at', 'updated_at');
+    IF cols IS NULL THEN
+        RAISE EXCEPTION 'table % not found', target_table;
+    END IF;
+
+    entity := CASE
+        WHEN 'grid_id' = ANY(cols) THEN 'grid_id'
+        WHEN 'beach_id' = ANY(cols) THEN 'beach_id'
+        WHEN 'county' = ANY(cols) THEN 'county'
+    END;
+
+    SELECT array_agg(c.column_name::text ORDER BY c.ordinal_position)
+    INTO numeric_cols
+    FROM information_schema.columns c
+    WHERE c.table_schema = 'public'
+      AND c.table_name = target_table
+      AND c.column_name = ANY(cols)
+      AND c.column_name IS DISTINCT FROM entity
+      AND c.data_type IN ('smallint', 'integer', 'bigint', 'numeric', 'real', 'double precision');
+
+    -- Source name -> column that only that source fills (skipped when the table lacks it)
+    FOR src IN SELECT key, value #>> '{}' AS col FROM jsonb_each(source_columns) LOOP
+        IF src.col = ANY(cols) THEN
+            source_exprs := source_exprs || format(', %L, count(%I)', src.key, src.col);
+            IF entity IS NOT NULL THEN
+                entity_exprs := entity_exprs
+                    || format(', %L, count(DISTINCT %I) FILTER (WHERE %I IS NOT NULL)', src.key, entity, src.col);
+            END IF;
+        END IF;
+    END LOOP;
+
+    -- One scan: row count, nulls per column, min/max per numeric column, entities per source
+    EXECUTE format(
+        'SELECT jsonb_build_object('
+        '''rows'', count(*), ''first_timestamp'', min("timestamp"), ''last_timestamp'', max("timestamp"), '
+        '''entities'', %s, ''entities_with_source'', jsonb_build_object(%s), '
+        '''nulls'', jsonb_build_object(%s), ''ranges'', jsonb_build_object(%s)) '
+        'FROM %I%s',
+        CASE WHEN entity IS NULL THEN 'NULL' ELSE format('count(DISTINCT %I)', entity) END,
+        substr(entity_exprs, 3),
+        (SELECT string_agg(format('%L, count(*) - count(%I)', c, c), ', ') FROM unnest(cols) AS c),
+        COALESCE((SELECT string_agg(format('%L, jsonb_build_array(min(%I), max(%I))', c, c, c), ', ')
+                  FROM unnest(numeric_cols) AS c), ''),
+        target_table, where_sql
+    ) INTO summary;
+
+    -- Wind gust below sustained speed, per entity (worst first)
+    IF entity IS NOT NULL AND 'wind_speed_mph' = ANY(cols) AND 'wind_gust_mph' = ANY(cols) THEN
+        EXECUTE format(
+            'WITH per_entity AS ('
+            ' SELECT %1$I AS entity, count(*) AS checked,'
+            '        count(*) FILTER (WHERE wind_gust_mph < wind_speed_mph) AS bad'
+            ' FROM %2$I'
+            ' WHERE wind_speed_mph IS NOT NULL AND wind_gust_mph IS NOT NULL%3$s'
+            ' GROUP BY 1) '
+            'SELECT jsonb_build_object('
+            ' ''checked'', COALESCE(sum(checked), 0), ''bad'', COALESCE(sum(bad), 0), ''entities'', count(*),'
+            ' ''severity'', jsonb_build_object('
+            '     ''0%%'', count(*) FILTER (WHERE bad = 0),'
+            '     ''1-25%%'', count(*) FILTER (WHERE bad > 0 AND bad * 4 <= checked),'
+            '     ''26-50%%'', count(*) FILTER (WHERE bad * 4 > checked AND bad * 2 <= checked),'
+            '     ''51-75%%'', count(*) FILTER (WHERE bad * 2 > checked AND bad * 4 <= checked * 3),'
+            '     ''76-100%%'', count(*) FILTER (WHERE bad * 4 > checked * 3)),'
+            ' ''worst'', COALESCE((SELECT jsonb_agg(w) FROM ('
+            '     SELECT entity, checked, bad, round(100.0 * bad / checked, 1) AS bad_pct'
+            '     FROM per_entity WHERE bad > 0'
+            '     ORDER BY bad::float / checked DESC, bad DESC'
+            '     LIMIT %4$s) AS w), ''[]''::jsonb)) '
+            'FROM per_entity',
+            entity, target_table, replace(where_sql, ' WHERE ', ' AND '), top_entities
+        ) INTO gusts;
+    END IF;
+
+    -- Rows, entities and per-source filled rows for each Pacific calendar day
+    EXECUTE format(
+        'SELECT COALESCE(jsonb_agg(d ORDER BY d->>''date''), ''[]''::jsonb) FROM ('
+        ' SELECT jsonb_build_object(''date'', ("timestamp" AT TIME ZONE ''America/Los_Angeles'')::date,'
+        '        ''rows'', count(*)%s, ''sources'', jsonb_build_object(%s)) AS d'
+        ' FROM %I%s'
+        ' GROUP BY ("timestamp" AT TIME ZONE ''America/Los_Angeles'')::date) AS days',
+        CASE WHEN entity IS NULL THEN '' ELSE format(', ''entities'', count(DISTINCT %I)', entity) END,
+        substr(source_exprs, 3),
+        target_table, where_sql
+    ) INTO coverage;
+
+    RETURN jsonb_build_object('table', target_table, 'entity', entity, 'since', since)
+        || summary
+        || jsonb_build_object('gust_violations', gusts, 'coverage', coverage);
+END;
+$$;
@@ -0,0 +1,331 @@
+-- Migration: Range-partition the forecast and tide tables by Pacific day
+-- Purpose: Retention becomes DROP of whole-day partitions (constant-time catalog
+--          operations) instead of DELETE ... WHERE timestamp < cutoff over REST,
+--          which rewrites indexes and leaves dead tuples behind.
+-- Tables:  forecast_data, grid_forecast_data, beach_tides_hourly, county_tides_15min
+--
+-- Each table is renamed to <table>_unpartitioned, recreated with the same
+-- columns as a partitioned table, and its rows copied over. Day partitions are
+-- named <table>_pYYYYMMDD and cover one Pacific calendar day; rows outside every
+-- day partition land in <table>_default. database.maintain_day_partitions()
+-- calls maintain_day_partitions() below on each run to create upcoming days and
+-- drop expired ones.
+--
+-- Notes:
+--   * Unique keys must include the partition key; the upsert keys already do
+--     ((beach_id|grid_id|county), timestamp). The old primary key is recreated
+--     with "timestamp" appended (e.g. (id, "timestamp")).
+--   * Foreign keys (e.g. fk_grid_forecast_grid_id), non-unique indexes, table
+--     grants and RLS policies are copied from the old table. Row level security
+--     is only enabled (on the parent and every partition) when the old table had
+--     it on; tables without RLS stay readable as before.
+--   * Views that read the old table are recreated from their definition so they
+--     read the partitioned table instead of <table>_unpartitioned. Materialized
+--     views are only reported and must be recreated by hand.
+--   * The partition functions only accept the four tables above and can only be
+--     executed by service_role.
+
+-- === HELPERS ===
+
+-- Pacific midnight starting a calendar day
+CREATE OR REPLACE FUNCTION pacific_day_start(day DATE)
+RETURNS TIMESTAMPTZ
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT day::timestamp AT TIME ZONE 'America/Los_Angeles'
+$$;
+
+-- Only the forecast/tide tables are ever partitioned (guards the dynamic SQL below)
+CREATE OR REPLACE FUNCTION assert_day_partitioned_table(table_name TEXT)
+RETURNS VOID
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF table_name IS NULL OR table_name NOT IN (
+        'forecast_data', 'grid_forecast_data', 'beach_tides_hourly', 'county_tides_15min'
+    ) THEN
+        RAISE EXCEPTION 'day partitions are not managed for table %', table_name;
+    END IF;
+END;
+$$;
+
+-- Create the partition for one Pacific day (moving any rows parked in the default partition)
+CREATE OR REPLACE FUNCTION create_day_partition(table_name TEXT, day DATE)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    part TEXT := format('%s_p%s', table_name, to_char(day, 'YYYYMMDD'));
+    lo TIMESTAMPTZ := pacific_day_start(day);
+    hi TIMESTAMPTZ := pacific_day_start(day + 1);
+BEGIN
+    PERFORM assert_day_partitioned_table(table_name);
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part, table_name);
+    -- Partitions are reachable over REST by name, so they follow the parent's RLS setting
+    IF (SELECT relrowsecurity FROM pg_class WHERE oid = to_regclass(table_name)) THEN
+        EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', part);
+    END IF;
+    IF to_regclass(table_name || '_default') IS NOT NULL THEN
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM %I WHERE "timestamp" >= $1 AND "timestamp" < $2 RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            table_name || '_default', part
+        ) USING lo, hi;
+    END IF;
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', table_name, part, lo, hi);
+    RETURN TRUE;
+END;
+$$;
+
+-- Convert an existing table into a day-partitioned one (idempotent)
+CREATE OR REPLACE FUNCTION partition_table_by_day(table_name TEXT, unique_cols TEXT[], days_ahead INTEGER DEFAULT 18)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    old_name TEXT := table_name || '_unpartitioned';
+    first_day DATE;
+    last_day DATE := (now() AT TIME ZONE 'America/Los_Angeles')::date + days_ahead;
+    day DATE;
+    col RECORD;
+    con RECORD;
+    pol RECORD;
+    moved BIGINT;
+    pk_cols NAME[];
+    rls_on BOOLEAN;
+    view_names TEXT[];
+    view_kinds "char"[];
+    view_defs TEXT[];
+    i INTEGER;
+BEGIN
+    PERFORM assert_day_partitioned_table(table_name);
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(table_name)) THEN
+        RAISE NOTICE '% is already partitioned', table_name;
+        RETURN 0;
+    END IF;
+
+    SELECT relrowsecurity INTO rls_on FROM pg_class WHERE oid = to_regclass(table_name);
+
+    -- Views bind to the table's OID and would follow the rename; keep their definitions
+    -- (still naming table_name) to point them at the new table afterwards
+    SELECT array_agg(v.oid::regclass::text ORDER BY v.oid),
+           array_agg(v.relkind ORDER BY v.oid),
+           array_agg(rtrim(pg_get_viewdef(v.oid), E'; \n') ORDER BY v.oid)
+    INTO view_names, view_kinds, view_defs
+    FROM (
+        SELECT DISTINCT v.oid, v.relkind
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.classid = 'pg_rewrite'::regclass
+          AND d.refclassid = 'pg_class'::regclass
+          AND d.refobjid = to_regclass(table_name)
+          AND v.oid <> d.refobjid
+    ) v;
+
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', table_name, old_name);
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS) '
+        'PARTITION BY RANGE ("timestamp")',
+        table_name, old_name
+    );
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I UNIQUE (%s)',
+        table_name, table_name || '_day_unique',
+        (SELECT string_agg(quote_ident(c), ', ') FROM unnest(unique_cols) AS c)
+    );
+
+    -- Primary key: the old key plus the partition key
+    SELECT array_agg(a.attname ORDER BY k.ord) INTO pk_cols
+    FROM pg_constraint pk
+    CROSS JOIN LATERAL unnest(pk.conkey) WITH ORDINALITY AS k(attnum, ord)
+    JOIN pg_attribute a ON a.attrelid = pk.conrelid AND a.attnum = k.attnum
+    WHERE pk.conrelid = old_name::regclass AND pk.contype = 'p';
+    IF pk_cols IS NOT NULL THEN
+        IF NOT ('timestamp' = ANY (pk_cols)) THEN
+            pk_cols := pk_cols || 'timestamp'::NAME;
+        END IF;
+        EXECUTE format(
+            'ALTER TABLE %I ADD CONSTRAINT %I PRIMARY KEY (%s)',
+            table_name, table_name || '_day_pkey',
+            (SELECT string_agg(quote_ident(c), ', ') FROM unnest(pk_cols) AS c)
+        );
+    END IF;
+
+    -- Foreign keys (constraint names are per table, so the old names are kept)
+    FOR con IN
+        SELECT conname, pg_get_constraintdef(oid) AS def
+        FROM pg_constraint
+        WHERE conrelid = old_name::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I %s', table_name, con.conname, con.def);
+    END LOOP;
+
+    -- Non-unique indexes (unique ones without "timestamp" cannot exist on a partitioned table;
+    -- the upsert key is covered by <table>_day_unique)
+    FOR con IN
+        SELECT c.relname, substring(pg_get_indexdef(i.indexrelid) FROM ' USING .*$') AS body
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = old_name::regclass AND NOT i.indisunique
+    LOOP
+        EXECUTE format('CREATE INDEX %I ON %I%s', left(con.relname, 59) || '_day', table_name, con.body);
+    END LOOP;
+    EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %I ("timestamp")', 'idx_' || table_name || '_day_timestamp', table_name);
+
+    -- Grants, RLS (only if the old table had it on) and policies
+    FOR con IN
+        SELECT CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(a.grantee)) END AS grantee,
+               string_agg(DISTINCT a.privilege_type, ', ') AS privs
+        FROM pg_class c, aclexplode(c.relacl) AS a
+        WHERE c.oid = old_name::regclass
+        GROUP BY 1
+    LOOP
+        EXECUTE format('GRANT %s ON %I TO %s', con.privs, table_name, con.grantee);
+    END LOOP;
+    IF rls_on THEN
+        EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', table_name);
+    END IF;
+    FOR pol IN
+        SELECT * FROM pg_policies WHERE schemaname = 'public' AND tablename = old_name
+    LOOP
+        EXECUTE format(
+            'CREATE POLICY %I ON %I AS %s FOR %s TO %s%s%s',
+            pol.policyname, table_name, pol.permissive, pol.cmd,
+            (SELECT string_agg(CASE WHEN r = 'public' THEN 'PUBLIC' ELSE quote_ident(r) END, ', ')
+             FROM unnest(pol.roles) AS r),
+            COALESCE(' USING (' || pol.qual || ')', ''),
+            COALESCE(' WITH CHECK (' || pol.with_check || ')', '')
+        );
+    END LOOP;
+    IF rls_on AND NOT EXISTS (SELECT 1 FROM pg_policies WHERE schemaname = 'public' AND tablename = old_name) THEN
+        RAISE NOTICE '% has RLS on and no policies; only the service role can read it until one is added', table_name;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', table_name || '_default', table_name);
+    IF rls_on THEN
+        EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', table_name || '_default');
+    END IF;
+
+    -- Serial sequences follow the new table so dropping the old copy keeps them
+    FOR col IN
+        SELECT a.attname, pg_get_serial_sequence(old_name, a.attname) AS seq
+        FROM pg_attribute a
+        WHERE a.attrelid = old_name::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    LOOP
+        IF col.seq IS NOT NULL THEN
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.%I', col.seq, table_name, col.attname);
+        END IF;
+    END LOOP;
+
+    EXECUTE format('SELECT min("timestamp" AT TIME ZONE ''America/Los_Angeles'')::date FROM %I', old_name)
+        INTO first_day;
+    day := LEAST(COALESCE(first_day, last_day), (now() AT TIME ZONE 'America/Los_Angeles')::date);
+    WHILE day <= last_day LOOP
+        PERFORM create_day_partition(table_name, day);
+        day := day + 1;
+    END LOOP;
+
+    EXECUTE format('INSERT INTO %I SELECT * FROM %I', table_name, old_name);
+    GET DIAGNOSTICS moved = ROW_COUNT;
+
+    -- Point dependent views at the partitioned table (same columns, so OR REPLACE keeps grants)
+    FOR i IN 1 .. COALESCE(array_length(view_names, 1), 0) LOOP
+        IF view_kinds[i] = 'v' THEN
+            EXECUTE format('CREATE OR REPLACE VIEW %s AS %s', view_names[i], view_defs[i]);
+            RAISE NOTICE 'view % now reads the partitioned %', view_names[i], table_name;
+        ELSE
+            RAISE NOTICE 'materialized view % still reads %; recreate it on %', view_names[i], old_name, table_name;
+        END IF;
+    END LOOP;
+    RAISE NOTICE '% partitioned: % rows copied, old table kept as %', table_name, moved, old_name;
+    RETURN moved::INTEGER;
+END;
+$$;
+
+-- Retention: create the next days' partitions and drop (or detach) expired ones.
+-- Returns one row per table with the partitions created / removed.
+CREATE OR REPLACE FUNCTION maintain_day_partitions(
+    table_names TEXT[],
+    keep_from TIMESTAMPTZ,
+    days_ahead INTEGER DEFAULT 18,
+    detach_only BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (table_name TEXT, created INTEGER, dropped INTEGER)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    tbl TEXT;
+    part RECORD;
+    today DATE := (now() AT TIME ZONE 'America/Los_Angeles')::date;
+    day DATE;
+BEGIN
+    FOREACH tbl IN ARRAY table_names LOOP
+        PERFORM assert_day_partitioned_table(tbl);
+        table_name := tbl;
+        created := 0;
+        dropped := 0;
+        IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(tbl)) THEN
+            RAISE EXCEPTION '% is not partitioned (run migrations/partition_forecast_tables_by_day.sql)', tbl;
+        END IF;
+
+        FOR day IN SELECT generate_series(today, today + days_ahead, interval '1 day')::date LOOP
+            IF create_day_partition(tbl, day) THEN
+                created := created + 1;
+            END IF;
+        END LOOP;
+
+        -- Whole days that end on/before keep_from go away as a catalog operation
+        FOR part IN
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = tbl::regclass
+              AND c.relname ~ ('^' || tbl || '_p[0-9]{8}$')
+              AND pacific_day_start(to_date(right(c.relname, 8), 'YYYYMMDD') + 1) <= keep_from
+        LOOP
+            EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', tbl, part.relname);
+            IF NOT detach_only THEN
+                EXECUTE format('DROP TABLE %I', part.relname);
+            END IF;
+            dropped := dropped + 1;
+        END LOOP;
+
+        -- Stragglers in the default partition are few; a plain delete is fine there
+        EXECUTE format('DELETE FROM %I WHERE "timestamp" < $1', tbl || '_default') USING keep_from;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+
+-- === PERMISSIONS ===
+-- These functions create, move and drop tables; only the update scripts (service role) may call them
+REVOKE EXECUTE ON FUNCTION create_day_partition(TEXT, DATE) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION partition_table_by_day(TEXT, TEXT[], INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION maintain_day_partitions(TEXT[], TIMESTAMPTZ, INTEGER, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_day_partition(TEXT, DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION partition_table_by_day(TEXT, TEXT[], INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION maintain_day_partitions(TEXT[], TIMESTAMPTZ, INTEGER, BOOLEAN) TO service_role;
+
+-- === CONVERSION ===
+SELECT partition_table_by_day('forecast_data', ARRAY['beach_id', 'timestamp']);
+SELECT partition_table_by_day('grid_forecast_data', ARRAY['grid_id', 'timestamp']);
+SELECT partition_table_by_day('beach_tides_hourly', ARRAY['beach_id', 'timestamp']);
+SELECT partition_table_by_day('county_tides_15min', ARRAY['county', 'timestamp']);
+
+-- county_tides_15min kept its updated_at trigger on the old table only
+DROP TRIGGER IF EXISTS update_county_tides_15min_updated_at ON county_tides_15min;
+CREATE TRIGGER update_county_tides_15min_updated_at
+    BEFORE UPDATE ON county_tides_15min
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- After validating the new tables:
+--   DROP TABLE forecast_data_unpartitioned, grid_forecast_data_unpartitioned,
+--              beach_tides_hourly_unpartitioned, county_tides_15min_unpartitioned;
@@ -0,0 +1,44 @@
+-- Migration: Version probe for the reference tables
+-- Purpose: reference_cache.py keeps local snapshots of beaches, counties and
+--          grid_points and asks for this version once per table per run; rows are
+--          only paged over REST when the version differs from the snapshot's.
+-- Version = row count, max(updated_at) when the table has that column, and an md5
+-- over the selected columns (NULL = whole row) so edits without updated_at
+-- bookkeeping (e.g. assign_beaches_to_grid.py setting grid_id) are still seen.
+
+CREATE OR REPLACE FUNCTION reference_table_version(
+    target_table TEXT,
+    columns TEXT[] DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+SET search_path = public
+AS $$
+DECLARE
+    row_expr TEXT;
+    updated_expr TEXT := 'NULL::timestamptz';
+    result JSONB;
+BEGIN
+    IF columns IS NULL THEN
+        row_expr := 'to_jsonb(t)::text';
+    ELSE
+        row_expr := format('jsonb_build_array(%s)::text',
+            (SELECT string_agg(format('t.%I', c), ', ') FROM unnest(columns) AS c));
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns c
+        WHERE c.table_schema = 'public' AND c.table_name = target_table AND c.column_name = 'updated_at'
+    ) THEN
+        updated_expr := 'max(t.updated_at)';
+    END IF;
+
+    EXECUTE format(
+        'SELECT jsonb_build_object(''rows'', count(*), ''updated_at'', %s, '
+        '''checksum'', md5(COALESCE(string_agg(%s, ''|'' ORDER BY %s), ''''))) FROM %I AS t',
+        updated_expr, row_expr, row_expr, target_table
+    ) INTO result;
+    RETURN result;
+END;
+$$;
@@ -0,0 +1,38 @@
+-- Migration: Refresh the daily surf-intensity rollups for many dates in one call
+-- Purpose: nowcast.py / nowcast_grid.py used to call refresh_daily_beach_surf_intensity /
+--          refresh_daily_grid_surf_intensity once per date over REST. These wrappers take a
+--          date array and run the per-date refreshes server-side in one round trip and one
+--          transaction (database.refresh_daily_surf_intensity falls back to per-date calls
+--          until this is applied).
+
+CREATE OR REPLACE FUNCTION refresh_daily_beach_surf_intensity_for_dates(target_dates DATE[])
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    d DATE;
+    refreshed INTEGER := 0;
+BEGIN
+    FOR d IN SELECT DISTINCT unnest(target_dates) ORDER BY 1 LOOP
+        PERFORM refresh_daily_beach_surf_intensity(d);
+        refreshed := refreshed + 1;
+    END LOOP;
+    RETURN refreshed;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION refresh_daily_grid_surf_intensity_for_dates(target_dates DATE[])
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    d DATE;
+    refreshed INTEGER := 0;
+BEGIN
+    FOR d IN SELECT DISTINCT unnest(target_dates) ORDER BY 1 LOOP
+        PERFORM refresh_daily_grid_surf_intensity(d);
+        refreshed := refreshed + 1;
+    END LOOP;
+    RETURN refreshed;
+END;
+$$;
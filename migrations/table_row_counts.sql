@@ -0,0 +1,20 @@
+-- Migration: Exact row counts for several tables in one call
+-- Purpose: database.get_database_stats(exact=True) counts every table with one RPC
+--          instead of a count=exact request per table
+
+CREATE OR REPLACE FUNCTION table_row_counts(table_names TEXT[])
+RETURNS TABLE (table_name TEXT, row_count BIGINT)
+LANGUAGE plpgsql
+STABLE
+SET search_path = public
+AS $$
+DECLARE
+    tbl TEXT;
+BEGIN
+    FOREACH tbl IN ARRAY table_names LOOP
+        table_name := tbl;
+        EXECUTE format('SELECT count(*) FROM %I', tbl) INTO row_count;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
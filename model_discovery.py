@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Model-run discovery for Hybrid Surf Database Update Script
+Finds the newest available NOMADS cycle by fetching each candidate run's
+OPeNDAP .dds (a few hundred bytes of metadata) concurrently instead of
+opening the datasets one after another. The last cycle found per model is
+kept in a small state file so newer cycles are checked first next run.
+"""
+
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import OPEN, get_breaker
+from rate_limiter import get_limiter
+from config import (
+    logger, MODEL_RUN_STATE_PATH, MODEL_DISCOVERY_WORKERS,
+    MODEL_DISCOVERY_TIMEOUT, MODEL_DISCOVERY_DAYS_BACK,
+)
+
+CYCLE_HOURS = (18, 12, 6, 0)
+CYCLE_FORMAT = "%Y%m%d%H"
+RATE_LIMIT_MARKERS = ("over rate limit", "rate limit", "limit exceeded")
+
+# Probe outcomes
+FOUND = "found"
+MISSING = "missing"            # server answered: run not there (yet) or incomplete
+UNREACHABLE = "unreachable"    # transport error or rate limit: says nothing about the run
+
+
+def cycle_from_url(url: Optional[str]) -> Optional[str]:
+    """Cycle (YYYYMMDDHH) encoded in a NOMADS dataset URL, e.g. .../20251023/..._12z."""
+    match = re.search(r"(\d{8})\D.*_(\d{2})z$", url or "")
+    return f"{match.group(1)}{match.group(2)}" if match else None
+
+
+# === STATE FILE ===
+def load_state(path: str = MODEL_RUN_STATE_PATH) -> Dict:
+    if not path:
+        return {}
+    try:
+        with open(path, encoding="utf-8") as fh:
+            state = json.load(fh)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(model: str, cycle: datetime, url: str, path: str = MODEL_RUN_STATE_PATH):
+    if not path:
+        return
+    state = load_state(path)
+    state[model] = {
+        "cycle": cycle.strftime(CYCLE_FORMAT),
+        "url": url,
+        "found_at": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(state, fh, indent=2, sort_keys=True)
+    except OSError as e:
+        logger.warning(f"   Could not write model run state to {path}: {e}")
+
+
+def last_known_cycle(model: str, path: str = MODEL_RUN_STATE_PATH) -> Optional[datetime]:
+    entry = load_state(path).get(model) or {}
+    try:
+        return datetime.strptime(entry["cycle"], CYCLE_FORMAT).replace(tzinfo=timezone.utc)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# === CANDIDATES ===
+def candidate_cycles(now: Optional[datetime] = None, days_back: int = MODEL_DISCOVERY_DAYS_BACK) -> List[datetime]:
+    """Every 00/06/12/18z cycle from `days_back` days ago up to now, newest first."""
+    now = now or datetime.now(timezone.utc)
+    today = datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
+    cycles = []
+    for days in range(days_back + 1):
+        day = today - timedelta(days=days)
+        for hour in CYCLE_HOURS:
+            cycle = day + timedelta(hours=hour)
+            if cycle <= now:
+                cycles.append(cycle)
+    return cycles
+
+
+# === PROBING ===
+def probe_dds(session: requests.Session, url: str, required_vars: Iterable[str],
+              timeout: float = MODEL_DISCOVERY_TIMEOUT) -> str:
+    """Fetch `url`.dds and check every required variable is declared."""
+    limiter = get_limiter(url)
+    limiter.acquire()
+    try:
+        response = session.get(f"{url}.dds", timeout=timeout)
+    except requests.RequestException as e:
+        logger.debug(f"      {url}.dds: {e}")
+        return UNREACHABLE
+
+    text = response.text or ""
+    if any(marker in text.lower() for marker in RATE_LIMIT_MARKERS):
+        logger.error(f"      NOAA RATE LIMIT DETECTED while probing {url}")
+        limiter.on_throttle()
+        get_breaker("nomads").record_failure(trip=True)
+        return UNREACHABLE
+    if response.status_code != 200:
+        return MISSING
+    for var in required_vars:
+        if not re.search(rf"\b{re.escape(var)}\b", text):
+            return MISSING
+    return FOUND
+
+
+def _probe_all(session, urls: List[str], required_vars, workers: int) -> List[str]:
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(urls)))) as executor:
+        return list(executor.map(lambda u: probe_dds(session, u, required_vars), urls))
+
+
+def discover_model_run(
+    model: str,
+    url_for: Callable[[str, str, int], str],
+    base_urls: List[str],
+    required_vars: Iterable[str],
+    now: Optional[datetime] = None,
+    workers: int = MODEL_DISCOVERY_WORKERS,
+    state_path: str = MODEL_RUN_STATE_PATH,
+) -> Optional[str]:
+    """
+    Newest available run of a NOMADS model.
+
+    Candidates from the last known cycle onward are probed first (all at once);
+    older cycles are only probed when none of those exist. A base URL whose
+    probes all fail at the transport level is skipped for the next one.
+
+    Args:
+        model: State file key (e.g. "gfswave_wcoast")
+        url_for: (base_url, "YYYYMMDD", cycle_hour) -> dataset URL
+        base_urls: Mirrors/protocols in preference order
+        required_vars: Variables the .dds must declare
+
+    Returns:
+        Dataset URL or None if no candidate is available (or the NOMADS circuit is open)
+    """
+    breaker = get_breaker("nomads")
+    if not breaker.allow():
+        logger.warning(f"   {model}: NOMADS circuit open, skipping discovery (retry in {breaker.retry_after():.0f}s)")
+        return None
+
+    required_vars = tuple(required_vars)
+    cycles = candidate_cycles(now)
+    last_cycle = last_known_cycle(model, state_path)
+    if last_cycle is not None and last_cycle >= cycles[-1]:
+        rounds = [[c for c in cycles if c >= last_cycle], [c for c in cycles if c < last_cycle]]
+        logger.info(f"   {model}: last known cycle {last_cycle:%Y-%m-%d %H}z, checking newer cycles first")
+    else:
+        rounds = [cycles]
+
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=workers))
+    session.mount("https://", HTTPAdapter(pool_maxsize=workers))
+    try:
+        for base_url in base_urls:
+            for round_cycles in rounds:
+                # A rate-limit page during the previous round trips the circuit: stop probing
+                if breaker.state == OPEN:
+                    logger.warning(f"   {model}: NOMADS circuit open, skipping the remaining probes")
+                    return None
+                urls = [url_for(base_url, c.strftime("%Y%m%d"), c.hour) for c in round_cycles]
+                results = _probe_all(session, urls, required_vars, workers)
+                for cycle, url, result in zip(round_cycles, urls, results):
+                    if result == FOUND:
+                        breaker.record_success()
+                        logger.info(f"   [OK] {model}: {url} ({len(urls)} candidates probed)")
+                        save_state(model, cycle, url, state_path)
+                        return url
+                if results and all(r == UNREACHABLE for r in results):
+                    breaker.record_failure()
+                    if breaker.state == OPEN:
+                        logger.warning(f"   {model}: NOMADS circuit open, giving up")
+                        return None
+                    logger.warning(f"   {model}: {base_url} unreachable, trying next base URL")
+                    break
+    finally:
+        session.close()
+
+    logger.error(f"   {model}: no available run in the last {MODEL_DISCOVERY_DAYS_BACK} days")
+    return None
@@ -5,24 +5,46 @@ This module extracts wave data directly from grid points instead of interpolatin
 """
 
 import numpy as np
-from datetime import datetime, timezone, timedelta
-import pytz
+import xarray as xr
 from config import logger
 from noaa_handler import (
     get_noaa_dataset_url, load_noaa_dataset, validate_noaa_dataset,
-    load_cdip_data, find_nearest_cdip_site, interpolate_cdip_to_gfs_times
+    load_cdip_data, CdipAlignment
 )
-from swell_ranking import (
-    rank_swell_trains, calculate_wave_energy_kj, get_surf_height_range
+from swell_ranking import rank_swell_train_arrays, surf_height_range_array
+from utils import surfline_energy_kj_index_array, wind_speed_direction
+from timestamps import bucket_pacific_3h, epoch_to_iso
+from instrumentation import record_opendap_read
+from reference_cache import GRID_POINT_COLUMNS, load_reference_rows
+
+# Variables read for all grid points at once (wind speed/gust come from GFS Atmospheric)
+GRID_POINT_VARS = (
+    'swell_1', 'swell_2', 'swell_3', 'swper_1', 'swper_2', 'swper_3',
+    'swdir_1', 'swdir_2', 'swdir_3', 'htsgwsfc', 'ugrdsfc', 'vgrdsfc',
 )
-from utils import normalize_surf_range
-import pandas as pd
+
+
+def _read_grid_point_matrix(ds, var, lat_var, lon_var, lat_index, lon_index):
+    """One pointwise (vectorized) read of `var` at every grid point -> (time, point) float64 matrix."""
+    values = ds[var].isel({lat_var: lat_index, lon_var: lon_index}).transpose(..., "point").values
+    record_opendap_read(var)
+    return np.asarray(values, dtype=np.float64)
+
+
+def _object_matrix(values, missing=None):
+    """(time, point) float matrix -> nested lists with `missing` where NaN (for record building)."""
+    return np.where(np.isnan(values), missing, values).tolist()
 
 
 def get_noaa_grid_data(ds, grid_points, cdip_data=None):
     """
     Extract NOAA GFSwave data directly from grid points with optional CDIP enhancement.
 
+    Each variable is read once for all grid points with a pointwise index
+    (latitude_index / longitude_index DataArrays), giving (time x grid point)
+    matrices; swell ranking, surf range, energy and wind direction run over
+    those matrices.
+
     Args:
         ds: Loaded xarray dataset from NOAA GFSwave
         grid_points: List of dicts with id, latitude, longitude, latitude_index, longitude_index
@@ -37,9 +59,6 @@ def get_noaa_grid_data(ds, grid_points, cdip_data=None):
         logger.info("WITH CDIP ENHANCEMENT")
     logger.info("=" * 80)
 
-    records = []
-    pacific = pytz.timezone('America/Los_Angeles')
-
     # Get time values
     times = ds['time'].values
 
@@ -51,244 +70,129 @@ def get_noaa_grid_data(ds, grid_points, cdip_data=None):
         lat_var = 'lat'
         lon_var = 'lon'
 
-    logger.info(f"Processing {len(grid_points)} grid points × {len(times)} time steps")
-    logger.info(f"Expected records: {len(grid_points) * len(times):,}")
-
-    # Process each grid point
-    for idx, grid_point in enumerate(grid_points, start=1):
-        grid_id = grid_point['id']
-        lat_idx = grid_point['latitude_index']
-        lon_idx = grid_point['longitude_index']
-        lat = grid_point['latitude']
-        lon = grid_point['longitude']
-
-        logger.info(f"   Processing grid point {idx}/{len(grid_points)} (grid_id={grid_id})")
-
-        # Extract data for this grid point across all times
-        try:
-            # Get swell data (height, period, direction for 3 trains)
-            swell_1_height = ds['swell_1'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
-            swell_2_height = ds['swell_2'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
-            swell_3_height = ds['swell_3'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
+    points = [
+        gp for gp in grid_points
+        if gp.get('latitude_index') is not None and gp.get('longitude_index') is not None
+    ]
+    if len(points) < len(grid_points):
+        logger.warning(f"   Skipping {len(grid_points) - len(points)} grid points without grid indices")
+    if not points or len(times) == 0:
+        return []
 
-            swell_1_period = ds['swper_1'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
-            swell_2_period = ds['swper_2'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
-            swell_3_period = ds['swper_3'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
+    logger.info(f"Processing {len(points)} grid points × {len(times)} time steps")
+    logger.info(f"Expected records: {len(points) * len(times):,}")
 
-            swell_1_dir = ds['swdir_1'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
-            swell_2_dir = ds['swdir_2'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
-            swell_3_dir = ds['swdir_3'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
+    lat_index = xr.DataArray([int(gp['latitude_index']) for gp in points], dims="point")
+    lon_index = xr.DataArray([int(gp['longitude_index']) for gp in points], dims="point")
 
-            # Get combined wave height (for surf calculations)
-            combined_wave_height = ds['htsgwsfc'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
+    # One pointwise read per variable: (time, point) matrices
+    try:
+        m = {
+            var: _read_grid_point_matrix(ds, var, lat_var, lon_var, lat_index, lon_index)
+            for var in GRID_POINT_VARS if var in ds.data_vars
+        }
+    except Exception as e:
+        logger.error(f"Error extracting grid point data: {e}")
+        return []
+    missing_vars = [var for var in GRID_POINT_VARS if var not in m]
+    if missing_vars:
+        logger.error(f"GFSwave dataset is missing {', '.join(missing_vars)}")
+        return []
 
-            # Get wind data
-            wind_u = ds['ugrdsfc'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
-            wind_v = ds['vgrdsfc'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
+    heights = np.stack([m['swell_1'], m['swell_2'], m['swell_3']])
+    periods = np.stack([m['swper_1'], m['swper_2'], m['swper_3']])
+    directions = np.stack([m['swdir_1'], m['swdir_2'], m['swdir_3']])
+    combined_wave_height = m['htsgwsfc']
+    # Direction only (speed and gust come from GFS Atmospheric for consistency)
+    _, wind_direction = wind_speed_direction(m['ugrdsfc'], m['vgrdsfc'])
 
-            # Wind gust (if available)
-            if 'gustsfc' in ds.data_vars:
-                wind_gust = ds['gustsfc'].isel({lat_var: lat_idx, lon_var: lon_idx}).values
-            else:
-                wind_gust = np.full(len(times), np.nan)
+    # Timestamps: UTC epoch seconds -> nearest 3-hour Pacific bucket, formatted once
+    epochs = np.asarray(times, dtype='datetime64[s]').astype(np.int64)
+    timestamp_isos = epoch_to_iso(bucket_pacific_3h(epochs))
 
+    # CDIP Enhancement (replace swell_1 with CDIP data where available): one alignment and one
+    # interpolation over the (variable, time, point) stack
+    if cdip_data is not None:
+        try:
+            alignment = CdipAlignment(cdip_data, times)
+            sites = alignment.site_indices([(gp['latitude'], gp['longitude']) for gp in points])
+            cdip_hs, cdip_tp, cdip_dp = alignment.interpolate(sites)
+            mask = ~np.isnan(cdip_hs)
+            heights[0] = np.where(mask, cdip_hs, heights[0])
+            periods[0] = np.where(mask, cdip_tp, periods[0])
+            directions[0] = np.where(mask, cdip_dp, directions[0])
+            combined_wave_height = np.where(mask, cdip_hs, combined_wave_height)
+            logger.debug(f"   CDIP enhanced {int(np.sum(mask.any(axis=0)))} grid points")
         except Exception as e:
-            logger.warning(f"Error extracting data for grid point {grid_id}: {e}")
-            continue
-
-        # CDIP Enhancement (replace swell_1 with CDIP data where available)
-        cdip_enhanced = False
-        if cdip_data is not None:
-            try:
-                # Find nearest CDIP site for this grid point
-                cdip_idx = find_nearest_cdip_site(cdip_data, lat, lon)
-
-                if cdip_idx is not None:
-                    # Convert times to Pacific for interpolation
-                    pacific_times = []
-                    for t_val in times:
-                        ts = np.datetime64(t_val, 'ns')
-                        dt_utc = datetime.utcfromtimestamp(ts.astype('datetime64[s]').astype(int)).replace(tzinfo=timezone.utc)
-                        dt_pac = dt_utc.astimezone(pacific)
-                        pacific_times.append(pd.Timestamp(dt_pac))
-
-                    # Extract and interpolate CDIP data to match GFS times
-                    cdip_hs_m = cdip_data['hs_m'][:, cdip_idx]
-                    cdip_tp_s = cdip_data['tp_s'][:, cdip_idx]
-                    cdip_dp_deg = cdip_data['dp_deg'][:, cdip_idx]
-
-                    cdip_hs_interp = interpolate_cdip_to_gfs_times(cdip_data['times'], cdip_hs_m, pacific_times)
-                    cdip_tp_interp = interpolate_cdip_to_gfs_times(cdip_data['times'], cdip_tp_s, pacific_times)
-                    cdip_dp_interp = interpolate_cdip_to_gfs_times(cdip_data['times'], cdip_dp_deg, pacific_times)
-
-                    # Replace swell_1 with CDIP data where valid
-                    valid_cdip = ~np.isnan(cdip_hs_interp)
-                    if np.any(valid_cdip):
-                        swell_1_height = np.where(valid_cdip, cdip_hs_interp, swell_1_height)
-                        swell_1_period = np.where(valid_cdip, cdip_tp_interp, swell_1_period)
-                        swell_1_dir = np.where(valid_cdip, cdip_dp_interp, swell_1_dir)
-                        combined_wave_height = np.where(valid_cdip, cdip_hs_interp, combined_wave_height)
-                        cdip_enhanced = True
-                        logger.debug(f"   Grid {grid_id}: Enhanced with CDIP data for {np.sum(valid_cdip)} timesteps")
-            except Exception as e:
-                logger.debug(f"   Grid {grid_id}: CDIP enhancement failed: {e}")
-
-        # Process each timestamp
-        for t_idx, time_val in enumerate(times):
-            try:
-                # Convert timestamp to Pacific time
-                ts = np.datetime64(time_val, 'ns')
-                dt_utc = datetime.utcfromtimestamp(ts.astype('datetime64[s]').astype(int)).replace(tzinfo=timezone.utc)
-                dt_pacific = dt_utc.astimezone(pacific)
-
-                # Round to nearest 3-hour interval (00:00, 03:00, 06:00, etc.)
-                hour = dt_pacific.hour
-                remainder = hour % 3
-                if remainder <= 1:
-                    target_hour = hour - remainder
-                else:
-                    target_hour = hour + (3 - remainder)
-
-                if target_hour >= 24:
-                    target_hour = 0
-                    dt_pacific += timedelta(days=1)
-
-                # Create clean timestamp
-                clean_timestamp = pacific.localize(datetime(
-                    dt_pacific.year, dt_pacific.month, dt_pacific.day,
-                    target_hour, 0, 0
-                ))
-
-                timestamp_iso = clean_timestamp.isoformat()
-
-                # Extract swell data for this time
-                swells = []
-
-                # Swell 1
-                h1 = float(swell_1_height[t_idx])
-                p1 = float(swell_1_period[t_idx])
-                d1 = float(swell_1_dir[t_idx])
-                if not (np.isnan(h1) or np.isnan(p1) or np.isnan(d1)):
-                    swells.append({
-                        'height_m': h1,
-                        'height_ft': h1 * 3.28084,
-                        'period_s': p1,
-                        'direction_deg': d1
-                    })
-
-                # Swell 2
-                h2 = float(swell_2_height[t_idx])
-                p2 = float(swell_2_period[t_idx])
-                d2 = float(swell_2_dir[t_idx])
-                if not (np.isnan(h2) or np.isnan(p2) or np.isnan(d2)):
-                    swells.append({
-                        'height_m': h2,
-                        'height_ft': h2 * 3.28084,
-                        'period_s': p2,
-                        'direction_deg': d2
-                    })
-
-                # Swell 3
-                h3 = float(swell_3_height[t_idx])
-                p3 = float(swell_3_period[t_idx])
-                d3 = float(swell_3_dir[t_idx])
-                if not (np.isnan(h3) or np.isnan(p3) or np.isnan(d3)):
-                    swells.append({
-                        'height_m': h3,
-                        'height_ft': h3 * 3.28084,
-                        'period_s': p3,
-                        'direction_deg': d3
-                    })
-
-                # Rank swells by impact
-                primary, secondary, tertiary = rank_swell_trains(swells)
-
-                # Calculate surf height from combined wave height
-                combined_height_m = float(combined_wave_height[t_idx])
-                if not np.isnan(combined_height_m):
-                    surf_min_ft, surf_max_ft = get_surf_height_range(combined_height_m)
-                    surf_min_ft, surf_max_ft = normalize_surf_range(surf_min_ft, surf_max_ft)
-                else:
-                    surf_min_ft = None
-                    surf_max_ft = None
-
-                # Calculate wave energy
-                if primary:
-                    wave_energy_kj = calculate_wave_energy_kj(primary['height_ft'], primary['period_s'])
-                else:
-                    wave_energy_kj = None
-
-                # Calculate wind direction (but not speed - will come from GFS Atmospheric for consistency)
-                wu = float(wind_u[t_idx])
-                wv = float(wind_v[t_idx])
-
-                if not (np.isnan(wu) or np.isnan(wv)):
-                    wind_direction = (270 - np.degrees(np.arctan2(wv, wu))) % 360
-                else:
-                    wind_direction = None
-
-                # NOTE: We no longer extract wind_speed_mph or wind_gust_mph from GFSwave
-                # because gustsfc is not available in this dataset, and mixing wind speed
-                # from GFSwave with wind gust from GFS Atmospheric causes inconsistencies
-                # (gust < speed in ~23% of records). Both will now come from GFS Atmospheric.
-
-                # Build record
-                record = {
-                    "grid_id": grid_id,
-                    "timestamp": timestamp_iso,
-                }
-
-                # Only include non-None values
-                def _set_if_value(key, value):
-                    if value is not None:
-                        record[key] = value
-
-                _set_if_value("primary_swell_height_ft", primary['height_ft'] if primary else None)
-                _set_if_value("primary_swell_period_s", primary['period_s'] if primary else None)
-                _set_if_value("primary_swell_direction", primary['direction_deg'] if primary else None)
-                _set_if_value("secondary_swell_height_ft", secondary['height_ft'] if secondary else None)
-                _set_if_value("secondary_swell_period_s", secondary['period_s'] if secondary else None)
-                _set_if_value("secondary_swell_direction", secondary['direction_deg'] if secondary else None)
-                _set_if_value("tertiary_swell_height_ft", tertiary['height_ft'] if tertiary else None)
-                _set_if_value("tertiary_swell_period_s", tertiary['period_s'] if tertiary else None)
-                _set_if_value("tertiary_swell_direction", tertiary['direction_deg'] if tertiary else None)
-                _set_if_value("surf_height_min_ft", surf_min_ft)
-                _set_if_value("surf_height_max_ft", surf_max_ft)
-                _set_if_value("wave_energy_kj", wave_energy_kj)
-                # wind_speed_mph and wind_gust_mph now come from GFS Atmospheric
-                _set_if_value("wind_direction_deg", wind_direction)
-                # wind_gust_mph now comes from GFS Atmospheric
-
-                records.append(record)
-
-            except Exception as e:
-                logger.debug(f"Error processing grid {grid_id} at time {t_idx}: {e}")
-                continue
-
-    logger.info(f"Extracted {len(records):,} records from {len(grid_points)} grid points")
+            logger.debug(f"   CDIP enhancement failed: {e}")
+
+    # Rank the three swell trains at every (time, point) by surf impact
+    heights_ft = heights * 3.28084
+    valid = ~(np.isnan(heights) | np.isnan(periods) | np.isnan(directions))
+    order, n_valid = rank_swell_train_arrays(heights_ft, periods, valid)
+    ranked = []
+    for rank in range(3):
+        present = n_valid > rank
+        pick = order[rank][None]
+        ranked.append(tuple(
+            np.where(present, np.take_along_axis(values, pick, axis=0)[0], np.nan)
+            for values in (heights_ft, periods, directions)
+        ))
+
+    # Surf height from combined wave height; energy from the primary swell
+    surf_min_ft, surf_max_ft = surf_height_range_array(combined_wave_height)
+    surf_min_ft = np.where(surf_max_ft <= 1.0, 0.0, surf_min_ft)
+    wave_energy_kj = surfline_energy_kj_index_array(ranked[0][0], ranked[0][1])
+
+    # NOTE: We no longer extract wind_speed_mph or wind_gust_mph from GFSwave
+    # because gustsfc is not available in this dataset, and mixing wind speed
+    # from GFSwave with wind gust from GFS Atmospheric causes inconsistencies
+    # (gust < speed in ~23% of records). Both will now come from GFS Atmospheric.
+    columns = [
+        ("primary_swell_height_ft", _object_matrix(ranked[0][0])),
+        ("primary_swell_period_s", _object_matrix(ranked[0][1])),
+        ("primary_swell_direction", _object_matrix(ranked[0][2])),
+        ("secondary_swell_height_ft", _object_matrix(ranked[1][0])),
+        ("secondary_swell_period_s", _object_matrix(ranked[1][1])),
+        ("secondary_swell_direction", _object_matrix(ranked[1][2])),
+        ("tertiary_swell_height_ft", _object_matrix(ranked[2][0])),
+        ("tertiary_swell_period_s", _object_matrix(ranked[2][1])),
+        ("tertiary_swell_direction", _object_matrix(ranked[2][2])),
+        ("surf_height_min_ft", _object_matrix(surf_min_ft)),
+        ("surf_height_max_ft", _object_matrix(surf_max_ft)),
+        ("wave_energy_kj", np.where(np.isnan(wave_energy_kj), None, np.nan_to_num(wave_energy_kj).astype(np.int64)).tolist()),
+        ("wind_direction_deg", _object_matrix(wind_direction)),
+    ]
+
+    # Build records (only non-None values, to preserve existing DB data)
+    records = []
+    for p, grid_point in enumerate(points):
+        grid_id = grid_point['id']
+        for t, timestamp_iso in enumerate(timestamp_isos):
+            record = {
+                "grid_id": grid_id,
+                "timestamp": timestamp_iso,
+            }
+            for key, values in columns:
+                value = values[t][p]
+                if value is not None:
+                    record[key] = value
+            records.append(record)
+
+    logger.info(f"Extracted {len(records):,} records from {len(points)} grid points")
     logger.info("=" * 80)
 
     return records
 
 
 def fetch_grid_points_from_db():
-    """Fetch all grid points from database."""
+    """Fetch all grid points from database (local snapshot when the table is unchanged)."""
     from database import supabase
 
     logger.info("Fetching grid points from database...")
-
-    try:
-        response = supabase.table("grid_points").select(
-            "id, latitude, longitude, latitude_index, longitude_index, region"
-        ).execute()
-
-        grid_points = response.data
-        logger.info(f"Found {len(grid_points)} grid points")
-        return grid_points
-
-    except Exception as e:
-        logger.error(f"Error fetching grid points: {e}")
-        return []
+    grid_points = load_reference_rows(supabase, "grid_points", GRID_POINT_COLUMNS)
+    logger.info(f"Found {len(grid_points)} grid points")
+    return grid_points
 
 
 def test_grid_extraction():
@@ -10,15 +10,14 @@ import math
 import xarray as xr
 import numpy as np
 import pandas as pd
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 import pytz
 
-from config import (
-    logger, NOAA_BASE_URLS, NOAA_VARS, NOAA_DATASET_TEST_DELAY,
-    NOAA_OCEAN_REQUEST_DELAY, NOAA_OCEAN_BATCH_DELAY, NOAA_RETRY_DELAY
-)
+from config import logger, NOAA_BASE_URLS, NOAA_VARS
+from circuit_breaker import get_breaker
+from model_discovery import discover_model_run
 from utils import (
-    enforce_noaa_rate_limit, safe_float, meters_to_feet, mps_to_mph,
+    enforce_noaa_rate_limit, report_rate_limited, safe_float, meters_to_feet, mps_to_mph,
     nonempty_record, normalize_surf_range
 )
 from swell_ranking import (
@@ -344,96 +343,114 @@ def calculate_cdip_wave_energy(cdip_data, site_idx, time_idx):
         logger.debug(f"   Error calculating CDIP wave energy: {e}")
         return None
   
-def interpolate_cdip_to_gfs_times(cdip_times, cdip_values, gfs_times):
-    """Interpolate CDIP data to match GFS 3-hour intervals."""
-    if len(cdip_values) == 0 or len(gfs_times) == 0:
-        return np.full(len(gfs_times), np.nan)
-    
-    # Convert to numeric timestamps for interpolation
-    cdip_numeric = pd.Series(cdip_times).astype('int64').values
-    gfs_numeric = pd.Series(gfs_times).astype('int64').values
-    
-    # Remove any NaN values from CDIP data
-    valid_mask = ~np.isnan(cdip_values)
-    if not np.any(valid_mask):
-        return np.full(len(gfs_times), np.nan)
-    
-    cdip_clean_times = cdip_numeric[valid_mask]
-    cdip_clean_values = cdip_values[valid_mask]
-    
-    # Interpolate to GFS times
-    interpolated = np.interp(gfs_numeric, cdip_clean_times, cdip_clean_values, 
-                           left=np.nan, right=np.nan)
-    
-    return interpolated
+class CdipAlignment:
+    """
+    CDIP -> GFS alignment built once per run: linear interpolation weights from the
+    CDIP time axis to the GFS time axis, and the nearest CDIP site for each entity.
+    Enhancing all beach groups / grid points is then one weighted gather over a
+    (variable, time, site) stack instead of one interpolation per entity and variable.
+    """
 
-def enhance_with_cdip_data(beach, grid_data, cdip_data):
-    """Enhance NOAA grid data with CDIP data for better accuracy."""
-    if cdip_data is None:
-        return grid_data  # Return original data if CDIP unavailable
-    
-    # Find nearest CDIP site (not exact point - closest available point)
-    cdip_idx = find_nearest_cdip_site(cdip_data, beach["LATITUDE"], beach["LONGITUDE"])
-    if cdip_idx is None:
-        logger.debug(f"   No suitable CDIP site for {beach['Name']} (lat={beach['LATITUDE']:.3f}, lon={beach['LONGITUDE']:.3f})")
-        return grid_data
-    
-    # Calculate distance for logging
-    distance_km = ((cdip_data['lats'][cdip_idx] - beach['LATITUDE'])**2 + 
-                   (cdip_data['lons'][cdip_idx] - beach['LONGITUDE'])**2)**0.5 * 111
-    
-    logger.debug(f"   Using CDIP site {cdip_idx} for {beach['Name']} "
-                f"(CDIP lat={cdip_data['lats'][cdip_idx]:.3f}, lon={cdip_data['lons'][cdip_idx]:.3f}, "
-                f"distance≈{distance_km:.1f}km)")
-    
-    # Extract CDIP data for this site
-    cdip_hs_m = cdip_data['hs_m'][:, cdip_idx]
-    cdip_tp_s = cdip_data['tp_s'][:, cdip_idx]
-    cdip_dp_deg = cdip_data['dp_deg'][:, cdip_idx]
-    
-    # Convert CDIP times to match GFS timezone (Pacific)
-    gfs_times_pacific = []
-    for ts in grid_data['time_vals']:
-        if hasattr(ts, 'tz_convert'):
-            pacific_time = ts.tz_convert("America/Los_Angeles")
+    NO_SITE = -1
+    # CDIP variables that replace GFSwave swell_1 (hs_m also replaces significant height)
+    SWELL_VARS = ('hs_m', 'tp_s', 'dp_deg')
+
+    def __init__(self, cdip_data, gfs_times):
+        """
+        Args:
+            cdip_data: Combined CDIP data from load_cdip_data()
+            gfs_times: GFS time axis (tz-aware, or naive UTC)
+        """
+        self.cdip_data = cdip_data
+        self.cdip_epochs = _epoch_seconds(cdip_data['times'])
+        self.gfs_epochs = _epoch_seconds(gfs_times)
+
+        # Bracketing CDIP samples and weight for every GFS time (same result as np.interp)
+        c, g = self.cdip_epochs, self.gfs_epochs
+        if c.size >= 2:
+            self.inside = (g >= c[0]) & (g <= c[-1])
+            self.hi = np.clip(np.searchsorted(c, g, side='left'), 1, c.size - 1)
+            self.lo = self.hi - 1
+            self.weight = (g - c[self.lo]) / (c[self.hi] - c[self.lo])
         else:
-            # Assume UTC and convert
-            pacific_time = pd.Timestamp(ts).tz_localize("UTC").tz_convert("America/Los_Angeles")
-        gfs_times_pacific.append(pacific_time)
-    
-    # Interpolate CDIP data to GFS 3-hour intervals
-    cdip_hs_interp = interpolate_cdip_to_gfs_times(cdip_data['times'], cdip_hs_m, gfs_times_pacific)
-    cdip_tp_interp = interpolate_cdip_to_gfs_times(cdip_data['times'], cdip_tp_s, gfs_times_pacific)
-    cdip_dp_interp = interpolate_cdip_to_gfs_times(cdip_data['times'], cdip_dp_deg, gfs_times_pacific)
-    
-    # Create enhanced grid data
+            self.inside = (g == c[0]) if c.size else np.zeros(g.size, dtype=bool)
+            self.lo = self.hi = np.zeros(g.size, dtype=np.int64)
+            self.weight = np.zeros(g.size)
+
+    def site_indices(self, coords):
+        """Nearest CDIP site for each (lat, lon) in one distance matrix; NO_SITE beyond ~25km."""
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        lats = np.asarray(self.cdip_data['lats'], dtype=np.float64)
+        lons = np.asarray(self.cdip_data['lons'], dtype=np.float64)
+        if coords.shape[0] == 0 or lats.size == 0:
+            return np.full(coords.shape[0], self.NO_SITE, dtype=np.int64)
+        distances = (lats[None, :] - coords[:, :1])**2 + (lons[None, :] - coords[:, 1:])**2
+        nearest = np.argmin(distances, axis=1)
+        # Same threshold as find_nearest_cdip_site()
+        too_far = distances[np.arange(coords.shape[0]), nearest] > 0.25
+        return np.where(too_far, self.NO_SITE, nearest).astype(np.int64)
+
+    def interpolate(self, sites, variables=SWELL_VARS):
+        """
+        CDIP `variables` at the GFS times for each entity's site.
+
+        Returns:
+            (variable, gfs time, entity) array, NaN outside the CDIP time range
+            and for entities without a site
+        """
+        sites = np.asarray(sites, dtype=np.int64)
+        out = np.full((len(variables), self.gfs_epochs.size, sites.size), np.nan)
+        has_site = sites != self.NO_SITE
+        if not np.any(has_site) or self.cdip_epochs.size == 0:
+            return out
+
+        unique_sites, columns = np.unique(sites[has_site], return_inverse=True)
+        stack = np.stack([np.asarray(self.cdip_data[var], dtype=np.float64)[:, unique_sites] for var in variables])
+        w = self.weight[None, :, None]
+        values = stack[:, self.lo, :] * (1.0 - w) + stack[:, self.hi, :] * w
+        values[:, ~self.inside, :] = np.nan
+
+        # Series with missing samples interpolate across the gaps between their valid samples
+        for v, s in np.argwhere(np.isnan(stack).any(axis=1)):
+            series = stack[v, :, s]
+            valid = ~np.isnan(series)
+            values[v, :, s] = (
+                np.interp(self.gfs_epochs, self.cdip_epochs[valid], series[valid], left=np.nan, right=np.nan)
+                if np.any(valid) else np.nan
+            )
+
+        out[:, :, has_site] = values[:, :, columns]
+        return out
+
+
+def _epoch_seconds(times):
+    """UTC epoch seconds (float) for a time axis; naive values are taken as UTC."""
+    index = pd.DatetimeIndex(pd.to_datetime(pd.Series(times), utc=True))
+    return ((index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64)
+
+
+def apply_cdip_swell(grid_data, cdip_hs, cdip_tp, cdip_dp):
+    """Copy of grid_data with swell_1 and significant height replaced where CDIP hs is valid."""
     enhanced_data = grid_data.copy()
-    
-    # Replace primary swell with CDIP data where available
-    valid_cdip = ~np.isnan(cdip_hs_interp)
+    valid_cdip = ~np.isnan(cdip_hs)
     if np.any(valid_cdip):
-        logger.debug(f"   Replacing {np.sum(valid_cdip)} timesteps with CDIP data for {beach['Name']}")
-        
-        # Convert CDIP height - it's already in meters, so keep in meters for consistency with NOAA
-        cdip_hs_for_noaa = cdip_hs_interp  # CDIP data is already in meters, no conversion needed
-        
-        # Replace swell_1 (primary) with CDIP data
-        enhanced_data['swell_1_height'] = np.where(valid_cdip, cdip_hs_for_noaa, grid_data['swell_1_height'])
-        enhanced_data['swell_1_period'] = np.where(valid_cdip, cdip_tp_interp, grid_data['swell_1_period'])
-        enhanced_data['swell_1_direction'] = np.where(valid_cdip, cdip_dp_interp, grid_data['swell_1_direction'])
-        
-        # Also update significant wave height with CDIP when available
-        enhanced_data['sig_wave_height'] = np.where(valid_cdip, cdip_hs_for_noaa, grid_data['sig_wave_height'])
-    
+        # CDIP height is already in meters, like NOAA
+        enhanced_data['swell_1_height'] = np.where(valid_cdip, cdip_hs, grid_data['swell_1_height'])
+        enhanced_data['swell_1_period'] = np.where(valid_cdip, cdip_tp, grid_data['swell_1_period'])
+        enhanced_data['swell_1_direction'] = np.where(valid_cdip, cdip_dp, grid_data['swell_1_direction'])
+        enhanced_data['sig_wave_height'] = np.where(valid_cdip, cdip_hs, grid_data['sig_wave_height'])
     return enhanced_data
 
+
 def test_noaa_url(url):
     """Test a single NOAA URL and return success/failure with details - RATE LIMITED."""
+    if not get_breaker("nomads").allow():
+        return False, "NOMADS circuit open"
     try:
         logger.info(f"      Testing: {url}")
         
         # Enforce rate limiting BEFORE each request
-        enforce_noaa_rate_limit(NOAA_OCEAN_REQUEST_DELAY)
+        enforce_noaa_rate_limit()
         
         try:
             # Try to open dataset with proper OpenDAP backend specification
@@ -453,6 +470,7 @@ def test_noaa_url(url):
             swell_shape = swell_var.shape
             
             ds_test.close()
+            get_breaker("nomads").record_success()
             logger.info(f"      SUCCESS: {time_len} time steps, swell shape: {swell_shape}")
             return True, f"Working dataset with {time_len} time steps"
             
@@ -461,8 +479,10 @@ def test_noaa_url(url):
             
             # Check if it's a rate limit error
             if 'rate limit' in error_str or 'over rate limit' in error_str or 'limit exceeded' in error_str:
-                logger.error(f"      RATE LIMITED by NOAA! Waiting {NOAA_RETRY_DELAY} seconds...")
-                time.sleep(NOAA_RETRY_DELAY)
+                # Trip the NOMADS breaker instead of sleeping out the penalty box
+                logger.error("      RATE LIMITED by NOAA! NOMADS circuit opened")
+                report_rate_limited()
+                get_breaker("nomads").record_failure(trip=True)
                 return False, "NOAA rate limit exceeded"
             else:
                 raise e
@@ -472,96 +492,40 @@ def test_noaa_url(url):
         
         # Check for HTML rate limit response in error message
         if 'over rate limit' in error_msg.lower() or 'doctype html' in error_msg.lower():
-            logger.error(f"      NOAA RATE LIMIT DETECTED! Must wait before retrying.")
-            logger.error(f"      Suggestion: Wait 1 hour before running again")
+            logger.error(f"      NOAA RATE LIMIT DETECTED! NOMADS circuit opened")
+            report_rate_limited()
+            get_breaker("nomads").record_failure(trip=True)
             return False, "NOAA rate limit - HTML response detected"
         
         logger.warning(f"      FAILED: {error_msg[:200]}")
         return False, error_msg
 
 def get_noaa_dataset_url():
-    """Get the current NOAA GFSwave dataset URL with RATE LIMITED testing."""
-    logger.info("   Searching for available NOAA GFSwave dataset (rate limited)...")
+    """Get the current NOAA GFSwave dataset URL (newest cycle whose .dds lists the swell variables)."""
+    logger.info("   Searching for available NOAA GFSwave dataset...")
     
     # Use UTC time for NOAA dataset dating (NOAA uses UTC for dataset naming)
     now_utc = datetime.now(timezone.utc)
-    today_str = now_utc.strftime("%Y%m%d")
-    
-    # Also show PST time for user reference
-    import pytz
-    pst = pytz.timezone('America/Los_Angeles')
-    now_pst = now_utc.astimezone(pst)
-    
     logger.info(f"   Current UTC time: {now_utc.isoformat()}")
-    logger.info(f"   Current PST time: {now_pst.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-    logger.info(f"   Using dataset date: {today_str} (UTC-based for NOAA compatibility)")
-    
-    runs_to_try = ["18z", "12z", "06z", "00z"]  # Try newest model cycles first
-
-    # Try today first
-    logger.info(f"   Trying today's data: {today_str}")
-    for base_url in NOAA_BASE_URLS:
-        logger.info(f"   Base URL: {base_url}")
-        for run in runs_to_try:
-            # CORRECTED URL FORMAT - includes the full dataset filename
-            url = f"{base_url}/{today_str}/gfswave.wcoast.0p16_{run}"
-            logger.info(f"   Testing URL: {url}")
-            success, message = test_noaa_url(url)
-            if success:
-                logger.info(f"   FOUND: Using {today_str} {run}")
-                return url
-            
-            # Add delay between tests to be extra conservative
-            time.sleep(NOAA_DATASET_TEST_DELAY)
     
-    # Try yesterday - REDUCED base URLs to minimize requests
-    yesterday_date = now_utc - timedelta(days=1)
-    yesterday_str = yesterday_date.strftime("%Y%m%d")
-    logger.info(f"   Trying yesterday's data: {yesterday_str}")
-    
-    # REDUCED: Only try first 2 base URLs
-    for base_url in NOAA_BASE_URLS[:2]:
-        logger.info(f"   Base URL: {base_url}")
-        for run in runs_to_try:
-            url = f"{base_url}/{yesterday_str}/gfswave.wcoast.0p16_{run}"
-            logger.info(f"   Testing URL: {url}")
-            success, message = test_noaa_url(url)
-            if success:
-                logger.info(f"   FOUND: Using {yesterday_str} {run} (yesterday)")
-                return url
-            
-            time.sleep(NOAA_DATASET_TEST_DELAY)
-    
-    # Try a few more days back - MINIMAL testing to reduce requests
-    logger.info("   Trying additional fallback dates...")
-    for days_back in [2, 3]:  # Reduced from [2,3,4] to minimize requests
-        fallback_date = now_utc - timedelta(days=days_back)
-        fallback_str = fallback_date.strftime("%Y%m%d")
-        logger.info(f"   Trying {days_back} days back: {fallback_str}")
-        
-        base_url = NOAA_BASE_URLS[0]
-        for run in runs_to_try:
-            url = f"{base_url}/{fallback_str}/gfswave.wcoast.0p16_{run}"
-            logger.info(f"   Testing URL: {url}")
-            success, message = test_noaa_url(url)
-            if success:
-                logger.info(f"   FOUND: Using {fallback_str} {run} ({days_back} days back)")
-                return url
-
-            time.sleep(NOAA_DATASET_TEST_DELAY)
+    url = discover_model_run(
+        "gfswave_wcoast",
+        lambda base_url, date_str, hour: f"{base_url}/{date_str}/gfswave.wcoast.0p16_{hour:02d}z",
+        NOAA_BASE_URLS,
+        required_vars=("time", "swell_2"),
+        now=now_utc,
+    )
+    if url:
+        return url
     
     # Comprehensive error message
     logger.error("   EXHAUSTED ALL OPTIONS:")
     logger.error(f"      Current UTC time: {now_utc.isoformat()}")
-    logger.error(f"      Tried dates: {today_str}, {yesterday_str}, and {days_back} days back")
     logger.error(f"      Tried base URLs: {len(NOAA_BASE_URLS)} different protocols")
-    logger.error(f"      Tried runs: {', '.join(runs_to_try)}")
     logger.error("      Possible causes:")
     logger.error("        - Network connectivity issues")
     logger.error("        - NOAA server maintenance")
     logger.error("        - OpenDAP service unavailable") 
-    logger.error("        - Firewall blocking OpenDAP protocol")
-    logger.error("        - Missing netcdf4 library (try: pip install netcdf4)")
     logger.error("        - Rate limit penalty box (wait 1+ hours)")
     logger.error("        - Dataset not yet available for today")
     
@@ -653,7 +617,7 @@ def find_nearest_ocean_point(ds, lat0, lon0, max_distance_deg=3.0):
 
     try:
         # Rate limit before bulk load (this is a large request that could trigger rate limits)
-        enforce_noaa_rate_limit(NOAA_OCEAN_REQUEST_DELAY)
+        enforce_noaa_rate_limit()
 
         # Define search area
         lat_min = lat0 - max_distance_deg
@@ -727,7 +691,7 @@ def load_noaa_dataset(url):
     logger.info("   Loading NOAA GFSwave dataset with rate limiting...")
 
     # Enforce rate limiting before dataset open
-    enforce_noaa_rate_limit(NOAA_OCEAN_REQUEST_DELAY)
+    enforce_noaa_rate_limit()
 
     try:
         # Load dataset with proper OpenDAP settings
@@ -806,6 +770,7 @@ def get_noaa_data_bulk_optimized(ds, beaches):
     
     # Step 2: Process each location group with rate limiting
     grid_data_cache = {}
+    representatives = {}
     
     group_count = 0
     for location_key, group_beaches in location_groups.items():
@@ -819,7 +784,7 @@ def get_noaa_data_bulk_optimized(ds, beaches):
         representative_beach = min(group_beaches, key=lambda b: b["LONGITUDE"])
 
         # Enforce rate limiting before grid point search
-        enforce_noaa_rate_limit(NOAA_OCEAN_REQUEST_DELAY)
+        enforce_noaa_rate_limit()
 
         # Find grid point for this location
         grid_lat, grid_lon = find_nearest_ocean_point(
@@ -835,7 +800,7 @@ def get_noaa_data_bulk_optimized(ds, beaches):
             logger.warning(f"   Representative beach failed for location {location_key}, trying up to {max_retries} more beaches...")
 
             for idx, beach in enumerate(group_beaches[:max_retries]):
-                enforce_noaa_rate_limit(NOAA_OCEAN_REQUEST_DELAY)
+                enforce_noaa_rate_limit()
                 grid_lat, grid_lon = find_nearest_ocean_point(
                     ds,
                     beach["LATITUDE"],
@@ -851,65 +816,74 @@ def get_noaa_data_bulk_optimized(ds, beaches):
             continue
         
         # Enforce rate limiting before bulk data extraction
-        enforce_noaa_rate_limit(NOAA_OCEAN_REQUEST_DELAY)
+        enforce_noaa_rate_limit()
         
         try:
             # BULK EXTRACT all variables for this grid point at once (SLICED to 7-day window)
-            grid_data = extract_grid_point_data(ds, grid_lat, grid_lon, sel_idx, filtered_time_vals)
-            
-            # ENHANCE with CDIP data for the first beach (representative)
-            enhanced_grid_data = enhance_with_cdip_data(representative_beach, grid_data, cdip_data)
-            
-            grid_data_cache[location_key] = enhanced_grid_data
-            logger.info(f"   Location {location_key} loaded and enhanced successfully")
+            grid_data_cache[location_key] = extract_grid_point_data(ds, grid_lat, grid_lon, sel_idx, filtered_time_vals)
+            representatives[location_key] = representative_beach
+            logger.info(f"   Location {location_key} loaded successfully")
             
         except Exception as e:
             logger.error(f"   Failed to load location {location_key}: {e}")
             grid_data_cache[location_key] = None
+
+    # ENHANCE every loaded group with CDIP at its representative beach: one alignment and one
+    # interpolation for all groups (all share the filtered GFS time axis)
+    if cdip_data is not None and representatives:
+        try:
+            alignment = CdipAlignment(cdip_data, filtered_time_vals)
+            keys = list(representatives)
+            sites = alignment.site_indices(
+                [(representatives[k]["LATITUDE"], representatives[k]["LONGITUDE"]) for k in keys]
+            )
+            cdip_hs, cdip_tp, cdip_dp = alignment.interpolate(sites)
+            for col, key in enumerate(keys):
+                grid_data_cache[key] = apply_cdip_swell(
+                    grid_data_cache[key], cdip_hs[:, col], cdip_tp[:, col], cdip_dp[:, col]
+                )
+            logger.info(f"   CDIP enhanced {int(np.sum(sites != CdipAlignment.NO_SITE))}/{len(keys)} location groups")
+        except Exception as e:
+            logger.warning(f"   CDIP enhancement failed, using GFSwave swell only: {e}")
         
-        # Add delay between location groups to be extra conservative
-        if group_count < len(location_groups):
-            logger.info(f"   Rate limiting: waiting {NOAA_OCEAN_BATCH_DELAY}s before next location...")
-            time.sleep(NOAA_OCEAN_BATCH_DELAY)
     
-    # Step 3: Process all beaches using cached grid data
+    # Step 3: Build records once per (location group, CDIP site) and fan them out to member beaches.
+    # Every beach in a group shares the same grid data, and the swell ranking / surf / wind math
+    # does not depend on the beach itself, so only beach_id (and the CDIP site) differ.
     logger.info("   Processing all beaches using cached and enhanced grid data...")
     processing_start = time.time()
     all_records = []
-    beach_count_total = sum(len(beaches) for beaches in location_groups.values())
     beaches_processed = 0
+    blocks_built = 0
 
     for location_key, group_beaches in location_groups.items():
         if location_key not in grid_data_cache or grid_data_cache[location_key] is None:
             continue
-            
-        base_grid_data = grid_data_cache[location_key]
-        
-        for beach in group_beaches:
-            try:
-                # OPTIMIZATION: Reuse base_grid_data (already CDIP-enhanced for the location group)
-                # instead of re-enhancing for each beach individually. Beaches in the same
-                # location group are within ~6-7 miles and can share CDIP data.
 
-                # Process this beach using the shared enhanced grid data
-                beach_records = process_beach_with_cached_data(
-                    beach, base_grid_data, location_key, cdip_data
-                )
-                all_records.extend(beach_records)
-                beaches_processed += 1
+        base_grid_data = grid_data_cache[location_key]
 
-                # Progress logging every 10 beaches
-                if beaches_processed % 10 == 0:
-                    elapsed = time.time() - processing_start
-                    rate = beaches_processed / elapsed if elapsed > 0 else 0
-                    logger.info(f"   Progress: {beaches_processed}/{beach_count_total} beaches processed ({rate:.1f} beaches/sec)")
+        members_by_site = {}
+        for beach in group_beaches:
+            members_by_site.setdefault(_cdip_site_for_beach(beach, cdip_data), []).append(beach)
 
+        for cdip_idx, members in members_by_site.items():
+            try:
+                block = build_location_records(base_grid_data, cdip_data, cdip_idx)
+                blocks_built += 1
             except Exception as e:
-                logger.error(f"   Error processing {beach['Name']} with cached data: {e}")
-                beaches_processed += 1
+                logger.error(f"   Error processing location {location_key} with cached data: {e}")
+                beaches_processed += len(members)
+                continue
+
+            for beach in members:
+                all_records.extend({"beach_id": beach["id"], **record} for record in block)
+            beaches_processed += len(members)
 
     processing_time = time.time() - processing_start
-    logger.info(f"   Beach processing complete: {beaches_processed} beaches in {processing_time:.2f}s ({beaches_processed/processing_time:.1f} beaches/sec)")
+    logger.info(
+        f"   Beach processing complete: {beaches_processed} beaches from {blocks_built} unique "
+        f"(grid cell, CDIP site) blocks in {processing_time:.2f}s"
+    )
 
     # Identify beaches with no NOAA records and backfill from nearest neighbor that has data.
     records_by_beach = {}
@@ -1072,20 +1046,29 @@ def extract_grid_point_data(ds, grid_lat, grid_lon, sel_idx, filtered_time_vals)
         logger.error(f"Error extracting grid point data at {grid_lat}, {grid_lon}: {e}")
         raise
 
+def _cdip_site_for_beach(beach, cdip_data):
+    """CDIP site whose spectra feed a beach's wave energy (None when no spectra are loaded)."""
+    if not cdip_data or cdip_data.get('wave_energy_density') is None:
+        return None
+    return find_nearest_cdip_site(cdip_data, beach["LATITUDE"], beach["LONGITUDE"])
+
 def process_beach_with_cached_data(beach, grid_data, grid_key, cdip_data=None):
     """
     Process a single beach using pre-loaded and CDIP-enhanced grid data.
+    Thin wrapper over build_location_records that stamps the beach_id.
+    """
+    cdip_idx = _cdip_site_for_beach(beach, cdip_data)
+    return [
+        {"beach_id": beach["id"], **record}
+        for record in build_location_records(grid_data, cdip_data, cdip_idx)
+    ]
+
+def build_location_records(grid_data, cdip_data=None, cdip_idx=None):
+    """
+    Build forecast records (without beach_id) for one grid cell and CDIP site.
     FIXED: Store timestamps aligned to Pacific 3-hour intervals (0, 3, 6, 9, 12, 15, 18, 21).
     Enhanced: Use CDIP spectral energy density when available.
     """
-    beach_id = beach["id"]
-    name = beach["Name"]
-    lat0 = beach["LATITUDE"]
-    lon0 = beach["LONGITUDE"]
-    
-    # Find CDIP site for this specific beach
-    cdip_idx = find_nearest_cdip_site(cdip_data, lat0, lon0) if cdip_data else None
-    
     records = []
     time_vals = grid_data['time_vals']
     
@@ -1131,24 +1114,18 @@ def process_beach_with_cached_data(beach, grid_data, grid_key, cdip_data=None):
                 'height_ft': safe_float(meters_to_feet(swell1_height_m)) if swell1_height_m is not None else None,
                 'period_s': safe_float(swell1_period_s),
                 'direction_deg': safe_float(swell1_direction),
-                'beach_lat': lat0,
-                'beach_lon': lon0,
                 'source': 'swell_1_cdip_enhanced'  # Indicate CDIP enhancement
             },
             {
                 'height_ft': safe_float(meters_to_feet(swell2_height_m)) if swell2_height_m is not None else None,
                 'period_s': safe_float(swell2_period_s),
                 'direction_deg': safe_float(swell2_direction),
-                'beach_lat': lat0,
-                'beach_lon': lon0,
                 'source': 'swell_2'
             },
             {
                 'height_ft': safe_float(meters_to_feet(swell3_height_m)) if swell3_height_m is not None else None,
                 'period_s': safe_float(swell3_period_s),
                 'direction_deg': safe_float(swell3_direction),
-                'beach_lat': lat0,
-                'beach_lon': lon0,
                 'source': 'swell_3'
             }
         ]
@@ -1214,7 +1191,6 @@ def process_beach_with_cached_data(beach, grid_data, grid_key, cdip_data=None):
 
 
         record = {
-            "beach_id": beach_id,
             "timestamp": final_timestamp,  # Clean Pacific intervals: 00:00, 03:00, 06:00, etc.
         }
 
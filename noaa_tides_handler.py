@@ -9,17 +9,25 @@ No API key required - free for commercial use
 
 import time
 import requests
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import pytz
+import numpy as np
 import pandas as pd
 import math
 
-from config import logger, TIDE_ADJUSTMENT_FT
-from utils import safe_float, celsius_to_fahrenheit
+from config import logger, TIDE_ADJUSTMENT_FT, TIDE_SOURCE
+from utils import celsius_to_fahrenheit
+from rate_limiter import limited_get
+from forecast_frame import ForecastFrame, as_forecast_frame, frame_like_input
+from timestamps import INVALID_EPOCH, PACIFIC_TZ, to_epoch
+from tide_harmonics import load_station_constants, predict_tides
 
 COOPS_BASE_URL = "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter"
 
+# A station value is only used for timestamps within this distance of a real sample
+SERIES_MAX_GAP_SECONDS = 90 * 60
+
 # California coastal tide stations (ID: (lat, lon, name))
 CA_TIDE_STATIONS = {
     "9410170": (32.7150, -117.1733, "San Diego"),
@@ -105,7 +113,7 @@ def get_tide_predictions(
     }
 
     try:
-        response = requests.get(COOPS_BASE_URL, params=params, timeout=15)
+        response = limited_get(COOPS_BASE_URL, params=params, timeout=15)
         response.raise_for_status()
         data = response.json()
 
@@ -143,7 +151,7 @@ def get_water_temperature(
     }
 
     try:
-        response = requests.get(COOPS_BASE_URL, params=params, timeout=15)
+        response = limited_get(COOPS_BASE_URL, params=params, timeout=15)
         response.raise_for_status()
         data = response.json()
 
@@ -158,52 +166,75 @@ def get_water_temperature(
         return []
 
 
+def _station_series(entries: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    CO-OPS entries ('t' local time, 'v' value) as sorted epoch / value arrays.
+
+    Returns:
+        (int64 epoch seconds, float64 values); unparseable entries are dropped
+    """
+    if not entries:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+    # Times are already in local timezone from the API (lst_ldt)
+    epochs = to_epoch([entry.get("t") for entry in entries], naive_tz=PACIFIC_TZ)
+    values = pd.to_numeric(pd.Series([entry.get("v") for entry in entries], dtype=object), errors="coerce")
+    values = values.to_numpy(dtype=np.float64)
+    keep = (epochs != INVALID_EPOCH) & np.isfinite(values)
+    order = np.argsort(epochs[keep], kind="stable")
+    return epochs[keep][order], values[keep][order]
+
+
+def _interp_series(epochs: np.ndarray, values: np.ndarray, targets: np.ndarray,
+                   max_gap_seconds: int = SERIES_MAX_GAP_SECONDS) -> np.ndarray:
+    """
+    Linearly interpolate a sorted station series onto `targets`.
+
+    Targets farther than `max_gap_seconds` from every sample (outside the
+    series or inside an outage) are NaN.
+    """
+    result = np.full(len(targets), np.nan)
+    if epochs.size == 0 or len(targets) == 0:
+        return result
+
+    result[:] = np.interp(targets, epochs, values)
+    pos = np.searchsorted(epochs, targets)
+    left = epochs[np.clip(pos - 1, 0, epochs.size - 1)]
+    right = epochs[np.clip(pos, 0, epochs.size - 1)]
+    nearest = np.minimum(np.abs(targets - left), np.abs(right - targets))
+    result[nearest > max_gap_seconds] = np.nan
+    return result
+
+
 def get_noaa_tides_supplement_data(
     beaches: List[Dict],
-    existing_records: List[Dict]
-) -> List[Dict]:
+    existing_records: Union[List[Dict], ForecastFrame]
+) -> Union[List[Dict], ForecastFrame]:
     """
     Supplement missing tide and water temperature fields using NOAA CO-OPS.
+    With TIDE_SOURCE=harmonic, tides are computed locally from station harmonic
+    constants (tide_harmonics.py) where available; water temperature observations
+    are always downloaded.
 
     Args:
         beaches: List of beach dicts with id, LATITUDE, LONGITUDE
-        existing_records: List of forecast records with potential null fields
+        existing_records: Forecast records (or a ForecastFrame) with potential null fields
 
     Returns:
-        Updated records with tide/water temp data filled in
+        Updated records with tide/water temp data filled in, in the same form as passed
     """
-    logger.info("   NOAA Tides supplement: fetching tide predictions...")
-
-    # Build mapping of all timestamps by beach (fill everything, not just missing)
-    needed_by_beach = {}
-
-    for rec in existing_records:
-        bid = rec.get("beach_id")
-        ts_iso = rec.get("timestamp")
-        if not bid or not ts_iso:
-            continue
-
-        if bid not in needed_by_beach:
-            needed_by_beach[bid] = set()
-        needed_by_beach[bid].add(ts_iso)
+    logger.info("   NOAA Tides supplement: building tide predictions...")
 
-    if not needed_by_beach:
+    frame = as_forecast_frame(existing_records)
+    if len(frame) == 0:
         logger.info("   NOAA Tides supplement: no records to process")
         return existing_records
 
-    # Build index for quick updates
-    updated_records = list(existing_records)
-    key_to_index = {f"{r['beach_id']}_{r['timestamp']}": idx for idx, r in enumerate(updated_records)}
-
     # Find date range needed
     pacific = pytz.timezone("America/Los_Angeles")
-    all_timestamps = set()
-    for timestamps in needed_by_beach.values():
-        all_timestamps.update(timestamps)
-
-    timestamps_dt = [datetime.fromisoformat(ts) for ts in all_timestamps]
-    min_time = min(timestamps_dt)
-    max_time = max(timestamps_dt)
+    epochs = frame.epochs
+    min_time = datetime.fromtimestamp(int(epochs.min()), tz=pacific)
+    max_time = datetime.fromtimestamp(int(epochs.max()), tz=pacific)
 
     begin_date = min_time.strftime("%Y%m%d")
     end_date = (max_time + timedelta(days=1)).strftime("%Y%m%d")
@@ -211,125 +242,65 @@ def get_noaa_tides_supplement_data(
     logger.info(f"   NOAA Tides: fetching data from {begin_date} to {end_date}")
 
     # Process each beach
-    target_beaches = [b for b in beaches if b["id"] in needed_by_beach]
+    needed_ids = set(frame.entity_ids.tolist())
+    target_beaches = [b for b in beaches if b["id"] in needed_ids]
     logger.info(f"   NOAA Tides supplement: processing {len(target_beaches)} beaches...")
 
-    # Group beaches by nearest station to avoid duplicate API calls
-    beaches_by_station = {}
+    # Nearest station per beach (one download / prediction per station, not per beach)
+    entity_station = {}
     for beach in target_beaches:
-        lat = beach["LATITUDE"]
-        lon = beach["LONGITUDE"]
-
-        station_info = find_nearest_tide_station(lat, lon)
-        if not station_info:
-            continue
-
-        station_id, distance = station_info
-        if station_id not in beaches_by_station:
-            beaches_by_station[station_id] = []
-        beaches_by_station[station_id].append(beach)
-
-    logger.info(f"   NOAA Tides: using {len(beaches_by_station)} tide stations")
+        station_info = find_nearest_tide_station(beach["LATITUDE"], beach["LONGITUDE"])
+        if station_info:
+            entity_station[beach["id"]] = station_info[0]
+    station_ids = sorted(set(entity_station.values()))
+
+    logger.info(f"   NOAA Tides: using {len(station_ids)} tide stations")
+
+    # Station x needed-timestamp matrices; every record reads one cell of each
+    targets, target_idx = np.unique(epochs, return_inverse=True)
+    tide = np.full((len(station_ids), len(targets)), np.nan)
+    water_temp = np.full_like(tide, np.nan)
+
+    # Tides from harmonic constants at the needed timestamps: all stations in one evaluation
+    constants = {}
+    if TIDE_SOURCE == "harmonic" and station_ids:
+        constants = load_station_constants(station_ids)
+        tide = predict_tides(station_ids, targets, constants) + TIDE_ADJUSTMENT_FT
+        logger.info(f"   NOAA Tides: harmonic predictions for {len(constants)}/{len(station_ids)} stations")
+
+    for row, station_id in enumerate(station_ids):
+        if station_id not in constants:
+            # No harmonic constants: interpolate CO-OPS hourly predictions
+            tide_epochs, tide_values = _station_series(get_tide_predictions(station_id, begin_date, end_date))
+            tide[row] = _interp_series(tide_epochs, tide_values + TIDE_ADJUSTMENT_FT, targets)
+
+        # Water temperature observations (Celsius -> Fahrenheit)
+        temp_epochs, temp_c = _station_series(get_water_temperature(station_id, begin_date, end_date))
+        water_temp[row] = _interp_series(temp_epochs, celsius_to_fahrenheit(temp_c), targets)
+
+    # Broadcast station rows to every record by array indexing
+    station_row = {station_id: row for row, station_id in enumerate(station_ids)}
+    codes, entities = pd.factorize(frame.entity_ids)
+    entity_rows = np.array([station_row.get(entity_station.get(e), -1) for e in entities] + [-1], dtype=np.int64)
+    rows = entity_rows[codes]  # code -1 (missing id) lands on the trailing -1
+    has_station = rows >= 0
 
     filled_count = 0
-
-    # Fetch data per station (much more efficient)
-    for station_id, station_beaches in beaches_by_station.items():
-        # Fetch tide predictions (no rate limiting - NOAA CO-OPS has generous limits)
-        tide_data = get_tide_predictions(station_id, begin_date, end_date)
-
-        # Fetch water temperature
-        water_temp_data = get_water_temperature(station_id, begin_date, end_date)
-
-        # Build lookup tables
-        tide_by_time = {}
-        for entry in tide_data:
-            try:
-                t_str = entry["t"]
-                v_str = entry["v"]
-
-                # Parse time (already in local timezone from API)
-                dt = datetime.strptime(t_str, "%Y-%m-%d %H:%M")
-                dt_local = pacific.localize(dt)
-
-                # Align to 3-hour intervals (DST-safe using Timestamp constructor)
-                local_hour = dt_local.hour
-                pacific_intervals = [0, 3, 6, 9, 12, 15, 18, 21]
-                closest_interval = min(pacific_intervals, key=lambda x: abs(x - local_hour))
-
-                # Use Timestamp constructor to handle DST properly
-                clean_time = pd.Timestamp(
-                    year=dt_local.year,
-                    month=dt_local.month,
-                    day=dt_local.day,
-                    hour=closest_interval,
-                    minute=0,
-                    second=0,
-                    tz="America/Los_Angeles"
-                )
-
-                ts_iso = clean_time.isoformat()
-                tide_by_time[ts_iso] = float(v_str) + TIDE_ADJUSTMENT_FT
-
-            except (ValueError, KeyError) as e:
-                continue
-
-        water_temp_by_time = {}
-        for entry in water_temp_data:
-            try:
-                t_str = entry["t"]
-                v_str = entry["v"]
-
-                dt = datetime.strptime(t_str, "%Y-%m-%d %H:%M")
-                dt_local = pacific.localize(dt)
-
-                # Align to 3-hour intervals (DST-safe using Timestamp constructor)
-                local_hour = dt_local.hour
-                pacific_intervals = [0, 3, 6, 9, 12, 15, 18, 21]
-                closest_interval = min(pacific_intervals, key=lambda x: abs(x - local_hour))
-
-                # Use Timestamp constructor to handle DST properly
-                clean_time = pd.Timestamp(
-                    year=dt_local.year,
-                    month=dt_local.month,
-                    day=dt_local.day,
-                    hour=closest_interval,
-                    minute=0,
-                    second=0,
-                    tz="America/Los_Angeles"
-                )
-
-                ts_iso = clean_time.isoformat()
-                # Convert Celsius to Fahrenheit
-                water_temp_by_time[ts_iso] = celsius_to_fahrenheit(float(v_str))
-
-            except (ValueError, KeyError):
-                continue
-
-        # Apply to all beaches using this station
-        for beach in station_beaches:
-            bid = beach["id"]
-
-            for ts_iso in needed_by_beach[bid]:
-                key = f"{bid}_{ts_iso}"
-                idx = key_to_index.get(key)
-                if idx is None:
-                    continue
-
-                rec = updated_records[idx]
-
-                # Fill tide level (overwrite existing data)
-                if ts_iso in tide_by_time:
-                    rec["tide_level_ft"] = safe_float(tide_by_time[ts_iso])
-                    filled_count += 1
-
-                # Fill water temperature (overwrite existing data)
-                if ts_iso in water_temp_by_time:
-                    rec["water_temp_f"] = safe_float(water_temp_by_time[ts_iso])
-                    filled_count += 1
+    if has_station.any():
+        r, c = rows[has_station], target_idx[has_station]
+        source = ForecastFrame.from_arrays(
+            frame.entity_ids[has_station],
+            epochs[has_station],
+            {
+                "tide_level_ft": tide[r, c],
+                "water_temp_f": water_temp[r, c],
+            },
+        )
+        # Overwrite existing data: CO-OPS is the authoritative tide/water temp source
+        filled_count = frame.fill_missing(["tide_level_ft", "water_temp_f"], source, overwrite=True)
 
     logger.info(f"   NOAA Tides supplement: filled {filled_count} field values")
-    return updated_records
+    return frame_like_input(frame, existing_records)
 
 
 def test_noaa_tides_connection() -> bool:
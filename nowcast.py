@@ -9,22 +9,22 @@ import sys
 import xarray as xr
 import numpy as np
 import pandas as pd
-import pytz
 from datetime import datetime, timezone
 from supabase import create_client, Client
 from typing import List, Dict, Optional, Tuple, Set
 
 # Import your existing config and database utilities
 try:
-    from config import SUPABASE_URL, SUPABASE_KEY, logger, UPSERT_CHUNK
+    from config import SUPABASE_URL, SUPABASE_KEY, logger, UPSERT_CHUNK, DAYS_FORECAST
     from utils import chunk_iter, safe_float, normalize_surf_range
-    from database import supabase  # Use existing supabase client
+    from database import supabase, refresh_daily_surf_intensity  # Use existing supabase client
 except ImportError:
     print("ERROR: Could not import required modules - make sure config.py, utils.py, and database.py are available")
     sys.exit(1)
 
 # Use the same compact surf-range logic used elsewhere
 from swell_ranking import get_surf_height_range, calculate_wave_energy_kj
+from timestamps import INVALID_EPOCH, PACIFIC_TZ, epoch_to_pacific_date, nearest_within, pacific_horizon_dates, to_epoch
 
 # Configuration
 CDIP_NOWCAST_URLS = {
@@ -34,7 +34,6 @@ CDIP_NOWCAST_URLS = {
 
 # Constants
 M_TO_FT = 3.28084
-PACIFIC_TZ = pytz.timezone('America/Los_Angeles')
 
 def load_cdip_nowcast_dataset(url: str, region_name: str) -> Optional[Dict]:
     """Load a single CDIP nowcast dataset."""
@@ -259,18 +258,20 @@ def update_records_with_cdip_nowcast(existing_records: List[Dict], beaches: List
     updated_records = []
     updated_dates: Set[str] = set()
     
-    for record in existing_records:
+    # Canonicalize timestamps once (naive values are Pacific); match on epoch seconds
+    record_epochs = to_epoch([r.get('timestamp') for r in existing_records], naive_tz=PACIFIC_TZ)
+    record_dates = epoch_to_pacific_date(record_epochs)
+    cdip_epochs = to_epoch(cdip_data['times'])
+    # Nearest CDIP time within 1 hour of every record, one binary search each
+    cdip_matches = nearest_within(cdip_epochs, record_epochs, 3600)
+    
+    for record, record_epoch, record_date, cdip_match in zip(existing_records, record_epochs.tolist(), record_dates, cdip_matches.tolist()):
         updated_record = record.copy()
         
         try:
             beach_id = record['beach_id']
-            record_timestamp = pd.Timestamp(record['timestamp'])
-            
-            # Ensure timezone awareness in Pacific time
-            if record_timestamp.tz is None:
-                record_timestamp = record_timestamp.tz_localize("America/Los_Angeles")
-            else:
-                record_timestamp = record_timestamp.tz_convert("America/Los_Angeles")
+            if record_epoch == INVALID_EPOCH:
+                raise ValueError(f"invalid timestamp {record.get('timestamp')!r}")
             
             beach = beach_lookup.get(beach_id)
             if not beach:
@@ -283,13 +284,8 @@ def update_records_with_cdip_nowcast(existing_records: List[Dict], beaches: List
                 updated_records.append(updated_record)
                 continue
             
-            # Find matching CDIP timestamp (within 1 hour tolerance)
-            matching_time_idx = None
-            for idx, cdip_time in enumerate(cdip_data['times']):
-                time_diff = abs((cdip_time - record_timestamp).total_seconds())
-                if time_diff <= 3600:  # Within 1 hour
-                    matching_time_idx = idx
-                    break
+            # Matching CDIP timestamp (nearest within 1 hour)
+            matching_time_idx = cdip_match if cdip_match >= 0 else None
             
             if matching_time_idx is None:
                 updated_records.append(updated_record)
@@ -327,8 +323,8 @@ def update_records_with_cdip_nowcast(existing_records: List[Dict], beaches: List
             
             # Keep ALL other existing fields (wind, weather, secondary swells, etc.)
             updated_count += 1
-            updated_dates.add(record_timestamp.date().isoformat())
-            logger.debug(f"Updated record for beach {beach_id} at {record_timestamp}")
+            updated_dates.add(record_date)
+            logger.debug(f"Updated record for beach {beach_id} at {record['timestamp']}")
             
         except Exception as e:
             logger.error(f"Error updating record for beach {record.get('beach_id')}: {e}")
@@ -398,54 +394,21 @@ def delete_previous_day_surf_intensity():
         today = now_pacific.date().isoformat()
 
         logger.info(f"Deleting all surf intensity data before {today}")
-        supabase.table("daily_beach_surf_intensity").delete().lt(
+        supabase.table("daily_beach_surf_intensity").delete(returning="minimal").lt(
             "date", today
         ).execute()
         logger.info(f"Deleted all previous surf intensity records")
     except Exception as e:
         logger.error(f"Failed to delete previous day's surf intensity: {e}")
 
-def get_all_forecast_dates() -> Set[str]:
-    """Get all unique dates that exist in the forecast_data table."""
-    try:
-        logger.info("Fetching all unique forecast dates...")
-        response = supabase.table("forecast_data").select("timestamp").execute()
-
-        if not response.data:
-            logger.warning("No forecast data found")
-            return set()
-
-        # Extract unique dates from timestamps
-        dates = set()
-        for record in response.data:
-            timestamp = pd.Timestamp(record['timestamp'])
-            if timestamp.tz is None:
-                timestamp = timestamp.tz_localize("America/Los_Angeles")
-            else:
-                timestamp = timestamp.tz_convert("America/Los_Angeles")
-            dates.add(timestamp.date().isoformat())
-
-        logger.info(f"Found {len(dates)} unique forecast dates")
-        return dates
-    except Exception as e:
-        logger.error(f"Failed to fetch forecast dates: {e}")
-        return set()
-
 def refresh_daily_surf_intensity_for_dates(target_dates: Set[str]):
-    """Invoke Supabase routine to refresh aggregated surf intensity for each target date."""
+    """Refresh aggregated surf intensity for all target dates in one batched Supabase call."""
     if not target_dates:
         logger.info("No target dates to refresh for daily surf intensity")
         return
 
-    for target_date in sorted(target_dates):
-        try:
-            logger.info(f"Refreshing daily surf intensity for {target_date}")
-            supabase.rpc(
-                "refresh_daily_beach_surf_intensity",
-                {"target_date": target_date}
-            ).execute()
-        except Exception as e:
-            logger.error(f"Failed to refresh daily surf intensity for {target_date}: {e}")
+    logger.info(f"Refreshing daily surf intensity for {len(target_dates)} dates")
+    refresh_daily_surf_intensity("refresh_daily_beach_surf_intensity", target_dates)
 
 def create_cdip_nowcast_records(beaches: List[Dict], cdip_data: Dict) -> List[Dict]:
     """Create nowcast records for all beaches and timestamps - REPLACES existing data."""
@@ -613,14 +576,14 @@ def main():
             return False
 
         # Update existing records with CDIP nowcast data (preserves all other data)
-        updated_records, _updated_dates = update_records_with_cdip_nowcast(existing_records, beaches, combined_cdip_data)
+        updated_records, updated_dates = update_records_with_cdip_nowcast(existing_records, beaches, combined_cdip_data)
 
         # Selectively update only the modified records
         selective_upsert_cdip_updates(updated_records)
 
-        # Get all dates in forecast table and refresh daily surf intensity for all
-        all_forecast_dates = get_all_forecast_dates()
-        refresh_daily_surf_intensity_for_dates(all_forecast_dates)
+        # Refresh the dates we just wrote plus the forecast horizon (the forecast
+        # pipelines write those days but leave the rollup to this job)
+        refresh_daily_surf_intensity_for_dates(updated_dates | set(pacific_horizon_dates(DAYS_FORECAST)))
 
         logger.info("CDIP nowcast selective update completed successfully")
         return True
@@ -9,21 +9,20 @@ import sys
 import xarray as xr
 import numpy as np
 import pandas as pd
-import pytz
-from datetime import datetime, timezone
 from typing import List, Dict, Optional, Tuple, Set
 
 # Import shared configuration and utilities
 try:
-    from config import SUPABASE_URL, SUPABASE_KEY, logger, UPSERT_CHUNK
+    from config import logger, UPSERT_CHUNK, DAYS_FORECAST
     from utils import chunk_iter, safe_float, normalize_surf_range
-    from database import supabase  # Shared Supabase client
+    from database import supabase, refresh_daily_surf_intensity  # Shared Supabase client
 except ImportError:
     print("ERROR: Could not import required modules - ensure config.py, utils.py, and database.py are available")
     sys.exit(1)
 
 from swell_ranking import get_surf_height_range, calculate_wave_energy_kj
 from noaa_grid_handler import fetch_grid_points_from_db
+from timestamps import INVALID_EPOCH, PACIFIC_TZ, epoch_to_pacific_date, nearest_within, pacific_horizon_dates, to_epoch
 
 # Configuration
 CDIP_NOWCAST_URLS = {
@@ -33,7 +32,6 @@ CDIP_NOWCAST_URLS = {
 
 # Constants
 M_TO_FT = 3.28084
-PACIFIC_TZ = pytz.timezone('America/Los_Angeles')
 GRID_FORECAST_TABLE = "grid_forecast_data"
 GRID_DAILY_TABLE = "daily_grid_surf_intensity"
 GRID_REFRESH_FUNCTION = "refresh_daily_grid_surf_intensity"
@@ -232,17 +230,20 @@ def update_grid_records_with_cdip_nowcast(existing_records: List[Dict], grid_poi
     updated_records = []
     updated_dates: Set[str] = set()
 
-    for record in existing_records:
+    # Canonicalize timestamps once (naive values are Pacific); match on epoch seconds
+    record_epochs = to_epoch([r.get('timestamp') for r in existing_records], naive_tz=PACIFIC_TZ)
+    record_dates = epoch_to_pacific_date(record_epochs)
+    cdip_epochs = to_epoch(cdip_data['times'])
+    # Nearest CDIP time within 1 hour of every record, one binary search each
+    cdip_matches = nearest_within(cdip_epochs, record_epochs, 3600)
+
+    for record, record_epoch, record_date, cdip_match in zip(existing_records, record_epochs.tolist(), record_dates, cdip_matches.tolist()):
         updated_record = record.copy()
 
         try:
             grid_id = record[GRID_ID_FIELD]
-            record_timestamp = pd.Timestamp(record['timestamp'])
-
-            if record_timestamp.tz is None:
-                record_timestamp = record_timestamp.tz_localize("America/Los_Angeles")
-            else:
-                record_timestamp = record_timestamp.tz_convert("America/Los_Angeles")
+            if record_epoch == INVALID_EPOCH:
+                raise ValueError(f"invalid timestamp {record.get('timestamp')!r}")
 
             grid_point = grid_lookup.get(grid_id)
             if not grid_point or grid_point["LATITUDE"] is None or grid_point["LONGITUDE"] is None:
@@ -254,12 +255,7 @@ def update_grid_records_with_cdip_nowcast(existing_records: List[Dict], grid_poi
                 updated_records.append(updated_record)
                 continue
 
-            matching_time_idx = None
-            for idx, cdip_time in enumerate(cdip_data['times']):
-                time_diff = abs((cdip_time - record_timestamp).total_seconds())
-                if time_diff <= 3600:
-                    matching_time_idx = idx
-                    break
+            matching_time_idx = cdip_match if cdip_match >= 0 else None
 
             if matching_time_idx is None:
                 updated_records.append(updated_record)
@@ -288,8 +284,8 @@ def update_grid_records_with_cdip_nowcast(existing_records: List[Dict], grid_poi
             })
 
             updated_count += 1
-            updated_dates.add(record_timestamp.date().isoformat())
-            logger.debug(f"Updated record for grid_id {grid_id} at {record_timestamp}")
+            updated_dates.add(record_date)
+            logger.debug(f"Updated record for grid_id {grid_id} at {record['timestamp']}")
 
         except Exception as e:
             logger.error(f"Error updating record for grid_id {record.get(GRID_ID_FIELD)}: {e}")
@@ -360,7 +356,7 @@ def delete_previous_day_grid_surf_intensity():
         today = now_pacific.date().isoformat()
 
         logger.info(f"Deleting all grid surf intensity data before {today}")
-        supabase.table(GRID_DAILY_TABLE).delete().lt(
+        supabase.table(GRID_DAILY_TABLE).delete(returning="minimal").lt(
             "date", today
         ).execute()
         logger.info("Deleted previous grid surf intensity records")
@@ -368,65 +364,14 @@ def delete_previous_day_grid_surf_intensity():
         logger.error(f"Failed to delete previous grid surf intensity: {e}")
 
 
-def get_all_grid_forecast_dates(table_name: str = GRID_FORECAST_TABLE) -> Set[str]:
-    """Get all unique dates that exist in the grid forecast table."""
-    try:
-        logger.info("Fetching all unique grid forecast dates...")
-        page_size = 1000
-        start = 0
-        dates: Set[str] = set()
-
-        while True:
-            end = start + page_size - 1
-            response = (
-                supabase
-                .table(table_name)
-                .select("timestamp")
-                .range(start, end)
-                .execute()
-            )
-
-            rows = response.data or []
-            if not rows:
-                break
-
-            for record in rows:
-                timestamp = pd.Timestamp(record['timestamp'])
-                if timestamp.tz is None:
-                    timestamp = timestamp.tz_localize("America/Los_Angeles")
-                else:
-                    timestamp = timestamp.tz_convert("America/Los_Angeles")
-                dates.add(timestamp.date().isoformat())
-
-            if len(rows) < page_size:
-                break
-            start += page_size
-
-        if not dates:
-            logger.warning("No grid forecast data found")
-
-        logger.info(f"Found {len(dates)} unique grid forecast dates")
-        return dates
-    except Exception as e:
-        logger.error(f"Failed to fetch grid forecast dates: {e}")
-        return set()
-
-
 def refresh_daily_grid_surf_intensity_for_dates(target_dates: Set[str]):
-    """Invoke Supabase routine to refresh aggregated grid surf intensity for each target date."""
+    """Refresh aggregated grid surf intensity for all target dates in one batched Supabase call."""
     if not target_dates:
         logger.info("No target dates to refresh for daily grid surf intensity")
         return
 
-    for target_date in sorted(target_dates):
-        try:
-            logger.info(f"Refreshing daily grid surf intensity for {target_date}")
-            supabase.rpc(
-                GRID_REFRESH_FUNCTION,
-                {"target_date": target_date}
-            ).execute()
-        except Exception as e:
-            logger.error(f"Failed to refresh grid surf intensity for {target_date}: {e}")
+    logger.info(f"Refreshing daily grid surf intensity for {len(target_dates)} dates")
+    refresh_daily_surf_intensity(GRID_REFRESH_FUNCTION, target_dates)
 
 
 def create_cdip_nowcast_grid_records(grid_points: List[Dict], cdip_data: Dict) -> List[Dict]:
@@ -552,10 +497,9 @@ def main():
 
         selective_upsert_grid_updates(updated_records)
 
-        all_dates = get_all_grid_forecast_dates()
-        if updated_dates:
-            all_dates.update(updated_dates)
-        refresh_daily_grid_surf_intensity_for_dates(all_dates)
+        # Refresh the dates we just wrote plus the forecast horizon (main_noaa_grid.py
+        # writes those days but leaves the rollup to this job)
+        refresh_daily_grid_surf_intensity_for_dates(updated_dates | set(pacific_horizon_dates(DAYS_FORECAST)))
 
         logger.info("CDIP grid nowcast selective update completed successfully")
         return True
@@ -10,15 +10,19 @@ No API key required - free for commercial use
 
 import time
 import requests
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
-import pytz
+from typing import List, Dict, Optional, Union
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+import numpy as np
+import pandas as pd
+
 from config import logger, BATCH_SIZE
+from forecast_frame import FLOAT_DTYPE, ForecastFrame, as_forecast_frame, frame_like_input
+from http_cache import CachedSession
 from utils import chunk_iter, safe_float, safe_int
+from timestamps import INVALID_EPOCH, bucket_pacific_3h, to_epoch, to_utc_iso
 
 # NWS API requires a User-Agent header per API documentation
 # Format: ApplicationName/vX.Y (contact-email)
@@ -60,43 +64,22 @@ def normalize_to_utc_iso(value) -> Optional[str]:
     Convert a datetime or ISO-formatted string to a normalized UTC ISO string.
     Returns None if the value cannot be parsed.
     """
-    if value is None:
-        return None
-
-    if isinstance(value, str):
-        ts_str = value.strip()
-        if not ts_str:
-            return None
-        if ts_str.endswith("Z"):
-            ts_str = ts_str[:-1] + "+00:00"
-        try:
-            dt = datetime.fromisoformat(ts_str)
-        except ValueError:
-            return None
-    elif isinstance(value, datetime):
-        dt = value
-    else:
-        return None
-
-    if dt.tzinfo is None:
-        dt = pytz.UTC.localize(dt)
-    else:
-        dt = dt.astimezone(pytz.UTC)
-
-    return dt.isoformat()
+    return to_utc_iso(value)
 
 
 def create_session() -> requests.Session:
     """
     Create a requests session with connection pooling and retry logic.
     This significantly speeds up repeated requests to the same host.
+    Responses go through the shared HTTP cache (gridpoints for 30 days,
+    forecasts for an hour, see HTTP_CACHE_POLICIES).
 
     Retry configuration:
     - 3 total retries with exponential backoff (0.5s, 1s, 2s)
     - Retries on connection errors, timeouts, and 5xx server errors
     - Does not retry on 4xx client errors (except 429 rate limit)
     """
-    session = requests.Session()
+    session = CachedSession()
 
     # Configure retry strategy with read timeout handling
     retry_strategy = Retry(
@@ -133,7 +116,7 @@ def get_nws_gridpoint(lat: float, lon: float, timeout: int = NWS_TIMEOUT, allow_
     Returns None if location not covered by NWS.
     """
     # Use provided session or create a temporary one
-    use_session = session if session else requests.Session()
+    use_session = session if session else CachedSession()
     if not session:
         use_session.headers.update({"User-Agent": USER_AGENT})
 
@@ -175,7 +158,7 @@ def get_nws_hourly_forecast(forecast_url: str, timeout: int = NWS_TIMEOUT, sessi
         - probabilityOfPrecipitation: dict
     """
     # Use provided session or create a temporary one
-    use_session = session if session else requests.Session()
+    use_session = session if session else CachedSession()
     if not session:
         use_session.headers.update({"User-Agent": USER_AGENT})
 
@@ -206,7 +189,7 @@ def get_nws_pressure_data(grid_data_url: str, timeout: int = NWS_TIMEOUT, sessio
     Returns empty dict if no pressure data is available.
     """
     # Use provided session or create a temporary one
-    use_session = session if session else requests.Session()
+    use_session = session if session else CachedSession()
     if not session:
         use_session.headers.update({"User-Agent": USER_AGENT})
 
@@ -384,7 +367,114 @@ def fetch_beach_forecast(beach: Dict, session: requests.Session, gridpoint_cache
     return result
 
 
-def get_nws_supplement_data(beaches: List[Dict], existing_records: List[Dict]) -> List[Dict]:
+def _pressure_lookup(pressure_map: Dict) -> tuple:
+    """Index a pressure map by exact epoch and by UTC hour (first value per hour wins)."""
+    if not pressure_map:
+        return {}, {}
+    keys = list(pressure_map.keys())
+    epochs = to_epoch(keys).tolist()
+    exact = {}
+    by_hour = {}
+    for key, epoch in zip(keys, epochs):
+        if epoch == INVALID_EPOCH:
+            continue
+        exact.setdefault(epoch, pressure_map[key])
+        by_hour.setdefault(epoch - epoch % 3600, pressure_map[key])
+    return exact, by_hour
+
+
+def _period_columns(periods: List[Dict], pressure_map: Dict) -> tuple:
+    """
+    Align NWS hourly periods to 3-hour Pacific buckets and parse their fields.
+
+    Returns (bucket_epochs, columns) where every column is a float array with
+    NaN for "no value in this period". A period without windGust estimates its
+    gust from the latest wind speed in its bucket; `_gust_from_record` is 1
+    where no period before it in the bucket had one, so the estimate uses the
+    record's own wind speed at merge time, and 0 where the period supplied a gust.
+    """
+    period_epochs = to_epoch([p.get("startTime") for p in periods])
+    # Align to 3-hour intervals (same as NOAA handler)
+    bucket_epochs = bucket_pacific_3h(period_epochs, wrap_midnight=False)
+    pressure_exact, pressure_by_hour = _pressure_lookup(pressure_map)
+
+    n = len(periods)
+    columns = {name: np.full(n, np.nan) for name in
+               ("temperature", "weather", "wind_speed_mph", "wind_gust_mph", "pressure_inhg", "_gust_from_record")}
+
+    bucket_wind = {}  # bucket epoch -> latest wind speed seen in that bucket
+    for i, (period, period_epoch, bucket_epoch) in enumerate(zip(periods, period_epochs.tolist(), bucket_epochs.tolist())):
+        try:
+            if period.get("temperature") is not None:
+                columns["temperature"][i] = safe_float(period["temperature"])
+
+            weather_code = extract_weather_code(period.get("shortForecast", ""))
+            if weather_code is not None:
+                columns["weather"][i] = safe_int(weather_code)
+
+            wind_speed = parse_wind_speed(period["windSpeed"]) if period.get("windSpeed") else None
+            if wind_speed is not None:
+                columns["wind_speed_mph"][i] = wind_speed
+                bucket_wind[bucket_epoch] = wind_speed
+
+            # Try to get actual wind gust from NWS
+            if period.get("windGust"):
+                wind_gust = parse_wind_speed(period["windGust"])
+                if wind_gust is not None:
+                    columns["wind_gust_mph"][i] = wind_gust
+                    columns["_gust_from_record"][i] = 0
+            elif bucket_epoch not in bucket_wind:
+                columns["_gust_from_record"][i] = 1
+            elif bucket_wind[bucket_epoch] > 0:
+                # If no NWS gust data, estimate from wind speed (1.4x typical gust factor)
+                columns["wind_gust_mph"][i] = bucket_wind[bucket_epoch] * 1.4
+                columns["_gust_from_record"][i] = 0
+
+            # Fill pressure data from grid data (if available)
+            # NOTE: Pressure data is frequently unavailable in NWS gridData
+            # Try exact match first, then any value within the same UTC hour
+            pressure_value = pressure_exact.get(period_epoch)
+            if pressure_value is None and period_epoch != INVALID_EPOCH:
+                pressure_value = pressure_by_hour.get(period_epoch - period_epoch % 3600)
+            if pressure_value is not None:
+                columns["pressure_inhg"][i] = safe_float(pressure_value)
+
+        except Exception as e:
+            logger.debug(f"   NWS: Error processing period: {e}")
+            continue
+
+    return bucket_epochs, columns
+
+
+def _stage_periods(parts: List[tuple], id_field: str) -> ForecastFrame:
+    """
+    Source frame from per-beach (beach_id, bucket_epochs, columns) parts.
+
+    Several hourly periods land in one 3-hour bucket; per field the latest
+    period that has a value wins, as when each period was written in turn.
+    """
+    if not parts:
+        return ForecastFrame.empty(id_field)
+
+    entity_ids = np.concatenate([np.full(len(epochs), bid, dtype=object) for bid, epochs, _ in parts])
+    epochs = np.concatenate([epochs for _, epochs, _ in parts])
+    columns = {name: np.concatenate([cols[name] for _, _, cols in parts]) for name in parts[0][2]}
+
+    valid = epochs != INVALID_EPOCH
+    index = pd.MultiIndex.from_arrays([entity_ids[valid], epochs[valid]])
+    df = pd.DataFrame({name: values[valid] for name, values in columns.items()}, index=index)
+    df = df.groupby(level=[0, 1], sort=False).last()  # last() skips NaN per column
+
+    return ForecastFrame.from_arrays(
+        df.index.get_level_values(0), df.index.get_level_values(1),
+        {name: df[name].to_numpy() for name in df.columns}, id_field,
+    )
+
+
+def get_nws_supplement_data(
+    beaches: List[Dict],
+    existing_records: Union[List[Dict], ForecastFrame]
+) -> Union[List[Dict], ForecastFrame]:
     """
     Supplement missing fields using NOAA NWS API.
     Fills: temperature, weather, wind_speed_mph, wind_gust_mph, pressure_inhg
@@ -395,47 +485,24 @@ def get_nws_supplement_data(beaches: List[Dict], existing_records: List[Dict]) -
 
     Args:
         beaches: List of beach dicts with id, LATITUDE, LONGITUDE
-        existing_records: List of forecast records with potential null fields
+        existing_records: Forecast records (or a ForecastFrame) with potential null fields
 
     Returns:
-        Updated records with NWS data filled in
+        Updated records with NWS data filled in, in the same form as passed
     """
     start_time = time.time()
     logger.info("   NWS supplement: fetching weather forecasts...")
 
-    # Build mapping of all timestamps by beach (fill everything, not just missing)
-    needed_by_beach = {}
-    fields_to_fill = {"temperature", "weather", "wind_speed_mph", "wind_gust_mph", "pressure_inhg"}
-
-    for rec in existing_records:
-        bid = rec.get("beach_id")
-        ts_iso = normalize_to_utc_iso(rec.get("timestamp"))
-        if not bid or not ts_iso:
-            continue
-
-        if bid not in needed_by_beach:
-            needed_by_beach[bid] = set()
-        needed_by_beach[bid].add(ts_iso)
-
-    if not needed_by_beach:
+    # Every (beach_id, epoch) row is filled, not just missing fields
+    frame = as_forecast_frame(existing_records)
+    if len(frame) == 0:
         logger.info("   NWS supplement: no records to process")
         return existing_records
 
-    # Create beach metadata lookup
-    beach_meta = {b["id"]: (b.get("Name"), b["LATITUDE"], b["LONGITUDE"]) for b in beaches}
-
-    # Build index for quick updates
-    updated_records = list(existing_records)
-    key_to_index: Dict[str, int] = {}
-    for idx, record in enumerate(updated_records):
-        bid = record.get("beach_id")
-        ts_iso = normalize_to_utc_iso(record.get("timestamp"))
-        if not bid or not ts_iso:
-            continue
-        key_to_index[f"{bid}_{ts_iso}"] = idx
+    needed_ids = set(frame.entity_ids.tolist())
 
     # Process beaches that need data
-    target_beaches = [b for b in beaches if b["id"] in needed_by_beach]
+    target_beaches = [b for b in beaches if b["id"] in needed_ids]
     logger.info(f"   NWS supplement: processing {len(target_beaches)} beaches...")
 
     # PRE-GROUP beaches by approximate location to minimize API calls
@@ -474,7 +541,6 @@ def get_nws_supplement_data(beaches: List[Dict], existing_records: List[Dict]) -
     pressure_cache = {}
     cache_lock = Lock()
 
-    filled_count = 0
     success_count = 0
     timeout_count = 0
     no_coverage_count = 0
@@ -551,106 +617,38 @@ def get_nws_supplement_data(beaches: List[Dict], existing_records: List[Dict]) -
 
     logger.info(f"   NWS: Successfully mapped forecasts to {len(beach_forecasts)} beaches")
 
-    # Now process all fetched forecasts and update records
-    pacific = pytz.timezone("America/Los_Angeles")
+    # Stage every beach's periods on its bucket epochs, then merge on (beach_id, epoch)
+    # Period times are shared by every beach in a group, so align them once per forecast
+    aligned_cache = {}
+    parts = []
 
     for beach_id, (periods, pressure_map, grid_key) in beach_forecasts.items():
-        if beach_id not in needed_by_beach:
-            continue
-
-        # Step 3: Match periods to our timestamps
-        for period in periods:
-            try:
-                # Parse NWS timestamp
-                period_time = datetime.fromisoformat(period["startTime"].replace("Z", "+00:00"))
-                period_local = period_time.astimezone(pacific)
-
-                # Align to 3-hour intervals (same as NOAA handler)
-                local_hour = period_local.hour
-                pacific_intervals = [0, 3, 6, 9, 12, 15, 18, 21]
-                closest_interval = min(pacific_intervals, key=lambda x: abs(x - local_hour))
-
-                clean_local_time = period_local.replace(
-                    hour=closest_interval,
-                    minute=0,
-                    second=0,
-                    microsecond=0
-                )
-
-                ts_iso = normalize_to_utc_iso(clean_local_time)
-                if ts_iso is None:
-                    continue
-
-                # Check if we need this timestamp
-                if ts_iso not in needed_by_beach[beach_id]:
-                    continue
-
-                key = f"{beach_id}_{ts_iso}"
-                idx = key_to_index.get(key)
-                if idx is None:
-                    continue
-
-                rec = updated_records[idx]
-
-                # Fill all NWS fields (overwrite existing data)
-                if period.get("temperature") is not None:
-                    rec["temperature"] = safe_float(period["temperature"])
-                    filled_count += 1
-
-                weather_code = extract_weather_code(period.get("shortForecast", ""))
-                if weather_code is not None:
-                    rec["weather"] = safe_int(weather_code)
-                    filled_count += 1
-
-                if period.get("windSpeed"):
-                    wind_speed = parse_wind_speed(period["windSpeed"])
-                    if wind_speed is not None:
-                        rec["wind_speed_mph"] = safe_float(wind_speed)
-                        filled_count += 1
-
-                # Try to get actual wind gust from NWS
-                if period.get("windGust"):
-                    wind_gust = parse_wind_speed(period["windGust"])
-                    if wind_gust is not None:
-                        rec["wind_gust_mph"] = safe_float(wind_gust)
-                        filled_count += 1
-                else:
-                    # If no NWS gust data, estimate from wind speed (1.4x typical gust factor)
-                    current_wind_speed = rec.get("wind_speed_mph")
-                    if current_wind_speed is not None and current_wind_speed > 0:
-                        rec["wind_gust_mph"] = safe_float(current_wind_speed * 1.4)
-                        filled_count += 1
-
-                # Fill pressure data from grid data (if available)
-                # NOTE: Pressure data is frequently unavailable in NWS gridData
-                if pressure_map:
-                    # Try to match the timestamp in pressure_map
-                    # Pressure timestamps are in UTC, so convert our local time to UTC
-                    period_utc = period_time.astimezone(pytz.UTC)
-
-                    # Try exact match first
-                    pressure_timestamp = period_utc.strftime("%Y-%m-%dT%H:%M:%S+00:00")
-                    pressure_value = pressure_map.get(pressure_timestamp)
-
-                    # If no exact match, try to find closest timestamp within same hour
-                    if pressure_value is None:
-                        hour_start = period_utc.replace(minute=0, second=0, microsecond=0)
-                        for ts, val in pressure_map.items():
-                            try:
-                                ts_dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-                                if ts_dt.replace(minute=0, second=0, microsecond=0) == hour_start:
-                                    pressure_value = val
-                                    break
-                            except:
-                                continue
-
-                    if pressure_value is not None:
-                        rec["pressure_inhg"] = safe_float(pressure_value)
-                        filled_count += 1
-
-            except Exception as e:
-                logger.debug(f"   NWS: Error processing period: {e}")
-                continue
+        cache_key = id(periods)
+        if cache_key not in aligned_cache:
+            aligned_cache[cache_key] = _period_columns(periods, pressure_map)
+        bucket_epochs, columns = aligned_cache[cache_key]
+        parts.append((beach_id, bucket_epochs, columns))
+
+    source = _stage_periods(parts, frame.id_field)
+
+    # Gusts estimated before any NWS wind speed in their bucket use the record's own wind speed
+    record_gusts = None
+    if len(source) and "wind_speed_mph" in frame.data.columns:
+        from_record = source.data["_gust_from_record"].reindex(frame.data.index) == 1
+        # Shortest float32 repr, as serialized, so 25.2 * 1.4 matches the record-based estimate
+        record_wind = pd.Series(frame.data["wind_speed_mph"].to_numpy().astype(str).astype(np.float64), index=frame.data.index)
+        estimate = from_record & (record_wind > 0)
+        if estimate.any():
+            record_gusts = ForecastFrame(
+                (record_wind[estimate] * 1.4).astype(FLOAT_DTYPE).to_frame("wind_gust_mph"), frame.id_field
+            )
+
+    # Fill all NWS fields (overwrite existing data)
+    filled_count = frame.fill_missing(
+        ["temperature", "weather", "wind_speed_mph", "wind_gust_mph", "pressure_inhg"], source, overwrite=True
+    )
+    if record_gusts is not None:
+        filled_count += frame.fill_missing(["wind_gust_mph"], record_gusts, overwrite=True)
 
     elapsed_time = time.time() - start_time
 
@@ -683,7 +681,7 @@ def get_nws_supplement_data(beaches: List[Dict], existing_records: List[Dict]) -
     logger.info(f"   NWS grid consolidation: {location_groups_count} location groups → {unique_grids} unique NWS grids ({groups_per_grid:.1f} groups/grid)")
     logger.info(f"   NWS total efficiency: {total_beaches} beaches served by {unique_grids} API calls = {total_api_savings:.1f}% reduction")
     logger.info(f"   NWS supplement: completed in {elapsed_time:.2f} seconds ({elapsed_time/60:.2f} minutes)")
-    return updated_records
+    return frame_like_input(frame, existing_records)
 
 
 def test_nws_connection() -> bool:
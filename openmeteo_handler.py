@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Open-Meteo API integration for Hybrid Surf Database Update Script
-Supplement mode: fills ONLY missing fields on top of NOAA rows, aligned by (beach_id, timestamp).
+Supplement mode: fills ONLY missing fields on top of NOAA rows, joined on (beach_id, epoch) through ForecastFrame.
 
 Fills these fields if they are None:
   - weather (code)
@@ -10,90 +10,34 @@ Fills these fields if they are None:
   - wind_gust_mph (paired with wind_speed_mph)
 """
 
-import time
 import math
 import numpy as np
 import bisect
 import pandas as pd
-from collections import defaultdict
 
 import openmeteo_requests
-import requests_cache
 from retry_requests import retry
 
+from circuit_breaker import CircuitOpenError
+from forecast_frame import ForecastFrame, as_forecast_frame, frame_like_input
+from http_cache import CachedSession
 from config import (
     logger, DAYS_FORECAST, BATCH_SIZE, OPENMETEO_WEATHER_URL, OPENMETEO_MARINE_URL,
-    OPENMETEO_BATCH_DELAY, OPENMETEO_RETRY_DELAY, TIDE_ADJUSTMENT_FT
+    TIDE_ADJUSTMENT_FT
 )
 from utils import (
-    api_request_with_retry, safe_openmeteo_delay, safe_float, safe_int,
+    api_request_with_retry, safe_float,
     celsius_to_fahrenheit, kph_to_mph, meters_to_feet, hpa_to_inhg,
     chunk_iter, normalize_surf_range
 )
 
+from timestamps import PACIFIC_TZ, bucket_pacific_3h
 from swell_ranking import (
     calculate_wave_energy_kj, get_surf_height_range
 )
 
-def nearest_valid_value(series, index):
-    """Return the closest non-null/non-NaN entry around the given index."""
-    if series is None:
-        return None
-    try:
-        values = np.asarray(series)
-    except Exception:
-        values = series
-    try:
-        n = len(values)
-    except TypeError:
-        return None
-    if n == 0:
-        return None
-
-    def _value_at(pos):
-        if pos < 0 or pos >= n:
-            return None
-        try:
-            val = values[pos]
-        except Exception:
-            return None
-        if np.ma.is_masked(val):
-            return None
-        if isinstance(val, np.ma.MaskedArray):
-            val = val.data
-        if isinstance(val, np.ndarray):
-            if val.size != 1:
-                return None
-            val = val.item()
-        if isinstance(val, np.generic):
-            val = val.item()
-        if val is None:
-            return None
-        try:
-            if np.isnan(val):
-                return None
-        except Exception:
-            pass
-        return val
-
-    current = _value_at(index)
-    if current is not None:
-        return current
-    for offset in range(1, n):
-        left = index - offset
-        if left >= 0:
-            val = _value_at(left)
-            if val is not None:
-                return val
-        right = index + offset
-        if right < n:
-            val = _value_at(right)
-            if val is not None:
-                return val
-    return None
-
-# Initialize Open-Meteo client with caching and retry
-cache_session = requests_cache.CachedSession(".cache", expire_after=3600)
+# Initialize Open-Meteo client with caching (shared HTTP cache) and retry
+cache_session = CachedSession()
 retry_session = retry(cache_session, retries=3, backoff_factor=0.2)
 openmeteo = openmeteo_requests.Client(session=retry_session)
 
@@ -130,196 +74,166 @@ FIELDS_FOR_NEIGHBOR_FILL = (
 
 
 
-def _fill_weather_from_nearby_time(records, beach_meta, max_hours=6, time_weight_km=20.0):
-    """Fill missing weather codes by borrowing from nearby beaches at nearby hours."""
-    if not records:
-        return records
-
-    donors = []
-    donor_times = []
-    for rec in records:
-        weather = rec.get('weather')
-        bid = rec.get('beach_id')
-        ts = rec.get('timestamp')
+def _entity_coords(frame, beach_meta):
+    """(lat, lon) float arrays per frame row from beach_meta; NaN where a beach has no coordinates."""
+    codes, entities = pd.factorize(frame.entity_ids)
+    lat = np.full(len(entities) + 1, np.nan)
+    lon = np.full(len(entities) + 1, np.nan)
+    for k, bid in enumerate(entities):
         meta = beach_meta.get(bid)
-        if weather is None or not meta or meta[1] is None or meta[2] is None or not ts:
-            continue
-        try:
-            ts_obj = pd.Timestamp(ts)
-        except Exception:
-            continue
-        donors.append((ts_obj, meta[1], meta[2], weather))
-        donor_times.append(ts_obj.value)
-
-    if not donors:
-        return records
+        if meta:
+            lat_k, lon_k = safe_float(meta[1]), safe_float(meta[2])
+            if lat_k is not None and lon_k is not None:
+                lat[k], lon[k] = lat_k, lon_k
+    return lat[codes], lon[codes]  # code -1 (missing id) lands on the trailing NaN
 
-    donors_sorted = sorted(zip(donor_times, donors), key=lambda x: x[0])
-    donor_times_sorted = [time for time, _ in donors_sorted]
-    donors_data = [data for _, data in donors_sorted]
 
-    max_delta_ns = max_hours * 3600 * 1_000_000_000
-
-    filled = 0
-    for rec in records:
-        if rec.get('weather') is not None:
-            continue
-        bid = rec.get('beach_id')
-        ts = rec.get('timestamp')
-        meta = beach_meta.get(bid)
-        if not ts or not meta or meta[1] is None or meta[2] is None:
-            continue
-        try:
-            target_ts = pd.Timestamp(ts)
-        except Exception:
-            continue
-        target_val = target_ts.value
-        idx = bisect.bisect_left(donor_times_sorted, target_val)
+def _fill_weather_from_nearby_time(frame, beach_meta, max_hours=6, time_weight_km=20.0):
+    """Fill missing weather codes by borrowing from nearby beaches at nearby hours."""
+    if len(frame) == 0 or "weather" not in frame.data.columns:
+        return 0
+
+    weather = frame.data["weather"].to_numpy()
+    epochs = frame.epochs
+    lat, lon = _entity_coords(frame, beach_meta)
+    located = ~np.isnan(lat) & ~np.isnan(lon)
+
+    donor_rows = np.flatnonzero(located & ~np.isnan(weather))
+    if not donor_rows.size:
+        return 0
+    donor_rows = donor_rows[np.argsort(epochs[donor_rows], kind="stable")]
+    donor_times = epochs[donor_rows].tolist()
+
+    max_delta = max_hours * 3600
+    fills = {}
+    for row in np.flatnonzero(located & np.isnan(weather)).tolist():
+        target = int(epochs[row])
+        idx = bisect.bisect_left(donor_times, target)
 
         best_val = None
         best_cost = None
-
         left = idx - 1
         right = idx
         while True:
             progressed = False
-            if left >= 0:
-                delta = abs(donor_times_sorted[left] - target_val)
-                if delta <= max_delta_ns:
-                    ts_obj, lat, lon, weather = donors_data[left]
-                    dist = _haversine_distance(meta[1], meta[2], lat, lon)
-                    if dist is not None:
-                        cost = dist + (delta / 1_000_000_000 / 3600.0) * time_weight_km
-                        if best_cost is None or cost < best_cost:
-                            best_cost = cost
-                            best_val = weather
+            for side in ("left", "right"):
+                pos = left if side == "left" else right
+                if not 0 <= pos < len(donor_times):
+                    continue
+                delta = abs(donor_times[pos] - target)
+                if delta > max_delta:
+                    if side == "left":
+                        left = -1
+                    else:
+                        right = len(donor_times)
+                    continue
+                donor = donor_rows[pos]
+                dist = _haversine_distance(lat[row], lon[row], lat[donor], lon[donor])
+                if dist is not None:
+                    cost = dist + (delta / 3600.0) * time_weight_km
+                    if best_cost is None or cost < best_cost:
+                        best_cost = cost
+                        best_val = weather[donor]
+                if side == "left":
                     left -= 1
-                    progressed = True
                 else:
-                    left = -1
-            if right < len(donors_data):
-                delta = abs(donor_times_sorted[right] - target_val)
-                if delta <= max_delta_ns:
-                    ts_obj, lat, lon, weather = donors_data[right]
-                    dist = _haversine_distance(meta[1], meta[2], lat, lon)
-                    if dist is not None:
-                        cost = dist + (delta / 1_000_000_000 / 3600.0) * time_weight_km
-                        if best_cost is None or cost < best_cost:
-                            best_cost = cost
-                            best_val = weather
                     right += 1
-                    progressed = True
-                else:
-                    right = len(donors_data)
+                progressed = True
             if not progressed:
                 break
 
         if best_val is not None:
-            rec['weather'] = best_val
-            filled += 1
-
-    if filled:
-        logger.info(f"   Open-Meteo supplement: filled {filled} weather codes using cross-hour neighbors")
-    return records
-
-def _fill_missing_fields_from_neighbors(records, beach_meta, fields=FIELDS_FOR_NEIGHBOR_FILL):
-    """Fill missing fields using nearest neighbor records at the same timestamp."""
-    if not records:
-        return records
-
-    grouped = defaultdict(list)
-    for idx, rec in enumerate(records):
-        ts = rec.get("timestamp")
-        bid = rec.get("beach_id")
-        if not ts or bid not in beach_meta:
-            continue
-        grouped[ts].append(idx)
+            fills[row] = best_val
 
-    filled_counts = {field: 0 for field in fields}
+    if fills:
+        rows = np.fromiter(fills.keys(), dtype=np.int64)
+        weather = weather.copy()
+        weather[rows] = np.fromiter(fills.values(), dtype=weather.dtype)
+        frame.data["weather"] = weather
+        logger.info(f"   Open-Meteo supplement: filled {len(fills)} weather codes using cross-hour neighbors")
+    return len(fills)
 
-    for ts, indices in grouped.items():
-        per_record_meta = []
-        for idx in indices:
-            rec = records[idx]
-            bid = rec.get("beach_id")
-            meta = beach_meta.get(bid)
-            if not meta or meta[1] is None or meta[2] is None:
-                per_record_meta.append(None)
-            else:
-                per_record_meta.append((meta[1], meta[2]))
-
-        for field in fields:
-            available = []
-            missing = []
-            for local_idx, record_idx in enumerate(indices):
-                meta = per_record_meta[local_idx]
-                if meta is None:
-                    continue
-                lat, lon = meta
-                val = records[record_idx].get(field)
-                if val is not None:
-                    available.append((lat, lon, val))
-                else:
-                    missing.append((record_idx, lat, lon))
 
-            if not available or not missing:
+def _fill_missing_fields_from_neighbors(frame, beach_meta, fields=FIELDS_FOR_NEIGHBOR_FILL):
+    """Fill missing fields using nearest neighbor records at the same epoch."""
+    if len(frame) == 0:
+        return 0
+
+    lat, lon = _entity_coords(frame, beach_meta)
+    located = ~np.isnan(lat) & ~np.isnan(lon)
+    groups = pd.Series(np.arange(len(frame)))[located].groupby(frame.epochs[located]).indices
+
+    filled_counts = {field: 0 for field in fields}
+    for field in fields:
+        if field not in frame.data.columns:
+            continue
+        values = frame.data[field].to_numpy().copy()
+        for positions in groups.values():
+            rows = np.flatnonzero(located)[positions]
+            available = rows[~np.isnan(values[rows])]
+            missing = rows[np.isnan(values[rows])]
+            if not available.size or not missing.size:
                 continue
 
-            for record_idx, lat, lon in missing:
+            for row in missing.tolist():
                 best_val = None
                 best_dist = None
-                for av_lat, av_lon, val in available:
-                    distance = _haversine_distance(lat, lon, av_lat, av_lon)
+                for donor in available.tolist():
+                    distance = _haversine_distance(lat[row], lon[row], lat[donor], lon[donor])
                     if distance is None:
                         continue
                     if best_dist is None or distance < best_dist:
                         best_dist = distance
-                        best_val = val
+                        best_val = values[donor]
                 if best_val is not None:
-                    records[record_idx][field] = best_val
+                    values[row] = best_val
                     filled_counts[field] += 1
+        if filled_counts[field]:
+            frame.data[field] = values
 
     total_filled = sum(filled_counts.values())
     if total_filled:
         summary = ", ".join(f"{field}: {count}" for field, count in filled_counts.items() if count)
         logger.info(f"   Open-Meteo supplement: filled {total_filled} fields via nearest neighbors ({summary})")
-    return records
+    return total_filled
 
-def _collect_needed_hours(existing_records):
-    """
-    Build:
-      - needed_by_beach: {beach_id: set(local_iso_timestamps)}
-      - missing_fields_by_key: {f"{beach_id}_{ts}": set(field_names_that_are_None)}
-      - overall min/max local times per beach to shrink API window
-    Assumes record['timestamp'] is tz-aware ISO string in America/Los_Angeles (matches NOAA writer).
-    """
-    needed_by_beach = defaultdict(set)
-    missing_fields_by_key = {}
-    window_by_beach = {}  # beach_id -> (min_ts_local, max_ts_local)
-
-    for rec in existing_records:
-        bid = rec.get("beach_id")
-        ts_iso = rec.get("timestamp")  # local ISO (America/Los_Angeles)
-        if not bid or not ts_iso:
-            continue
 
-        # Only consider if ANY of the target fields are missing
-        missing = {f for f in TARGET_FIELDS if rec.get(f) in (None,)}
-        if not missing:
-            continue  # nothing to fill for this hour
+def _collect_needed_hours(frame):
+    """
+    Rows with at least one TARGET_FIELDS value missing.
 
-        needed_by_beach[bid].add(ts_iso)
-        missing_fields_by_key[f"{bid}_{ts_iso}"] = missing
+    Returns:
+        (needed (entity_id, epoch) MultiIndex,
+         {beach_id: (min epoch, max epoch)} to shrink the API window)
+    """
+    needed = ~frame.valid_mask(list(TARGET_FIELDS)).all(axis=1).to_numpy()
+    index = frame.data.index[needed]
+    if not len(index):
+        return index, {}
+    window = pd.Series(frame.epochs[needed]).groupby(frame.entity_ids[needed]).agg(["min", "max"])
+    return index, {bid: (int(lo), int(hi)) for bid, lo, hi in window.itertuples()}
 
-        # Track window per beach (local time)
-        ts = pd.Timestamp(ts_iso)
-        if bid not in window_by_beach:
-            window_by_beach[bid] = (ts, ts)
-        else:
-            lo, hi = window_by_beach[bid]
-            window_by_beach[bid] = (min(lo, ts), max(hi, ts))
 
-    return needed_by_beach, missing_fields_by_key, window_by_beach
+def _nearest_valid(values) -> np.ndarray:
+    """
+    Each entry replaced by the closest finite one (the earlier on ties); all NaN
+    if none is finite.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(values))
+    if not valid.size:
+        return np.full(values.shape, np.nan)
+    positions = np.arange(values.size)
+    right = np.clip(np.searchsorted(valid, positions), 0, valid.size - 1)
+    left = np.clip(right - 1, 0, valid.size - 1)
+    use_left = np.abs(positions - valid[left]) <= np.abs(valid[right] - positions)
+    return values[np.where(use_left, valid[left], valid[right])]
+
+
+def _hour_epochs(hourly) -> np.ndarray:
+    """Open-Meteo hourly axis as 3-hour Pacific bucket epochs (the alignment of the NOAA records)."""
+    epochs = np.arange(hourly.Time(), hourly.TimeEnd(), hourly.Interval(), dtype=np.int64)
+    return bucket_pacific_3h(epochs, wrap_midnight=False)
 
 def _derive_local_date_range(lo_ts, hi_ts):
     """
@@ -367,15 +281,23 @@ def get_openmeteo_supplement_data(beaches, existing_records):
     """
     Supplement missing fields using Open-Meteo, aligned to NOAA rows.
     Only hours present in `existing_records` (that are missing target fields) are requested/filled.
-    FIXED: Aligns timestamps to clean 3-hour intervals to match NOAA handler.
+    Open-Meteo hours are snapped to the 3-hour Pacific buckets of the NOAA rows and
+    joined on (beach_id, epoch); for several hours in one bucket the latest wins.
+
+    Args:
+        beaches: Beach dicts with id, Name, LATITUDE, LONGITUDE
+        existing_records: Forecast records (or a ForecastFrame)
+
+    Returns:
+        Updated records, in the same form as passed
     """
     logger.info("   Open-Meteo supplement: aligning to NOAA timestamps and filling only missing fields…")
 
-    # 1) Determine exactly which (beach_id, timestamp_local_iso) we need, and for which fields.
-    needed_by_beach, missing_fields_by_key, window_by_beach = _collect_needed_hours(existing_records)
+    # 1) Determine exactly which (beach_id, epoch) rows we need
+    frame = as_forecast_frame(existing_records)
+    needed, window_by_beach = _collect_needed_hours(frame)
 
-    total_needed_pairs = sum(len(v) for v in needed_by_beach.values())
-    if total_needed_pairs == 0:
+    if len(needed) == 0:
         logger.info("   Open-Meteo supplement: nothing to fill (no missing fields).")
         return existing_records
 
@@ -383,16 +305,12 @@ def get_openmeteo_supplement_data(beaches, existing_records):
     beach_meta = {b["id"]: (b.get("Name"), b["LATITUDE"], b["LONGITUDE"]) for b in beaches}
 
     # 2) Build a worklist of beaches that actually have missing fields
-    target_beaches = [b for b in beaches if b["id"] in needed_by_beach]
-    logger.info(f"   Will supplement {len(target_beaches)} beaches, {total_needed_pairs} hour-rows need fill.")
+    target_beaches = [b for b in beaches if b["id"] in window_by_beach]
+    logger.info(f"   Will supplement {len(target_beaches)} beaches, {len(needed)} hour-rows need fill.")
 
     # 3) Process in batches, deriving a local date window per batch that covers only what's needed.
-    updated_records = list(existing_records)  # copy to return
-    key_to_index = {f"{r['beach_id']}_{r['timestamp']}": idx for idx, r in enumerate(updated_records)}
-
-    # Track wind data sources
-    wind_filled_count = 0
-    wind_skipped_count = 0  # NOAA data preserved
+    weather_parts = []  # (beach_id, bucket epochs, {field: values}) per beach
+    marine_parts = []
 
     batch_count = 0
     total_batches = len(list(chunk_iter(target_beaches, BATCH_SIZE)))
@@ -404,23 +322,16 @@ def get_openmeteo_supplement_data(beaches, existing_records):
         lons = [b["LONGITUDE"] for b in batch]
 
         # Compute a combined local window for this batch (min of mins, max of maxes)
-        los, his = [], []
-        for bid in ids:
-            lo, hi = window_by_beach[bid]
-            los.append(lo)
-            his.append(hi)
-        batch_lo = min(los)
-        batch_hi = max(his)
+        batch_lo = min(window_by_beach[bid][0] for bid in ids)
+        batch_hi = max(window_by_beach[bid][1] for bid in ids)
 
         # Convert local window to YYYY-MM-DD for Open-Meteo. OM will return local-hour timestamps.
-        start_date, end_date = _derive_local_date_range(batch_lo, batch_hi)
+        start_date, end_date = _derive_local_date_range(
+            pd.Timestamp(batch_lo, unit="s", tz="UTC").tz_convert(PACIFIC_TZ),
+            pd.Timestamp(batch_hi, unit="s", tz="UTC").tz_convert(PACIFIC_TZ),
+        )
         logger.info(f"   Batch {batch_count}/{total_batches}: {len(batch)} beaches, window {start_date} → {end_date}")
 
-        # Respect batch pacing
-        if batch_count > 1:
-            logger.info(f"   Waiting {OPENMETEO_BATCH_DELAY}s between Open-Meteo batches…")
-            time.sleep(OPENMETEO_BATCH_DELAY)
-
         # 4) WEATHER call: weather_code, wind speed, and wind gust (local timezone)
         weather_params = {
             "latitude": lats,
@@ -430,10 +341,12 @@ def get_openmeteo_supplement_data(beaches, existing_records):
             "start_date": start_date,
             "end_date": end_date
         }
-        wrs = api_request_with_retry(openmeteo.weather_api, OPENMETEO_WEATHER_URL, params=weather_params)
-
-        logger.info("      Waiting briefly before Marine call…")
-        safe_openmeteo_delay()
+        try:
+            wrs = api_request_with_retry(openmeteo.weather_api, OPENMETEO_WEATHER_URL, params=weather_params)
+        except CircuitOpenError as e:
+            # Remaining rows keep their NOAA/GFS values; the next run fills them
+            logger.warning(f"   Open-Meteo unavailable ({e}); skipping the remaining {total_batches - batch_count + 1} batches")
+            break
 
         # 5) MARINE call: sea surface temp only (local timezone)
         # Using forecast_days instead of start_date/end_date for better data coverage
@@ -444,171 +357,77 @@ def get_openmeteo_supplement_data(beaches, existing_records):
             "timezone": "America/Los_Angeles",
             "forecast_days": 16
         }
-        mrs = api_request_with_retry(openmeteo.weather_api, OPENMETEO_MARINE_URL, params=marine_params)
+        try:
+            mrs = api_request_with_retry(openmeteo.weather_api, OPENMETEO_MARINE_URL, params=marine_params)
+        except CircuitOpenError as e:
+            logger.warning(f"   Open-Meteo unavailable ({e}); skipping the remaining {total_batches - batch_count + 1} batches")
+            break
 
         if len(wrs) != len(mrs) or len(wrs) != len(batch):
             logger.warning(f"      Response count mismatch in supplement batch {batch_count}; skipping batch.")
             continue
 
-        # 6) Build supplements keyed by (beach_id, local_ts_iso) but ONLY for hours we actually need
-        for i, b in enumerate(batch):
-            bid = b["id"]
-            if bid not in needed_by_beach:
-                continue
-
+        # 6) Stage each beach's hours on the bucket epochs of the NOAA rows
+        for i, bid in enumerate(ids):
             try:
                 wh = wrs[i].Hourly()
                 mh = mrs[i].Hourly()
 
-                # Construct local timestamps for BOTH weather and marine (they may differ)
-                weather_timestamps = pd.to_datetime(
-                    range(wh.Time(), wh.TimeEnd(), wh.Interval()),
-                    unit="s", utc=True
-                ).tz_convert("America/Los_Angeles")
-
-                marine_timestamps = pd.to_datetime(
-                    range(mh.Time(), mh.TimeEnd(), mh.Interval()),
-                    unit="s", utc=True
-                ).tz_convert("America/Los_Angeles")
-
-                weather_code      = wh.Variables(0).ValuesAsNumpy()
-                wind_speed_kph    = wh.Variables(1).ValuesAsNumpy()
-                wind_gust_kph     = wh.Variables(2).ValuesAsNumpy()
-
-                water_temp_c      = mh.Variables(0).ValuesAsNumpy()
-
-                # Process WEATHER data with weather timestamps
-                for j, ts_local in enumerate(weather_timestamps):
-                    ts_local_aware = pd.Timestamp(ts_local)
-
-                    # Apply same alignment logic as NOAA handler
-                    local_hour = ts_local_aware.hour
-                    pacific_intervals = [0, 3, 6, 9, 12, 15, 18, 21]
-
-                    # Find the closest 3-hour interval
-                    closest_interval = min(pacific_intervals, key=lambda x: abs(x - local_hour))
-
-                    # Create clean aligned timestamp
-                    clean_local_time = ts_local_aware.replace(
-                        hour=closest_interval,
-                        minute=0,
-                        second=0,
-                        microsecond=0
-                    )
-
-                    # Convert to UTC for matching database timestamps
-                    clean_utc_time = clean_local_time.tz_convert('UTC')
-                    ts_iso = clean_utc_time.isoformat()
-
-                    if ts_iso not in needed_by_beach[bid]:
-                        continue  # we don't need this hour
-
-                    key = f"{bid}_{ts_iso}"
-                    if key not in missing_fields_by_key:
-                        continue
+                # Weather codes are integers; the scalar path truncated with int()
+                weather_parts.append((bid, _hour_epochs(wh), {
+                    "weather": np.trunc(_nearest_valid(wh.Variables(0).ValuesAsNumpy())),
+                    "wind_speed_mph": kph_to_mph(_nearest_valid(wh.Variables(1).ValuesAsNumpy())),
+                    "wind_gust_mph": kph_to_mph(_nearest_valid(wh.Variables(2).ValuesAsNumpy())),
+                }))
+                marine_parts.append((bid, _hour_epochs(mh), {
+                    "water_temp_f": celsius_to_fahrenheit(_nearest_valid(mh.Variables(0).ValuesAsNumpy())),
+                }))
+            except Exception as e:
+                logger.error(f"      Supplement processing failed for beach_id={bid}: {e}")
 
-                    missing = missing_fields_by_key[key]
-                    idx = key_to_index.get(key)
-                    if idx is None:
-                        continue  # shouldn't happen, but guard anyway
-                    rec = updated_records[idx]
-
-                    # Prepare candidate values from WEATHER API
-                    weather_val = nearest_valid_value(weather_code, j)
-                    wind_speed_val = nearest_valid_value(wind_speed_kph, j)
-                    wind_gust_val = nearest_valid_value(wind_gust_kph, j)
-
-                    # Convert wind speeds to mph
-                    wind_speed_mph_val = safe_float(kph_to_mph(wind_speed_val)) if wind_speed_val is not None else None
-                    wind_gust_mph_val = safe_float(kph_to_mph(wind_gust_val)) if wind_gust_val is not None else None
-
-                    # Data quality check: Log if gust is lower than speed (shouldn't happen naturally)
-                    if wind_speed_mph_val is not None and wind_gust_mph_val is not None:
-                        if wind_gust_mph_val < wind_speed_mph_val:
-                            logger.debug(f"   Open Meteo data quality issue: gust ({wind_gust_mph_val:.1f}) < speed ({wind_speed_mph_val:.1f}) for beach {bid} at {ts_iso}")
-                            # Keep the bad data to maintain data integrity rather than artificially fixing it
-                            # Users can filter or handle this in their own analysis
-
-                    candidates = {
-                        "weather": safe_int(weather_val) if weather_val is not None else None,
-                        "wind_speed_mph": wind_speed_mph_val,
-                        "wind_gust_mph": wind_gust_mph_val,
-                    }
-
-                    # PAIRED FILLING LOGIC: wind_speed_mph and wind_gust_mph must be filled together
-                    # PRIORITIZE OPEN METEO: Always fill wind data from Open Meteo for consistency
-                    # This ensures wind_speed and wind_gust come from the same source
-                    if wind_speed_mph_val is not None and wind_gust_mph_val is not None:
-                        # Always fill BOTH fields to ensure paired, consistent data from Open Meteo
-                        rec["wind_speed_mph"] = wind_speed_mph_val
-                        rec["wind_gust_mph"] = wind_gust_mph_val
-                        wind_filled_count += 1
-
-                    # Fill non-wind fields independently
-                    for f in missing:
-                        if f not in ("wind_speed_mph", "wind_gust_mph"):
-                            val = candidates.get(f, None)
-                            if val is not None:
-                                rec[f] = val
-
-                # Process MARINE data with marine timestamps (separate loop for water_temp, tides, etc.)
-                for j, ts_local in enumerate(marine_timestamps):
-                    ts_local_aware = pd.Timestamp(ts_local)
-
-                    # Apply same alignment logic
-                    local_hour = ts_local_aware.hour
-                    pacific_intervals = [0, 3, 6, 9, 12, 15, 18, 21]
-                    closest_interval = min(pacific_intervals, key=lambda x: abs(x - local_hour))
-                    clean_local_time = ts_local_aware.replace(
-                        hour=closest_interval,
-                        minute=0,
-                        second=0,
-                        microsecond=0
-                    )
-
-                    # Convert to UTC for matching database timestamps
-                    clean_utc_time = clean_local_time.tz_convert('UTC')
-                    ts_iso = clean_utc_time.isoformat()
-
-                    if ts_iso not in needed_by_beach[bid]:
-                        continue
+    # 7) Merge on (beach_id, epoch), only into the rows that need it
+    weather = _stage_frame(weather_parts, needed)
+    marine = _stage_frame(marine_parts, needed)
 
-                    key = f"{bid}_{ts_iso}"
-                    if key not in missing_fields_by_key:
-                        continue
+    # PAIRED FILLING LOGIC: wind_speed_mph and wind_gust_mph come from Open-Meteo together,
+    # overwriting NOAA winds on these rows so both fields share one source
+    wind_filled_count = 0
+    if len(weather):
+        paired = weather.data[["wind_speed_mph", "wind_gust_mph"]].notna().all(axis=1)
+        gust_low = paired & (weather.data["wind_gust_mph"] < weather.data["wind_speed_mph"])
+        if gust_low.any():
+            # Keep the data as reported rather than artificially fixing it
+            logger.debug(f"   Open Meteo data quality issue: gust < speed on {int(gust_low.sum())} rows")
+        wind = ForecastFrame(weather.data.loc[paired, ["wind_speed_mph", "wind_gust_mph"]], frame.id_field)
+        wind_filled_count = len(wind)
+        frame.fill_missing(["wind_speed_mph", "wind_gust_mph"], wind, overwrite=True)
+        frame.fill_missing(["weather"], weather)
+    frame.fill_missing(["water_temp_f"], marine)
+
+    # 8) Neighbor fills for what Open-Meteo could not supply
+    _fill_missing_fields_from_neighbors(frame, beach_meta)
+    _fill_weather_from_nearby_time(frame, beach_meta)
 
-                    missing = missing_fields_by_key[key]
-                    idx = key_to_index.get(key)
-                    if idx is None:
-                        continue
-                    rec = updated_records[idx]
+    # Log wind data source statistics
+    if wind_filled_count > 0:
+        logger.info(f"   Wind data sources: {wind_filled_count} rows from Open Meteo (filled)")
 
-                    # Prepare candidate values from MARINE API
-                    water_temp_val = nearest_valid_value(water_temp_c, j)
+    logger.info("   Open-Meteo supplement: fill complete.")
+    return frame_like_input(frame, existing_records)
 
-                    marine_candidates = {
-                        "water_temp_f": safe_float(celsius_to_fahrenheit(water_temp_val)) if water_temp_val is not None else None,
-                    }
 
-                    # Only set the fields that are actually missing in this record
-                    for f in missing:
-                        val = marine_candidates.get(f, None)
-                        if val is not None:
-                            rec[f] = val
+def _stage_frame(parts, needed) -> ForecastFrame:
+    """Source frame from per-beach (beach_id, epochs, columns) parts, limited to the `needed` rows."""
+    if not parts:
+        return ForecastFrame.empty()
+    source = ForecastFrame.from_arrays(
+        np.concatenate([np.full(len(epochs), bid, dtype=object) for bid, epochs, _ in parts]),
+        np.concatenate([epochs for _, epochs, _ in parts]),
+        {name: np.concatenate([columns[name] for _, _, columns in parts]) for name in parts[0][2]},
+    )
+    source.data = source.data.loc[source.data.index.isin(needed)]
+    return source
 
-            except Exception as e:
-                logger.error(f"      Supplement processing failed for beach_id={bid}: {e}")
-
-    # 7) Done — only missing fields were filled, keys untouched, alignment preserved
-    updated_records = _fill_missing_fields_from_neighbors(updated_records, beach_meta)
-    updated_records = _fill_weather_from_nearby_time(updated_records, beach_meta)
-    
-    # Log wind data source statistics
-    if wind_filled_count > 0 or wind_skipped_count > 0:
-        logger.info(f"   Wind data sources: {wind_skipped_count} from NOAA (preserved), {wind_filled_count} from Open Meteo (filled)")
-    
-    logger.info("   Open-Meteo supplement: fill complete.")
-    return updated_records
 # ---------------- Optional utilities retained from your original file ----------------
 
 def test_openmeteo_connection():
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Progressive publish for Hybrid Surf Database Update Script
+Extracted records are split by forecast lead (PROGRESSIVE_LEAD_HOURS, e.g. 0-48h
+then the rest) and each window runs supplement + fill + upsert on its own, so
+today and tomorrow are in the database before the long tail is supplemented.
+Supplements only request the hours present in the records they are given.
+"""
+
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import PROGRESSIVE_LEAD_HOURS
+from instrumentation import record_step, stage
+from timestamps import INVALID_EPOCH, PACIFIC_TZ, to_epoch
+
+# Get shared logger
+logger = logging.getLogger("surf_update")
+
+
+def split_by_lead(records: List[Dict], lead_hours: Optional[Sequence[int]] = None,
+                  now_epoch: Optional[int] = None) -> List[Tuple[str, List[Dict]]]:
+    """
+    Split records into forecast-lead windows.
+
+    Args:
+        records: Records with a "timestamp" (naive values are Pacific)
+        lead_hours: Window boundaries in hours from now (default PROGRESSIVE_LEAD_HOURS)
+        now_epoch: Reference time (default: now)
+
+    Returns:
+        [(label, records)] nearest window first; earlier hours of today and
+        unparseable timestamps go in the first window
+    """
+    bounds = sorted(PROGRESSIVE_LEAD_HOURS if lead_hours is None else lead_hours)
+    if not bounds or not records:
+        return [("all", records)]
+
+    if now_epoch is None:
+        now_epoch = int(time.time())
+    epochs = to_epoch([r.get("timestamp") for r in records], naive_tz=PACIFIC_TZ)
+    epochs = np.where(epochs == INVALID_EPOCH, now_epoch, epochs)
+    window = np.digitize(epochs, now_epoch + np.asarray(bounds, dtype=np.int64) * 3600)
+
+    edges = [0] + list(bounds)
+    labels = [f"{lo}-{hi}h" for lo, hi in zip(edges, bounds)] + [f"{bounds[-1]}h+"]
+    return [
+        (labels[w], [records[i] for i in np.flatnonzero(window == w).tolist()])
+        for w in range(len(labels))
+    ]
+
+
+class PublishResult:
+    """Outcome of publish_progressively(): rows written and the lead windows that failed."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.written = 0
+        self.failed: List[str] = []
+        # Start of the first failed window in epoch seconds (INVALID_EPOCH when the nearest
+        # window failed, None when none did); every record before it was published
+        self.failed_from: Optional[int] = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def raise_if_failed(self) -> None:
+        """Raise after all windows ran, so the caller (and the script's exit code) sees the failure."""
+        if self.failed:
+            raise Exception(
+                f"{self.name} window(s) {', '.join(self.failed)} failed "
+                f"({self.written:,} records written by the other windows)"
+            )
+
+
+def publish_progressively(records: List[Dict], publish: Callable[[List[Dict]], int],
+                          lead_hours: Optional[Sequence[int]] = None, name: str = "forecast") -> PublishResult:
+    """
+    Run `publish` (supplement + fill + upsert -> rows written) once per lead window, nearest first.
+
+    A failing window is logged, the later windows still run, and the failure is
+    reported in the result (see PublishResult.raise_if_failed()).
+
+    Returns:
+        PublishResult with the total rows written and the failed windows
+    """
+    bounds = sorted(PROGRESSIVE_LEAD_HOURS if lead_hours is None else lead_hours)
+    now_epoch = int(time.time())
+    # Window w starts at now + bounds[w - 1] hours; the first one has no lower bound
+    starts = [INVALID_EPOCH] + [now_epoch + int(h) * 3600 for h in bounds]
+    windows = [
+        (label, chunk, start)
+        for (label, chunk), start in zip(split_by_lead(records, bounds, now_epoch), starts)
+        if chunk
+    ]
+    if len(windows) > 1:
+        logger.info("   Progressive publish: " + ", ".join(f"{label} {len(chunk):,}" for label, chunk, _ in windows))
+
+    result = PublishResult(name)
+    for label, chunk, start in windows:
+        try:
+            with stage(f"publish_{label}"):
+                written = publish(chunk)
+        except Exception as e:
+            logger.error(f"   {name} {label} window failed: {e}")
+            result.failed.append(label)
+            if result.failed_from is None:
+                result.failed_from = start
+            continue
+        result.written += written
+        message = f"{name} {label} published: {written:,} records"
+        logger.info(f"   {message}")
+        record_step(message)
+    return result
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Adaptive per-host rate limiting for Hybrid Surf Database Update Script
+One token bucket per upstream host with AIMD pacing: the rate creeps up
+while a host answers normally and is cut on a 429 / rate-limit page, so each
+run settles at what the upstream actually tolerates. Safe to share between
+threads and asyncio tasks (waits are reserved under a short lock, then slept
+outside it).
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from config import RATE_LIMITS, RATE_LIMIT_INCREASE, RATE_LIMIT_DECREASE, RATE_LIMIT_RECOVERY_SECONDS
+from instrumentation import record_rate_limit_sleep
+
+# Get shared logger
+logger = logging.getLogger("surf_update")
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket whose refill rate follows AIMD.
+
+    Every grant made while the host has not throttled us for
+    RATE_LIMIT_RECOVERY_SECONDS adds `increase` req/s (up to max_rate); every
+    throttle multiplies the rate by `decrease` (down to min_rate) and empties
+    the bucket so the next request waits a full interval.
+    """
+
+    def __init__(self, host: str, rate: float, min_rate: float, max_rate: float,
+                 burst: float = 1.0, increase: float = RATE_LIMIT_INCREASE,
+                 decrease: float = RATE_LIMIT_DECREASE, recovery_seconds: float = RATE_LIMIT_RECOVERY_SECONDS):
+        self.host = host
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.burst = float(burst)
+        self.increase = increase
+        self.decrease = decrease
+        self.recovery_seconds = recovery_seconds
+
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._last_throttle = float("-inf")
+        self._lock = threading.Lock()
+
+        self.granted = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.throttles = 0
+
+    def _reserve(self, tokens: float) -> float:
+        """Take `tokens` now (the balance may go negative) and return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = max(0.0, -self._tokens / self.rate)
+
+            if now - self._last_throttle >= self.recovery_seconds:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+            self.granted += 1
+            if wait > 0:
+                self.waits += 1
+                self.wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            return wait
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until a request may go out; returns the seconds waited."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+            record_rate_limit_sleep(self.host, wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """acquire() for coroutines (does not block the event loop)."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+            record_rate_limit_sleep(self.host, wait)
+        return wait
+
+    def on_throttle(self):
+        """The host said slow down (429, rate-limit page): cut the rate multiplicatively."""
+        with self._lock:
+            previous = self.rate
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+            self._last_throttle = time.monotonic()
+            self.throttles += 1
+        logger.warning(f"   Rate limit: {self.host} throttled us, {previous:.2f} -> {self.rate:.2f} req/s")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rate_per_s": round(self.rate, 3),
+                "granted": self.granted,
+                "waits": self.waits,
+                "wait_s": round(self.wait_seconds, 3),
+                "max_wait_s": round(self.max_wait_seconds, 3),
+                "throttles": self.throttles,
+            }
+
+
+_limiters: Dict[str, AdaptiveTokenBucket] = {}
+_registry_lock = threading.Lock()
+
+
+def host_of(url_or_host: Optional[str]) -> str:
+    if not url_or_host:
+        return "default"
+    return urlparse(str(url_or_host)).hostname or str(url_or_host)
+
+
+def get_limiter(url_or_host: Optional[str]) -> AdaptiveTokenBucket:
+    """Shared bucket for a host (URLs are reduced to their hostname)."""
+    host = host_of(url_or_host)
+    with _registry_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            rate, min_rate, max_rate, burst = RATE_LIMITS.get(host, RATE_LIMITS["default"])
+            limiter = _limiters[host] = AdaptiveTokenBucket(host, rate, min_rate, max_rate, burst)
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict]:
+    """Current rate and wait stats per host (for the run report)."""
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return {limiter.host: limiter.stats() for limiter in limiters}
+
+
+def reset():
+    """Forget all buckets (used by benchmarks between runs)."""
+    with _registry_lock:
+        _limiters.clear()
+
+
+def limited_get(url: str, session=None, **kwargs):
+    """
+    requests GET paced by the host's bucket; a 429 response cuts that host's rate.
+    Without a session the shared cached session is used, which only paces
+    requests that actually go out (cache hits do not take a token).
+    """
+    if session is None:
+        from http_cache import shared_session
+        return shared_session().get(url, **kwargs)
+
+    limiter = get_limiter(url)
+    limiter.acquire()
+    response = session.get(url, **kwargs)
+    if response.status_code == 429:
+        limiter.on_throttle()
+    return response
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Reference-table snapshots for Hybrid Surf Database Update Script
+beaches, counties and grid_points rarely change, so each is kept as a versioned
+snapshot in REFERENCE_CACHE_DIR. One reference_table_version() RPC per table
+(migrations/reference_table_version.sql) checks the snapshot; rows are only
+paged over REST when the version changed. CoordinateIndex hands the loaded
+coordinates to callers as NumPy arrays with a vectorized nearest lookup.
+"""
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import REFERENCE_CACHE_DIR
+from utils import valid_coord
+
+# Get shared logger
+logger = logging.getLogger("surf_update")
+
+REFERENCE_PAGE_SIZE = 1000
+# One column set per table, shared by every loader so the snapshots are not refetched back and forth
+BEACH_COLUMNS = ("id", "Name", "LATITUDE", "LONGITUDE", "COUNTY", "grid_id")
+GRID_POINT_COLUMNS = (
+    "id", "latitude", "longitude", "latitude_index", "longitude_index", "region", "distance_from_coast_miles",
+)
+EARTH_RADIUS_KM = 6371.0
+
+# (table, columns) -> rows already loaded by this process
+_LOADED: Dict[Tuple[str, Tuple[str, ...]], List[Dict]] = {}
+
+
+def _snapshot_path(table: str) -> str:
+    return os.path.join(REFERENCE_CACHE_DIR, f"{table}.json.gz")
+
+
+def _probe_version(client, table: str, columns: Tuple[str, ...]) -> Optional[Dict]:
+    """Server-side version of the table (row count, max(updated_at), checksum), or None."""
+    try:
+        resp = client.rpc("reference_table_version", {
+            "target_table": table,
+            "columns": list(columns) if columns else None,
+        }).execute()
+        return resp.data
+    except Exception as e:
+        logger.debug(f"   reference_table_version unavailable for {table}: {e}")
+        return None
+
+
+def _read_snapshot(table: str) -> Optional[Dict]:
+    if not REFERENCE_CACHE_DIR:
+        return None
+    try:
+        with gzip.open(_snapshot_path(table), "rt", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(table: str, columns: Tuple[str, ...], version: Optional[Dict], rows: List[Dict]) -> None:
+    if not REFERENCE_CACHE_DIR:
+        return
+    path = _snapshot_path(table)
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(REFERENCE_CACHE_DIR, exist_ok=True)
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+            json.dump({
+                "table": table,
+                "columns": list(columns),
+                "version": version,
+                "saved_at": datetime.now(timezone.utc).isoformat(),
+                "rows": rows,
+            }, fh, default=str)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"   Could not write {table} snapshot: {e}")
+
+
+def _fetch_rows(client, table: str, columns: Tuple[str, ...]) -> List[Dict]:
+    """Page the whole table over REST (raises on failure)."""
+    rows = []
+    start = 0
+    while True:
+        resp = (
+            client
+            .table(table)
+            .select(",".join(columns) if columns else "*")
+            .range(start, start + REFERENCE_PAGE_SIZE - 1)
+            .execute()
+        )
+        page = resp.data or []
+        rows.extend(page)
+        if len(page) < REFERENCE_PAGE_SIZE:
+            return rows
+        start += REFERENCE_PAGE_SIZE
+
+
+def load_reference_rows(client, table: str, columns: Sequence[str] = ()) -> List[Dict]:
+    """
+    All rows of a reference table, from the local snapshot when it is current.
+
+    Args:
+        client: Supabase client
+        table: Table name
+        columns: Columns to load (empty = all)
+
+    Returns:
+        New list of row dict copies (callers may modify them); a stale snapshot
+        if the table cannot be read, else []
+    """
+    columns = tuple(columns)
+    key = (table, columns)
+    if key not in _LOADED:
+        rows = _load_rows(client, table, columns)
+        if rows is None:
+            return []
+        _LOADED[key] = rows
+    return [dict(row) for row in _LOADED[key]]
+
+
+def _load_rows(client, table: str, columns: Tuple[str, ...]) -> Optional[List[Dict]]:
+    """Snapshot or REST rows for load_reference_rows(); None when neither is available."""
+    version = _probe_version(client, table, columns)
+    snapshot = _read_snapshot(table)
+    if (
+        snapshot is not None and version is not None
+        and tuple(snapshot.get("columns") or ()) == columns
+        and snapshot.get("version") == version
+    ):
+        rows = snapshot.get("rows") or []
+        logger.info(f"   {table}: {len(rows)} rows from local snapshot (unchanged since {snapshot.get('saved_at')})")
+        return rows
+
+    try:
+        rows = _fetch_rows(client, table, columns)
+    except Exception as e:
+        if snapshot is not None and tuple(snapshot.get("columns") or ()) == columns:
+            logger.warning(f"   Could not read {table} ({e}); using snapshot from {snapshot.get('saved_at')}")
+            return snapshot.get("rows") or []
+        logger.error(f"ERROR: Error fetching {table}: {e}")
+        return None
+
+    _write_snapshot(table, columns, version, rows)
+    logger.info(f"   {table}: {len(rows)} rows fetched, snapshot refreshed")
+    return rows
+
+
+def reset_loaded() -> None:
+    """Forget the rows loaded by this process (long-running watchers revalidate per model cycle)."""
+    _LOADED.clear()
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km; broadcasts over arrays (longitude convention does not matter)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class CoordinateIndex:
+    """Coordinates of reference rows as NumPy arrays with vectorized nearest-row lookup."""
+
+    def __init__(self, rows: List[Dict], lat_key: str = "latitude", lon_key: str = "longitude", id_key: str = "id"):
+        self.rows = [r for r in rows if valid_coord(r.get(lat_key)) and valid_coord(r.get(lon_key))]
+        self.ids = np.array([r.get(id_key) for r in self.rows], dtype=object)
+        self.lats = np.array([float(r[lat_key]) for r in self.rows], dtype=np.float64)
+        self.lons = np.array([float(r[lon_key]) for r in self.rows], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def nearest(self, lats, lons, chunk: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest indexed row for each query point.
+
+        Returns:
+            (row positions, distances in km); position -1 / distance inf if the index is empty
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        positions = np.full(lats.size, -1, dtype=np.int64)
+        distances = np.full(lats.size, np.inf)
+        if not len(self):
+            return positions, distances
+        for start in range(0, lats.size, chunk):
+            part = slice(start, start + chunk)
+            d = haversine_km(lats[part, None], lons[part, None], self.lats[None, :], self.lons[None, :])
+            positions[part] = np.argmin(d, axis=1)
+            distances[part] = d[np.arange(d.shape[0]), positions[part]]
+        return positions, distances
+
+    def within(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Positions of rows within radius_km of a point, nearest first."""
+        d = haversine_km(lat, lon, self.lats, self.lons)
+        hits = np.flatnonzero(d <= radius_km)
+        return hits[np.argsort(d[hits], kind="stable")]
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Record/replay fixtures for Hybrid Surf Database Update Script
+Captures HTTP responses (NWS, CO-OPS, Open-Meteo, USNO, ...) and the coastal
+subset of every OPeNDAP dataset the handlers read, then serves them back
+offline with configurable artificial latency.
+
+Supabase reads of the reference tables are snapshotted on record; on replay
+the client's table()/rpc() are served by an in-memory FakeSupabaseClient.
+
+Controlled by REPLAY_MODE (off | record | replay), REPLAY_FIXTURE_DIR and
+REPLAY_LATENCY_MS ("150" or "nomads.ncep.noaa.gov=800,api.weather.gov=150,default=100").
+Dates in URLs are keyed relative to the run date and shifted on replay, so a
+fixture recorded last week replays as if it had been fetched today (JSON/text
+bodies and netCDF time axes are shifted; binary Open-Meteo payloads are not).
+"""
+
+import atexit
+import base64
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import pytz
+
+from config import (
+    logger, REPLAY_MODE, REPLAY_FIXTURE_DIR, REPLAY_LATENCY_MS, REPLAY_BOX
+)
+
+MODES = ("off", "record", "replay")
+REPLAY_TABLES = ("beaches", "counties", "grid_points")
+SNAPSHOT_PAGE_SIZE = 1000
+SECRET_PARAMS = {"key", "apikey", "api_key", "token", "access_token"}
+KEPT_HEADERS = ("Content-Type", "Content-Encoding", "ETag", "Last-Modified", "Cache-Control")
+
+_DATE_DASHED = re.compile(r"(?<!\d)(20\d{2})-(\d{2})-(\d{2})(?!\d)")
+_DATE_COMPACT = re.compile(r"(?<!\d)(20\d{2})(\d{2})(\d{2})(?!\d)")
+_RELATIVE_TOKEN = re.compile(r"\{D([+-]\d+)(c?)\}")
+
+_installed = False
+_lock = threading.Lock()
+_open_recorders = []
+_recorded_vars = defaultdict(set)  # fixture name -> variables read across every open of that URL
+
+
+# === CONFIG HELPERS ===
+def get_mode() -> str:
+    mode = (REPLAY_MODE or "off").strip().lower()
+    if mode not in MODES:
+        logger.warning(f"   Unknown REPLAY_MODE '{mode}', replay disabled")
+        return "off"
+    return mode
+
+
+def _parse_latency(spec: str) -> dict:
+    """'150' -> {'default': 0.15}; 'host=800,default=100' -> per-host seconds."""
+    latency = {"default": 0.0}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        host, _, value = part.rpartition("=")
+        try:
+            latency[host.strip() or "default"] = float(value) / 1000.0
+        except ValueError:
+            logger.warning(f"   Ignoring bad REPLAY_LATENCY_MS entry '{part}'")
+    return latency
+
+
+_LATENCY = _parse_latency(REPLAY_LATENCY_MS)
+
+
+def _simulate_latency(url: str):
+    host = urlparse(url).hostname or ""
+    delay = _LATENCY.get(host, _LATENCY["default"])
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _today() -> date:
+    return datetime.now(pytz.timezone("America/Los_Angeles")).date()
+
+
+# === KEYS ===
+def _relative_dates(text: str, today: date) -> str:
+    """Replace calendar dates with offsets from `today` ({D-1} / {D+0c} for compact form)."""
+    def swap(match, compact):
+        try:
+            day = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            return match.group(0)
+        return "{D%+d%s}" % ((day - today).days, "c" if compact else "")
+
+    text = _DATE_DASHED.sub(lambda m: swap(m, False), text)
+    return _DATE_COMPACT.sub(lambda m: swap(m, True), text)
+
+
+def _absolute_dates(text: str, today: date) -> str:
+    """Inverse of _relative_dates()."""
+    def swap(match):
+        day = today + timedelta(days=int(match.group(1)))
+        return day.strftime("%Y%m%d" if match.group(2) else "%Y-%m-%d")
+    return _RELATIVE_TOKEN.sub(swap, text)
+
+
+def _redact(url: str) -> str:
+    parsed = urlparse(url)
+    query = [(k, "REDACTED" if k.lower() in SECRET_PARAMS else v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)]
+    return urlunparse(parsed._replace(query=urlencode(sorted(query))))
+
+
+def _fixture_key(kind: str, method: str, url: str, body: bytes = b"") -> tuple:
+    """(hash, normalized) where normalized has secrets redacted and dates made relative."""
+    normalized = f"{method.upper()} {_relative_dates(_redact(url), _today())}"
+    digest = hashlib.sha1(normalized.encode("utf-8"))
+    if body:
+        digest.update(body if isinstance(body, bytes) else str(body).encode("utf-8"))
+    return f"{kind}-{digest.hexdigest()[:16]}", normalized
+
+
+def _fixture_path(name: str, suffix: str) -> str:
+    return os.path.join(REPLAY_FIXTURE_DIR, f"{name}{suffix}")
+
+
+def _shift_days(meta: dict) -> int:
+    recorded = meta.get("recorded_on")
+    if not recorded:
+        return 0
+    return (_today() - date.fromisoformat(recorded)).days
+
+
+# === HTTP ===
+def _record_response(name: str, normalized: str, response):
+    os.makedirs(REPLAY_FIXTURE_DIR, exist_ok=True)
+    payload = {
+        "request": normalized,
+        "recorded_on": _today().isoformat(),
+        "status": response.status_code,
+        "headers": {h: response.headers[h] for h in KEPT_HEADERS if h in response.headers},
+        "body_b64": base64.b64encode(response.content or b"").decode("ascii"),
+    }
+    with open(_fixture_path(name, ".json"), "w", encoding="utf-8") as fh:
+        json.dump(payload, fh)
+
+
+def _replay_response(name: str, request):
+    import requests
+
+    path = _fixture_path(name, ".json")
+    if not os.path.exists(path):
+        raise requests.exceptions.ConnectionError(f"No replay fixture for {_redact(request.url)}")
+    with open(path, encoding="utf-8") as fh:
+        payload = json.load(fh)
+
+    body = base64.b64decode(payload["body_b64"])
+    shift = _shift_days(payload)
+    content_type = payload["headers"].get("Content-Type", "")
+    if shift and ("json" in content_type or "text" in content_type):
+        recorded_on = date.fromisoformat(payload["recorded_on"])
+        text = _relative_dates(body.decode("utf-8", errors="replace"), recorded_on)
+        body = _absolute_dates(text, _today()).encode("utf-8")
+
+    response = requests.Response()
+    response.status_code = payload["status"]
+    response.headers.update(payload["headers"])
+    response.headers.pop("Content-Encoding", None)  # body is stored decoded
+    response._content = body
+    response.url = request.url
+    response.request = request
+    response.encoding = "utf-8"
+    return response
+
+
+def _install_http(mode: str):
+    try:
+        import requests
+    except ImportError:
+        return
+
+    original_send = requests.Session.send
+
+    @functools.wraps(original_send)
+    def send(self, request, **kwargs):
+        name, normalized = _fixture_key("http", request.method, request.url, request.body or b"")
+        if mode == "replay":
+            _simulate_latency(request.url)
+            return _replay_response(name, request)
+        response = original_send(self, request, **kwargs)
+        try:
+            _record_response(name, normalized, response)
+        except OSError as e:
+            logger.warning(f"   Replay: could not record {normalized}: {e}")
+        return response
+
+    requests.Session.send = send
+
+
+# === OPENDAP ===
+def _box_slices(ds) -> dict:
+    """isel() slices covering REPLAY_BOX on the dataset's lat/lon axes."""
+    lat_min, lat_max, lon_min, lon_max = REPLAY_BOX
+    slices = {}
+    for lat_name in ("lat", "latitude"):
+        if lat_name in ds.coords:
+            lats = ds[lat_name].values
+            idx = [i for i, v in enumerate(lats) if lat_min <= v <= lat_max]
+            if idx:
+                slices[lat_name] = slice(min(idx), max(idx) + 1)
+    for lon_name in ("lon", "longitude"):
+        if lon_name in ds.coords:
+            lons = ds[lon_name].values
+            uses_360 = float(lons.max()) > 180
+            lo, hi = (lon_min % 360, lon_max % 360) if uses_360 else (lon_min, lon_max)
+            idx = [i for i, v in enumerate(lons) if lo <= v <= hi]
+            if idx:
+                slices[lon_name] = slice(min(idx), max(idx) + 1)
+    return slices
+
+
+def _translate_indexers(indexers: dict, offsets: dict) -> dict:
+    """Full-grid isel() indexers -> indexers on the recorded subset (the only place offsets are applied)."""
+    translated = dict(indexers)
+    for dim, value in indexers.items():
+        offset = offsets.get(dim)
+        if not offset:
+            continue
+        if isinstance(value, slice):
+            translated[dim] = slice(
+                None if value.start is None else value.start - offset,
+                None if value.stop is None else value.stop - offset,
+                value.step,
+            )
+        else:
+            translated[dim] = value - offset
+    return translated
+
+
+class _RecordingDataset:
+    """Wraps a live dataset, remembers which variables were read, writes their coastal subset on close."""
+
+    def __init__(self, ds, name: str, normalized: str):
+        self._ds = ds
+        self._name = name
+        self._normalized = normalized
+        self._read_vars = _recorded_vars[name]
+        self._saved = False
+
+    def __getattr__(self, attr):
+        if attr in self._ds.data_vars:
+            self._read_vars.add(attr)
+        return getattr(self._ds, attr)
+
+    def __getitem__(self, key):
+        if isinstance(key, str) and key in self._ds.data_vars:
+            self._read_vars.add(key)
+        return self._ds[key]
+
+    def __contains__(self, key):
+        return key in self._ds
+
+    def save(self):
+        if self._saved:
+            return
+        self._saved = True
+        try:
+            slices = _box_slices(self._ds)
+            subset = self._ds[sorted(self._read_vars)] if self._read_vars else self._ds[[]]
+            subset = subset.isel(slices).load()
+            os.makedirs(REPLAY_FIXTURE_DIR, exist_ok=True)
+            subset.to_netcdf(_fixture_path(self._name, ".nc"))
+            meta = {
+                "request": self._normalized,
+                "recorded_on": _today().isoformat(),
+                "offsets": {dim: s.start for dim, s in slices.items()},
+                # Full lat/lon axes, so replayed coordinates give the same indices as the live grid
+                "axes": {dim: self._ds[dim].values.tolist() for dim in slices},
+                "variables": sorted(self._read_vars),
+            }
+            with open(_fixture_path(self._name, ".json"), "w", encoding="utf-8") as fh:
+                json.dump(meta, fh)
+            logger.info(f"   Replay: recorded {len(self._read_vars)} variables for {self._normalized}")
+        except Exception as e:
+            logger.warning(f"   Replay: could not record {self._normalized}: {e}")
+
+    def close(self):
+        self.save()
+        return self._ds.close()
+
+
+class _OffsetArray:
+    """DataArray proxy translating full-grid isel() indices onto the recorded subset."""
+
+    def __init__(self, array, offsets: dict):
+        self._array = array
+        self._offsets = offsets
+
+    def __getattr__(self, attr):
+        return getattr(self._array, attr)
+
+    def __getitem__(self, key):
+        return self._array[key]
+
+    def __len__(self):
+        return len(self._array)
+
+    def isel(self, indexers=None, **kwargs):
+        return self._array.isel(_translate_indexers(dict(indexers or {}, **kwargs), self._offsets))
+
+
+class _ReplayDataset:
+    """
+    Recorded subset served in place of the remote dataset; each variable read pays the host latency.
+
+    Coordinates are served on the full grid (the recorded axes), so indices a
+    handler derives from ds["lat"] match indices stored from the live grid
+    (grid_points.latitude_index); both are full-grid and are shifted onto the
+    subset only by isel().
+    """
+
+    def __init__(self, ds, offsets: dict, axes: dict, url: str):
+        self._ds = ds
+        self._offsets = offsets
+        self._axes = axes
+        self._url = url
+
+    def _variable(self, key):
+        if key in self._axes:
+            return self._axes[key]
+        if key in self._ds.data_vars:
+            _simulate_latency(self._url)
+            return _OffsetArray(self._ds[key], self._offsets)
+        return None
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        found = self._variable(attr)
+        return found if found is not None else getattr(self._ds, attr)
+
+    def __getitem__(self, key):
+        found = self._variable(key) if isinstance(key, str) else None
+        return found if found is not None else self._ds[key]
+
+    def __contains__(self, key):
+        return key in self._ds
+
+    @property
+    def sizes(self):
+        return dict(self._ds.sizes, **{dim: axis.size for dim, axis in self._axes.items()})
+
+    def isel(self, indexers=None, **kwargs):
+        indexers = dict(indexers or {}, **kwargs)
+        if any(dim in self._axes for dim in indexers):
+            return self._ds.isel(_translate_indexers(indexers, self._offsets))
+        return _ReplayDataset(self._ds.isel(indexers), self._offsets, self._axes, self._url)
+
+
+def _open_replay(url: str, name: str, normalized: str, original_open):
+    """Recorded fixture for an OPeNDAP URL as a _ReplayDataset (raises OSError like a failed open)."""
+    import numpy as np
+    import xarray as xr
+
+    meta_path = _fixture_path(name, ".json")
+    if not os.path.exists(meta_path):
+        raise OSError(f"No replay fixture for {normalized}")
+    with open(meta_path, encoding="utf-8") as fh:
+        meta = json.load(fh)
+    if "error" in meta:
+        raise OSError(meta["error"])
+    ds = original_open(_fixture_path(name, ".nc")).load()
+    shift = _shift_days(meta)
+    if shift:
+        for coord in ds.coords:
+            if np.issubdtype(ds[coord].dtype, np.datetime64):
+                ds = ds.assign_coords({coord: ds[coord].values + np.timedelta64(shift, "D")})
+
+    offsets = meta.get("offsets", {})
+    if offsets and "axes" not in meta:
+        logger.warning(f"   Replay: fixture for {normalized} predates full-axis recording; re-record it")
+    axes = {}
+    for dim, values in meta.get("axes", {}).items():
+        values = np.asarray(values, dtype=ds[dim].dtype)
+        axes[dim] = xr.DataArray(values, coords={dim: values}, dims=dim, name=dim, attrs=ds[dim].attrs)
+    return _ReplayDataset(ds, offsets, axes, url)
+
+
+def _install_opendap(mode: str):
+    try:
+        import xarray as xr
+    except ImportError:
+        return
+
+    original_open = xr.open_dataset
+
+    @functools.wraps(original_open)
+    def open_dataset(filename_or_obj, *args, **kwargs):
+        if not isinstance(filename_or_obj, str) or not filename_or_obj.startswith(("http://", "https://")):
+            return original_open(filename_or_obj, *args, **kwargs)
+
+        name, normalized = _fixture_key("dap", "GET", filename_or_obj)
+        meta_path = _fixture_path(name, ".json")
+
+        if mode == "replay":
+            _simulate_latency(filename_or_obj)
+            return _open_replay(filename_or_obj, name, normalized, original_open)
+
+        try:
+            ds = original_open(filename_or_obj, *args, **kwargs)
+        except Exception as e:
+            # Failed probes are part of model-run discovery; replay them as failures too
+            os.makedirs(REPLAY_FIXTURE_DIR, exist_ok=True)
+            with open(meta_path, "w", encoding="utf-8") as fh:
+                json.dump({"request": normalized, "recorded_on": _today().isoformat(),
+                           "error": f"{type(e).__name__}: {e}"}, fh)
+            raise
+        recorder = _RecordingDataset(ds, name, normalized)
+        with _lock:
+            _open_recorders.append(recorder)
+        return recorder
+
+    xr.open_dataset = open_dataset
+
+
+def _flush_recorders():
+    with _lock:
+        recorders = list(_open_recorders)
+        _open_recorders.clear()
+    for recorder in recorders:
+        recorder.save()
+
+
+# === SUPABASE ===
+def _snapshot_tables():
+    """Save the reference tables the pipelines read so replay can serve them offline."""
+    from database import supabase
+
+    os.makedirs(REPLAY_FIXTURE_DIR, exist_ok=True)
+    for table in REPLAY_TABLES:
+        rows, start = [], 0
+        try:
+            while True:
+                resp = supabase.table(table).select("*").range(start, start + SNAPSHOT_PAGE_SIZE - 1).execute()
+                batch = resp.data or []
+                rows.extend(batch)
+                if len(batch) < SNAPSHOT_PAGE_SIZE:
+                    break
+                start += SNAPSHOT_PAGE_SIZE
+        except Exception as e:
+            logger.warning(f"   Replay: could not snapshot {table}: {e}")
+            continue
+        with open(_fixture_path(f"supabase-{table}", ".json"), "w", encoding="utf-8") as fh:
+            json.dump(rows, fh, default=str)
+        logger.info(f"   Replay: snapshotted {len(rows)} {table} rows")
+
+
+def _install_fake_database():
+    """Point the shared supabase client's table()/rpc() at an in-memory copy of the snapshots."""
+    import database
+    from fake_supabase import FakeSupabaseClient
+
+    fake = FakeSupabaseClient()
+    for table in REPLAY_TABLES:
+        path = _fixture_path(f"supabase-{table}", ".json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                fake.load_table(table, json.load(fh))
+        else:
+            logger.warning(f"   Replay: no snapshot for {table}; it will read as empty")
+
+    # Patch the instance so modules that already imported `supabase` see the fake too
+    database.supabase.table = fake.table
+    database.supabase.from_ = fake.from_
+    database.supabase.rpc = fake.rpc
+    return fake
+
+
+# === ENTRY POINT ===
+def install() -> str:
+    """Hook requests and xarray according to REPLAY_MODE (idempotent); returns the active mode."""
+    global _installed
+    mode = get_mode()
+    if mode == "off" or _installed:
+        return mode
+
+    if mode == "record":
+        _snapshot_tables()
+        atexit.register(_flush_recorders)
+    else:
+        _install_fake_database()
+    _install_http(mode)
+    _install_opendap(mode)
+    _installed = True
+
+    latency = ", ".join(f"{h}={s * 1000:.0f}ms" for h, s in _LATENCY.items() if s)
+    logger.info(f"   Replay: {mode} mode using fixtures in {REPLAY_FIXTURE_DIR}" + (f" (latency {latency})" if latency else ""))
+    return mode
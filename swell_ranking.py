@@ -6,6 +6,7 @@ Handles dynamic swell prioritization and surf impact calculations
 
 import math
 import logging
+import numpy as np
 from utils import safe_float, calculate_wave_energy_kj as util_wave_energy_kj
 
 # Get shared logger
@@ -63,6 +64,14 @@ def calculate_surf_size_score(height_ft, period_s, direction_deg=None, beach_lat
         logger.error(f"Error calculating surf size score: {e}")
         return 0
 
+def surf_size_score_array(height_ft, period_s):
+    """calculate_surf_size_score() over arrays of valid heights/periods (same bonuses and rounding)."""
+    height_ft = np.asarray(height_ft, dtype=np.float64)
+    period_s = np.asarray(period_s, dtype=np.float64)
+    period_bonus = np.select([period_s >= 16, period_s >= 12, period_s >= 8], [2.0, 1.5, 1.2], 1.0)
+    size_bonus = np.select([height_ft >= 6, height_ft >= 4, height_ft >= 2], [1.5, 1.3, 1.1], 1.0)
+    return np.round((height_ft ** 2) * period_s * period_bonus * size_bonus, 2)
+
 def calculate_wave_energy_kj(wave_height_ft, wave_period_s, direction_deg=None, beach_normal_deg=None):
     """
     Calculate wave energy in kilojoules using deep-water approximation.
@@ -111,6 +120,30 @@ def rank_swell_trains(swell_data_list):
     
     return [primary, secondary, tertiary]
 
+def rank_swell_train_arrays(height_ft, period_s, valid):
+    """
+    rank_swell_trains() over stacked arrays: trains on axis 0, any shape after it.
+
+    Args:
+        height_ft, period_s: (n_trains, ...) arrays
+        valid: (n_trains, ...) mask of trains that take part in the ranking
+
+    Returns:
+        (order, n_valid): order[k] is the train index ranked k-th (ties keep train
+        order, like the stable sort); rank k exists where k < n_valid
+    """
+    scores = np.where(valid, surf_size_score_array(np.where(valid, height_ft, 0), np.where(valid, period_s, 0)), -np.inf)
+    order = np.argsort(-scores, axis=0, kind="stable")
+    return order, valid.sum(axis=0)
+
+def surf_height_range_array(significant_wave_height_m):
+    """get_surf_height_range() over an array; NaN bands where the height is missing."""
+    hs_ft = np.asarray(significant_wave_height_m, dtype=np.float64) * 3.28084
+    width = np.select([hs_ft < 3, hs_ft < 6], [1.0, 2.0], 3.0)
+    band_min = np.maximum(0.0, np.floor(hs_ft - width / 2.0))
+    missing = ~np.isfinite(hs_ft)
+    return np.where(missing, np.nan, band_min), np.where(missing, np.nan, band_min + width)
+
 def create_swell_train_data(height_m, period_s, direction_deg, beach_lat, beach_lon, source_name):
     """
     Create a standardized swell train data structure.
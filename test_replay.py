@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Check that replayed OPeNDAP reads match the live reads they were recorded from.
+
+Opens the current GFS atmospheric dataset through the replay recorder, reads
+  - the coastal cube with load_atmospheric_cube() (indices derived from ds["lat"] / ds["lon"])
+  - one grid cell at full-grid indices (as stored in grid_points.latitude_index)
+  - one variable by attribute access (ds.hgtsfc)
+then replays the fixture it just wrote and compares every array.
+
+Requires network access to NOMADS:
+    python test_replay.py
+"""
+
+import sys
+import tempfile
+
+import numpy as np
+import xarray as xr
+
+import replay
+from gfs_atmospheric_cube import load_atmospheric_cube
+from gfs_atmospheric_handler_v2 import get_gfs_atmospheric_dataset_url
+
+# ---------------------------------------------------------------------
+# Southern California, inside REPLAY_BOX
+BOUNDS = (32.5, 34.5, -119.0, -117.0)
+POINT_LAT = 33.65
+POINT_LON = -118.0 + 360.0   # GFS uses 0..360
+TIME_INDICES = range(0, 9)
+ATTR_VAR = "hgtsfc"          # not part of the cube, only read as ds.hgtsfc
+# ---------------------------------------------------------------------
+
+
+def read_all(ds):
+    cube = load_atmospheric_cube(ds, BOUNDS, TIME_INDICES)
+    i = int(np.abs(np.asarray(ds["lat"].values) - POINT_LAT).argmin())
+    j = int(np.abs(np.asarray(ds["lon"].values) - POINT_LON).argmin())
+    arrays = {
+        "cube lats": cube.lats,
+        "cube lons": cube.lons,
+        "point tmp2m": ds["tmp2m"].isel(time=slice(0, 9), lat=i, lon=j).values,
+        f"attribute {ATTR_VAR}": getattr(ds, ATTR_VAR).isel(time=0, lat=slice(i - 2, i + 3), lon=j).values,
+    }
+    for var, values in cube.data.items():
+        arrays[f"cube {var}"] = values
+    return (i, j), arrays
+
+
+def main():
+    url = get_gfs_atmospheric_dataset_url()
+    if not url:
+        print("ERROR: no GFS atmospheric dataset available")
+        sys.exit(1)
+    print(f"Live dataset: {url}")
+
+    replay.REPLAY_FIXTURE_DIR = tempfile.mkdtemp(prefix="replay-check-")
+    name, normalized = replay._fixture_key("dap", "GET", url)
+
+    live = replay._RecordingDataset(xr.open_dataset(url), name, normalized)
+    live_point, live_arrays = read_all(live)
+    live.close()  # writes the fixture
+    print(f"Recorded {sorted(replay._recorded_vars[name])} to {replay.REPLAY_FIXTURE_DIR}")
+
+    replayed = replay._open_replay(url, name, normalized, xr.open_dataset)
+    replay_point, replay_arrays = read_all(replayed)
+
+    failures = 0
+    if live_point != replay_point:
+        print(f"FAIL grid cell: live {live_point} vs replay {replay_point}")
+        failures += 1
+    for key, live_values in live_arrays.items():
+        replay_values = replay_arrays.get(key)
+        ok = (
+            replay_values is not None
+            and np.shape(live_values) == np.shape(replay_values)
+            and np.array_equal(live_values, replay_values, equal_nan=True)
+        )
+        print(f"{'PASS' if ok else 'FAIL'} {key}: shape {np.shape(live_values)}")
+        failures += not ok
+
+    if failures:
+        print(f"ERROR: {failures} replayed read(s) differ from live")
+        sys.exit(1)
+    print("Replay matches live output")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Compare the vectorized utils.derive_weather_codes() / wind_speed_direction()
+against the scalar code they replaced, on one mixed fixture:
+  - threshold boundaries (precip 0.5 / 2.5 / 10 / 50 mm/hr, cloud 10 / 25 / 50 / 70 / 90 %, 35°F)
+  - None and NaN inputs (the handlers passed None to the scalar for NaN reads)
+  - calm wind (u = v = 0), pure compass directions and random u/v
+
+Runs offline:
+    python test_weather_codes.py
+"""
+
+import itertools
+import sys
+
+import numpy as np
+
+from gfs_atmospheric_handler_v2 import derive_weather_code as derive_weather_code_v2
+from gfs_atmospheric_handler import derive_weather_code as derive_weather_code_v1
+from utils import derive_weather_codes, wind_speed_direction
+
+
+def as_scalar_input(value):
+    """What the handlers handed to the scalar function: None for a missing or NaN read."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return float(value)
+
+
+def scalar_wind(u, v):
+    """Per-sample wind speed/direction as noaa_grid_handler / gfs_atmospheric_handler_v2 computed it."""
+    if u is None or v is None or np.isnan(u) or np.isnan(v):
+        return None, None
+    return float(np.sqrt(u ** 2 + v ** 2)), float((270 - np.degrees(np.arctan2(v, u))) % 360)
+
+
+def weather_fixture(seed: int = 7):
+    clouds = [None, np.nan, 0.0, 9.99, 10.0, 24.99, 25.0, 49.99, 50.0, 69.99, 70.0, 89.99, 90.0, 100.0]
+    precips = [None, np.nan, 0.0, 0.5, 0.51, 2.49, 2.5, 9.99, 10.0, 49.99, 50.0, 120.0]
+    temps = [None, np.nan, -10.0, 34.99, 35.0, 60.0, 95.0]
+    cases = list(itertools.product(clouds, precips, temps))
+
+    rng = np.random.default_rng(seed)
+    for _ in range(2000):
+        cases.append(tuple(
+            None if rng.random() < 0.05 else (np.nan if rng.random() < 0.05 else float(x))
+            for x in (rng.uniform(0, 100), rng.choice([0.0, rng.uniform(0, 80)]), rng.uniform(0, 100))
+        ))
+    return cases
+
+
+def wind_fixture(seed: int = 11):
+    cases = [
+        (0.0, 0.0), (-0.0, 0.0), (0.0, -0.0),            # calm
+        (1.0, 0.0), (-1.0, 0.0), (0.0, 1.0), (0.0, -1.0),  # from W, E, S, N
+        (1e-9, -1e-9), (25.0, 25.0), (-3.5, 12.25),
+        (np.nan, 1.0), (1.0, np.nan), (None, 2.0), (2.0, None), (None, None),
+    ]
+    rng = np.random.default_rng(seed)
+    cases.extend((float(u), float(v)) for u, v in rng.normal(0, 8, size=(2000, 2)))
+    return cases
+
+
+def check_weather_codes() -> int:
+    cases = weather_fixture()
+    cloud, precip, temp = (np.array(column, dtype=object) for column in zip(*cases))
+    vectorized = derive_weather_codes(cloud, precip, temp)
+
+    failures = 0
+    for name, scalar in (("gfs_atmospheric_handler_v2", derive_weather_code_v2),
+                         ("gfs_atmospheric_handler", derive_weather_code_v1)):
+        expected = np.array([scalar(*(as_scalar_input(x) for x in case)) for case in cases])
+        bad = np.flatnonzero(expected != vectorized)
+        for k in bad[:10]:
+            print(f"   FAIL {name}: {cases[k]} -> scalar {expected[k]}, vectorized {vectorized[k]}")
+        print(f"{'PASS' if not bad.size else 'FAIL'} derive_weather_codes vs {name}.derive_weather_code: "
+              f"{len(cases) - bad.size}/{len(cases)} match")
+        failures += int(bad.size)
+
+    # Scalars and plain float arrays with NaN go through the same path
+    for case in cases[:50]:
+        single = int(derive_weather_codes(*case))
+        if single != int(derive_weather_code_v2(*(as_scalar_input(x) for x in case))):
+            print(f"   FAIL scalar input {case} -> {single}")
+            failures += 1
+    return failures
+
+
+def check_wind() -> int:
+    cases = wind_fixture()
+    u, v = (np.array(column, dtype=object) for column in zip(*cases))
+    speed, direction = wind_speed_direction(u, v)
+
+    failures = 0
+    for k, (cu, cv) in enumerate(cases):
+        exp_speed, exp_dir = scalar_wind(cu, cv)
+        if exp_speed is None:
+            ok = np.isnan(speed[k]) and np.isnan(direction[k])
+        else:
+            ok = np.isclose(speed[k], exp_speed, rtol=0, atol=1e-12) and np.isclose(direction[k], exp_dir, rtol=0, atol=1e-9)
+        if not ok:
+            failures += 1
+            if failures <= 10:
+                print(f"   FAIL wind {(cu, cv)} -> scalar {(exp_speed, exp_dir)}, vectorized {(speed[k], direction[k])}")
+        if exp_dir is not None and not 0.0 <= direction[k] < 360.0:
+            failures += 1
+            print(f"   FAIL wind {(cu, cv)} direction {direction[k]} outside [0, 360)")
+    print(f"{'PASS' if not failures else 'FAIL'} wind_speed_direction vs per-sample arctan2: "
+          f"{len(cases) - failures}/{len(cases)} match")
+    return failures
+
+
+def main():
+    failures = check_weather_codes() + check_wind()
+    if failures:
+        print(f"ERROR: {failures} mismatches")
+        sys.exit(1)
+    print("Vectorized weather codes and wind match the scalar originals")
+
+
+if __name__ == "__main__":
+    main()
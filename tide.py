@@ -2,10 +2,12 @@
 """
 NOAA CO-OPS Tide Updater for Waves & Waders.
 
-Pulls tide predictions from NOAA CO-OPS API at 6-minute intervals, grouped by county.
-Each county uses the nearest NOAA tide station. Data is stored in `county_tides_15min`
-table (one row per county per timestamp, not per beach). Starting at 12:00 AM of the
-current Pacific day for DAYS_FORECAST days.
+Fetches tide predictions at 6-minute intervals, grouped by county, from the
+nearest NOAA tide station's CO-OPS predictions. With TIDE_SOURCE=harmonic they
+are computed locally from the station's harmonic constituents instead
+(tide_harmonics.py; stations without constants still download). Data is stored in
+`county_tides_15min` table (one row per county per timestamp, not per beach).
+Starting at 12:00 AM of the current Pacific day for DAYS_FORECAST days.
 
 Advantages over Open-Meteo beach-based approach:
   - Uses official NOAA tide predictions (more accurate)
@@ -15,19 +17,25 @@ Advantages over Open-Meteo beach-based approach:
   - Faster queries - join beaches to county tides instead of querying per beach
 """
 
-import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple
+import numpy as np
 import pytz
 
-from config import logger, DAYS_FORECAST, TIDE_ADJUSTMENT_FT
+from config import (
+    logger, DAYS_FORECAST, TIDE_ADJUSTMENT_FT, TIDE_SOURCE, TIDE_INTERVAL_MINUTES, TIDE_REFRESH_MODE
+)
 from database import (
-    fetch_all_beaches, fetch_all_counties,
+    fetch_all_beaches, fetch_all_counties, fetch_county_tide_high_water_marks, count_county_tide_rows,
+    maintain_day_partitions,
     upsert_county_tide_data, delete_all_county_tide_data, delete_county_tide_data_before
 )
 from noaa_tides_handler import (
     find_nearest_tide_station, CA_TIDE_STATIONS
 )
+from rate_limiter import limited_get
+from tide_harmonics import load_station_constants, predict_tides, tide_epochs
+from timestamps import epoch_to_iso, to_epoch_scalar
 import requests
 
 COOPS_BASE_URL = "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter"
@@ -92,7 +100,7 @@ def get_tide_predictions_15min(
     }
 
     try:
-        response = requests.get(COOPS_BASE_URL, params=params, timeout=30)
+        response = limited_get(COOPS_BASE_URL, params=params, timeout=30)
         response.raise_for_status()
         data = response.json()
 
@@ -139,24 +147,79 @@ def get_county_center(beaches: List[Dict]) -> Tuple[float, float]:
     return (avg_lat, avg_lon)
 
 
-def update_tides_by_county(beaches: List[Dict], day_start) -> int:
+def resume_from(mark, station_id: str, day_start):
+    """
+    First Pacific midnight a county still needs tides from.
+
+    Predictions are deterministic, so days up to the county's high-water mark
+    are kept; a partially written last day is redone. Rows from a different
+    station (or no rows at all) mean starting over at day_start.
+    """
+    if not mark:
+        return day_start
+    timestamp, stored_station = mark
+    last_epoch = to_epoch_scalar(timestamp)
+    if last_epoch is None or str(stored_station) != str(station_id):
+        return day_start
+
+    pacific_tz = pytz.timezone('America/Los_Angeles')
+    next_step = datetime.fromtimestamp(last_epoch + TIDE_INTERVAL_MINUTES * 60, tz=pacific_tz)
+    next_midnight = pacific_tz.localize(datetime.combine(next_step.date(), datetime.min.time()))
+    return max(next_midnight, day_start)
+
+
+def first_short_day(county_name: str, day_start, resume, epochs: np.ndarray):
+    """
+    Earliest Pacific day in [day_start, resume) with fewer stored rows than the
+    6-minute grid (`epochs`) expects, else resume.
+
+    The high-water mark only shows the last stored day; a day missing
+    mid-horizon (a failed upsert chunk, a manual delete) is found here and
+    backfilled. One count covers the whole span; days are counted one by one
+    only when rows are missing.
     """
-    Update tides using NOAA CO-OPS API, grouped by county.
-    Each county uses the nearest NOAA tide station, then distributes to all beaches.
+    if resume <= day_start:
+        return resume
+
+    def expected(lo, hi):
+        return int(((epochs >= int(lo.timestamp())) & (epochs < int(hi.timestamp()))).sum())
+
+    if count_county_tide_rows(county_name, day_start, resume) >= expected(day_start, resume):
+        return resume
+
+    pacific_tz = pytz.timezone('America/Los_Angeles')
+    day = day_start
+    while day < resume:
+        next_day = pacific_tz.localize(datetime.combine(day.date() + timedelta(days=1), datetime.min.time()))
+        if count_county_tide_rows(county_name, day, next_day) < expected(day, next_day):
+            logger.warning(f"TIDES: {county_name} County is missing rows on {day.strftime('%Y-%m-%d')}, backfilling from there")
+            return day
+        day = next_day
+    return resume
+
+
+def update_tides_by_county(beaches: List[Dict], day_start, incremental: bool = None) -> Tuple[int, bool]:
+    """
+    Update tides grouped by county.
+    Each county uses the nearest NOAA tide station: predictions come from the
+    CO-OPS API, or from its harmonic constants with TIDE_SOURCE=harmonic.
 
     Args:
         beaches: List of all beaches
         day_start: Pacific midnight datetime to start from
+        incremental: Only write from each county's first missing or incomplete day
+            (default: TIDE_REFRESH_MODE == "incremental")
 
     Returns:
-        Total number of tide records upserted
+        (total number of tide records upserted, True when every county with a
+        station was skipped because every day of the horizon is already stored)
     """
     if not beaches:
         logger.error("TIDES: No beaches provided for tide update")
-        return 0
+        return 0, False
 
     begin_date, end_date = derive_date_range(midnight=day_start)
-    logger.info(f"TIDES: Fetching 6-minute tide predictions from {begin_date} through {end_date} (Pacific)")
+    logger.info(f"TIDES: Building 6-minute tide predictions from {begin_date} through {end_date} (Pacific)")
 
     # Group beaches by county
     by_county = group_beaches_by_county(beaches)
@@ -165,71 +228,126 @@ def update_tides_by_county(beaches: List[Dict], day_start) -> int:
     total_records = 0
     pacific_tz = pytz.timezone('America/Los_Angeles')
 
+    # Resolve the nearest NOAA tide station for every county first
+    county_stations = {}
     for county_name, county_beaches in by_county.items():
-        logger.info(f"TIDES: Processing {county_name} County ({len(county_beaches)} beaches)")
-
-        # Find nearest NOAA tide station for this county
         county_lat, county_lon = get_county_center(county_beaches)
         station_info = find_nearest_tide_station(county_lat, county_lon, max_distance_km=200)
-
         if not station_info:
             logger.warning(f"TIDES: No NOAA tide station found within 200km of {county_name} County, skipping")
             continue
+        county_stations[county_name] = station_info
+
+    epochs = tide_epochs(day_start, DAYS_FORECAST, TIDE_INTERVAL_MINUTES)
+
+    # High-water mark per county, pulled back to the first day with missing rows:
+    # skip days already stored in full from the same station
+    if incremental is None:
+        incremental = TIDE_REFRESH_MODE == "incremental"
+    county_starts = {county_name: day_start for county_name in county_stations}
+    if incremental and county_stations:
+        try:
+            marks = fetch_county_tide_high_water_marks(list(county_stations))
+            county_starts = {
+                county_name: first_short_day(
+                    county_name, day_start, resume_from(marks.get(county_name), station_id, day_start), epochs
+                )
+                for county_name, (station_id, _) in county_stations.items()
+            }
+        except Exception as e:
+            # Unknown stored rows must not look like "nothing is missing": rewrite from day_start
+            logger.error(f"TIDES: Could not read stored tide rows ({e}); refreshing every county in full")
+            county_starts = {county_name: day_start for county_name in county_stations}
+        resumed = sum(1 for start in county_starts.values() if start > day_start)
+        logger.info(f"TIDES: Incremental refresh - {resumed}/{len(county_stations)} counties resume after stored days")
+
+    # Local harmonic predictions: every pending station x every 6-minute step in one evaluation
+    end_epoch = int(epochs[-1]) if len(epochs) else 0
+    station_ids = sorted({
+        station_id for county_name, (station_id, _) in county_stations.items()
+        if int(county_starts[county_name].timestamp()) <= end_epoch
+    })
+    predicted = {}
+    if TIDE_SOURCE == "harmonic" and station_ids:
+        constants = load_station_constants(station_ids)
+        heights = predict_tides(station_ids, epochs, constants)
+        predicted = {s: heights[i] for i, s in enumerate(station_ids) if s in constants}
+        logger.info(f"TIDES: Predicted {len(epochs)} steps for {len(predicted)}/{len(station_ids)} stations from harmonic constants")
+    timestamps = epoch_to_iso(epochs) if predicted else []
+
+    counties_current = 0
+    for county_name, (station_id, distance_km) in county_stations.items():
+        county_start = county_starts[county_name]
+        if int(county_start.timestamp()) > end_epoch:
+            logger.info(f"TIDES: {county_name} County already has tides through {end_date}, skipping")
+            counties_current += 1
+            continue
 
-        station_id, distance_km = station_info
+        logger.info(f"TIDES: Processing {county_name} County ({len(by_county[county_name])} beaches) from {county_start.strftime('%Y-%m-%d')}")
         station_name = CA_TIDE_STATIONS.get(station_id, (0, 0, "Unknown"))[2]
         logger.info(f"   Using NOAA station {station_id} ({station_name}) at {distance_km:.1f}km from county center")
 
-        # Fetch tide predictions for this station at 15-minute intervals
-        predictions = get_tide_predictions_15min(station_id, begin_date, end_date)
-
-        if not predictions:
-            logger.warning(f"   No tide predictions received for {county_name} County")
-            continue
-
-        logger.info(f"   Received {len(predictions)} tide predictions at 6-minute intervals")
-
-        # Build records for this county (one record per timestamp, not per beach)
         to_upsert = []
-        for pred in predictions:
-            try:
-                # Parse timestamp (format: "YYYY-MM-DD HH:MM")
-                timestamp_str = pred['t']
-                tide_value_ft = float(pred['v'])
-
-                # Convert to Pacific timezone-aware datetime
-                timestamp_dt = pacific_tz.localize(datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M"))
-
-                # Only keep timestamps on/after day_start
-                if timestamp_dt < day_start:
-                    continue
-
-                # Apply tide adjustment
+        if station_id in predicted:
+            first = int(np.searchsorted(epochs, int(county_start.timestamp())))
+            for timestamp, tide_value_ft in zip(timestamps[first:], predicted[station_id][first:].tolist()):
                 adjusted_ft = tide_value_ft + TIDE_ADJUSTMENT_FT
-                tide_level_m = adjusted_ft * 0.3048  # Convert feet to meters
-
                 to_upsert.append({
                     "county": county_name,
-                    "timestamp": timestamp_dt.isoformat(),
+                    "timestamp": timestamp,
                     "tide_level_ft": adjusted_ft,
-                    "tide_level_m": tide_level_m,
+                    "tide_level_m": adjusted_ft * 0.3048,
                     "station_id": station_id,
                     "station_name": station_name,
                 })
-            except (KeyError, ValueError) as e:
-                logger.debug(f"   Failed to parse tide prediction: {e}")
+        else:
+            # No harmonic constants for this station: download CO-OPS predictions
+            predictions = get_tide_predictions_15min(station_id, county_start.strftime('%Y%m%d'), end_date)
+
+            if not predictions:
+                logger.warning(f"   No tide predictions received for {county_name} County")
                 continue
 
+            logger.info(f"   Received {len(predictions)} tide predictions at 6-minute intervals")
+
+            # Build records for this county (one record per timestamp, not per beach)
+            for pred in predictions:
+                try:
+                    # Parse timestamp (format: "YYYY-MM-DD HH:MM")
+                    timestamp_str = pred['t']
+                    tide_value_ft = float(pred['v'])
+
+                    # Convert to Pacific timezone-aware datetime
+                    timestamp_dt = pacific_tz.localize(datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M"))
+
+                    # Only keep timestamps on/after the county's start
+                    if timestamp_dt < county_start:
+                        continue
+
+                    # Apply tide adjustment
+                    adjusted_ft = tide_value_ft + TIDE_ADJUSTMENT_FT
+                    tide_level_m = adjusted_ft * 0.3048  # Convert feet to meters
+
+                    to_upsert.append({
+                        "county": county_name,
+                        "timestamp": timestamp_dt.isoformat(),
+                        "tide_level_ft": adjusted_ft,
+                        "tide_level_m": tide_level_m,
+                        "station_id": station_id,
+                        "station_name": station_name,
+                    })
+                except (KeyError, ValueError) as e:
+                    logger.debug(f"   Failed to parse tide prediction: {e}")
+                    continue
+
         if to_upsert:
             inserted = upsert_county_tide_data(to_upsert)
             total_records += inserted
             logger.info(f"   ✓ Upserted {inserted} tide records for {county_name} County")
 
-        # Small delay between counties to be respectful to NOAA API
-        time.sleep(0.5)
-
     logger.info(f"TIDES: Successfully upserted {total_records} total tide records across {len(by_county)} counties")
-    return total_records
+    all_current = bool(county_stations) and counties_current == len(county_stations)
+    return total_records, all_current
 
 
 def main():
@@ -241,23 +359,27 @@ def main():
 
     day_start = pacific_midnight_today()
 
-    # Optional delete control via env; default removes rows before today's midnight
+    # Optional delete control via env; default removes only expired rows (before today's midnight)
     import os
     tide_delete_mode = os.environ.get("TIDE_DELETE", "outdated")
+    incremental = TIDE_REFRESH_MODE == "incremental" and tide_delete_mode != "all"
 
     if tide_delete_mode == "all":
         logger.info("TIDES: Deleting all existing county tide data")
         delete_all_county_tide_data()
-    else:
+    elif not maintain_day_partitions(("county_tides_15min",), day_start):
         logger.info(f"TIDES: Deleting county tide data before {day_start.strftime('%Y-%m-%d %H:%M %Z')}")
         delete_county_tide_data_before(day_start)
 
-    # Update tides using NOAA CO-OPS
-    total = update_tides_by_county(beaches, day_start)
+    # Update tides (CO-OPS predictions, or harmonic with TIDE_SOURCE=harmonic)
+    total, all_current = update_tides_by_county(beaches, day_start, incremental=incremental)
 
     if total > 0:
         logger.info(f"TIDES: Update completed successfully - {total} records")
         return True
+    elif all_current:
+        logger.info("TIDES: All counties already up to date - nothing to append")
+        return True
     else:
         logger.error("TIDES: Update failed - no records inserted")
         return False
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Local harmonic tide predictor for Hybrid Surf Database Update Script
+Computes tide heights (feet above MLLW) from the published CO-OPS harmonic
+constituents of each station instead of downloading predictions every run.
+Constituent tables and datums are fetched once per station into
+TIDE_HARMONICS_PATH; after that predictions need no network at all.
+
+All stations x all timestamps are evaluated as one sum of cosines:
+    h(t) = MSL + sum_c f_c(t) * H_c * cos(V_c(t) + u_c(t) - kappa_c)
+with Schureman equilibrium arguments V and nodal corrections f/u.
+
+Usage:
+    python tide_harmonics.py                   # fetch missing station constants
+    python tide_harmonics.py --refresh         # refetch every station
+    python tide_harmonics.py --record-fixture  # store CO-OPS predictions for offline validation
+    python tide_harmonics.py --validate        # compare against the stored CO-OPS predictions (offline)
+    python tide_harmonics.py --validate --live # compare against CO-OPS predictions for the next days
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pytz
+
+from config import TIDE_HARMONICS_PATH, TIDE_VALIDATION_FIXTURE_PATH, TIDE_VALIDATION_TOLERANCE_FT
+from rate_limiter import limited_get
+from timestamps import PACIFIC_TZ, to_epoch
+
+# Get shared logger
+logger = logging.getLogger("surf_update")
+
+MDAPI_BASE_URL = "https://api.tidesandcurrents.noaa.gov/mdapi/prod/webapi/stations"
+
+# Seconds from the Unix epoch to J2000.0 (2000-01-01 12:00 UTC)
+J2000_EPOCH = 946728000
+
+# The 37 NOS constituents: equilibrium argument V as coefficients of
+# (T, s, h, p, p1) plus a constant phase in degrees (Schureman), and the
+# nodal factor group used for f and u.
+CONSTITUENTS = {
+    "M2":   ((2, -2, 2, 0, 0), 0, "M2"),
+    "S2":   ((2, 0, 0, 0, 0), 0, None),
+    "N2":   ((2, -3, 2, 1, 0), 0, "M2"),
+    "K1":   ((1, 0, 1, 0, 0), -90, "K1"),
+    "M4":   ((4, -4, 4, 0, 0), 0, "M4"),
+    "O1":   ((1, -2, 1, 0, 0), 90, "O1"),
+    "M6":   ((6, -6, 6, 0, 0), 0, "M6"),
+    "MK3":  ((3, -2, 3, 0, 0), -90, "MK3"),
+    "S4":   ((4, 0, 0, 0, 0), 0, None),
+    "MN4":  ((4, -5, 4, 1, 0), 0, "M4"),
+    "NU2":  ((2, -3, 4, -1, 0), 0, "M2"),
+    "S6":   ((6, 0, 0, 0, 0), 0, None),
+    "MU2":  ((2, -4, 4, 0, 0), 0, "M2"),
+    "2N2":  ((2, -4, 2, 2, 0), 0, "M2"),
+    "OO1":  ((1, 2, 1, 0, 0), -90, "OO1"),
+    "LAM2": ((2, -1, 0, 1, 0), 180, "M2"),
+    "S1":   ((1, 0, 0, 0, 0), 0, None),
+    "M1":   ((1, -1, 1, 1, 0), -90, "O1"),
+    "J1":   ((1, 1, 1, -1, 0), -90, "J1"),
+    "MM":   ((0, 1, 0, -1, 0), 0, "MM"),
+    "SSA":  ((0, 0, 2, 0, 0), 0, None),
+    "SA":   ((0, 0, 1, 0, 0), 0, None),
+    "MSF":  ((0, 2, -2, 0, 0), 0, "MSF"),
+    "MF":   ((0, 2, 0, 0, 0), 0, "MF"),
+    "RHO":  ((1, -3, 3, -1, 0), 90, "O1"),
+    "Q1":   ((1, -3, 1, 1, 0), 90, "O1"),
+    "T2":   ((2, 0, -1, 0, 1), 0, None),
+    "R2":   ((2, 0, 1, 0, -1), 180, None),
+    "2Q1":  ((1, -4, 1, 2, 0), 90, "O1"),
+    "P1":   ((1, 0, -1, 0, 0), 90, None),
+    "2SM2": ((2, 2, -2, 0, 0), 0, "MSF"),
+    "M3":   ((3, -3, 3, 0, 0), 0, "M3"),
+    "L2":   ((2, -1, 2, -1, 0), 180, "M2"),
+    "2MK3": ((3, -4, 3, 0, 0), 90, "2MK3"),
+    "K2":   ((2, 0, 2, 0, 0), 0, "K2"),
+    "M8":   ((8, -8, 8, 0, 0), 0, "M8"),
+    "MS4":  ((4, -2, 2, 0, 0), 0, "M2"),
+}
+CONSTITUENT_NAMES = list(CONSTITUENTS)
+# CO-OPS spells a few names differently
+NAME_ALIASES = {"RHO1": "RHO", "LAMBDA2": "LAM2"}
+
+
+# === ASTRONOMY ===
+def _astronomical_arguments(epochs: np.ndarray) -> Dict[str, np.ndarray]:
+    """Mean longitudes in degrees (Meeus) at each epoch: T, s, h, p, p1 and the lunar node N."""
+    days = (np.asarray(epochs, dtype=np.float64) - J2000_EPOCH) / 86400.0
+    return {
+        "T": np.mod(360.0 * days, 360.0),                      # mean solar hour angle at Greenwich (0 at noon)
+        "s": np.mod(218.3165 + 13.17639648 * days, 360.0),      # moon
+        "h": np.mod(280.4661 + 0.98564736 * days, 360.0),       # sun
+        "p": np.mod(83.3532 + 0.11140353 * days, 360.0),        # lunar perigee
+        "p1": np.mod(282.9373 + 0.00004707 * days, 360.0),      # solar perigee
+        "N": np.mod(125.0445 - 0.05295377 * days, 360.0),       # lunar ascending node
+    }
+
+
+def _nodal_factors(N: np.ndarray) -> Dict[str, tuple]:
+    """
+    Nodal amplitude factor f and phase correction u (degrees) per factor group.
+
+    Series in the lunar node N (Schureman/IHO). M1 and L2 use the O1/M2 terms:
+    their exact corrections also depend on perigee and only matter at the
+    hundredth-of-a-foot level on this coast.
+    """
+    n = np.radians(N)
+    c1, c2, c3 = np.cos(n), np.cos(2 * n), np.cos(3 * n)
+    s1, s2, s3 = np.sin(n), np.sin(2 * n), np.sin(3 * n)
+
+    f_m2 = 1.0004 - 0.0373 * c1 + 0.0002 * c2
+    u_m2 = -2.14 * s1
+    f_k1 = 1.0060 + 0.1150 * c1 - 0.0088 * c2 + 0.0006 * c3
+    u_k1 = -8.86 * s1 + 0.68 * s2 - 0.07 * s3
+    factors = {
+        "M2": (f_m2, u_m2),
+        "K1": (f_k1, u_k1),
+        "O1": (1.0089 + 0.1871 * c1 - 0.0147 * c2 + 0.0014 * c3, 10.80 * s1 - 1.34 * s2 + 0.19 * s3),
+        "K2": (1.0241 + 0.2863 * c1 + 0.0083 * c2 - 0.0015 * c3, -17.74 * s1 + 0.68 * s2 - 0.04 * s3),
+        "J1": (1.0129 + 0.1676 * c1 - 0.0170 * c2 + 0.0016 * c3, -12.94 * s1 + 1.34 * s2 - 0.19 * s3),
+        "OO1": (1.1027 + 0.6504 * c1 + 0.0317 * c2 - 0.0014 * c3, -36.68 * s1 + 4.02 * s2 - 0.57 * s3),
+        "MM": (1.0000 - 0.1300 * c1 + 0.0013 * c2, np.zeros_like(n)),
+        "MF": (1.0429 + 0.4135 * c1 - 0.0040 * c2, -23.74 * s1 + 2.68 * s2 - 0.38 * s3),
+        "MSF": (f_m2, -u_m2),
+        "M3": (f_m2 ** 1.5, 1.5 * u_m2),
+        "M4": (f_m2 ** 2, 2 * u_m2),
+        "M6": (f_m2 ** 3, 3 * u_m2),
+        "M8": (f_m2 ** 4, 4 * u_m2),
+        "MK3": (f_m2 * f_k1, u_m2 + u_k1),
+        "2MK3": (f_m2 ** 2 * f_k1, 2 * u_m2 - u_k1),
+    }
+    return factors
+
+
+def constituent_arguments(epochs: Iterable[int]):
+    """
+    Phase (V + u, radians) and nodal factor f of every constituent at each epoch.
+
+    Returns:
+        (phase, f) arrays of shape (len(CONSTITUENTS), len(epochs))
+    """
+    astro = _astronomical_arguments(epochs)
+    factors = _nodal_factors(astro["N"])
+    basis = np.vstack([astro["T"], astro["s"], astro["h"], astro["p"], astro["p1"]])
+
+    coefficients = np.array([CONSTITUENTS[name][0] for name in CONSTITUENT_NAMES], dtype=np.float64)
+    offsets = np.array([CONSTITUENTS[name][1] for name in CONSTITUENT_NAMES], dtype=np.float64)
+    phase = coefficients @ basis + offsets[:, None]
+
+    f = np.ones_like(phase)
+    for row, name in enumerate(CONSTITUENT_NAMES):
+        group = CONSTITUENTS[name][2]
+        if group is not None:
+            f[row], u = factors[group]
+            phase[row] += u
+    return np.radians(np.mod(phase, 360.0)), f
+
+
+# === CONSTANTS ===
+def fetch_station_constants(station_id: str) -> Optional[Dict]:
+    """Harmonic constituents (feet, Greenwich phase) and MSL above MLLW for one station from CO-OPS."""
+    try:
+        harcon = limited_get(f"{MDAPI_BASE_URL}/{station_id}/harcon.json", params={"units": "english"}, timeout=20)
+        harcon.raise_for_status()
+        datums = limited_get(f"{MDAPI_BASE_URL}/{station_id}/datums.json", params={"units": "english"}, timeout=20)
+        datums.raise_for_status()
+        harcon_data, datum_data = harcon.json(), datums.json()
+    except Exception as e:
+        logger.warning(f"   Tide harmonics: could not fetch constants for station {station_id}: {e}")
+        return None
+
+    constituents = {}
+    for entry in harcon_data.get("HarmonicConstituents") or []:
+        name = str(entry.get("name", "")).upper()
+        name = NAME_ALIASES.get(name, name)
+        try:
+            amplitude, phase = float(entry["amplitude"]), float(entry["phase_GMT"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if name in CONSTITUENTS and amplitude > 0:
+            constituents[name] = [amplitude, phase]
+
+    levels = {d.get("name"): d.get("value") for d in datum_data.get("datums") or []}
+    try:
+        msl_above_mllw = float(levels["MSL"]) - float(levels["MLLW"])
+    except (KeyError, TypeError, ValueError):
+        msl_above_mllw = None
+
+    if not constituents or msl_above_mllw is None:
+        logger.warning(f"   Tide harmonics: station {station_id} has no harmonic constants or datums (subordinate station?)")
+        return None
+    return {
+        "constituents": constituents,
+        "msl_above_mllw_ft": msl_above_mllw,
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def _read_constants(path: str) -> Dict[str, Dict]:
+    if not path:
+        return {}
+    try:
+        with open(path, encoding="utf-8") as fh:
+            payload = json.load(fh)
+        return payload.get("stations") or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_constants(stations: Dict[str, Dict], path: str):
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"source": MDAPI_BASE_URL, "stations": stations}, fh, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"   Tide harmonics: could not write {path}: {e}")
+
+
+def load_station_constants(station_ids: Iterable[str], path: str = TIDE_HARMONICS_PATH,
+                           refresh: bool = False) -> Dict[str, Dict]:
+    """
+    Harmonic constants for the requested stations, fetching (and storing) only
+    the ones missing from the local file.
+
+    Returns:
+        Dict of station_id -> constants; stations that could not be fetched are absent
+    """
+    stations = _read_constants(path)
+    wanted = list(dict.fromkeys(str(s) for s in station_ids))
+    missing = [s for s in wanted if refresh or s not in stations]
+    fetched = 0
+    for station_id in missing:
+        constants = fetch_station_constants(station_id)
+        if constants:
+            stations[station_id] = constants
+            fetched += 1
+    if fetched and path:
+        _write_constants(stations, path)
+        logger.info(f"   Tide harmonics: stored constants for {fetched} station(s) in {path}")
+    return {s: stations[s] for s in wanted if s in stations}
+
+
+# === PREDICTION ===
+def predict_tides(station_ids: List[str], epochs: Iterable[int],
+                  constants: Optional[Dict[str, Dict]] = None) -> np.ndarray:
+    """
+    Tide heights in feet above MLLW for every station at every epoch.
+
+    Args:
+        station_ids: Stations (rows of the result)
+        epochs: UTC epoch seconds (columns of the result)
+        constants: Output of load_station_constants() (loaded if omitted)
+
+    Returns:
+        float64 array (len(station_ids), len(epochs)); NaN rows for stations without constants
+    """
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if constants is None:
+        constants = load_station_constants(station_ids)
+    heights = np.full((len(station_ids), len(epochs)), np.nan)
+    if epochs.size == 0:
+        return heights
+
+    # Station constants as (stations x constituents) amplitude matrices split on the station phase:
+    # H cos(A - kappa) = (H cos kappa) cos A + (H sin kappa) sin A
+    rows = [i for i, s in enumerate(station_ids) if str(s) in constants]
+    if not rows:
+        return heights
+    amp_cos = np.zeros((len(rows), len(CONSTITUENT_NAMES)))
+    amp_sin = np.zeros_like(amp_cos)
+    datum = np.zeros(len(rows))
+    for r, i in enumerate(rows):
+        station = constants[str(station_ids[i])]
+        datum[r] = station["msl_above_mllw_ft"]
+        for c, name in enumerate(CONSTITUENT_NAMES):
+            amplitude, kappa = station["constituents"].get(name, (0.0, 0.0))
+            amp_cos[r, c] = amplitude * np.cos(np.radians(kappa))
+            amp_sin[r, c] = amplitude * np.sin(np.radians(kappa))
+
+    phase, f = constituent_arguments(epochs)
+    heights[rows] = datum[:, None] + amp_cos @ (f * np.cos(phase)) + amp_sin @ (f * np.sin(phase))
+    return heights
+
+
+def tide_epochs(day_start: datetime, days: int, interval_minutes: int) -> np.ndarray:
+    """Epochs every `interval_minutes` from `day_start` (Pacific midnight) through the end of day `days`."""
+    pacific = pytz.timezone(PACIFIC_TZ)
+    last_midnight = pacific.localize(datetime.combine(day_start.date() + timedelta(days=days + 1), datetime.min.time()))
+    return np.arange(int(day_start.timestamp()), int(last_midnight.timestamp()), interval_minutes * 60, dtype=np.int64)
+
+
+# === VALIDATION ===
+def _compare(station_id: str, reference: List[Dict], constants: Dict[str, Dict]) -> Dict:
+    """Local prediction error against CO-OPS [{'t': local time, 'v': feet}] predictions for one station."""
+    missing = {"rmse_ft": None, "max_error_ft": None, "n": 0, "ok": False}
+    if station_id not in constants:
+        return missing
+    epochs = to_epoch([p.get("t") for p in reference], naive_tz=PACIFIC_TZ)
+    values = np.array([float(p.get("v", "nan") or "nan") for p in reference])
+    valid = (epochs >= 0) & np.isfinite(values)
+    if not valid.any():
+        return missing
+    predicted = predict_tides([station_id], epochs[valid], constants)[0]
+    error = predicted - values[valid]
+    rmse = float(np.sqrt(np.mean(error ** 2)))
+    return {
+        "rmse_ft": round(rmse, 3),
+        "max_error_ft": round(float(np.max(np.abs(error))), 3),
+        "n": int(valid.sum()),
+        "ok": rmse <= TIDE_VALIDATION_TOLERANCE_FT,
+    }
+
+
+def validate_against_coops(station_ids: List[str], days: int = 3) -> Dict[str, Dict]:
+    """
+    Compare local predictions with CO-OPS hourly predictions (served from the
+    HTTP cache when available) for the next `days` days.
+
+    Returns:
+        Dict of station_id -> {"rmse_ft", "max_error_ft", "n", "ok"}
+    """
+    from noaa_tides_handler import get_tide_predictions
+
+    now = datetime.now(timezone.utc)
+    begin_date = now.strftime("%Y%m%d")
+    end_date = (now + timedelta(days=days)).strftime("%Y%m%d")
+    constants = load_station_constants(station_ids)
+    return {
+        station_id: _compare(station_id, get_tide_predictions(station_id, begin_date, end_date), constants)
+        for station_id in station_ids
+    }
+
+
+def record_validation_fixture(station_ids: List[str], days: int = 3,
+                              path: str = TIDE_VALIDATION_FIXTURE_PATH) -> int:
+    """
+    Store CO-OPS hourly predictions (local time, feet above MLLW) for the next
+    `days` days so --validate can run without network access.
+
+    Returns:
+        Number of stations stored
+    """
+    from noaa_tides_handler import get_tide_predictions
+
+    now = datetime.now(timezone.utc)
+    begin_date = now.strftime("%Y%m%d")
+    end_date = (now + timedelta(days=days)).strftime("%Y%m%d")
+    stations = {}
+    for station_id in station_ids:
+        predictions = get_tide_predictions(station_id, begin_date, end_date)
+        if predictions:
+            stations[station_id] = [{"t": p.get("t"), "v": p.get("v")} for p in predictions]
+    if stations:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({
+                "source": "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter (product=predictions, "
+                          "datum=MLLW, units=english, time_zone=lst_ldt, interval=h)",
+                "begin_date": begin_date,
+                "end_date": end_date,
+                "recorded_at": now.isoformat(),
+                "stations": stations,
+            }, fh, indent=1, sort_keys=True)
+        logger.info(f"   Tide harmonics: stored CO-OPS predictions for {len(stations)} station(s) in {path}")
+    return len(stations)
+
+
+def validate_against_fixture(station_ids: List[str], path: str = TIDE_VALIDATION_FIXTURE_PATH,
+                             constants_path: str = TIDE_HARMONICS_PATH) -> Optional[Dict[str, Dict]]:
+    """
+    Compare local predictions with the stored CO-OPS predictions; reads only
+    local files (constants are not fetched).
+
+    Returns:
+        Dict of station_id -> {"rmse_ft", "max_error_ft", "n", "ok"}, or None without a fixture
+    """
+    try:
+        with open(path, encoding="utf-8") as fh:
+            fixture = json.load(fh)
+    except (OSError, ValueError) as e:
+        logger.error(f"   Tide harmonics: no validation fixture at {path} ({e}); run --record-fixture once online")
+        return None
+    constants = _read_constants(constants_path)
+    reference = fixture.get("stations") or {}
+    logger.info(
+        f"   Tide harmonics: validating against CO-OPS predictions {fixture.get('begin_date')}-"
+        f"{fixture.get('end_date')} stored in {path}"
+    )
+    return {
+        station_id: _compare(station_id, reference[station_id], constants)
+        for station_id in station_ids if station_id in reference
+    }
+
+
+def main() -> bool:
+    from noaa_tides_handler import CA_TIDE_STATIONS
+
+    parser = argparse.ArgumentParser(description="Local harmonic tide predictions")
+    parser.add_argument("--refresh", action="store_true", help="Refetch constants for every station")
+    parser.add_argument("--validate", action="store_true", help="Compare with the stored CO-OPS predictions")
+    parser.add_argument("--live", action="store_true", help="With --validate: compare with CO-OPS for the next days")
+    parser.add_argument("--record-fixture", action="store_true", help="Store CO-OPS predictions for --validate")
+    parser.add_argument("--days", type=int, default=3, help="Validation horizon in days")
+    args = parser.parse_args()
+
+    station_ids = list(CA_TIDE_STATIONS)
+    if args.validate and not args.live:
+        results = validate_against_fixture(station_ids)
+        if results is None:
+            return False
+    else:
+        constants = load_station_constants(station_ids, refresh=args.refresh)
+        logger.info(f"Tide harmonics: constants available for {len(constants)}/{len(station_ids)} stations")
+        if args.record_fixture and not record_validation_fixture(station_ids, args.days):
+            return False
+        if not args.validate:
+            return bool(constants)
+        results = validate_against_coops(station_ids, args.days)
+
+    logger.info(f"   {'station':<10}{'name':<24}{'rmse ft':>9}{'max ft':>9}{'n':>6}")
+    for station_id, r in results.items():
+        name = CA_TIDE_STATIONS[station_id][2]
+        rmse = "-" if r["rmse_ft"] is None else f"{r['rmse_ft']:.3f}"
+        worst = "-" if r["max_error_ft"] is None else f"{r['max_error_ft']:.3f}"
+        flag = "" if r["ok"] else "  <-- uses CO-OPS fallback" if r["rmse_ft"] is None else "  <-- FAIL"
+        logger.info(f"   {station_id:<10}{name:<24}{rmse:>9}{worst:>9}{r['n']:>6}{flag}")
+    return all(r["ok"] for r in results.values() if r["rmse_ft"] is not None)
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)
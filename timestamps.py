@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Timestamp canonicalization for Hybrid Surf Database Update Script
+All internal joins use int64 UTC epoch seconds; ISO strings are only
+produced when records are serialized for the database
+"""
+
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import pytz
+
+PACIFIC_TZ = "America/Los_Angeles"
+BUCKET_HOURS = 3
+BUCKET_SECONDS = BUCKET_HOURS * 3600
+INVALID_EPOCH = -1
+
+_EPOCH_UTC = pd.Timestamp("1970-01-01", tz="UTC")
+# Trailing "Z", "+00:00" or "-0800" marks a timezone-aware ISO string
+_OFFSET_PATTERN = r"(?:Z|[+-]\d{2}:?\d{2})$"
+
+
+def _seconds_since_epoch(parsed: pd.Series) -> np.ndarray:
+    seconds = (parsed - _EPOCH_UTC) // pd.Timedelta(seconds=1)
+    return seconds.fillna(INVALID_EPOCH).astype(np.int64).to_numpy()
+
+
+def to_epoch(values: Iterable, naive_tz: Optional[str] = "UTC") -> np.ndarray:
+    """
+    Convert ISO strings, datetimes or pandas Timestamps to int64 UTC epoch seconds.
+
+    Args:
+        values: Iterable of timestamps (mixed offsets allowed)
+        naive_tz: Timezone assumed for values without an offset; None marks them invalid
+
+    Returns:
+        np.ndarray of int64 seconds, INVALID_EPOCH (-1) where a value cannot be parsed
+    """
+    series = pd.Series(list(values), dtype=object)
+    if series.empty:
+        return np.array([], dtype=np.int64)
+
+    as_text = series.astype(str).str.strip()
+    naive = ~as_text.str.contains(_OFFSET_PATTERN, regex=True)
+    epochs = np.full(len(series), INVALID_EPOCH, dtype=np.int64)
+
+    aware_mask = (~naive).to_numpy()
+    if aware_mask.any():
+        parsed = pd.to_datetime(as_text[aware_mask], utc=True, errors="coerce", format="ISO8601")
+        epochs[aware_mask] = _seconds_since_epoch(parsed)
+
+    naive_mask = naive.to_numpy() & series.notna().to_numpy()
+    if naive_mask.any() and naive_tz is not None:
+        parsed = pd.to_datetime(as_text[naive_mask], errors="coerce", format="ISO8601")
+        if naive_tz != "UTC":
+            # Ambiguous wall times resolve to standard time, matching pytz.localize()
+            parsed = parsed.dt.tz_localize(
+                naive_tz,
+                ambiguous=np.zeros(len(parsed), dtype=bool),
+                nonexistent="shift_forward",
+            )
+        else:
+            parsed = parsed.dt.tz_localize("UTC")
+        epochs[naive_mask] = _seconds_since_epoch(parsed)
+
+    return epochs
+
+
+def to_epoch_scalar(value, naive_tz: Optional[str] = "UTC") -> Optional[int]:
+    """Single-value form of to_epoch(); returns None instead of INVALID_EPOCH."""
+    if value is None:
+        return None
+    epoch = int(to_epoch([value], naive_tz)[0])
+    return None if epoch == INVALID_EPOCH else epoch
+
+
+def epoch_to_iso(epochs: Iterable[int], tz: str = PACIFIC_TZ) -> List[str]:
+    """Format epoch seconds as ISO strings with a colon offset (e.g. 2025-10-23T00:00:00-07:00)."""
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if epochs.size == 0:
+        return []
+    local = pd.to_datetime(epochs, unit="s", utc=True).tz_convert(tz)
+    text = pd.Series(local.strftime("%Y-%m-%dT%H:%M:%S%z"))
+    return (text.str[:-2] + ":" + text.str[-2:]).tolist()
+
+
+def to_utc_iso(value) -> Optional[str]:
+    """Normalize a datetime or ISO string to a UTC ISO string (naive values are UTC)."""
+    epoch = to_epoch_scalar(value)
+    if epoch is None:
+        return None
+    return epoch_to_iso([epoch], "UTC")[0]
+
+
+def bucket_pacific_3h(epochs: Iterable[int], wrap_midnight: bool = True) -> np.ndarray:
+    """
+    Snap epoch seconds to the nearest 3-hour Pacific bucket (00, 03, ... 21 local).
+
+    Minutes are ignored and an hour two past a boundary rounds up, matching the
+    NOAA grid handler. Bucket hours never fall in a DST transition, so each
+    bucket maps to exactly one instant.
+
+    Args:
+        epochs: int64 UTC epoch seconds
+        wrap_midnight: Round 23:xx up to next-day 00:00; if False clamp to 21:00
+            (the alignment used by the Open-Meteo, NWS and CO-OPS handlers)
+
+    Returns:
+        np.ndarray of bucket epoch seconds (INVALID_EPOCH preserved)
+    """
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if epochs.size == 0:
+        return epochs.copy()
+
+    valid = epochs != INVALID_EPOCH
+    local = pd.to_datetime(np.where(valid, epochs, 0), unit="s", utc=True).tz_convert(PACIFIC_TZ).tz_localize(None)
+    hours = local.hour.to_numpy()
+    remainder = hours % BUCKET_HOURS
+    target = hours - remainder + np.where(remainder == 2, BUCKET_HOURS, 0)
+    if not wrap_midnight:
+        target = np.minimum(target, 24 - BUCKET_HOURS)
+
+    bucket_local = local.normalize() + pd.to_timedelta(target, unit="h")
+    bucket = bucket_local.tz_localize(PACIFIC_TZ, ambiguous=np.zeros(len(bucket_local), dtype=bool), nonexistent="shift_forward")
+    seconds = (bucket - _EPOCH_UTC) // pd.Timedelta(seconds=1)
+    return np.where(valid, np.asarray(seconds, dtype=np.int64), INVALID_EPOCH)
+
+
+def epoch_to_pacific_date(epochs: Iterable[int]) -> List[Optional[str]]:
+    """Pacific calendar date (YYYY-MM-DD) for each epoch; None where invalid."""
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if epochs.size == 0:
+        return []
+    valid = epochs != INVALID_EPOCH
+    local = pd.to_datetime(np.where(valid, epochs, 0), unit="s", utc=True).tz_convert(PACIFIC_TZ)
+    dates = local.strftime("%Y-%m-%d").tolist()
+    return [d if ok else None for d, ok in zip(dates, valid.tolist())]
+
+
+def cadence_seconds(freq: str) -> int:
+    """Length of a fixed pandas frequency string ("h", "H", "3h", "15min") in seconds."""
+    return int(pd.Timedelta(pd.tseries.frequencies.to_offset(freq.lower())).total_seconds())
+
+
+def floor_epoch(epochs: Iterable[int], seconds: int) -> np.ndarray:
+    """Floor epoch seconds to a fixed UTC step (e.g. 3600 for hourly buckets)."""
+    epochs = np.asarray(epochs, dtype=np.int64)
+    return np.where(epochs == INVALID_EPOCH, INVALID_EPOCH, epochs - epochs % seconds)
+
+
+def pacific_midnight_epoch(days_offset: int = 0, now: Optional[datetime] = None) -> int:
+    """Epoch seconds of Pacific midnight today (plus `days_offset` days)."""
+    pacific = pytz.timezone(PACIFIC_TZ)
+    now = now.astimezone(pacific) if now is not None else datetime.now(pacific)
+    day = (pd.Timestamp(now.date()) + pd.Timedelta(days=days_offset)).to_pydatetime()
+    return int(pacific.localize(day).timestamp())
+
+
+def pacific_horizon_dates(days: int, now: Optional[datetime] = None) -> List[str]:
+    """Pacific calendar dates (YYYY-MM-DD) from today through today + `days`."""
+    pacific = pytz.timezone(PACIFIC_TZ)
+    now = now.astimezone(pacific) if now is not None else datetime.now(pacific)
+    return [d.strftime("%Y-%m-%d") for d in pd.date_range(now.date(), periods=days + 1, freq="D")]
+
+
+def nearest_index(sorted_epochs: Iterable[int], targets: Iterable[int], tolerance_seconds: int) -> np.ndarray:
+    """
+    Index of the closest entry in `sorted_epochs` for every target (binary search).
+
+    Ties go to the earlier entry, matching np.argmin over absolute differences.
+
+    Returns:
+        np.ndarray of int64 indices, -1 where nothing lies within `tolerance_seconds`
+    """
+    sorted_epochs = np.asarray(sorted_epochs, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    if sorted_epochs.size == 0 or targets.size == 0:
+        return np.full(targets.shape, -1, dtype=np.int64)
+
+    right = np.clip(np.searchsorted(sorted_epochs, targets, side="left"), 0, sorted_epochs.size - 1)
+    left = np.clip(right - 1, 0, sorted_epochs.size - 1)
+    left_diff = np.abs(targets - sorted_epochs[left])
+    right_diff = np.abs(sorted_epochs[right] - targets)
+    best = np.where(left_diff <= right_diff, left, right)
+    best_diff = np.minimum(left_diff, right_diff)
+    return np.where(best_diff <= tolerance_seconds, best, -1).astype(np.int64)
+
+
+def nearest_within(epochs: Iterable[int], targets: Iterable[int], tolerance_seconds: int) -> np.ndarray:
+    """
+    nearest_index() for epochs in any order (INVALID_EPOCH entries never match).
+
+    Returns:
+        np.ndarray of int64 positions into `epochs`, -1 where nothing lies within tolerance
+    """
+    epochs = np.asarray(epochs, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    valid = np.flatnonzero(epochs != INVALID_EPOCH)
+    if valid.size == 0:
+        return np.full(targets.shape, -1, dtype=np.int64)
+    order = valid[np.argsort(epochs[valid], kind="stable")]
+    found = nearest_index(epochs[order], targets, tolerance_seconds)
+    matched = np.where(found >= 0, order[np.maximum(found, 0)], -1)
+    return np.where(targets == INVALID_EPOCH, -1, matched).astype(np.int64)
+
+
+class EpochIndex:
+    """
+    Per-entity sorted epoch arrays over a list of records.
+
+    Built once in O(R log R); each lookup is a binary search, so matching any
+    number of targets (exact or near misses) never rescans an entity's records.
+    Duplicate (entity, timestamp) rows resolve to the last one, like a dict index.
+    """
+
+    def __init__(self, records: List[dict], id_field: str, timestamp_field: str = "timestamp",
+                 naive_tz: Optional[str] = "UTC"):
+        self.epochs = to_epoch([r.get(timestamp_field) for r in records], naive_tz)
+        positions = {}
+        for idx, record in enumerate(records):
+            entity = record.get(id_field)
+            if entity is not None and self.epochs[idx] != INVALID_EPOCH:
+                positions.setdefault(entity, []).append(idx)
+
+        self._entities = {}
+        for entity, idx_list in positions.items():
+            idx_arr = np.asarray(idx_list, dtype=np.int64)
+            idx_arr = idx_arr[np.argsort(self.epochs[idx_arr], kind="stable")]
+            entity_epochs = self.epochs[idx_arr]
+            # Keep the last row of each run of equal timestamps
+            last = np.append(entity_epochs[1:] != entity_epochs[:-1], True)
+            self._entities[entity] = (entity_epochs[last], idx_arr[last])
+
+    def __contains__(self, entity) -> bool:
+        return entity in self._entities
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def lookup(self, entity, targets: Iterable[int], tolerance_seconds: int = 0) -> np.ndarray:
+        """
+        Record index nearest each target epoch for one entity.
+
+        Returns:
+            np.ndarray of int64 record indices, -1 where no record lies within tolerance
+        """
+        targets = np.asarray(targets, dtype=np.int64)
+        entry = self._entities.get(entity)
+        if entry is None:
+            return np.full(targets.shape, -1, dtype=np.int64)
+        entity_epochs, record_indices = entry
+        found = nearest_index(entity_epochs, targets, tolerance_seconds)
+        return np.where(found >= 0, record_indices[np.maximum(found, 0)], -1).astype(np.int64)
@@ -16,6 +16,7 @@ import pytz
 
 from config import logger, BATCH_SIZE
 from utils import chunk_iter
+from rate_limiter import limited_get
 
 USNO_BASE_URL = "https://aa.usno.navy.mil/api"
 
@@ -45,7 +46,7 @@ def get_sun_moon_data(lat: float, lon: float, date_str: str, max_retries: int =
 
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, params=params, timeout=20)
+            response = limited_get(url, params=params, timeout=20)
             response.raise_for_status()
             data = response.json()
 
@@ -201,9 +202,6 @@ def update_daily_conditions_usno(counties: List[Dict]) -> List[Dict]:
             # Fetch data for this day
             data = get_sun_moon_data(lat, lon, date_str)
 
-            # Small delay between requests to be respectful to USNO API
-            time.sleep(0.5)
-
             if data:
                 # Convert moon phase name to numeric value
                 moon_phase = convert_moon_phase_to_value(data.get("moon_phase_name"))
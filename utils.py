@@ -5,23 +5,18 @@ Contains unit conversions, rate limiting, and helper functions
 """
 
 import math
-import time
 import numpy as np
 import logging
 
 # Get shared logger
 logger = logging.getLogger("surf_update")
 
-from config import (
-    NOAA_REQUEST_DELAY,
-    NOAA_OCEAN_REQUEST_DELAY,
-    NOAA_ATMOSPHERIC_REQUEST_DELAY,
-    OPENMETEO_REQUEST_DELAY,
-    OPENMETEO_RETRY_DELAY,
-    OPENMETEO_MAX_RETRIES,
-    get_noaa_rate_limit_globals,
-    set_noaa_last_request_time
-)
+from config import OPENMETEO_MAX_RETRIES
+from circuit_breaker import get_breaker
+from instrumentation import record_retry, record_step
+from rate_limiter import get_limiter
+
+NOAA_HOST = "nomads.ncep.noaa.gov"
 
 # === UNIT CONVERSION FUNCTIONS ===
 def celsius_to_fahrenheit(celsius):
@@ -125,6 +120,13 @@ def surfline_energy_kj_index(height_ft: float, period_s: float, direction_deg: f
     except Exception:
         return None
 
+def surfline_energy_kj_index_array(height_ft, period_s) -> np.ndarray:
+    """surfline_energy_kj_index() over arrays (no direction term); NaN where height or period is missing."""
+    H = _float_array(height_ft, np.nan)
+    T = _float_array(period_s, np.nan)
+    base = (0.129233 * H * (T ** 2)) + (-0.04233 * (H ** 2) * T)
+    return np.rint(np.maximum(0.0, base))
+
 def calculate_wave_energy_kj(wave_height_ft, wave_period_s, direction_deg: float = None, beach_normal_deg: float = None):
     """
     Return Surf-Forecast-like energy index (rounded int).
@@ -138,40 +140,43 @@ def calculate_wave_energy_kj(wave_height_ft, wave_period_s, direction_deg: float
         return None
 
 # === RATE LIMITING FUNCTIONS ===
-def enforce_noaa_rate_limit(delay=None):
+def enforce_noaa_rate_limit(host=NOAA_HOST):
     """
-    Enforce NOAA rate limiting with thread safety.
+    Wait for the host's adaptive token bucket before a NOAA request (thread safe).
 
     Args:
-        delay: Optional override for rate limit delay. If not specified, uses NOAA_REQUEST_DELAY.
-               Use NOAA_OCEAN_REQUEST_DELAY for ocean data or NOAA_ATMOSPHERIC_REQUEST_DELAY for atmospheric data.
+        host: Upstream host; each host is paced independently (see rate_limiter.py)
     """
-    if delay is None:
-        delay = NOAA_REQUEST_DELAY
-
-    last_request_time, request_lock = get_noaa_rate_limit_globals()
-
-    with request_lock:
-        current_time = time.time()
-        time_since_last = current_time - last_request_time
+    get_limiter(host).acquire()
 
-        if time_since_last < delay:
-            sleep_time = delay - time_since_last
-            logger.debug(f"      Rate limiting: sleeping {sleep_time:.1f}s")
-            time.sleep(sleep_time)
-
-        set_noaa_last_request_time(time.time())
+def report_rate_limited(host=NOAA_HOST):
+    """Tell the host's limiter it throttled us (429 or an HTML rate-limit page)."""
+    get_limiter(host).on_throttle()
 
 def api_request_with_retry(api_func, *args, max_retries=OPENMETEO_MAX_RETRIES, **kwargs):
-    """Make Open-Meteo API request with retry logic for rate limiting."""
+    """
+    Make Open-Meteo API request with retry logic for rate limiting.
+
+    Requests are paced by the endpoint host's adaptive bucket. Rate-limited
+    attempts halve that host's rate and count against the "openmeteo" circuit
+    breaker; once the circuit opens CircuitOpenError is raised at once instead
+    of sleeping out the limit.
+    """
+    # The endpoint URL is the first positional argument for the Open-Meteo client
+    host = args[0] if args else kwargs.get("url")
+    breaker = get_breaker("openmeteo")
+    limiter = get_limiter(host)
     for attempt in range(max_retries + 1):
+        breaker.check()
         try:
-            # Add delay before each Open-Meteo request
             if attempt > 0:
-                logger.info(f"      Retry attempt {attempt}, waiting {OPENMETEO_REQUEST_DELAY}s...")
-                time.sleep(OPENMETEO_REQUEST_DELAY)
+                logger.info(f"      Retry attempt {attempt} ({limiter.rate:.2f} req/s)...")
+                record_retry(host)
+            # Pace every Open-Meteo request through the host's adaptive bucket
+            limiter.acquire()
             
             result = api_func(*args, **kwargs)
+            breaker.record_success()
             return result
             
         except Exception as e:
@@ -179,24 +184,19 @@ def api_request_with_retry(api_func, *args, max_retries=OPENMETEO_MAX_RETRIES, *
             
             # Check if it's a rate limit error
             if any(phrase in error_str for phrase in ['rate limit', 'limit exceeded', 'try again', 'too many requests', '429']):
+                breaker.record_failure()
+                limiter.on_throttle()
+                logger.warning(f"      Open-Meteo RATE LIMITED (attempt {attempt + 1}/{max_retries + 1})")
                 if attempt < max_retries:
-                    wait_time = OPENMETEO_RETRY_DELAY * (attempt + 1)  # Exponential backoff
-                    logger.warning(f"      Open-Meteo RATE LIMITED (attempt {attempt + 1}/{max_retries + 1}). Waiting {wait_time}s...")
-                    time.sleep(wait_time)
                     continue
-                else:
-                    logger.error(f"ERROR: Open-Meteo rate limit exceeded after {max_retries + 1} attempts")
-                    raise e
+                logger.error(f"ERROR: Open-Meteo rate limit exceeded after {max_retries + 1} attempts")
+                raise e
             else:
                 # Not a rate limit error, don't retry
                 raise e
     
     raise Exception("Open-Meteo max retries exceeded")
 
-def safe_openmeteo_delay():
-    """Add a delay between Open-Meteo API calls to be respectful."""
-    time.sleep(OPENMETEO_REQUEST_DELAY)
-
 # === VALIDATION FUNCTIONS ===
 def valid_coord(x):
     """Check if coordinate is valid (not None, not NaN)."""
@@ -243,6 +243,7 @@ def safe_int(x):
 # === HELPER FUNCTIONS ===
 def log_step(message: str, step_num: int = None):
     """Log a major step with formatting."""
+    record_step(message, step_num)
     if step_num:
         logger.info(f"STEP {step_num}: {message}")
     else:
@@ -281,6 +282,75 @@ def get_date_range_strings(days_forecast):
 # === DATA PROCESSING HELPERS ===
 # Note: Swell ranking functions moved to swell_ranking.py module
 
+# WMO weather code thresholds shared by derive_weather_codes()
+DRIZZLE_THRESHOLD_MMHR = 0.5
+LIGHT_THRESHOLD_MMHR = 2.5
+MODERATE_THRESHOLD_MMHR = 10.0
+HEAVY_THRESHOLD_MMHR = 50.0
+SNOW_BELOW_F = 35
+
+
+def _float_array(values, missing):
+    """float64 array from a scalar, list or array; None and NaN become `missing`."""
+    if values is None:
+        return np.array(missing, dtype=np.float64)
+    arr = np.asarray(values)
+    if arr.dtype == object:
+        arr = np.where(np.equal(arr, None), np.nan, arr)
+    arr = arr.astype(np.float64)
+    return np.where(np.isnan(arr), missing, arr)
+
+
+def derive_weather_codes(cloud_cover_pct, precip_rate, temperature_f) -> np.ndarray:
+    """
+    Array form of the handlers' derive_weather_code() (same thresholds and codes).
+
+    Missing inputs (None or NaN) take the scalar defaults: 50% cloud,
+    0 mm/hr precipitation and 60°F.
+
+    Args:
+        cloud_cover_pct: Cloud cover percentages (0-100)
+        precip_rate: Precipitation rates in mm/hr
+        temperature_f: Temperatures in Fahrenheit
+
+    Returns:
+        np.ndarray of int64 WMO codes, broadcast over the inputs
+    """
+    cloud, precip, temp = np.broadcast_arrays(
+        _float_array(cloud_cover_pct, 50.0),
+        _float_array(precip_rate, 0.0),
+        _float_array(temperature_f, 60.0),
+    )
+
+    precipitating = precip > DRIZZLE_THRESHOLD_MMHR
+    snow = precipitating & (temp < SNOW_BELOW_F)
+    rain = precipitating & ~snow
+    heavy = precip >= HEAVY_THRESHOLD_MMHR
+    moderate = precip >= MODERATE_THRESHOLD_MMHR
+
+    conditions = [
+        snow & heavy, snow & moderate, snow,
+        rain & heavy & (cloud >= 70), rain & heavy, rain & moderate,
+        rain & (precip >= LIGHT_THRESHOLD_MMHR), rain,
+        cloud < 10, cloud < 25, cloud < 50, cloud < 90,
+    ]
+    choices = [75, 73, 71, 95, 65, 63, 61, 51, 0, 1, 2, 3]
+    return np.select(conditions, choices, default=45).astype(np.int64)
+
+
+def wind_speed_direction(u, v):
+    """
+    Wind speed and meteorological direction (degrees the wind blows FROM) from u/v components.
+
+    Returns:
+        (speed, direction) float64 arrays; speed is in the units of u/v, NaN where either is missing
+    """
+    u = _float_array(u, np.nan)
+    v = _float_array(v, np.nan)
+    speed = np.sqrt(u ** 2 + v ** 2)
+    direction = (270 - np.degrees(np.arctan2(v, u))) % 360
+    return speed, direction
+
 # === ERROR HANDLING HELPERS ===
 def is_rate_limit_error(error_str):
     """Check if error string indicates a rate limit."""